@@ -1,7 +1,7 @@
 import os
 import json
 import mysql.connector
-from sqlalchemy import create_engine
+from databases import connection_pool, bulk_loader
 import pandas as pd
 import pymysql.cursors
 # from code1.logger import logger
@@ -45,8 +45,7 @@ class MySQL_DB:
         """
         Connect to Database for Fetching Data
         """
-        return mysql.connector.connect(user=self.user, password=self.password,host=self.host,
-                                       port=self.port,database=self.dbname, **self.ssl_args)
+        return connection_pool.get_connection()
 
     def update_transaction_table_with_scores(self):
         """
@@ -239,22 +238,11 @@ class MySQL_DB:
                 tablename : table to which the data should be uploaded
         """
     
-        engine = create_engine("mysql+pymysql://"+self.user+":"+self.password+"@"+self.host+":"+str(self.port)+"/"+self.dbname, connect_args = self.connect_args)
-        with engine.connect() as connection:
-            data.to_sql(tablename, con=connection,index = False, if_exists = 'append')
-            engine.dispose()
+        bulk_loader.upload_dataframe(data, tablename)
 
     def connect_db_cursorclass(self):
 
-        conn = pymysql.connect(
-        host=self.host,
-        user=self.user,
-        password=self.password,
-        db=self.dbname,
-        cursorclass=pymysql.cursors.DictCursor,
-        **self.ssl_args
-        )
-        return conn  
+        return connection_pool.get_pymysql_connection(cursorclass=pymysql.cursors.DictCursor)  
 
     def get_user_matrix(self):
         """
@@ -6,6 +6,7 @@ import pandas as pd
 import os
 from cleanco import basename
 from rapidfuzz import fuzz
+from row_dedup import anti_join
 
 import pandas as pd
 from code1.logger import capture_log_message
@@ -346,12 +347,8 @@ def filter_out_duplicate_credit_debit_pairs(existing_df: pd.DataFrame, new_df: p
     """
     subset_columns = ['ENTRY_ID', 'COMPANY_CODE', 'POSTED_DATE', 'INVOICE_NUMBER', 'INVOICE_DATE']
 
-    # Convert to tuples for comparison
-    existing_tuples = set(existing_df[subset_columns].apply(tuple, 1))
-    new_tuples = new_df[subset_columns].apply(tuple, 1)
-    # Keep only rows not in existing data
-    unique_mask = ~new_tuples.isin(existing_tuples)
-    unique_df = new_df[unique_mask].copy()
+    # Keep only rows not in existing data (hash anti-join on the key columns)
+    unique_df = anti_join(new_df, existing_df, subset_columns).copy()
 
     return unique_df
 
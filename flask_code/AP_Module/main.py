@@ -18,7 +18,7 @@ from AP_Module.exceptions import AIScoringException,StatScoringException,RulesSc
 import utils
 import re
 
-from Ingestor.fetch_data import read_ddf_from_path, find_month_label_based_on_date, get_quarters
+from Ingestor.fetch_data import read_ddf_from_path, read_candidates_from_hist_index, find_month_label_based_on_date, get_quarters
 from pipeline_data import PipelineData
 # Lock for thread safety
 # lock = threading.Lock()
@@ -678,10 +678,25 @@ def ap_main(audit_id):
         
 
 
+        HIST_DUPLICATE_COLUMNS = ['ACCOUNTING_DOC','INVOICE_NUMBER','INVOICE_DATE','INVOICE_AMOUNT','POSTED_BY','POSTED_DATE',
+                                  'COMPANY_CODE','COMPANY_NAME','SUPPLIER_NAME','PAYMENT_DATE','SUPPLIER_ID','DEBIT_CREDIT_INDICATOR',
+                                  'PURCHASE_ORDER_NUMBER','MONTH_LABEL','REGION','DOC_TYPE','batch_id']
+
         def handle_historical_data(df):
             current_df = df.copy()
-          
-            historical_data_df = read_ddf_from_path(g.client_folder_path, g.hist_date_strt, g.hist_date_end)
+
+            # Probe the persisted historical invoice index instead of reading the full history window
+            use_hist_index = os.getenv("DUPLICATE_HIST_INDEX", "false").lower() == "true"
+            if use_hist_index:
+                batch_ids = current_df['batch_id'].unique() if 'batch_id' in current_df.columns else []
+                historical_data_df = read_candidates_from_hist_index(g.client_folder_path, current_df,
+                                                                     g.hist_date_strt, g.hist_date_end,
+                                                                     exclude_batch_id=batch_ids[0] if len(batch_ids)==1 else None,
+                                                                     supplier_name_mask_fn=similar_supplier_names)
+            else:
+                # Only the columns used for duplicate detection are decoded from the history window
+                historical_data_df = read_ddf_from_path(g.client_folder_path, g.hist_date_strt, g.hist_date_end,
+                                                        columns=HIST_DUPLICATE_COLUMNS)
             if historical_data_df.empty:
                 capture_log_message("No historical data files found in path!!")
                 # Return current data with is_current_data flag set
@@ -752,6 +767,11 @@ def ap_main(audit_id):
 
 
             capture_log_message(f"Shape of historical data df: {historical_data_df.shape}")
+            if use_hist_index:
+                # Historical rows are already restricted to candidate neighbours of the current batch
+                combined_df = pd.concat([historical_data_df.reset_index(drop=True), current_df],ignore_index=True)
+                capture_log_message(f"Shape of final combined df: {combined_df.shape}")
+                return combined_df
             current_vendors_list = current_df['SUPPLIER_NAME'].unique()
             capture_log_message(f"Length of unique vendors' list: {len(current_vendors_list)}")
             vendor_mask = similar_supplier_names(historical_data_df, current_vendors_list)
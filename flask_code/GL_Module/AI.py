@@ -20,6 +20,7 @@ from sklearn.preprocessing import StandardScaler
 import pickle
 from GL_Module.Data_Preparation import Preparation
 from GL_Module.db_connector import MySQL_DB
+from GL_Module.model_registry import registry
 import json
 # from GL_Module.logger import logger
 session_conf = tf.compat.v1.ConfigProto(intra_op_parallelism_threads=1, inter_op_parallelism_threads=1)
@@ -143,13 +144,13 @@ class AI_Framework:
         df = self.sync_columns(df) # Syncing column names used in the model and the prepared data
         capture_log_message(log_message='Shape of data after syncing columns '+str(df.shape))
         #Normalizing the data using training scalar
-        Minmax = pickle.load(open(self.min_max_name, 'rb'))
+        Minmax = registry.get(self.min_max_name)
         Minmax.clip = False
         X_test = Minmax.transform(df)
 
         #Loading model for scoring
         model_path = os.path.join('GL_Module/pickle_files',self.model_name+'.keras')
-        model = load_model(model_path)
+        model = registry.get(model_path, loader=load_model)
         capture_log_message(log_message='Model Loaded for Scoring {}'.format(self.model_name))
 
         #Scoring the data using model
@@ -165,7 +166,7 @@ class AI_Framework:
         scored['AI_RISK_SCORE_RAW'] = np.mean(np.abs(X_pred- X_test), axis=1) #calculating difference between predicted neurons and actual neurons
         min_val = scored['AI_RISK_SCORE_RAW'].min()
         max_val = scored['AI_RISK_SCORE_RAW'].max()
-        scored['AI_RISK_SCORE'] = scored['AI_RISK_SCORE_RAW'].apply(lambda x: Prep.remap(x,min_val,max_val,0,1)) #remapping the raw score between 0 and 1
+        scored['AI_RISK_SCORE'] = Prep.remap_values(scored['AI_RISK_SCORE_RAW'],min_val,max_val,0,1) #remapping the raw score between 0 and 1
         capture_log_message(log_message='Scoring for AI Model Completed')
 
         # scored.to_csv(os.path.join('csv_files',self.model_name+'_AI_Scored.csv'),index=False) #Storing the scores in csv file
@@ -58,7 +58,33 @@ class Preparation:
             result = newMax - portion
 
         return result
-    
+
+    def remap_values(self, values, oMin, oMax, nMin, nMax):
+        """
+        Vectorized remap, same result as remap applied to each value
+        (all NaN when the input or output range is zero)
+        """
+        values = np.asarray(values, dtype=float)
+        if oMin == oMax:
+            capture_log_message(log_message="Warning: Zero input range")
+            return np.full(values.shape, np.nan)
+
+        if nMin == nMax:
+            capture_log_message(log_message="Warning: Zero output range")
+            return np.full(values.shape, np.nan)
+
+        oldMin, oldMax = min(oMin, oMax), max(oMin, oMax)
+        newMin, newMax = min(nMin, nMax), max(nMin, nMax)
+
+        if oldMin == oMin:
+            portion = (values-oldMin)*(newMax-newMin)/(oldMax-oldMin)
+        else:
+            portion = (oldMax-values)*(newMax-newMin)/(oldMax-oldMin)
+
+        if newMin == nMin:
+            return portion + newMin
+        return newMax - portion
+
     
     
 
@@ -16,6 +16,7 @@ from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import MinMaxScaler,StandardScaler
 from GL_Module.db_connector import MySQL_DB
 from GL_Module.Data_Preparation import Preparation
+from GL_Module.model_registry import registry, score_in_chunks
 # from GL_Module.logger import logger
 import json
 from code1.logger import capture_log_message
@@ -111,7 +112,13 @@ class Stat_Framework:
         min_non_anom = df[df[columnname]<1][columnname].min()
         max_non_anom = df[df[columnname]<1][columnname].max()
         #remapping the scores which came below 0 (anomalies) between 0.7 and 1 and the rest between 0
-        df[columnname+"_INDEXED"]=df[columnname].apply(lambda x: self.remap(x,min_anom,max_anom,0.7,1) if x>1 else self.remap(x,min_non_anom,max_non_anom,0,0.69)) 
+        Prep = Preparation()
+        scores = df[columnname].to_numpy(dtype=float)
+        anomalies = scores > 1
+        indexed = np.empty(len(scores))
+        indexed[anomalies] = Prep.remap_values(scores[anomalies],min_anom,max_anom,0.7,1)
+        indexed[~anomalies] = Prep.remap_values(scores[~anomalies],min_non_anom,max_non_anom,0,0.69)
+        df[columnname+"_INDEXED"] = indexed
 
         return df
 
@@ -121,9 +128,9 @@ class Stat_Framework:
         """
         IF_Model_path = os.path.join('GL_Module/pickle_files', 'IF_'+self.model_name+'_1.sav')
         capture_log_message(f"IF model path:{IF_Model_path}")
-        IF_Model_1 = pickle.load(open(IF_Model_path, 'rb'))
+        IF_Model_1 = registry.get(IF_Model_path)
         capture_log_message(log_message="Scoring Stat Model 1 Started")
-        IF_Scores_1 = IF_Model_1.decision_function(data)
+        IF_Scores_1 = score_in_chunks(IF_Model_1.decision_function, data)
         capture_log_message(log_message="Scoring Stat Model 1 Finished")
 
         # IF_Model_path = os.path.join('GL_Module/pickle_files', 'IF_'+self.model_name+'_2.sav')
@@ -199,7 +206,7 @@ class Stat_Framework:
         capture_log_message(log_message="Data Preparation of Stat Completed")
         df = self.sync_columns(df) ## Syncing column names used in the model and the prepared data
         #Normalizing the data using training scalar
-        Minmax = pickle.load(open(self.min_max_name, 'rb'))
+        Minmax = registry.get(self.min_max_name)
         Minmax.clip=False
         X_test = pd.DataFrame(Minmax.transform(df))
 
@@ -1,3 +1,5 @@
+import re
+import numpy as np
 import pandas as pd
 
 class RecurringEntriesDetector:
@@ -47,191 +49,182 @@ class RecurringEntriesDetector:
         """
         Detects recurring entries across time periods.
         
-        Processes each recurring entry rule against all relevant time periods
-        to determine presence, amounts, and document references.
+        Transactions are aggregated to documents once per period granularity (month,
+        quarter). The rules are joined to the documents on (credit account, debit account),
+        amount and keyword criteria are evaluated as masks over all (rule, document)
+        pairs, and the first matching document (in document id order) is taken per
+        rule and period.
         
         Returns DataFrame: ['entry_id', 'period', 'is_present', 'recorded_amount', 'account_doc_number']
         """
+        rules = self.recurring_entries.reset_index(drop=True)
+        is_monthly = rules['frequency'].str.lower() == 'monthly' if len(rules) else pd.Series(dtype=bool)
+
+        # First match per (rule position, period) for each frequency
+        matches = {}
+        for monthly, period_col in ((True, 'month_year'), (False, 'quarter_year')):
+            frequency_rules = rules[is_monthly == monthly]
+            if not frequency_rules.empty:
+                matches.update(self._first_matches(frequency_rules, period_col))
+
         records = []
-        
-        # Process each recurring entry rule
-        for _, entry in self.recurring_entries.iterrows():
-            freq = entry['frequency'].lower()
-            
-            # Select appropriate time periods based on frequency
-            periods = self.all_months if freq == 'monthly' else self.all_quarters
-            period_col = 'month_year' if freq == 'monthly' else 'quarter_year'
-
-            # Check each period for this recurring entry
+        # One record per rule and period of its frequency
+        for rule_position, entry in rules.iterrows():
+            monthly = bool(is_monthly.iloc[rule_position])
+            periods = self.all_months if monthly else self.all_quarters
             for period in periods:
                 # Derive year and month based on frequency
-                if freq == 'monthly':
+                if monthly:
                     year, month = period.split('-')
                     month = int(month)
                 else:  # 'quarterly'
                     # Example period: '2024Q1'
                     year = int(period[:4])
                     quarter = int(period[-1])
-                    # You can set `month` as the starting month of the quarter
+                    # Starting month of the quarter
                     month = (quarter - 1) * 3 + 1
-                # Slice raw transactions for the period
-                present, rec_amount, doc_id = self._process_recurring_entry(period_col=period_col, period=period, entry=entry)
+                rec_amount, doc_id = matches.get((rule_position, period), (None, None))
 
                 records.append({
                     'entry_id': entry['entry_id'],
                     'year': year,
                     'month': month,
-                    'is_present': present,
+                    'is_present': doc_id is not None,
                     'recorded_amount': rec_amount,
                     'account_doc_number': doc_id
                 })
         
         return pd.DataFrame(records)
 
-
-    def _process_recurring_entry(self, period_col, period, entry):
+    def _first_matches(self, rules: pd.DataFrame, period_col: str) -> dict:
         """
-        Process a single recurring entry for a specific time period.
-        
-        Filters transactions for the given period, preprocesses them,
-        and checks for matches against the recurring entry criteria.
-        
-        :param period_col: Column name for the time period ('month_year' or 'quarter_year')
-        :param period: Specific period value to filter by
-        :param entry: Recurring entry rule to match against
-        :return: Tuple of (is_present, recorded_amount, document_id)
-        """
-        # Filter transactions for the specific period
-        df_period = self.transactions[self.transactions[period_col] == period]
-
-        # Preprocess only this period's transactions
-        df_preprocessed = self._preprocess_transactions(df_period)
-
-        # Filter by account pair (credit and debit accounts)
-        df_match = df_preprocessed[
-            (df_preprocessed['CREDIT_ACCOUNT'] == entry['credit_accounts']) &
-            (df_preprocessed['DEBIT_ACCOUNT']  == entry['debit_accounts'])
-        ]
+        Match rules of one frequency against the documents of every period in one pass.
 
-        # Initialize return values
-        present, rec_amount, doc_id = False, None, None
-        
-        # Check each matching document for amount and keyword criteria
-        for _, doc in df_match.iterrows():
-            # Check if amount matches the recurring entry criteria
-            if not self._match_amount(doc['AMOUNT'], entry['amount'],
-                                        entry['amount_deviation'],
-                                        entry['min_amount'], entry['max_amount']):
-                continue
-            
-            # Check if keywords match
-            keywords = [kw.strip().lower()
-                        for kw in (entry.get('keywords') or '').split(',') if kw.strip()]
-            if not self._match_keywords(doc['TRANSACTION_DESCRIPTION'], keywords):
-                continue
-            
-            # If we reach here, we found a match
-            present = True
-            rec_amount = doc['AMOUNT']
-            doc_id = doc['ACCOUNTDOCID']
-            return present, rec_amount, doc_id
-        
-        return present, rec_amount, doc_id
-
-
-    def _preprocess_transactions(self, df: pd.DataFrame) -> pd.DataFrame:
+        :param rules: Recurring entry rules (index = rule position)
+        :param period_col: 'month_year' or 'quarter_year'
+        :return: dict of (rule position, period) -> (recorded amount, document id)
         """
-        Preprocess transactions for a given time period.
-        
-        For a subset of transactions, aggregate per document:
-        - Create CREDIT_ACCOUNT/DEBIT_ACCOUNT via DEBIT_CREDIT_INDICATOR
+        documents = self._preprocess_transactions(self.transactions, group_columns=[period_col, 'ACCOUNTDOCID'])
+        if documents.empty:
+            return {}
+        documents['_doc_order'] = np.arange(len(documents))
+
+        # Join rules to documents on (credit account, debit account), compared as ==
+        credit_codes = _joint_codes(documents['CREDIT_ACCOUNT'], rules['credit_accounts'])
+        debit_codes = _joint_codes(documents['DEBIT_ACCOUNT'], rules['debit_accounts'])
+        documents['_credit'], documents['_debit'] = credit_codes[0], debit_codes[0]
+        rule_keys = pd.DataFrame({'_rule_position': rules.index, '_credit': credit_codes[1], '_debit': debit_codes[1]})
+        pairs = documents[(documents['_credit'] >= 0) & (documents['_debit'] >= 0)].merge(
+            rule_keys[(rule_keys['_credit'] >= 0) & (rule_keys['_debit'] >= 0)], on=['_credit', '_debit'])
+        if pairs.empty:
+            return {}
+
+        pair_rules = rules.loc[pairs['_rule_position']]
+        matched = self._amount_matches(pairs['AMOUNT'].to_numpy(), pair_rules) & \
+            self._keyword_matches(pairs['TRANSACTION_DESCRIPTION'], pairs['_rule_position'], rules)
+        first = (pairs[matched]
+                 .sort_values(['_rule_position', '_doc_order'])
+                 .drop_duplicates(subset=['_rule_position', period_col], keep='first'))
+        return {(rule_position, period): (amount, doc_id)
+                for rule_position, period, amount, doc_id in zip(first['_rule_position'], first[period_col],
+                                                                 first['AMOUNT'], first['ACCOUNTDOCID'])}
+
+    def _preprocess_transactions(self, df: pd.DataFrame, group_columns: list = None) -> pd.DataFrame:
+        """
+        Aggregate transactions per document (and period, when given in group_columns):
+        - Create CREDIT_ACCOUNT/DEBIT_ACCOUNT via the credit / debit amounts
         - Sum amounts, pick first non-empty text, carry POSTED_DATE
+        Only documents with a single credit and a single debit account are kept.
         
-        :param df: DataFrame containing transactions for a specific period
-        :return: Preprocessed DataFrame with aggregated document-level data
+        :param df: DataFrame containing transactions
+        :param group_columns: Columns identifying a document, ['ACCOUNTDOCID'] by default
+        :return: Preprocessed DataFrame with aggregated document-level data, in group order
         """
-        df_work = df.copy()
-        
-        # Determine credit and debit accounts based on amount indicators
-        df_work['CREDIT_ACCOUNT'] = df_work.apply(
-            lambda x: x['ACCOUNT_CODE'] if x['CREDIT_AMOUNT']>0 else None,
-            axis=1
-        )
-        df_work['DEBIT_ACCOUNT'] = df_work.apply(
-            lambda x: x['ACCOUNT_CODE'] if x['DEBIT_AMOUNT']>0 else None,
-            axis=1
+        group_columns = group_columns or ['ACCOUNTDOCID']
+        text = df['TRANSACTION_DESCRIPTION']
+        df_work = df[group_columns + ['AMOUNT', 'POSTED_DATE']].assign(
+            # Determine credit and debit accounts based on amount indicators
+            CREDIT_ACCOUNT=df['ACCOUNT_CODE'].where(df['CREDIT_AMOUNT'] > 0),
+            DEBIT_ACCOUNT=df['ACCOUNT_CODE'].where(df['DEBIT_AMOUNT'] > 0),
+            TRANSACTION_DESCRIPTION=text.where(text.notna() & text.astype(bool)),
         )
         
         # Aggregate transactions by document ID
-        agg = df_work.groupby('ACCOUNTDOCID').agg({
-            'CREDIT_ACCOUNT': lambda v: list(v.dropna().unique()),
-            'DEBIT_ACCOUNT' : lambda v: list(v.dropna().unique()),
-            'AMOUNT'        : 'sum',
-            'TRANSACTION_DESCRIPTION': lambda v: next((t for t in v if pd.notna(t) and t), ''),
-            'POSTED_DATE'   : 'first'
-        }).reset_index()
-        
+        grouped = df_work.groupby(group_columns)
+        agg = grouped.agg(
+            CREDIT_ACCOUNT=('CREDIT_ACCOUNT', 'first'),
+            DEBIT_ACCOUNT=('DEBIT_ACCOUNT', 'first'),
+            AMOUNT=('AMOUNT', 'sum'),
+            TRANSACTION_DESCRIPTION=('TRANSACTION_DESCRIPTION', 'first'),
+            POSTED_DATE=('POSTED_DATE', 'first'),
+        )
+        agg['TRANSACTION_DESCRIPTION'] = agg['TRANSACTION_DESCRIPTION'].fillna('')
+
         # Filter to only include documents with single credit & debit accounts
-        agg = agg[(agg['CREDIT_ACCOUNT'].apply(len) == 1) & (agg['DEBIT_ACCOUNT'].apply(len) == 1)]
-        
-        # Convert account lists to single values
-        agg['CREDIT_ACCOUNT'] = agg['CREDIT_ACCOUNT'].apply(lambda a: a[0])
-        agg['DEBIT_ACCOUNT']  = agg['DEBIT_ACCOUNT'] .apply(lambda a: a[0])
-        
-        return agg
+        single_accounts = (grouped['CREDIT_ACCOUNT'].nunique() == 1) & (grouped['DEBIT_ACCOUNT'].nunique() == 1)
+        return agg[single_accounts].reset_index()
 
-    def _match_amount(self, transaction_amount: float, entry_amount: float,
-                      deviation: float, min_amt: float, max_amt: float) -> bool:
+    def _amount_matches(self, transaction_amounts: np.ndarray, rules: pd.DataFrame) -> np.ndarray:
         """
-        Check if a transaction amount matches the recurring entry amount criteria.
+        Check transaction amounts against the amount criteria of the rule on the same row.
         
-        Supports three types of matching:
+        Per rule, the first applicable criterion decides:
         1. Exact amount match
-        2. Deviation-based match (percentage tolerance)
-        3. Range-based match (min/max bounds)
+        2. Deviation-based match (percentage tolerance), when amount and deviation are given
+        3. Range-based match (min/max bounds), when min and max are given
+        Without any criterion there is no match.
         
-        :param transaction_amount: Amount from the transaction
-        :param entry_amount: Expected amount from recurring entry rule
-        :param deviation: Allowed percentage deviation from expected amount
-        :param min_amt: Minimum acceptable amount
-        :param max_amt: Maximum acceptable amount
-        :return: True if amount matches criteria, False otherwise
+        :param transaction_amounts: Amounts of the documents
+        :param rules: Rule of each document (same length)
+        :return: Boolean mask
         """
-        # Exact match
-        if entry_amount is not None and transaction_amount == entry_amount:
-            return True
-        
-        # Deviation-based match
-        if entry_amount is not None and deviation is not None:
-            deviation = abs((float(deviation)/100) * entry_amount)
-            return abs(transaction_amount - entry_amount) <= deviation
-        
-        # Range-based match
-        if min_amt is not None and max_amt is not None:
-            return min_amt <= transaction_amount <= max_amt
-        
-        # No constraints provided condition
-        return False
+        def given(column):
+            return rules[column].map(lambda value: value is not None).to_numpy(dtype=bool)
 
-    def _match_keywords(self, text: str, keywords: list) -> bool:
+        def values(column):
+            return pd.to_numeric(rules[column], errors='coerce').to_numpy(dtype=float)
+
+        amount_given, deviation_given = given('amount'), given('amount_deviation')
+        range_given = given('min_amount') & given('max_amount')
+        entry_amount, min_amount, max_amount = values('amount'), values('min_amount'), values('max_amount')
+        tolerance = np.abs(values('amount_deviation') / 100 * entry_amount)
+
+        with np.errstate(invalid='ignore'):
+            exact = amount_given & (transaction_amounts == entry_amount)
+            deviation_rule = amount_given & deviation_given
+            within_deviation = np.abs(transaction_amounts - entry_amount) <= tolerance
+            within_range = (min_amount <= transaction_amounts) & (transaction_amounts <= max_amount)
+        return exact | (deviation_rule & within_deviation) | (~deviation_rule & range_given & within_range)
+
+    def _keyword_matches(self, texts: pd.Series, rule_positions: pd.Series, rules: pd.DataFrame) -> np.ndarray:
         """
-        Check if transaction description contains any of the specified keywords.
+        Check whether each description contains any keyword of its rule (case-insensitive).
+        Rules without keywords match every description.
         
-        Performs case-insensitive keyword matching in transaction descriptions.
-        
-        :param text: Transaction description text to search in
-        :param keywords: List of keywords to search for
-        :return: True if any keyword is found or no keywords specified, False otherwise
+        :param texts: Document descriptions
+        :param rule_positions: Rule position of each description
+        :param rules: Recurring entry rules (index = rule position)
+        :return: Boolean mask
         """
-        # If no keywords specified, consider it a match
-        if not keywords:
-            return True
-        
-        # Convert text to lowercase for case-insensitive matching
-        txt = (text or '').lower()
-        
-        # Check if any keyword is present in the text
-        return any(kw in txt for kw in keywords)
+        matches = np.ones(len(texts), dtype=bool)
+        lowered = texts.astype(str).str.lower().to_numpy()
+        rule_positions = rule_positions.to_numpy()
+        for rule_position, keywords in rules['keywords'].items() if 'keywords' in rules else []:
+            keywords = [kw.strip().lower() for kw in (keywords if isinstance(keywords, str) else '').split(',')
+                        if kw.strip()]
+            if not keywords:
+                continue
+            rows = np.flatnonzero(rule_positions == rule_position)
+            if len(rows):
+                pattern = '|'.join(re.escape(kw) for kw in keywords)
+                matches[rows] = pd.Series(lowered[rows]).str.contains(pattern, regex=True).to_numpy()
+        return matches
+
+
+def _joint_codes(left: pd.Series, right: pd.Series) -> tuple:
+    """Integer codes of two columns, equal codes for equal values and -1 for missing values"""
+    codes, _ = pd.factorize(pd.concat([left, right], ignore_index=True))
+    return codes[:len(left)], codes[len(left):]
     
 
 if __name__ == "__main__":
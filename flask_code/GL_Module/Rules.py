@@ -6,6 +6,9 @@ from datetime import datetime, timezone
 from flask import g
 from GL_Module.db_connector import MySQL_DB
 from GL_Module.Data_Preparation import Preparation
+from GL_Module.rule_engine import DocumentAggregates, run_rules
+from GL_Module.account_pairing import credit_debit_pairs, rows_in_account_docs
+from GL_Module.robust_statistics import grouped_mad_outliers
 #import holidays
 from code1.logger import capture_log_message
 from itertools import product
@@ -40,6 +43,7 @@ class Rules_Framework():
         # 'ACCRUAL':4,'REVERSALS':6, 'CASH_NEGATIVE_BALANCE':5, "CASH_CONCENTRATION_CREDIT":4,"CASH_CONCENTRATION_DEBIT":4,"CASH_DISBURSEMENT_CREDIT":7,"CASH_DISBURSEMENT_DEBIT":7,"CASH_PAYROLL_CREDIT":4,"CASH_PAYROLL_DEBIT":4,"CASH_LOCKBOX":6,
         # 'UNUSUAL_ACCOUNTING_PATTERN':9}
         self.DB = MySQL_DB('DB.json')
+        self.document_aggregates = None
         self.rule_weights = {
             'POSTS_WEEKEND':5, 'POSTS_HOLIDAYS':4, 'NEXT_QTR_POSTING':5,'SAME_USER_POSTING':6, 'SUSPICIOUS_KEYWORDS':4,'NON_BALANCED':6,'ROUNDING_OFF':4
         }
@@ -172,7 +176,8 @@ class Rules_Framework():
         Passing 
         """
         
-        data['POSTS_WEEKEND'] = np.where(data['ENTERED_DATE'].isnull(),0,np.where(((data['ENTERED_DATE'].dt.dayofweek<self.week_start) | (data['ENTERED_DATE'].dt.dayofweek>self.week_end)),1,0))
+        dayofweek = self.document_aggregates.entered_date_parts['dayofweek']
+        data['POSTS_WEEKEND'] = np.where(data['ENTERED_DATE'].isnull(),0,np.where(((dayofweek<self.week_start) | (dayofweek>self.week_end)),1,0))
         capture_log_message(log_message='Weekend Rule Completed')
 
     def Holiday_Rule(self,data):
@@ -190,7 +195,8 @@ class Rules_Framework():
         Flag transactions which were posted outside working hours
         Passing
         """
-        data['POSTS_NIGHT'] = np.where(data['ENTERED_DATE'].isnull(),0,np.where(((data['ENTERED_DATE'].dt.hour > self.business_hour_end) | (data['ENTERED_DATE'].dt.hour < self.business_hour_start)), 1, 0))
+        hour = self.document_aggregates.entered_date_parts['hour']
+        data['POSTS_NIGHT'] = np.where(data['ENTERED_DATE'].isnull(),0,np.where(((hour > self.business_hour_end) | (hour < self.business_hour_start)), 1, 0))
         capture_log_message(log_message='Late Night Posting Rule Completed')
 
     def Next_Qtr_posting(self, data):
@@ -200,8 +206,8 @@ class Rules_Framework():
         """
         cols = ['DIFF_POSTING_ACCOUNTING','SAME_QUARTER']
         
-        data['DIFF_POSTING_ACCOUNTING'] = np.where(data['DIFF_POSTING_ACCOUNTING'].isnull(),0,data['DIFF_POSTING_ACCOUNTING'].astype(int))
-        data['NEXT_QTR_POSTING'] = np.where(data[cols].isnull().any(axis=1),0,np.where((data['DIFF_POSTING_ACCOUNTING'] >= self.day_difference) & (data['SAME_QUARTER'] == 0), 1, 0))
+        diff_posting_accounting = np.where(data['DIFF_POSTING_ACCOUNTING'].isnull(),0,data['DIFF_POSTING_ACCOUNTING'].astype(int))
+        data['NEXT_QTR_POSTING'] = np.where(data[cols].isnull().any(axis=1),0,np.where((diff_posting_accounting >= self.day_difference) & (data['SAME_QUARTER'] == 0), 1, 0))
         capture_log_message(log_message='Next Quarter Posting Rule Completed')
     
     def Blank_JE_Rule(self,data):
@@ -257,8 +263,8 @@ class Rules_Framework():
         Accounting Docs where Debit Amount != Credit Amount
         Passing
         """
-        data['NON_BALANCED'] =  np.where(np.isclose(data.groupby('ACCOUNTDOCID')['DEBIT_AMOUNT'].transform('sum'),
-                                                    data.groupby('ACCOUNTDOCID')['CREDIT_AMOUNT'].transform('sum')),0,1)  
+        amount_totals = self.document_aggregates.amount_totals
+        data['NON_BALANCED'] =  np.where(np.isclose(amount_totals['DEBIT_AMOUNT'], amount_totals['CREDIT_AMOUNT']),0,1)
         capture_log_message(log_message='Out of Balance Rule Completed')
                                            
     def Cash_Accrual_Rule(self,data):
@@ -315,20 +321,16 @@ class Rules_Framework():
         JE in Cash Negative Balances account is not entered in the beginning of the month.
         """
 
-        data["CASH_NEGATIVE_BALANCE"] = np.where((data['ACCOUNT_CODE'] .isin(self.Cash_Negative_Balance_account)) & (data['ENTERED_DATE'].dt.day.astype(int).between(self.Cash_Negative_Balance_start_date, self.Cash_Negative_Balance_end_date)),1,0)
+        day = self.document_aggregates.entered_date_parts['day']
+        data["CASH_NEGATIVE_BALANCE"] = np.where((data['ACCOUNT_CODE'] .isin(self.Cash_Negative_Balance_account)) & (day.astype(int).between(self.Cash_Negative_Balance_start_date, self.Cash_Negative_Balance_end_date)),1,0)
         capture_log_message(log_message='Cash Negative Balance Rule Completed')
 
     def Cash_Concentration_Credit_Rule(self, data):
             """
             JE with Cash Concentration account in credit side   are considered.
             """
-            flag_list=[]
-            for i in set(data[((data['ACCOUNT_CODE'].isin( self.Cash_Concentration_account))) & (data['DEBIT_CREDIT_INDICATOR'] == "C")]['ACCOUNTDOCID']):
-                if [row for row in data[(data['ACCOUNTDOCID'] == i) & (data['DEBIT_CREDIT_INDICATOR'] == "D")]['ACCOUNT_CODE'] \
-                if row not in self.Cash_Concentration_Credit_account_debit_side]:
-                    flag_list.append(i)
-                else:
-                    continue
+            flag_list = self.document_aggregates.docs_with_counter_accounts(
+                self.Cash_Concentration_account, "C", self.Cash_Concentration_Credit_account_debit_side, "D", counter_in=False)
             data["CASH_CONCENTRATION_CREDIT"] = np.where(data['ACCOUNTDOCID'].isin(flag_list),1,0)
             capture_log_message(log_message='Cash Concentration Credit Rule Completed')
 
@@ -336,12 +338,8 @@ class Rules_Framework():
         """
         JE with Cash Concentration account in debit side are considered.
         """
-        flag_list=[]
-        for i in set(data[(data['ACCOUNT_CODE'].isin(self.Cash_Concentration_account)) & (data['DEBIT_CREDIT_INDICATOR'] == "D")]['ACCOUNTDOCID']):
-            if [row for row in data[(data['ACCOUNTDOCID'] == i) & (data['DEBIT_CREDIT_INDICATOR'] == "C")]['ACCOUNT_CODE'] if row not in self.Cash_Concentration_Debit_account_credit_side]:
-                flag_list.append(i)
-            else:
-                continue
+        flag_list = self.document_aggregates.docs_with_counter_accounts(
+            self.Cash_Concentration_account, "D", self.Cash_Concentration_Debit_account_credit_side, "C", counter_in=False)
         data["CASH_CONCENTRATION_DEBIT"] = np.where(data['ACCOUNTDOCID'].isin(flag_list),1,0)
         capture_log_message(log_message='Cash Concentration Debit Rule Completed')
         
@@ -349,12 +347,8 @@ class Rules_Framework():
         """
         JE with Cash Disbursement account in  credit side are considered.
         """
-        flag_list=[]
-        for i in set(data[(data['ACCOUNT_CODE'] .isin( self.Cash_Disbursement_account)) & (data['DEBIT_CREDIT_INDICATOR'] == "C")]['ACCOUNTDOCID']):
-            if [row for row in data[(data['ACCOUNTDOCID'] == i) & (data['DEBIT_CREDIT_INDICATOR'] == "D")]['ACCOUNT_CODE'] if row not in self.Cash_Disbursement_Credit_account_debit_side]:
-                flag_list.append(i)
-            else:
-                continue
+        flag_list = self.document_aggregates.docs_with_counter_accounts(
+            self.Cash_Disbursement_account, "C", self.Cash_Disbursement_Credit_account_debit_side, "D", counter_in=False)
         data["CASH_DISBURSEMENT_CREDIT"] = np.where(data['ACCOUNTDOCID'].isin(flag_list),1,0)
         capture_log_message(log_message='Cash Disbursement Credit Rule Completed')
 
@@ -362,12 +356,8 @@ class Rules_Framework():
         """
         JE with Cash Disbursement account in debit side are considered.
         """
-        flag_list=[]
-        for i in set(data[(data['ACCOUNT_CODE'].isin(self.Cash_Disbursement_account)) & (data['DEBIT_CREDIT_INDICATOR'] == "D")]['ACCOUNTDOCID']):
-            if [row for row in data[(data['ACCOUNTDOCID'] == i) & (data['DEBIT_CREDIT_INDICATOR'] == "C")]['ACCOUNT_CODE'] if row not in self.Cash_Disbursement_Debit_account_credit_side]:
-                flag_list.append(i)
-            else:
-                continue
+        flag_list = self.document_aggregates.docs_with_counter_accounts(
+            self.Cash_Disbursement_account, "D", self.Cash_Disbursement_Debit_account_credit_side, "C", counter_in=False)
         data["CASH_DISBURSEMENT_DEBIT"] = np.where(data['ACCOUNTDOCID'].isin(flag_list),1,0)
         capture_log_message(log_message='Cash Disbursement Debit Rule Completed')
        
@@ -375,12 +365,8 @@ class Rules_Framework():
         """
         JE with Cash Payroll account in credit side  are considered.
         """
-        flag_list=[]
-        for i in set(data[(data['ACCOUNT_CODE'].isin(self.CashPayroll_account)) & (data['DEBIT_CREDIT_INDICATOR'] == "C")]['ACCOUNTDOCID']):
-            if [row for row in data[(data['ACCOUNTDOCID'] == i) & (data['DEBIT_CREDIT_INDICATOR'] == "D")]['ACCOUNT_CODE'] if row not in self.CashPayroll_credit_account_debit_side]:
-                flag_list.append(i)
-            else:
-                continue
+        flag_list = self.document_aggregates.docs_with_counter_accounts(
+            self.CashPayroll_account, "C", self.CashPayroll_credit_account_debit_side, "D", counter_in=False)
         data["CASH_PAYROLL_CREDIT"] = np.where(data['ACCOUNTDOCID'].isin(flag_list),1,0)
         capture_log_message(log_message='Cash Payroll Credit Rule Completed')
         
@@ -389,12 +375,8 @@ class Rules_Framework():
         """
         JE with Cash Payroll account in debit side are considered.
         """
-        flag_list=[]
-        for i in set(data[(data['ACCOUNT_CODE'].isin(self.CashPayroll_account)) & (data['DEBIT_CREDIT_INDICATOR'] == "D")]['ACCOUNTDOCID']):
-            if [row for row in data[(data['ACCOUNTDOCID'] == i) & (data['DEBIT_CREDIT_INDICATOR'] == "C")]['ACCOUNT_CODE'] if row not in self.CashPayroll_debit_account_credit_side]:
-                flag_list.append(i)
-            else:
-                continue
+        flag_list = self.document_aggregates.docs_with_counter_accounts(
+            self.CashPayroll_account, "D", self.CashPayroll_debit_account_credit_side, "C", counter_in=False)
         data["CASH_PAYROLL_DEBIT"] = np.where(data['ACCOUNTDOCID'].isin(flag_list),1,0)
         capture_log_message(log_message='Cash Payroll Debit Rule Completed')
         
@@ -403,18 +385,11 @@ class Rules_Framework():
         """
         JE with Cash Lockbox account as Credit are considered if their corresponding debit account does fall under Cash Concentration.
         """
-        flag_list=[]
-        for i in set(data[(data['ACCOUNT_CODE'].isin(self.Cash_Lockbox_account)) & (data['DEBIT_CREDIT_INDICATOR'] == "C")]['ACCOUNTDOCID']):
-            if [row for row in data[(data['ACCOUNTDOCID'] == i) & (data['DEBIT_CREDIT_INDICATOR'] == "D")]['ACCOUNT_CODE'] if row not in self.Cash_Lockbox_account_debit_side]:
-                flag_list.append(i)
-            else:
-                continue
-
-        for i in set(data[(data['ACCOUNT_CODE'] .isin(self.Cash_Lockbox_account)) & (data['DEBIT_CREDIT_INDICATOR'] == "D")]['ACCOUNTDOCID']):
-            if [row for row in data[(data['ACCOUNTDOCID'] == i) & (data['DEBIT_CREDIT_INDICATOR'] == "C")]['ACCOUNT_DESCRIPTION'] if row in self.Cash_Lockbox_account_credit_side]:
-                flag_list.append(i)
-            else:
-                continue
+        aggregates = self.document_aggregates
+        flag_list = np.concatenate([
+            aggregates.docs_with_counter_accounts(self.Cash_Lockbox_account, "C", self.Cash_Lockbox_account_debit_side, "D", counter_in=False),
+            aggregates.docs_with_counter_accounts(self.Cash_Lockbox_account, "D", self.Cash_Lockbox_account_credit_side, "C",
+                                                  counter_column='ACCOUNT_DESCRIPTION')])
 
         data["CASH_LOCKBOX"] = np.where(data['ACCOUNTDOCID'].isin(flag_list),1,0)
         capture_log_message(log_message='Cash Lockbox Rule Completed')
@@ -460,37 +435,11 @@ class Rules_Framework():
         
         # Filter out reversal Transactions
         capture_log_message(f"Shape of Data before dropping reversals: {df.shape}")
-        non_reversal_df = df[df['IS_REVERSED']==0]
+        non_reversal_df = df[self.document_aggregates.non_reversal_mask]
         capture_log_message(f"Shape of Data after dropping reversals: {non_reversal_df.shape}")
         
-        # 1. Compute combinations per journal as a Series of lists of tuples
-        comb_series = (
-            non_reversal_df
-            .groupby('ACCOUNTDOC_CODE', sort=False)
-            .apply(lambda df: self.find_credit_debit_combinations(df),include_groups=False)
-        )
-
-        # 2. Turn that Series into a DataFrame so the journal code becomes a column
-        exploded = comb_series.explode()
-
-        # 3. “Explode” the list in each row so each tuple becomes its own row
-        exploded = exploded.reset_index(name='pairs')
-
-        # 4. Drop any rows where there was no combination
-        exploded = exploded.dropna(subset=['pairs'])
-
-        # 5. Split the tuple in “pairs” into two separate columns
-        pairs_df = pd.DataFrame(
-            exploded['pairs'].tolist(),
-            columns=['CREDIT_ACCOUNT_CODE', 'DEBIT_ACCOUNT_CODE'],
-            index=exploded.index
-        )
-
-        # 6. Join back the journal codes
-        credit_debit_combinations_df = (
-            pairs_df.join(exploded[['ACCOUNTDOC_CODE']])
-            [['ACCOUNTDOC_CODE','CREDIT_ACCOUNT_CODE','DEBIT_ACCOUNT_CODE']]
-            .reset_index(drop=True) )
+        # Credit/debit account pairs of all journals in one pass
+        credit_debit_combinations_df = credit_debit_pairs(non_reversal_df, doc_column='ACCOUNTDOC_CODE')
         
         capture_log_message(f"No of unique journals after calculating cr/db combinations:{credit_debit_combinations_df['ACCOUNTDOC_CODE'].nunique()}")
 
@@ -504,47 +453,22 @@ class Rules_Framework():
         credit_debit_combinations_df['DEBIT_ACC_TYPE'] = credit_debit_combinations_df['DEBIT_ACCOUNT_CODE'].map(acc_number_to_type_mappings)
         
         capture_log_message(f"No of rows in credit_debit_combinations_Df: {credit_debit_combinations_df.shape}")
-        credit_debit_combinations_df['UNUSUAL_FLAG'] = credit_debit_combinations_df.apply( lambda x:\
-                                                        predefined_unusual_dict.get( (x['CREDIT_ACC_TYPE'],x['DEBIT_ACC_TYPE']),False ),axis=1)
+        account_types = credit_debit_combinations_df[['CREDIT_ACC_TYPE','DEBIT_ACC_TYPE']]
+        credit_debit_combinations_df['UNUSUAL_FLAG'] = account_types.notna().all(axis=1).to_numpy() & \
+                                                        pd.MultiIndex.from_frame(account_types).isin(list(predefined_unusual_dict))
         
         capture_log_message(f"No. of rows that were flagged true: {credit_debit_combinations_df['UNUSUAL_FLAG'].value_counts()}")
         unusual_entries_df = credit_debit_combinations_df[credit_debit_combinations_df['UNUSUAL_FLAG']==True].copy()
         capture_log_message(f"No of accounting docs flagged under unusual accounting module: {unusual_entries_df['ACCOUNTDOC_CODE'].nunique()}")
         
-        # OPTIMIZED Flagging
         if not unusual_entries_df.empty:
-            # Build maps: account → list of docs where it's flagged as credit/debit
-            credit_account_to_docs_map = (
-                unusual_entries_df
-                .groupby('CREDIT_ACCOUNT_CODE')['ACCOUNTDOC_CODE']
-                .apply(list)
-                .to_dict()
-            )
-            debit_account_to_docs_map = (
-                unusual_entries_df
-                .groupby('DEBIT_ACCOUNT_CODE')['ACCOUNTDOC_CODE']
-                .apply(list)
-                .to_dict()
-            )
-
-            # Flatten into sets of (account, doc) pairs for O(1) lookups
-            flagged_pairs_credit = {
-                (acc, doc)
-                for acc, docs in credit_account_to_docs_map.items()
-                for doc in docs
-            }
-            flagged_pairs_debit = {
-                (acc, doc)
-                for acc, docs in debit_account_to_docs_map.items()
-                for doc in docs
-            }
-
-            # Create tuple column for per-row (account, doc)
-            acc_and_accdoc_series = pd.Series(zip(data['ACCOUNT_CODE'], data['ACCOUNTDOC_CODE']), index=data.index)
+            # (account, journal) of the credit and debit side of the unusual pairs
+            flagged_credit = unusual_entries_df[['CREDIT_ACCOUNT_CODE','ACCOUNTDOC_CODE']].rename(columns={'CREDIT_ACCOUNT_CODE':'ACCOUNT_CODE'})
+            flagged_debit = unusual_entries_df[['DEBIT_ACCOUNT_CODE','ACCOUNTDOC_CODE']].rename(columns={'DEBIT_ACCOUNT_CODE':'ACCOUNT_CODE'})
 
             #Boolean masks for debit/credit anomalies
-            unusual_debit_flag = acc_and_accdoc_series.isin(flagged_pairs_debit) & (data['DEBIT_AMOUNT'] > 0)
-            unusual_credit_flag = acc_and_accdoc_series.isin(flagged_pairs_credit) & (data['CREDIT_AMOUNT'] > 0)
+            unusual_debit_flag = rows_in_account_docs(data, flagged_debit) & (data['DEBIT_AMOUNT'] > 0)
+            unusual_credit_flag = rows_in_account_docs(data, flagged_credit) & (data['CREDIT_AMOUNT'] > 0)
 
             # Combine into final flag series
             unusual_series = (unusual_debit_flag | unusual_credit_flag).astype(int)
@@ -568,7 +492,7 @@ class Rules_Framework():
         
         unusual_series = pd.Series(0, index=data.index)
         # Filter out reversals
-        non_reversal_df = df[df['IS_REVERSED'] == 0]
+        non_reversal_df = df[self.document_aggregates.non_reversal_mask]
         capture_log_message(f"Shape of Data after dropping reversals: {non_reversal_df.shape}")
         
         # Use amount-based conditions for better accuracy
@@ -612,33 +536,13 @@ class Rules_Framework():
             unique_unusual_docs = unusual_docs_detailed["ACCOUNTDOC_CODE"].nunique()
             capture_log_message(f"Unique ACCOUNTDOC_CODEs involved in unusual pairs: {unique_unusual_docs}")
 
-            # Build account number→acc_docs maps for debit & credit
-            debit_account_to_docs_map = (
-                unusual_docs_detailed
-                .groupby('ACCOUNT_CODE_DEBIT')['ACCOUNTDOC_CODE']
-                .apply(list)
-                .to_dict()
-            )
-            credit_account_to_docs_map = (
-                unusual_docs_detailed
-                .groupby('ACCOUNT_CODE_CREDIT')['ACCOUNTDOC_CODE']
-                .apply(list)
-                .to_dict()
-            )
-            
-            # Flatten to sets of (account,acc_doc) for O(1) lookup
-            flagged_pairs_debit = {
-                (acc,doc) for acc,docs in debit_account_to_docs_map.items() for doc in docs
-            }
-            flagged_pairs_credit = {
-                (acc,doc) for acc,docs in credit_account_to_docs_map.items() for doc in docs
-            }
-            # Create tuple column for per-row (account, doc)
-            acc_and_accdoc_series = pd.Series(zip(data['ACCOUNT_CODE'], data['ACCOUNTDOC_CODE']), index=data.index)
+            # (account, journal) of the debit and credit side of the unusual pairs
+            flagged_debit = unusual_docs_detailed[['ACCOUNT_CODE_DEBIT','ACCOUNTDOC_CODE']].rename(columns={'ACCOUNT_CODE_DEBIT':'ACCOUNT_CODE'})
+            flagged_credit = unusual_docs_detailed[['ACCOUNT_CODE_CREDIT','ACCOUNTDOC_CODE']].rename(columns={'ACCOUNT_CODE_CREDIT':'ACCOUNT_CODE'})
 
             #Boolean masks for debit/credit anomalies
-            unusual_debit_flag = acc_and_accdoc_series.isin(flagged_pairs_debit) & (data['DEBIT_AMOUNT'] > 0)
-            unusual_credit_flag = acc_and_accdoc_series.isin(flagged_pairs_credit) & (data['CREDIT_AMOUNT'] > 0)
+            unusual_debit_flag = rows_in_account_docs(data, flagged_debit) & (data['DEBIT_AMOUNT'] > 0)
+            unusual_credit_flag = rows_in_account_docs(data, flagged_credit) & (data['CREDIT_AMOUNT'] > 0)
 
             # Combine into final flag series
             unusual_series = (unusual_debit_flag | unusual_credit_flag).astype(int)
@@ -685,71 +589,21 @@ class Rules_Framework():
         capture_log_message('Unusual Account Pairing Main Function Completed')
     
 
-    def mark_unusual_activity_using_MAD(self, df ,column_name ,threshold=3.5, amount_threshold = 1000000):
-        values = df[column_name].values
-        min_val = np.min(values)
-        max_val = np.max(values)
-        median = np.median(values)
-        if median!=0:
-            spread_ratio = (max_val - min_val) / median
-        else:
-            spread_ratio = 0
-        # print('median',median)
-        # print('spread ratio',spread_ratio)
-        if spread_ratio < 0.2:
-            df['mad_label'] = False
-            return df
-        mad = np.median(np.abs(values - median))
-        # print('mad',mad)
-        if mad ==0:
-            is_outlier = (values != median) & ((np.abs(values - median) / median) >= 0.5)
-            df['mad_label'] = is_outlier
-            return df
-        
-        # The constant 0.6745 makes MAD comparable to std dev for normal data.
-        modified_z = 0.6745 * (values - median) / mad
-        # print('modified z score',modified_z)
-        is_outlier = np.abs(modified_z) > threshold
-
-        if amount_threshold is not None:
-            is_outlier = is_outlier & (np.abs(values)> amount_threshold)
-        df['mad_label'] = is_outlier
-        df['modified_z'] = modified_z
-        return df
-    
-
     def unsual_account_pattern_based_on_account_numbers(self, df):
+        """
+        Accounting docs whose credit (debit) amount on an account is a MAD outlier among the
+        docs of that account, for all accounts at once.
+        Returns two DataFrames (credit, debit) of the flagged ACCOUNT_CODE, ACCOUNTDOC_CODE
+        """
+        unusual_docs = []
+        for amount_column in ['CREDIT_AMOUNT', 'DEBIT_AMOUNT']:
+            # Amount per account and accounting doc on this side
+            side_rows = df[df[amount_column]>0]
+            doc_wise = side_rows.groupby(['ACCOUNT_CODE','ACCOUNTDOC_CODE'])[amount_column].sum()
+            res = grouped_mad_outliers(doc_wise, doc_wise.index.get_level_values('ACCOUNT_CODE'), threshold=4.5)
+            unusual_docs.append(doc_wise.index[res['mad_label'].to_numpy()].to_frame(index=False))
 
-        # Seperate credit rows and debit rows
-        credit_df = df[df['CREDIT_AMOUNT']>0]
-        debit_df = df[df['DEBIT_AMOUNT']>0]
-        
-        # Get list of all credit and debit account numbers
-        list_of_credit_accounts = credit_df['ACCOUNT_CODE'].unique()
-        list_of_debit_accounts = debit_df['ACCOUNT_CODE'].unique()
-
-        unusual_docs_for_credit_numbers = {}
-        unusual_docs_for_debit_numbers = {}
-        
-        # Store all unique account numbers 
-        list_of_unique_accounts = set(list(list_of_credit_accounts)+list(list_of_debit_accounts))
-        for account_num in list_of_unique_accounts:
-            credit_rows = credit_df[credit_df['ACCOUNT_CODE']==account_num]
-            debit_rows = debit_df[debit_df['ACCOUNT_CODE']==account_num]
-            if credit_rows.shape[0]!=0:
-                doc_wise_df = credit_rows.groupby('ACCOUNTDOC_CODE').agg({'CREDIT_AMOUNT':'sum'})
-                res = self.mark_unusual_activity_using_MAD(doc_wise_df,'CREDIT_AMOUNT',4.5)
-                if res['mad_label'].any():
-                    unusual_amounts = res[res['mad_label']==True]
-                    unusual_docs_for_credit_numbers[account_num]=unusual_amounts.index.values
-
-            if debit_rows.shape[0]!=0:
-                doc_wise_df = debit_rows.groupby('ACCOUNTDOC_CODE').agg({'DEBIT_AMOUNT':'sum'})
-                res = self.mark_unusual_activity_using_MAD(doc_wise_df,'DEBIT_AMOUNT',4.5)
-                if res['mad_label'].any():
-                    unusual_amounts = res[res['mad_label']==True]
-                    unusual_docs_for_debit_numbers[account_num]=unusual_amounts.index.values
-
+        unusual_docs_for_credit_numbers, unusual_docs_for_debit_numbers = unusual_docs
         return unusual_docs_for_credit_numbers, unusual_docs_for_debit_numbers
                     
     
@@ -757,24 +611,14 @@ class Rules_Framework():
         """
         Find out the transactions in the primary account which is not debited or credited to secondary account.
         """
-        res_credit, res_debit = self.unsual_account_pattern_based_on_account_numbers(data.copy())
-        
-        # Flatten to sets of (account,acc_doc) for O(1) lookup
-        flagged_pairs_debit = {(acc, doc) for acc, docs in res_debit.items() for doc in docs}
-        flagged_pairs_credit = {(acc, doc) for acc, docs in res_credit.items() for doc in docs}
-        
-        # Create tuple column for pairwise matching
-        data['ACC_DOC_PAIR'] = list(zip(data['ACCOUNT_CODE'], data['ACCOUNTDOC_CODE']))
+        res_credit, res_debit = self.unsual_account_pattern_based_on_account_numbers(data)
 
         #Vectorized flaging
-        unusual_debit_flag = data['ACC_DOC_PAIR'].isin(flagged_pairs_debit) & (data['DEBIT_AMOUNT'] > 0)
-        unusual_credit_flag = data['ACC_DOC_PAIR'].isin(flagged_pairs_credit) & (data['CREDIT_AMOUNT'] > 0)
+        unusual_debit_flag = rows_in_account_docs(data, res_debit) & (data['DEBIT_AMOUNT'] > 0)
+        unusual_credit_flag = rows_in_account_docs(data, res_credit) & (data['CREDIT_AMOUNT'] > 0)
         
         # Combine into final flag series
         data['UNUSUAL_ACCOUNTING_PATTERN'] = (unusual_debit_flag | unusual_credit_flag).astype(int)
-
-        # Clean up temporary column
-        data.drop(columns=['ACC_DOC_PAIR'], inplace=True)
         capture_log_message(log_message='Unusual Accounting Pattern Rule Completed')
 
     # def Unusual_Accounting_Pattern(self, data):
@@ -861,27 +705,10 @@ class Rules_Framework():
             """
             Identify the cash entries (debit or credit ) transacted with SUSPENSE account.
             """
-            flag_list=[]
-            # print(self.suspense_account_primary)
-            # print(self.suspense_account_secondary)
-            # print(data['ACCOUNT_CODE'].dtype)
-            flag_list=[]
-            for i in set(data[((data['ACCOUNT_CODE'].isin(self.suspense_account_primary))) & (data['DEBIT_CREDIT_INDICATOR'] == "C")]['ACCOUNTDOCID']):
-                # print(i)
-                # print(data[data['ACCOUNTDOCID'] == i]['DEBIT_CREDIT_INDICATOR'])
-                if [row for row in data[(data['ACCOUNTDOCID'] == i) & (data['DEBIT_CREDIT_INDICATOR'] == "D")]['ACCOUNT_CODE'] if row in self.suspense_account_secondary]:
-                
-                    # print(i)
-                    flag_list.append(i)
-                else:
-                    continue
-            for i in set(data[((data['ACCOUNT_CODE'].isin(self.suspense_account_primary))) & (data['DEBIT_CREDIT_INDICATOR'] == "D")]['ACCOUNTDOCID']):
-                if [row for row in data[(data['ACCOUNTDOCID'] == i) & (data['DEBIT_CREDIT_INDICATOR'] == "C")]['ACCOUNT_CODE'] \
-                if row in self.suspense_account_secondary]:
-                    # print(i)
-                    flag_list.append(i)
-                else:
-                    continue
+            aggregates = self.document_aggregates
+            flag_list = np.concatenate([
+                aggregates.docs_with_counter_accounts(self.suspense_account_primary, "C", self.suspense_account_secondary, "D"),
+                aggregates.docs_with_counter_accounts(self.suspense_account_primary, "D", self.suspense_account_secondary, "C")])
             data["SUSPENSE_ACCOUNT_WITH_CASH"] = np.where(data['ACCOUNTDOCID'].isin(flag_list),1,0)
             capture_log_message(log_message='Suspense Account With Cash Rule Completed')
             
@@ -889,13 +716,8 @@ class Rules_Framework():
             """
             Identify the cash entries (debit or credit ) transacted with SUSPENSE account.
             """
-            flag_list=[]
-            for i in set(data[((data['ACCOUNT_CODE'].isin( self.inventory_account_primary))) & (data['DEBIT_CREDIT_INDICATOR'] == "C")]['ACCOUNTDOCID']):
-                if [row for row in data[(data['ACCOUNTDOCID'] == i) & (data['DEBIT_CREDIT_INDICATOR'] == "D")]['ACCOUNT_CODE'] \
-                if row in self.inventory_account_secondary]:
-                    flag_list.append(i)
-                else:
-                    continue  
+            flag_list = self.document_aggregates.docs_with_counter_accounts(
+                self.inventory_account_primary, "C", self.inventory_account_secondary, "D")
             data["SUSPENSE_ACCOUNT_WITH_INVENTORY"] = np.where(data['ACCOUNTDOCID'].isin(flag_list),1,0)
             capture_log_message(log_message='Suspense Account With Inventory Rule Completed')
   
@@ -966,11 +788,16 @@ class Rules_Framework():
         data = Prep.Data_Prep_for_Rules(data)
         self.build_gl_rules(data.columns)
         # print(data["ENTERED_DATE"].dtype)
-        #Running the enabled rules based on the rule keys
+        #Running the enabled rules based on the rule keys, concurrently on shared per document aggregates
         capture_log_message(log_message='Rules Calculation Started')
-        for rule in self.rule_weights.keys():
-            capture_log_message(log_message='Rule Calculation Started for {rule}'.format(rule=rule))
-            self.rule_functions[rule](data)
+        self.document_aggregates = DocumentAggregates(data)
+        self.rule_telemetry = run_rules(self.rule_functions, list(self.rule_weights.keys()), data)
+        for telemetry in self.rule_telemetry.to_dict('records'):
+            capture_log_message(log_message='Rule {RULE}: wall time {WALL_SECONDS}s, cpu time {CPU_SECONDS}s, '
+                                            'output {OUTPUT_COLUMNS} ({OUTPUT_MB} MB)'.format(**telemetry), store_in_db=False)
+        peak_memory_before, peak_memory_after = self.rule_telemetry.attrs['peak_memory_mb']
+        capture_log_message(log_message=f'Peak memory during rules calculation: {peak_memory_before:.0f} MB -> {peak_memory_after:.0f} MB')
+        self.document_aggregates = None
         #suppressing scores of  transactions based on request
         # self.suppression_rule(data)
         capture_log_message(log_message='Rules Calculation Completed')
@@ -0,0 +1,79 @@
+"""
+Account Pairing
+Credit / debit account pairs of all journals (accounting documents) at once, for the
+Unusual Account Pairing rule.
+
+Per journal, the credit accounts are paired with the debit accounts whose summed
+amount in the journal is the same (rounded to cents). When the amounts of the accounts
+left unpaired balance, every leftover credit account is also paired with every leftover
+debit account of the journal. This is Rules_Framework.find_credit_debit_combinations
+for every journal, computed with one amount-matched self-merge of the per account
+totals and one cross product that is limited to the leftover accounts of the balanced
+journals.
+"""
+import numpy as np
+import pandas as pd
+
+CREDIT_ACCOUNT = 'CREDIT_ACCOUNT_CODE'
+DEBIT_ACCOUNT = 'DEBIT_ACCOUNT_CODE'
+_AMOUNT = '_PAIR_AMOUNT'
+
+
+def _account_totals(df: pd.DataFrame, doc_column: str, amount_column: str, account_name: str) -> pd.DataFrame:
+    """Amount per (journal, account) on one side, rounded to cents"""
+    side = df[df[amount_column] > 0]
+    totals = side.groupby([doc_column, 'ACCOUNT_CODE'], sort=False)[amount_column].sum().round(2)
+    return totals.rename(_AMOUNT).reset_index().rename(columns={'ACCOUNT_CODE': account_name})
+
+
+def _side_accounts(df: pd.DataFrame, doc_column: str, amount_column: str, account_name: str) -> pd.DataFrame:
+    """Distinct (journal, account) on one side"""
+    accounts = df.loc[df[amount_column] > 0, [doc_column, 'ACCOUNT_CODE']].drop_duplicates()
+    return accounts.rename(columns={'ACCOUNT_CODE': account_name})
+
+
+def credit_debit_pairs(df: pd.DataFrame, doc_column: str = 'ACCOUNTDOC_CODE') -> pd.DataFrame:
+    """
+    Credit / debit account pairs of every journal in df.
+
+    Args:
+        df: Transactions with doc_column, ACCOUNT_CODE, CREDIT_AMOUNT and DEBIT_AMOUNT
+        doc_column: Journal column, transactions without a journal are ignored
+    Returns:
+        DataFrame with doc_column, CREDIT_ACCOUNT_CODE, DEBIT_ACCOUNT_CODE (one row per pair)
+    """
+    df = df[[doc_column, 'ACCOUNT_CODE', 'CREDIT_AMOUNT', 'DEBIT_AMOUNT']].dropna(subset=[doc_column])
+    pair_columns = [doc_column, CREDIT_ACCOUNT, DEBIT_ACCOUNT]
+
+    # Accounts with equal credit and debit totals within the journal
+    credit_totals = _account_totals(df, doc_column, 'CREDIT_AMOUNT', CREDIT_ACCOUNT)
+    debit_totals = _account_totals(df, doc_column, 'DEBIT_AMOUNT', DEBIT_ACCOUNT)
+    matched_pairs = credit_totals.merge(debit_totals, on=[doc_column, _AMOUNT])[pair_columns]
+
+    # Transactions of the accounts that are not part of an amount matched pair
+    matched_accounts = pd.concat([
+        matched_pairs[[doc_column, CREDIT_ACCOUNT]].set_axis([doc_column, 'ACCOUNT_CODE'], axis=1),
+        matched_pairs[[doc_column, DEBIT_ACCOUNT]].set_axis([doc_column, 'ACCOUNT_CODE'], axis=1),
+    ]).drop_duplicates()
+    remaining = df[~rows_in_account_docs(df, matched_accounts, doc_column)]
+
+    # Journals whose leftover credits and debits balance pair all leftover accounts
+    remaining_totals = remaining.groupby(doc_column, sort=False)[['CREDIT_AMOUNT', 'DEBIT_AMOUNT']].sum().round(2)
+    balanced_docs = remaining_totals.index[remaining_totals['CREDIT_AMOUNT'] == remaining_totals['DEBIT_AMOUNT']]
+    remaining = remaining[remaining[doc_column].isin(balanced_docs)]
+    leftover_pairs = _side_accounts(remaining, doc_column, 'CREDIT_AMOUNT', CREDIT_ACCOUNT).merge(
+        _side_accounts(remaining, doc_column, 'DEBIT_AMOUNT', DEBIT_ACCOUNT), on=doc_column)[pair_columns]
+
+    return pd.concat([matched_pairs, leftover_pairs], ignore_index=True)
+
+
+def rows_in_account_docs(data: pd.DataFrame, account_docs: pd.DataFrame, doc_column: str = 'ACCOUNTDOC_CODE') -> np.ndarray:
+    """
+    Boolean mask over the rows of data, True where the (ACCOUNT_CODE, doc_column) of the row
+    is one of the rows of account_docs.
+    """
+    if account_docs.empty:
+        return np.zeros(len(data), dtype=bool)
+    keys = account_docs[['ACCOUNT_CODE', doc_column]].drop_duplicates().assign(_FOUND=True)
+    found = data[['ACCOUNT_CODE', doc_column]].merge(keys, how='left', on=['ACCOUNT_CODE', doc_column])['_FOUND']
+    return found.notna().to_numpy()
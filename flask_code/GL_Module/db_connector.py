@@ -1,6 +1,6 @@
 from operator import index
 import os,json,mysql.connector
-from sqlalchemy import create_engine
+from databases import connection_pool, bulk_loader
 import pandas as pd
 # from GL_Module.logger import logger
 from code1.logger import capture_log_message
@@ -42,8 +42,7 @@ class MySQL_DB:
         """
         Connect to Database for Fetching Data
         """
-        return mysql.connector.connect(user=self.user, password=self.password,host=self.host,
-                                       port=self.port,database=self.dbname, **self.ssl_args)
+        return connection_pool.get_connection()
 
     def update_transaction_table_with_scores(self):
         """
@@ -235,10 +234,7 @@ class MySQL_DB:
                 tablename : table to which the data should be uploaded
         """
 
-        engine = create_engine("mysql+pymysql://"+self.user+":"+self.password+"@"+self.host+":"+str(self.port)+"/"+self.dbname, connect_args = self.connect_args)
-        with engine.connect() as connection:
-            data.to_sql(tablename, con=connection, index = False, if_exists = 'append')
-        engine.dispose()
+        bulk_loader.upload_dataframe(data, tablename)
 
     def get_matching_account_numbers_from_coa(self,column_to_filter,value_to_filter):
         """This function is used to fetch Account Numbers from ChartofAccounts that matches a particular category"""
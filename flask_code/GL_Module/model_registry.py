@@ -0,0 +1,152 @@
+"""
+Model Registry
+Loads the trained GL scoring models (IsolationForest, MinMax scalers, AutoEncoder) once
+per process and scores large inputs in row chunks across cores.
+
+Models are cached by path and file version (modification time), so a retrained model
+saved under the same name is picked up on the next call. Pickled models are converted
+once to a joblib file in GL_MODEL_CACHE_DIR, named after a hash of the model path and
+its version; older versions of the same model are deleted when a new one is cached.
+The joblib file is loaded with memory mapping (GL_MODEL_MMAP_MODE), which keeps plain
+numpy arrays (e.g. of the MinMax scalers) in the page cache shared by all worker
+processes. sklearn trees copy their node arrays on load, so for the IsolationForest the
+gain is loading it once per process rather than sharing its memory.
+
+score_in_chunks splits the rows into chunks of GL_SCORING_CHUNK_ROWS and scores them in
+GL_SCORING_WORKERS threads. Tree scoring releases the GIL, so the chunks run in parallel
+without copying the model; the scores are the same as scoring all rows at once.
+"""
+import os
+import glob
+import pickle
+import hashlib
+import threading
+from typing import Callable, Optional
+import numpy as np
+import pandas as pd
+from code1.logger import capture_log_message
+
+try:
+    import joblib
+    from joblib import Parallel, delayed
+except ImportError:  # models are then unpickled without memory mapping and scored serially
+    joblib = None
+
+MODEL_CACHE_DIR = os.getenv('GL_MODEL_CACHE_DIR', os.path.join('GL_Module', 'pickle_files', 'mmap_cache'))
+MODEL_MMAP_MODE = os.getenv('GL_MODEL_MMAP_MODE', 'r') or None
+SCORING_WORKERS = int(os.getenv('GL_SCORING_WORKERS', str(os.cpu_count() or 1)))
+SCORING_CHUNK_ROWS = int(os.getenv('GL_SCORING_CHUNK_ROWS', '50000'))
+
+
+class ModelRegistry:
+    """
+    In process cache of the scoring models, each model version is loaded once (thread safe).
+
+    Args:
+        cache_dir: Folder of the memory mappable joblib copies of the pickled models
+        mmap_mode: joblib mmap_mode of the cached models, None loads them into memory
+    """
+
+    def __init__(self, cache_dir: str = MODEL_CACHE_DIR, mmap_mode: Optional[str] = MODEL_MMAP_MODE):
+        self.cache_dir = cache_dir
+        self.mmap_mode = mmap_mode
+        self._models = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def get(self, path: str, loader: Optional[Callable] = None):
+        """
+        Model saved at path, loaded on the first call for each version of the file.
+
+        Args:
+            path: Model file
+            loader: Function loading the model from path (e.g. keras load_model),
+                    None for pickled models
+        Returns:
+            The loaded model
+        """
+        key = (os.path.abspath(path), os.stat(path).st_mtime_ns)
+        with self._guard:
+            if key in self._models:
+                return self._models[key]
+            lock = self._locks.setdefault(key, threading.Lock())
+        try:
+            with lock:
+                if key not in self._models:
+                    capture_log_message(log_message=f"Loading model {path} into the model registry")
+                    model = loader(path) if loader is not None else self._load_pickle(path, key[1])
+                    with self._guard:
+                        # Drop the older versions of the model
+                        for old_key in [k for k in self._models if k[0] == key[0]]:
+                            del self._models[old_key]
+                        self._models[key] = model
+        finally:
+            with self._guard:
+                # Later calls find the model, waiting threads still hold their reference to the lock
+                if self._locks.get(key) is lock:
+                    del self._locks[key]
+        return self._models[key]
+
+    def _load_pickle(self, path: str, version: int):
+        if joblib is None:
+            with open(path, 'rb') as model_file:
+                return pickle.load(model_file)
+
+        # Same named models in different folders get different cache files
+        path_hash = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:16]
+        cache_prefix = os.path.join(self.cache_dir, f"{os.path.basename(path)}.{path_hash}")
+        cache_file = f"{cache_prefix}.{version}.joblib"
+        if not os.path.exists(cache_file):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(path, 'rb') as model_file:
+                model = pickle.load(model_file)
+            # Written under a temporary name so other workers never map a partial file
+            temp_file = f"{cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+            joblib.dump(model, temp_file)
+            os.replace(temp_file, cache_file)
+            self._remove_stale_cache_files(cache_prefix, cache_file)
+        return joblib.load(cache_file, mmap_mode=self.mmap_mode)
+
+    @staticmethod
+    def _remove_stale_cache_files(cache_prefix: str, cache_file: str):
+        """Delete the cached joblib files of older versions of the model"""
+        for stale_file in glob.glob(f"{glob.escape(cache_prefix)}.*.joblib"):
+            if stale_file == cache_file:
+                continue
+            try:
+                # Processes that mapped it keep their mapping until they reload the model
+                os.remove(stale_file)
+            except OSError as e:
+                capture_log_message(log_message=f"Could not delete stale model cache file {stale_file}: {e}")
+
+    def clear(self):
+        """Forget all loaded models"""
+        with self._guard:
+            self._models.clear()
+            self._locks.clear()
+
+
+registry = ModelRegistry()
+
+
+def score_in_chunks(score_function: Callable, data, chunk_rows: int = SCORING_CHUNK_ROWS,
+                    n_jobs: int = SCORING_WORKERS) -> np.ndarray:
+    """
+    Apply score_function to chunks of the rows of data in parallel threads.
+
+    Args:
+        score_function: Row wise scoring function returning one score per row (e.g. decision_function)
+        data: Array or DataFrame to score
+        chunk_rows: Rows per chunk
+        n_jobs: Number of threads, 1 scores the chunks one after another
+    Returns:
+        Scores of all rows, in row order
+    """
+    n_rows = data.shape[0]
+    if joblib is None or n_jobs <= 1 or n_rows <= chunk_rows:
+        return np.asarray(score_function(data))
+
+    rows = data.iloc if isinstance(data, pd.DataFrame) else data
+    chunks = (rows[start:start + chunk_rows] for start in range(0, n_rows, chunk_rows))
+    scores = Parallel(n_jobs=n_jobs, backend='threading')(delayed(score_function)(chunk) for chunk in chunks)
+    return np.concatenate(scores)
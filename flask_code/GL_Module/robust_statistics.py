@@ -0,0 +1,53 @@
+"""
+Robust Statistics
+Median / MAD based outlier marking for many groups at once (one group per GL account
+in the Unusual Accounting Pattern rule).
+
+Each statistic is a groupby transform over the whole Series, so the result equals the
+per account MAD check applied to every group separately
+(tests/test_robust_statistics.py keeps that per group check as the reference).
+"""
+import numpy as np
+import pandas as pd
+
+# Makes MAD comparable to the standard deviation for normal data
+MAD_SCALE = 0.6745
+
+
+def grouped_mad_outliers(values: pd.Series, groups, threshold: float = 3.5,
+                         amount_threshold: float = 1000000) -> pd.DataFrame:
+    """
+    Mark the outliers of values within each group with the modified z-score.
+
+    Per group:
+    - spread ratio (max - min) / median below 0.2 (or a zero median): no outliers
+    - MAD of zero: values that are not the median and differ from it by at least 50%
+    - otherwise: |modified z| above threshold and |value| above amount_threshold (if given)
+
+    Args:
+        values: Values to check
+        groups: Group key per value (anything groupby accepts: array, Series or index level)
+        threshold: Modified z-score threshold
+        amount_threshold: Minimum absolute value of an outlier, None for no minimum
+    Returns:
+        DataFrame indexed like values with median, mad, spread_ratio, modified_z
+        (NaN where the MAD is zero) and mad_label
+    """
+    grouped = values.groupby(groups)
+    median = grouped.transform('median')
+    spread = grouped.transform('max') - grouped.transform('min')
+    deviation = values - median
+    mad = deviation.abs().groupby(groups).transform('median')
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        spread_ratio = (spread / median).where(median != 0, 0)
+        modified_z = (MAD_SCALE * deviation / mad).where(mad != 0)
+        zero_mad_outlier = (values != median) & ((deviation.abs() / median) >= 0.5)
+
+    z_outlier = modified_z.abs() > threshold
+    if amount_threshold is not None:
+        z_outlier = z_outlier & (values.abs() > amount_threshold)
+    mad_label = (spread_ratio >= 0.2) & np.where(mad == 0, zero_mad_outlier, z_outlier)
+
+    return pd.DataFrame({'median': median, 'mad': mad, 'spread_ratio': spread_ratio,
+                         'modified_z': modified_z, 'mad_label': mad_label}, index=values.index)
@@ -0,0 +1,164 @@
+"""
+GL Rule Engine
+Runs the enabled Rules_Framework rules concurrently against one shared set of
+per accounting document aggregates.
+
+DocumentAggregates computes what several rules need from the whole ledger (debit /
+credit totals per accounting document, the accounts on each side of a document,
+the reversal flags and the entered date parts) once, on first use, and shares it
+between the rules.
+
+run_rules executes the rules in a thread pool (GL_RULE_WORKERS threads). Each rule
+works on a shallow copy of the data, so no column data is copied and the rules do
+not see each other's columns. Rules add their flag columns and leave the existing
+columns unchanged; the added columns are collected and set on the data in rule order
+once all rules are done, which gives the same data as running the rules one after
+another. Per rule wall time, CPU time and the memory of the added columns are recorded.
+"""
+import os
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+RULE_WORKERS = int(os.getenv('GL_RULE_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+
+class DocumentAggregates:
+    """
+    Ledger aggregates shared by the GL rules, each computed once on first use (thread safe).
+
+    Args:
+        data: Prepared GL data (Preparation.Data_Prep_for_Rules)
+        doc_column: Accounting document column
+    """
+
+    def __init__(self, data: pd.DataFrame, doc_column: str = 'ACCOUNTDOCID'):
+        self.data = data
+        self.doc_column = doc_column
+        self._values = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def _shared(self, name: str, compute: Callable):
+        with self._guard:
+            if name in self._values:
+                return self._values[name]
+            lock = self._locks.setdefault(name, threading.Lock())
+        with lock:
+            if name not in self._values:
+                self._values[name] = compute()
+        return self._values[name]
+
+    @property
+    def amount_totals(self) -> pd.DataFrame:
+        """DEBIT_AMOUNT and CREDIT_AMOUNT summed over the document of each row (row aligned)"""
+        return self._shared('amount_totals', lambda: self.data.groupby(self.doc_column)[
+            ['DEBIT_AMOUNT', 'CREDIT_AMOUNT']].transform('sum'))
+
+    @property
+    def entered_date_parts(self) -> pd.DataFrame:
+        """Day of week, hour and day of month of ENTERED_DATE (row aligned)"""
+        def compute():
+            entered_date = self.data['ENTERED_DATE']
+            return pd.DataFrame({'dayofweek': entered_date.dt.dayofweek, 'hour': entered_date.dt.hour,
+                                 'day': entered_date.dt.day}, index=self.data.index)
+        return self._shared('entered_date_parts', compute)
+
+    @property
+    def non_reversal_mask(self) -> np.ndarray:
+        """True for the rows that are not reversed (IS_REVERSED == 0)"""
+        return self._shared('non_reversal_mask', lambda: (self.data['IS_REVERSED'] == 0).to_numpy())
+
+    def side_values(self, column: str = 'ACCOUNT_CODE') -> pd.DataFrame:
+        """Distinct (document, DEBIT_CREDIT_INDICATOR, column) rows of the documents"""
+        return self._shared(f'side_values:{column}', lambda: self.data[
+            [self.doc_column, 'DEBIT_CREDIT_INDICATOR', column]].dropna(subset=[self.doc_column]).drop_duplicates())
+
+    def docs_with_counter_accounts(self, accounts: List[str], side: str, counter_values: List[str],
+                                   counter_side: str, counter_in: bool = True,
+                                   counter_column: str = 'ACCOUNT_CODE') -> np.ndarray:
+        """
+        Documents with an account of accounts on side, that have a counter_column value on
+        counter_side which is in counter_values (counter_in) or not in counter_values (not counter_in).
+
+        Args:
+            accounts: Account codes looked for on side
+            side: 'D' or 'C'
+            counter_values: Values of counter_column looked for on counter_side
+            counter_side: 'D' or 'C'
+            counter_in: Whether the counter value has to be in or outside counter_values
+            counter_column: Column compared with counter_values
+        Returns:
+            Array of document ids
+        """
+        accounts_df = self.side_values('ACCOUNT_CODE')
+        docs = accounts_df.loc[(accounts_df['DEBIT_CREDIT_INDICATOR'] == side) &
+                               accounts_df['ACCOUNT_CODE'].isin(accounts), self.doc_column].unique()
+        counter_df = self.side_values(counter_column)
+        counter_df = counter_df[(counter_df['DEBIT_CREDIT_INDICATOR'] == counter_side) &
+                                counter_df[self.doc_column].isin(docs)]
+        in_values = counter_df[counter_column].isin(counter_values)
+        return counter_df.loc[in_values if counter_in else ~in_values, self.doc_column].unique()
+
+
+def _run_rule(rule_function: Callable, rule_frame: pd.DataFrame) -> Tuple[float, float]:
+    start_time = time.perf_counter()
+    start_cpu_time = time.thread_time()
+    rule_function(rule_frame)
+    return time.perf_counter() - start_time, time.thread_time() - start_cpu_time
+
+
+def _peak_memory_mb() -> float:
+    if resource is None:
+        return float('nan')
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_rules(rule_functions: Dict[str, Callable], rules: List[str], data: pd.DataFrame,
+              max_workers: int = RULE_WORKERS) -> pd.DataFrame:
+    """
+    Run the rules on data concurrently and set their columns on data.
+
+    Args:
+        rule_functions: Rule key -> function flagging the rule on the DataFrame it is given
+        rules: Rule keys to run, in order
+        data: Prepared GL data, the rule columns are added in place (existing columns are not updated)
+        max_workers: Number of threads, 1 runs the rules one after another
+    Returns:
+        Telemetry DataFrame, one row per rule: RULE, WALL_SECONDS, CPU_SECONDS,
+        OUTPUT_COLUMNS, OUTPUT_MB (memory of the columns the rule added)
+    Raises:
+        The first exception raised by a rule (in rule order)
+    """
+    rule_frames = {rule: data.copy(deep=False) for rule in rules}
+    peak_memory_before = _peak_memory_mb()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(rules) or 1))) as executor:
+        # Each task runs in a copy of the caller's context, so the rules keep the flask app context (g)
+        futures = {rule: executor.submit(contextvars.copy_context().run, _run_rule, rule_functions[rule],
+                                         rule_frames[rule]) for rule in rules}
+        timings = {rule: futures[rule].result() for rule in rules}
+
+    existing_columns = set(data.columns)
+    telemetry = []
+    for rule in rules:
+        rule_frame = rule_frames.pop(rule)
+        added = [column for column in rule_frame.columns if column not in existing_columns]
+        output_mb = rule_frame[added].memory_usage(index=False, deep=True).sum() / 1024 ** 2 if added else 0.0
+        for column in added:
+            data[column] = rule_frame[column]
+        wall_seconds, cpu_seconds = timings[rule]
+        telemetry.append({'RULE': rule, 'WALL_SECONDS': round(wall_seconds, 3), 'CPU_SECONDS': round(cpu_seconds, 3),
+                          'OUTPUT_COLUMNS': ",".join(added), 'OUTPUT_MB': round(output_mb, 3)})
+    telemetry = pd.DataFrame(telemetry, columns=['RULE', 'WALL_SECONDS', 'CPU_SECONDS', 'OUTPUT_COLUMNS', 'OUTPUT_MB'])
+    telemetry.attrs['peak_memory_mb'] = (peak_memory_before, _peak_memory_mb())
+    return telemetry
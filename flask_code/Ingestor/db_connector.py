@@ -1,6 +1,6 @@
 from operator import index
 import os,json,mysql.connector
-from sqlalchemy import create_engine
+from databases import bulk_loader
 import pandas as pd
 # from GL_Module.logger import logger
 from code1.logger import capture_log_message
@@ -216,7 +216,4 @@ class MySQL_DB:
                 tablename : table to which the data should be uploaded
         """
         
-        engine = create_engine("mysql+pymysql://"+self.user+":"+self.password+"@"+self.host+":"+str(self.port)+"/"+self.dbname, connect_args = self.connect_args)
-        with engine.connect() as connection:
-            data.to_sql(tablename, con=connection, index = False, if_exists = 'append')
-        engine.dispose()
\ No newline at end of file
+        bulk_loader.upload_dataframe(data, tablename)
\ No newline at end of file
@@ -1,11 +1,12 @@
 import pandas as pd
-import dask.dataframe as dd
 import numpy as np
 from flask import g
 from code1.logger import capture_log_message, update_data_time_period_for_audit_id
 from code1 import src_load 
 import os
 from src_load import connect_to_database
+from Ingestor.historical_invoice_index import HistoricalInvoiceIndex
+from Ingestor.parquet_reader import read_parquet_pushdown
 
 
 def find_month_label_based_on_date(date_value):
@@ -56,7 +57,7 @@ def get_quarters(batch_id=None):
 #         capture_log_message(current_logger=g.error_logger, log_message='{}'.format(e))
 #         return None
 
-def read_batch_ddf_from_path(client_folder_path, batch_id):
+def read_batch_ddf_from_path(client_folder_path, batch_id, columns=None):
     capture_log_message(f"Fetching {g.module_nm} historical folder path for Batch id {batch_id}...")
     if g.module_nm =='AP':
         historical_folder_path = os.path.join(client_folder_path,'historical_AP_data_parquet')
@@ -74,17 +75,12 @@ def read_batch_ddf_from_path(client_folder_path, batch_id):
     data_files_path = [os.path.join(historical_erp_folder_path, file) for file in files_name_lst]
     capture_log_message(f"Parquet data files list: {data_files_path}")
 
-    ddf = dd.read_parquet(data_files_path)
- 
-    # Filter the Dask DataFrame based on the date range
-    ddf_filtered = ddf[ddf['batch_id']==batch_id]
-    # Convert the filtered Dask DataFrame to a Pandas DataFrame
-    data_df = ddf_filtered.compute()
-
-    data_df = data_df.reset_index(drop=True)
+    # Only the row groups of this batch (and the requested columns) are decoded
+    data_df = read_parquet_pushdown(data_files_path, historical_erp_folder_path, columns=columns,
+                                    batch_id=batch_id, erp_id=g.erp_id)
     return data_df
 
-def read_ddf_from_path(client_folder_path, start_date, end_date):
+def read_ddf_from_path(client_folder_path, start_date, end_date, columns=None):
     if g.module_nm =='AP':
         historical_folder_path = os.path.join(client_folder_path,'historical_AP_data_parquet')
     elif g.module_nm == 'ZBLOCK':
@@ -101,19 +97,52 @@ def read_ddf_from_path(client_folder_path, start_date, end_date):
     data_files_path = [os.path.join(historical_erp_folder_path, file) for file in files_name_lst]
     capture_log_message(f"Historical ERP data files list: {data_files_path}")
 
-    ddf = dd.read_parquet(data_files_path)
-    
-    # Convert start_date and end_date to datetime format for filtering
-    start_date = pd.to_datetime(start_date)
-    end_date = pd.to_datetime(end_date)
+    # Posted date window and column projection are pushed down to pyarrow
+    data_df = read_parquet_pushdown(data_files_path, historical_erp_folder_path, columns=columns,
+                                    start_date=start_date, end_date=end_date, erp_id=g.erp_id)
+    return data_df
 
-    # Filter the Dask DataFrame based on the date range
-    ddf_filtered = ddf[(ddf['POSTED_DATE'] >= start_date) & (ddf['POSTED_DATE'] <= end_date)]
 
-    # Convert the filtered Dask DataFrame to a Pandas DataFrame
-    data_df = ddf_filtered.compute()
-    data_df = data_df.reset_index(drop=True)
-    return data_df
+def read_candidates_from_hist_index(client_folder_path, current_df, start_date, end_date,
+                                    exclude_batch_id=None, supplier_name_mask_fn=None):
+    """Reads only the historical AP rows that are candidate neighbours of the current batch,
+    using the persisted historical invoice index instead of the full history window.
+
+    Args:
+        client_folder_path (str): Client folder path
+        current_df (pd.DataFrame): Current batch (VENDORCODE, SUPPLIER_NAME, INVOICE_NUMBER, INVOICE_DATE, INVOICE_AMOUNT)
+        start_date, end_date : Historical posted date window
+        exclude_batch_id : Batch id whose rows are skipped (the current batch)
+        supplier_name_mask_fn : Optional fn(historical_df, vendor_list) -> bool mask for similar supplier names
+    Returns:
+        data_df (pd.DataFrame) : Historical rows of the candidate accounting documents
+    """
+    historical_erp_folder_path = os.path.join(client_folder_path, 'historical_AP_data_parquet', 'erp_'+str(g.erp_id))
+    capture_log_message(f"Historical ERP data folder path is {historical_erp_folder_path}")
+
+    files_name_lst = get_quarters_file_names(start_date, end_date, historical_erp_folder_path)
+    if not files_name_lst:
+        return pd.DataFrame()
+
+    hist_index = HistoricalInvoiceIndex(historical_erp_folder_path)
+    hist_index.refresh()
+    index_df = hist_index.load(files_name_lst, start_date, end_date)
+    capture_log_message(f"Historical invoice index entries in window: {index_df.shape[0]}")
+    if index_df.empty:
+        return pd.DataFrame()
+
+    matched_supplier_names = None
+    if supplier_name_mask_fn is not None:
+        hist_suppliers = index_df[['SUPPLIER_NAME']].drop_duplicates().reset_index(drop=True)
+        supplier_mask = supplier_name_mask_fn(hist_suppliers, current_df['SUPPLIER_NAME'].unique())
+        matched_supplier_names = hist_suppliers.loc[supplier_mask, 'SUPPLIER_NAME'].tolist()
+
+    mask = HistoricalInvoiceIndex.neighbour_mask(index_df, current_df,
+                                                 matched_supplier_names=matched_supplier_names,
+                                                 exclude_batch_id=exclude_batch_id)
+    candidates_df = index_df[mask]
+    capture_log_message(f"Candidate historical entries for current batch: {candidates_df.shape[0]} of {index_df.shape[0]}")
+    return hist_index.read_rows(candidates_df, start_date, end_date)
 
 
 def process_batch_data(batch_id, client_id):
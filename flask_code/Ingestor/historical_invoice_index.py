@@ -0,0 +1,251 @@
+"""
+Historical Invoice Index
+========================
+Persisted key index over the monthly historical AP parquet files
+(``historical_AP_data_parquet/erp_{id}/hist_{client}_{erp}_m{month}_{year}.parquet``).
+
+For every monthly file a small parquet holding only the duplicate lookup keys is
+kept in ``erp_{id}/duplicate_invoice_index/``:
+
+- SUPPLIER_KEY          : supplier id as stripped string
+- AMOUNT_BUCKET         : floor of the absolute invoice amount
+- INVOICE_NUMBER_KEY    : invoice number upper-cased, alphanumerics only, leading zeros removed
+- INVOICE_DATE_KEY      : invoice date normalised to the day
+
+A ``manifest.json`` records size and mtime of every indexed file so ``refresh``
+only re-indexes monthly files that were added or rewritten since the last run.
+A new batch is probed against the index and only its candidate neighbours are
+read back from the monthly files, so the read scales with the batch instead of
+with the history window.
+"""
+
+import os
+import json
+import uuid
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from flask import g
+from code1.logger import capture_log_message
+
+INDEX_FOLDER_NAME = 'duplicate_invoice_index'
+MANIFEST_FILE_NAME = 'manifest.json'
+INDEX_VERSION = 1
+
+SOURCE_KEY_COLUMNS = ['ACCOUNTING_DOC', 'POSTED_DATE', 'batch_id', 'SUPPLIER_ID', 'SUPPLIER_NAME',
+                      'INVOICE_NUMBER', 'INVOICE_DATE', 'INVOICE_AMOUNT']
+INDEX_COLUMNS = ['ACCOUNTING_DOC', 'POSTED_DATE', 'batch_id', 'SUPPLIER_NAME',
+                 'SUPPLIER_KEY', 'AMOUNT_BUCKET', 'INVOICE_NUMBER_KEY', 'INVOICE_DATE_KEY']
+
+
+def normalize_supplier_key(values: pd.Series) -> pd.Series:
+    return values.astype(str).str.strip()
+
+
+def normalize_amount_bucket(values: pd.Series) -> pd.Series:
+    amounts = pd.to_numeric(values, errors='coerce').abs()
+    return amounts.floordiv(1).fillna(-1).astype('int64')
+
+
+def normalize_invoice_number_key(values: pd.Series) -> pd.Series:
+    return (values.fillna('').astype(str).str.upper()
+            .str.replace(r'[^A-Z0-9]', '', regex=True)
+            .str.lstrip('0'))
+
+
+def normalize_invoice_date_key(values: pd.Series) -> pd.Series:
+    return pd.to_datetime(values, errors='coerce').dt.normalize()
+
+
+def _write_parquet_atomic(df: pd.DataFrame, path: str):
+    # Unique temporary name, concurrent pipelines may refresh the same index
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+class HistoricalInvoiceIndex:
+    """
+    Incrementally maintained key index over one ERP historical parquet folder.
+    """
+
+    def __init__(self, historical_erp_folder_path: str):
+        self.data_folder_path = historical_erp_folder_path
+        self.index_folder_path = os.path.join(historical_erp_folder_path, INDEX_FOLDER_NAME)
+        self.manifest_path = os.path.join(self.index_folder_path, MANIFEST_FILE_NAME)
+
+    def _load_manifest(self) -> dict:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path) as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError) as e:
+            capture_log_message(f"Historical invoice index manifest unreadable, rebuilding index: {e}")
+            return {}
+        if manifest.get('version') != INDEX_VERSION:
+            return {}
+        return manifest.get('files', {})
+
+    def _save_manifest(self, files: dict):
+        tmp_path = f"{self.manifest_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w') as manifest_file:
+            json.dump({'version': INDEX_VERSION, 'files': files}, manifest_file)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _index_file_path(self, file_name: str) -> str:
+        return os.path.join(self.index_folder_path, file_name)
+
+    def _build_file_index(self, file_name: str) -> pd.DataFrame:
+        source_path = os.path.join(self.data_folder_path, file_name)
+        available = set(pq.read_schema(source_path).names)
+        columns = [col for col in SOURCE_KEY_COLUMNS if col in available]
+        df = pd.read_parquet(source_path, columns=columns)
+        for col in SOURCE_KEY_COLUMNS:
+            if col not in df.columns:
+                df[col] = None
+
+        index_df = df[['ACCOUNTING_DOC', 'batch_id', 'SUPPLIER_NAME']].copy()
+        index_df['POSTED_DATE'] = pd.to_datetime(df['POSTED_DATE'], errors='coerce')
+        index_df['SUPPLIER_NAME'] = index_df['SUPPLIER_NAME'].fillna('').astype(str)
+        index_df['SUPPLIER_KEY'] = normalize_supplier_key(df['SUPPLIER_ID'])
+        index_df['AMOUNT_BUCKET'] = normalize_amount_bucket(df['INVOICE_AMOUNT'])
+        index_df['INVOICE_NUMBER_KEY'] = normalize_invoice_number_key(df['INVOICE_NUMBER'])
+        index_df['INVOICE_DATE_KEY'] = normalize_invoice_date_key(df['INVOICE_DATE'])
+        return index_df[INDEX_COLUMNS]
+
+    def refresh(self) -> int:
+        """
+        Index monthly files that are new or changed since the last refresh and drop
+        the entries of files that no longer exist.
+
+        Returns:
+            int : Number of monthly files (re)indexed
+        """
+        if not os.path.exists(self.data_folder_path):
+            return 0
+        os.makedirs(self.index_folder_path, exist_ok=True)
+
+        manifest = self._load_manifest()
+        source_files = sorted(file for file in os.listdir(self.data_folder_path) if file.endswith('.parquet'))
+        updated_manifest = {}
+        no_of_indexed_files = 0
+
+        for file_name in source_files:
+            stat = os.stat(os.path.join(self.data_folder_path, file_name))
+            signature = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+            entry = manifest.get(file_name)
+            if entry and all(entry.get(key) == value for key, value in signature.items()) \
+                    and os.path.exists(self._index_file_path(file_name)):
+                updated_manifest[file_name] = entry
+                continue
+
+            index_df = self._build_file_index(file_name)
+            _write_parquet_atomic(index_df, self._index_file_path(file_name))
+            updated_manifest[file_name] = dict(signature, rows=int(index_df.shape[0]))
+            no_of_indexed_files += 1
+
+        for file_name in set(manifest) - set(updated_manifest):
+            index_file_path = self._index_file_path(file_name)
+            if os.path.exists(index_file_path):
+                os.remove(index_file_path)
+
+        self._save_manifest(updated_manifest)
+        capture_log_message(f"Historical invoice index refreshed, {no_of_indexed_files} of {len(source_files)} monthly files (re)indexed")
+        return no_of_indexed_files
+
+    def load(self, file_names: list, start_date, end_date) -> pd.DataFrame:
+        """
+        Read the index entries of the given monthly files within the posted date window.
+        """
+        frames = []
+        for file_name in file_names:
+            index_file_path = self._index_file_path(file_name)
+            if not os.path.exists(index_file_path):
+                continue
+            index_df = pd.read_parquet(index_file_path)
+            index_df['SOURCE_FILE'] = file_name
+            frames.append(index_df)
+        if not frames:
+            return pd.DataFrame(columns=INDEX_COLUMNS + ['SOURCE_FILE'])
+
+        index_df = pd.concat(frames, ignore_index=True)
+        in_window = (index_df['POSTED_DATE'] >= pd.to_datetime(start_date)) & \
+                    (index_df['POSTED_DATE'] <= pd.to_datetime(end_date))
+        return index_df[in_window].reset_index(drop=True)
+
+    @staticmethod
+    def neighbour_mask(index_df: pd.DataFrame, current_df: pd.DataFrame,
+                       supplier_column: str = 'VENDORCODE',
+                       matched_supplier_names=None,
+                       exclude_batch_id=None):
+        """
+        Flag index entries that are candidate neighbours of the current batch.
+
+        An entry is a neighbour when it shares with at least one invoice of the current batch
+        - a supplier name in matched_supplier_names, or
+        - the normalised invoice number, or
+        - the invoice date, or
+        - the supplier id with an amount bucket at most one apart (99.99 and 100.00 fall in
+          adjacent buckets).
+        The first three are the vendor, invoice number and invoice date filters of the full
+        window read, so the candidates are a superset of the rows that read keeps.
+
+        Returns:
+            numpy boolean array aligned with index_df
+        """
+        current_keys = pd.DataFrame({
+            'SUPPLIER_KEY': normalize_supplier_key(current_df[supplier_column]),
+            'AMOUNT_BUCKET': normalize_amount_bucket(current_df['INVOICE_AMOUNT']),
+            'INVOICE_NUMBER_KEY': normalize_invoice_number_key(current_df['INVOICE_NUMBER']),
+            'INVOICE_DATE_KEY': normalize_invoice_date_key(current_df['INVOICE_DATE']),
+        })
+
+        index_supplier_bucket = pd.MultiIndex.from_frame(index_df[['SUPPLIER_KEY', 'AMOUNT_BUCKET']])
+        mask = np.zeros(index_df.shape[0], dtype=bool)
+        for offset in (-1, 0, 1):
+            neighbour_keys = current_keys[['SUPPLIER_KEY', 'AMOUNT_BUCKET']].assign(
+                AMOUNT_BUCKET=current_keys['AMOUNT_BUCKET'] + offset)
+            mask |= index_supplier_bucket.isin(pd.MultiIndex.from_frame(neighbour_keys))
+
+        if matched_supplier_names is not None and len(matched_supplier_names):
+            mask |= index_df['SUPPLIER_NAME'].isin(set(matched_supplier_names)).to_numpy()
+
+        # Invoice numbers that normalise to '' (missing, "000") match each other, as equal raw values do
+        invoice_keys = set(current_keys['INVOICE_NUMBER_KEY'])
+        mask |= index_df['INVOICE_NUMBER_KEY'].isin(invoice_keys).to_numpy()
+
+        mask |= index_df['INVOICE_DATE_KEY'].isin(set(current_keys['INVOICE_DATE_KEY'].dropna())).to_numpy()
+
+        if exclude_batch_id is not None:
+            mask &= (index_df['batch_id'] != exclude_batch_id).to_numpy()
+        return mask
+
+    def read_rows(self, candidates_df: pd.DataFrame, start_date, end_date) -> pd.DataFrame:
+        """
+        Read the full historical rows of the candidate accounting documents, only from
+        the monthly files that contain them.
+        """
+        frames = []
+        for file_name, file_candidates in candidates_df.groupby('SOURCE_FILE'):
+            docs = file_candidates['ACCOUNTING_DOC'].drop_duplicates().tolist()
+            table = pq.read_table(os.path.join(self.data_folder_path, file_name),
+                                  filters=[('ACCOUNTING_DOC', 'in', docs)])
+            frames.append(table.to_pandas())
+        if not frames:
+            return pd.DataFrame()
+
+        data_df = pd.concat(frames, ignore_index=True)
+        data_df = data_df[(data_df['POSTED_DATE'] >= pd.to_datetime(start_date)) &
+                          (data_df['POSTED_DATE'] <= pd.to_datetime(end_date))]
+        return data_df.reset_index(drop=True)
+
+
+def refresh_historical_invoice_index(historical_erp_folder_path: str):
+    """Refresh the index after new data is stored, failures are logged and never raised"""
+    try:
+        return HistoricalInvoiceIndex(historical_erp_folder_path).refresh()
+    except Exception as e:
+        capture_log_message(current_logger=g.error_logger,
+                            log_message=f"Error while refreshing historical invoice index: {e}")
+        return 0
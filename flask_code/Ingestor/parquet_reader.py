@@ -0,0 +1,161 @@
+"""
+Historical Parquet Reader
+=========================
+Pushdown reader for the historical ERP parquet folders
+(``historical_{MODULE}_data_parquet/erp_{id}/...``).
+
+The requested posted date window, batch id and ERP id are turned
+into a pyarrow dataset filter, and the requested columns into a projection, so
+pyarrow skips row groups whose statistics cannot match and only decodes the
+needed columns. Hive-style sub folders (``.../COMPANY_CODE=1000/part.parquet``)
+are exposed as partition columns and pruned by the same filter.
+
+Predicates on columns missing from the files, or whose parquet type cannot be
+compared with the requested value, are applied in pandas after the read instead.
+
+Files whose schemas cannot be unified (e.g. a timestamp column written with a time
+zone in some months and without in others, or as text) are read one file at a time
+and concatenated in pandas, which coerces the differing columns like the former
+pandas reader did.
+"""
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from code1.logger import capture_log_message
+
+
+# Raised by pyarrow when the files of a dataset do not share a compatible schema
+SCHEMA_MISMATCH_ERRORS = (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError)
+
+
+def _dataset(data_files_path: list, base_folder_path: str) -> ds.Dataset:
+    dataset = ds.dataset(data_files_path, format='parquet',
+                         partitioning='hive', partition_base_dir=base_folder_path)
+    # Monthly files written over time may differ in columns, use the union of all file footers.
+    # Raises one of SCHEMA_MISMATCH_ERRORS when a column changed type between files
+    schema = pa.unify_schemas([dataset.schema] +
+                              [fragment.physical_schema for fragment in dataset.get_fragments()])
+    return ds.dataset(data_files_path, schema=schema, format='parquet',
+                      partitioning='hive', partition_base_dir=base_folder_path)
+
+
+def _scalar_for(field_type: pa.DataType, value):
+    """Value as a pyarrow scalar of the column type, None when it cannot be compared"""
+    try:
+        if pa.types.is_timestamp(field_type) or pa.types.is_date(field_type):
+            return pa.scalar(pd.Timestamp(value).to_pydatetime(), type=pa.timestamp('us')).cast(field_type)
+        if pa.types.is_string(field_type) or pa.types.is_large_string(field_type):
+            return pa.scalar(str(value), type=field_type)
+        if pa.types.is_integer(field_type) or pa.types.is_floating(field_type):
+            return pa.scalar(value).cast(field_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, ValueError, TypeError):
+        return None
+    return None
+
+
+def build_filter(schema: pa.Schema, start_date=None, end_date=None, batch_id=None,
+                 erp_id=None, date_column: str = 'POSTED_DATE'):
+    """
+    Build the dataset filter expression for the requested window.
+
+    Returns:
+        (expression or None, list of (column, op, value) predicates left for pandas)
+    """
+    expression = None
+    remaining = []
+
+    def add(column, op, value):
+        nonlocal expression
+        if column not in schema.names:
+            if column != 'erp_id':
+                remaining.append((column, op, value))
+            return
+        field_type = schema.field(column).type
+        if op in ('>=', '<=') and not (pa.types.is_timestamp(field_type) or pa.types.is_date(field_type)):
+            # Dates stored as text do not order like dates, compare them after parsing in pandas
+            predicate = None
+        else:
+            scalar = _scalar_for(field_type, value)
+            predicate = None if scalar is None else {'>=': ds.field(column) >= scalar,
+                                                    '<=': ds.field(column) <= scalar,
+                                                    '==': ds.field(column) == scalar}[op]
+        if predicate is None:
+            remaining.append((column, op, value))
+            return
+        expression = predicate if expression is None else expression & predicate
+
+    if start_date is not None:
+        add(date_column, '>=', pd.to_datetime(start_date))
+    if end_date is not None:
+        add(date_column, '<=', pd.to_datetime(end_date))
+    if batch_id is not None:
+        add('batch_id', '==', batch_id)
+    if erp_id is not None:
+        # Only applies to hive partitioned folders (erp_id=...), the flat layout is already per ERP
+        add('erp_id', '==', erp_id)
+    return expression, remaining
+
+
+def _apply_in_pandas(data_df: pd.DataFrame, predicates: list) -> pd.DataFrame:
+    for column, op, value in predicates:
+        if column not in data_df.columns:
+            continue
+        if column == 'batch_id':
+            mask = data_df[column].astype(str) == str(value)
+        else:
+            values = pd.to_datetime(data_df[column], errors='coerce')
+            mask = values >= value if op == '>=' else values <= value
+        data_df = data_df[mask]
+    return data_df
+
+
+def _read(dataset: ds.Dataset, columns, start_date, end_date, batch_id, erp_id, date_column) -> pd.DataFrame:
+    schema = dataset.schema
+    expression, remaining = build_filter(schema, start_date=start_date, end_date=end_date, batch_id=batch_id,
+                                         erp_id=erp_id, date_column=date_column)
+    read_columns = None
+    if columns is not None:
+        # Columns needed by the pandas fallback predicates are read too and dropped afterwards
+        wanted = list(dict.fromkeys(list(columns) + [column for column, _, _ in remaining]))
+        read_columns = [column for column in wanted if column in schema.names]
+
+    capture_log_message(f"Parquet pushdown read of {len(dataset.files)} files, filter: {expression}, "
+                        f"columns: {read_columns if read_columns is not None else 'all'}")
+    data_df = dataset.to_table(columns=read_columns, filter=expression).to_pandas()
+    if remaining:
+        capture_log_message(f"Predicates applied after the read: {remaining}")
+        data_df = _apply_in_pandas(data_df, remaining)
+        if columns is not None:
+            data_df = data_df[[column for column in columns if column in data_df.columns]]
+    return data_df
+
+
+def read_parquet_pushdown(data_files_path: list, base_folder_path: str, columns=None,
+                          start_date=None, end_date=None, batch_id=None,
+                          erp_id=None, date_column: str = 'POSTED_DATE') -> pd.DataFrame:
+    """
+    Read the given parquet files with the window pushed down to pyarrow.
+
+    Args:
+        data_files_path (list): Parquet files to read
+        base_folder_path (str): Folder the hive partition directories are relative to
+        columns (list): Columns to return, None for all. Missing columns are skipped
+        start_date, end_date : Inclusive window on date_column
+        batch_id : Only rows of this batch
+        erp_id : Only rows of this ERP when the folder is hive partitioned on erp_id
+    Returns:
+        data_df (pd.DataFrame)
+    """
+    if not data_files_path:
+        return pd.DataFrame()
+    read_args = dict(columns=columns, start_date=start_date, end_date=end_date, batch_id=batch_id,
+                     erp_id=erp_id, date_column=date_column)
+    try:
+        data_df = _read(_dataset(data_files_path, base_folder_path), **read_args)
+    except SCHEMA_MISMATCH_ERRORS as e:
+        capture_log_message(f"Parquet files have incompatible schemas ({e}), reading them one at a time")
+        data_df = pd.concat([_read(ds.dataset(path, format='parquet', partitioning='hive',
+                                              partition_base_dir=base_folder_path), **read_args)
+                             for path in data_files_path], ignore_index=True)
+    return data_df.reset_index(drop=True)
@@ -28,6 +28,7 @@ from hist_data.hist_data_flow import hist_bp
 # from apscheduler.schedulers.background import BackgroundScheduler
 
 from databases.sharding_tables import ShardingTables
+from databases import connection_pool
 from pipeline_data import PipelineData
 import traceback
 from mysql.connector import Error as MySQLError
@@ -47,6 +48,8 @@ app.register_blueprint(invoice_blueprint)
 # Register SAP 3-Stage Pipeline Blueprint for reading raw sap data
 from sap_data_pipeline.api import sap_pipeline_bp
 app.register_blueprint(sap_pipeline_bp)
+from pipeline_stage_runner import StageRunner, route_stage
+import pipeline_scheduler
 
 # credentials = get_database_credentials()
 # DB_USERNAME = credentials["username"]
@@ -176,6 +179,7 @@ def after_request(response):
     if request.endpoint in ['custom_pipeline_gl','custom_pipeline_ap','hist_data.custom_hist_ap',
                             'hist_data.custom_hist_gl','hist_data.custom_data_read_zblock', 'custom_zblock_data_ingestion']:
         
+        capture_log_message(f'Database pool metrics:{connection_pool.get_pool_metrics()}',store_in_db=False)
         # Delete temp tables and views
         obj = ShardingTables()
         if request.endpoint == "custom_pipeline_ap":
@@ -518,6 +522,15 @@ def custom_zblock_pipeline(batch_id, run_timestamp=None):
             request_payload_data = {"pipeline_mode":pipeline_mode, "incoming_folder": incoming_folder_path,"batch_id":batch_id}
 
             root_logger.info(f"ZBLOCK Pipeline - Step 1: Calling SAP Raw Data Pipeline API at {request_url} with payload: {request_payload_data}")
+
+            # Data Read --> Ingestion --> Invoice Analysis, executed in this process
+            stage_runner = StageRunner(pipeline_mode, batch_id, [
+                route_stage(app, utils.ZBLOCK_DATA_READ_STAGE, "/sap-raw-data-pipeline", 'POST', request_payload_data),
+                route_stage(app, utils.ZBLOCK_DATA_INGESTION_STAGE, f"/custom_data_read_zblock/{batch_id}",
+                            depends_on=[utils.ZBLOCK_DATA_READ_STAGE]),
+                route_stage(app, utils.Z_BLOCK_INVOICE_VERIFICATION_STAGE, f"/invoice_analysis/{batch_id}",
+                            depends_on=[utils.ZBLOCK_DATA_INGESTION_STAGE]),
+            ])
             
             root_logger.info(f"Incoming folder path for ZBLOCK Pipeline: {incoming_folder_path}")
 
@@ -540,7 +553,7 @@ def custom_zblock_pipeline(batch_id, run_timestamp=None):
                                                                         current_step=utils.ZBLOCK_DATA_READ_STAGE,
                                                                         pipeline=pipeline_mode)
             
-            response = make_api_calls(request_url, request_type, request_payload_data)
+            response = stage_runner.run_stage(utils.ZBLOCK_DATA_READ_STAGE)
               # Use special handler for Stage 1 responses (handles all 6 return cases)
             # stage1_result = handle_stage1_pipeline_response(response, pipeline_mode="ZBLOCK")
             root_logger.info(f"ZBLOCK Pipeline - Step 1: Calling SAP Raw Data Pipeline API completed. Response received.")
@@ -590,7 +603,7 @@ def custom_zblock_pipeline(batch_id, run_timestamp=None):
                 request_type = 'GET'
                 request_url = f"{os.getenv('APP_URL')}/custom_data_read_zblock/{batch_id}"
                 root_logger.info(f"ZBLOCK Pipeline - Step 2: Calling Data Ingestion API at {request_url}")
-                response = make_api_calls(url=request_url, request_type=request_type)
+                response = stage_runner.run_stage(utils.ZBLOCK_DATA_INGESTION_STAGE)
                 
                 root_logger.info(f"ZBLOCK Pipeline - Step 2: Calling Data Ingestion API completed. Response received.")
                 root_logger.info(f"ZBLOCK Pipeline - Step 2: Response Status Code: {response.status_code if response else 'No Response'}")
@@ -675,7 +688,7 @@ def custom_zblock_pipeline(batch_id, run_timestamp=None):
                     request_url = f"{os.getenv('APP_URL')}/invoice_analysis/{batch_id}"
                     request_type = 'GET'
                     root_logger.info(f"ZBLOCK Pipeline - Step 3: Calling Invoice Verification API at {request_url}")
-                    response = make_api_calls(request_type=request_type,url=request_url)
+                    response = stage_runner.run_stage(utils.Z_BLOCK_INVOICE_VERIFICATION_STAGE)
 
                     root_logger.info(f"ZBLOCK Pipeline - Step 3: Calling Invoice Verification API completed. Response received.")
                     root_logger.info(f"ZBLOCK Pipeline - Step 3: Response Status Code: {response.status_code if response else 'No Response'}")
@@ -721,6 +734,9 @@ def custom_zblock_pipeline(batch_id, run_timestamp=None):
                         )
                         root_logger.info(f"ZBLOCK Pipeline - Client notification email {client_email_obj}")
                         
+                        root_logger.info(f"ZBLOCK Pipeline - Stage metrics: {stage_runner.metrics}")
+                        root_logger.info(f"ZBLOCK Pipeline - Database pool metrics: {connection_pool.get_pool_metrics()}")
+                        stage_runner.complete()
                         # Update the flow in Pipeline run table
                         res = src_load.update_status_in_pipeline_run_table(batch_id=batch_id,
                                                                            pipeline=pipeline_mode,
@@ -904,6 +920,15 @@ def custom_ap_pipeline(batch_id, run_timestamp=None):
         request_payload_data = {"pipeline_mode":pipeline_mode, "incoming_folder": incoming_folder_path,"batch_id":batch_id} 
 
         root_logger.info(f"AP Pipeline - Step 1: Calling SAP Raw Data Pipeline API at {request_url} with payload: {request_payload_data}")
+
+        # Data Read --> Ingestion --> Scoring, executed in this process
+        stage_runner = StageRunner(pipeline_mode, batch_id, [
+            route_stage(app, utils.AP_DATA_READ_STAGE, "/sap-raw-data-pipeline", 'POST', request_payload_data),
+            route_stage(app, utils.DATA_INGESTION_STAGE, f"/custom_hist_ap/{batch_id}",
+                        depends_on=[utils.AP_DATA_READ_STAGE]),
+            route_stage(app, utils.DATA_SCORING_STAGE, f"/ap-ingestion-and-scoring-flow/{batch_id}",
+                        depends_on=[utils.DATA_INGESTION_STAGE]),
+        ])
         root_logger.info(f"Incoming folder path for AP Pipeline: {incoming_folder_path}")
 
 
@@ -926,7 +951,7 @@ def custom_ap_pipeline(batch_id, run_timestamp=None):
                                                                  current_step=utils.AP_DATA_READ_STAGE,
                                                                  pipeline=pipeline_mode)
 
-        response = make_api_calls(request_url, request_type, request_payload_data)
+        response = stage_runner.run_stage(utils.AP_DATA_READ_STAGE)
         root_logger.info(f"AP Pipeline - Step 1: Calling SAP Raw Data Pipeline API completed. Response received.")
         root_logger.info(f"AP Pipeline - Step 1: Response Status Code: {response.status_code if response else 'No Response'}")  
         root_logger.info(f"AP Pipeline - Step 1: Response Content: {response.text if response else 'No Response'}") 
@@ -979,7 +1004,7 @@ def custom_ap_pipeline(batch_id, run_timestamp=None):
 
             root_logger.info(f"AP Pipeline - Step 2: Calling Data Ingestion API at {request_url}")
 
-            response = make_api_calls(url=request_url, request_type=request_type)
+            response = stage_runner.run_stage(utils.DATA_INGESTION_STAGE)
             
             root_logger.info(f"AP Pipeline - Step 2: Calling Data Ingestion API completed. Response received.")
             root_logger.info(f"AP Pipeline - Step 2: Response Status Code: {response.status_code if response else 'No Response'}")
@@ -1042,7 +1067,7 @@ def custom_ap_pipeline(batch_id, run_timestamp=None):
 
                 root_logger.info(f"AP Pipeline - Step 3: Calling AP Ingestion and Scoring API at {request_url}")
 
-                response = make_api_calls(request_type=request_type,url=request_url)
+                response = stage_runner.run_stage(utils.DATA_SCORING_STAGE)
                 root_logger.info(f"AP Pipeline - Step 3: Calling AP Ingestion and Scoring API completed. Response received.")
                 root_logger.info(f"AP Pipeline - Step 3: Response Status Code: {response.status_code if response else 'No Response'}")
                 root_logger.info(f"AP Pipeline - Step 3: Response Content: {response.text   if response else 'No Response'}")
@@ -1082,6 +1107,9 @@ def custom_ap_pipeline(batch_id, run_timestamp=None):
                     )
                     root_logger.info(f"AP Pipeline - Client notification email {client_email_obj}")
                     
+                    root_logger.info(f"AP Pipeline - Stage metrics: {stage_runner.metrics}")
+                    root_logger.info(f"AP Pipeline - Database pool metrics: {connection_pool.get_pool_metrics()}")
+                    stage_runner.complete()
                     # If all steps succeed, return a success response
                     res = src_load.update_status_in_pipeline_run_table(batch_id=batch_id,
                                                                        pipeline=pipeline_mode,
@@ -1235,7 +1263,8 @@ def pipeline_enqueue():
     Request JSON:
     {
         "pipeline": "ZBLOCK" or "AP",
-        "run_datetime": "2026-01-22T14:00:00+00:00"
+        "run_datetime": "2026-01-22T14:00:00+00:00",
+        "priority": 10  // optional, lower runs first
     }
     
     Responses:
@@ -1262,8 +1291,13 @@ def pipeline_enqueue():
         if not pipeline or not run_datetime:
             return jsonify({"error": "Missing required fields: 'pipeline' and 'run_datetime'"}), 400
         
+        # Optional queue priority, lower values are claimed first (interactive runs)
+        priority = data.get('priority')
+        if priority is not None and not isinstance(priority, int):
+            return jsonify({"error": "'priority' must be an integer"}), 400
+
         # Call enqueue function
-        result = src_load.enqueue_pipeline(pipeline, run_datetime)
+        result = src_load.enqueue_pipeline(pipeline, run_datetime, priority=priority)
         root_logger.info(f"Enqueue pipeline result: {result}")
         
         # Map result to HTTP response
@@ -1304,27 +1338,22 @@ def execute_pipeline_in_background(run_id, batch_id, pipeline, run_timestamp_str
     """
     try:
         root_logger.info(f"[Background Process] Executing {pipeline} pipeline: run_id={run_id}, batch_id={batch_id}, run_timestamp={run_timestamp_str}")
-        # Build request URL based on pipeline type
+        # Build request path based on pipeline type
         if pipeline == "AP":
-            if run_timestamp_str:
-                request_url = f"{os.getenv('APP_URL')}/custom-ap-pipeline/{batch_id}/{run_timestamp_str}"
-            else:
-                request_url = f"{os.getenv('APP_URL')}/custom-ap-pipeline/{batch_id}"
+            request_path = f"/custom-ap-pipeline/{batch_id}"
         elif pipeline == "ZBLOCK":
-            if run_timestamp_str:
-                request_url = f"{os.getenv('APP_URL')}/custom-zblock-pipeline/{batch_id}/{run_timestamp_str}"
-            else:
-                request_url = f"{os.getenv('APP_URL')}/custom-zblock-pipeline/{batch_id}"
+            request_path = f"/custom-zblock-pipeline/{batch_id}"
         else:
             root_logger.info(f" Unknown pipeline type: {pipeline}")
             return
-        
+        if run_timestamp_str:
+            request_path = f"{request_path}/{run_timestamp_str}"
 
-        root_logger.info(f"[Background Process] Built request URL: {request_url}")
+        root_logger.info(f"[Background Process] Built request path: {request_path}")
         
-        # Execute pipeline in background
+        # Execute pipeline in background, dispatched inside this process
         root_logger.info(f"[Background Process] Starting {pipeline} pipeline: run_id={run_id}, batch_id={batch_id}")
-        response = make_api_calls(request_url, 'GET', None)
+        response = route_stage(app, pipeline, request_path).run({})
         
         if response and response.status_code == 200:
             root_logger.info(f" [Background Process] {pipeline} pipeline completed successfully: run_id={run_id}")
@@ -1340,42 +1369,40 @@ def execute_pipeline_in_background(run_id, batch_id, pipeline, run_timestamp_str
 @app.route("/pipeline/process-queue", methods=['GET'])
 def pipeline_process_queue():
     """
-    GET endpoint to process the FIFO queue of pending pipeline runs in BACKGROUND.
+    GET endpoint to process the queue of pending pipeline runs in BACKGROUND.
     
     Logic:
-    1. Check if ANY pipeline is currently RUNNING
-       → If yes: Return 429 (Too Soon) - block until completion
-    2. If no RUNNING: Get oldest PENDING pipeline_run record
-       → If found: Start background process (returns immediately)
-       → If not found: Return 200 (queue empty)
+    1. Requeue RUNNING pipelines whose worker stopped sending heartbeats
+    2. Claim PENDING runs (priority, then FIFO) with SELECT ... FOR UPDATE SKIP LOCKED
+       while the overall, per client and per pipeline type quotas allow
+    3. Start each claimed run in its own background process (returns immediately)
     
     Responses:
-    - 202: Pipeline started in background (ACCEPTED)
+    - 202: Pipeline(s) started in background (ACCEPTED)
     - 200: Queue is empty - no pending pipeline runs
-    - 429: Pipeline already running - cannot start new execution
+    - 429: Pending runs exist but all slots / quotas are in use
     - 500: Server error
     """
     try:
         root_logger.info(f"Pipeline Process Queue endpoint called")
 
-        # CHECK 1: Is any pipeline currently RUNNING?
-        running_count = src_load.check_running_pipeline_count()
-        root_logger.info(f"Current running pipeline count: {running_count}")
-        if running_count > 0:
-            return jsonify({
-                "success": False,
-                "message": "Pipeline already running - cannot start new execution",
-                "queue_processed": False,
-                "run_id": None,
-                "batch_id": None,
-                "pipeline": None,
-                "running_count": running_count
-            }), 429  # 429 Too Soon
-        
-        # CHECK 2: Get next PENDING pipeline run from queue
-        pending_run = src_load.get_next_pending_pipeline_run()
-        
-        if not pending_run:
+        result = pipeline_scheduler.schedule_pending_runs(target=execute_pipeline_in_background)
+        started_runs = result['started']
+
+        if not started_runs:
+            if src_load.get_next_pending_pipeline_run():
+                running_count = src_load.check_running_pipeline_count()
+                root_logger.info(f"No free pipeline slot, current running pipeline count: {running_count}")
+                return jsonify({
+                    "success": False,
+                    "message": "All pipeline slots are in use - pending runs stay queued",
+                    "queue_processed": False,
+                    "run_id": None,
+                    "batch_id": None,
+                    "pipeline": None,
+                    "running_count": running_count
+                }), 429  # 429 Too Soon
+
             root_logger.info("Queue is empty - no pending pipeline runs")
             return jsonify({
                 "success": True,
@@ -1385,38 +1412,19 @@ def pipeline_process_queue():
                 "batch_id": None,
                 "pipeline": None
             }), 200
-        
-        # Extract details
-        run_id = pending_run['run_id']
-        batch_id = pending_run['batch_id']
-        pipeline = pending_run['pipeline']
-        
-        root_logger.info(f"Starting background execution for pipeline: {pipeline}, run_id: {run_id}, batch_id: {batch_id}")
-        # FETCH the scheduled run_date from pipeline_run table
-        run_date = src_load.get_run_date_for_pipeline_run(run_id)
-        root_logger.info(f"Fetched run_date for run_id {run_id}: {run_date}")
-        # Convert run_date to URL format (YYYY_MM_DD_HH_MM)
-        if run_date:
-            run_timestamp_str = run_date.strftime("%Y_%m_%d_%H_%M")
-        else:
-            run_timestamp_str = None
-        
-        root_logger.info(f"Converted run_date to URL format: {run_timestamp_str}")
 
-        root_logger.info(f"Spawning background process for pipeline execution")
-        # ✅ START BACKGROUND PROCESS (don't wait for pipeline to complete)
-        process = Process(target=execute_pipeline_in_background, 
-                         args=(run_id, batch_id, pipeline, run_timestamp_str))
-        process.start()
-        
         # ✅ RETURN IMMEDIATELY with 202 Accepted (processing started in background)
+        first_run = started_runs[0]
         return jsonify({
             "success": True,
-            "message": f"Pipeline {pipeline} started in background",
+            "message": f"{len(started_runs)} pipeline(s) started in background",
             "queue_processed": True,
-            "run_id": run_id,
-            "batch_id": batch_id,
-            "pipeline": pipeline,
+            "run_id": first_run['run_id'],
+            "batch_id": first_run['batch_id'],
+            "pipeline": first_run['pipeline'],
+            "started_runs": [{"run_id": run['run_id'], "batch_id": run['batch_id'], "pipeline": run['pipeline']}
+                             for run in started_runs],
+            "reclaimed_runs": result['reclaimed'],
             "status": "PROCESSING_IN_BACKGROUND"
         }), 202  # 202 Accepted
             
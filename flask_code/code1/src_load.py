@@ -4,7 +4,6 @@ Python script to load the data to SRC table and update status in SRC_STATUS tabl
 
 import json
 import pandas as pd
-from sqlalchemy import create_engine
 import mysql.connector
 # from code1.logger import logger
 from code1.logger import capture_log_message
@@ -12,8 +11,9 @@ import time
 import os
 from flask import g
 import utils
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 from local_database import get_database_credentials
+from databases import connection_pool, bulk_loader
 from Ingestor.fetch_data import get_quarters
 import re
 
@@ -91,12 +91,8 @@ def upload_data_to_database(data, tablename):
             data : data to be uploaded
             tablename : table to which the data should be uploaded
     """
-    engine = create_engine("mysql+pymysql://"+DB_USERNAME+":"+DB_PASSWORD +
-                        "@"+DB_HOST+":"+DB_PORT+"/"+DB_NAME,connect_args = connect_args)                                       
-    # engine = engine.raw_connection()
-    with engine.connect() as connection:
-        data.to_sql(tablename, con=connection, index=False, if_exists='append')
-    engine.dispose()
+    # Large frames are bulk loaded (LOAD DATA LOCAL INFILE), small ones appended with to_sql
+    bulk_loader.upload_dataframe(data, tablename)
 
 def get_filename_src(src_id):
     """
@@ -185,9 +181,9 @@ def read_doctype():
 def connect_to_database():
     """
     Connect to Database for Fetching Data
+    Returns a connection from the process-wide pool, close() returns it to the pool
     """
-    connection = mysql.connector.connect(user=DB_USERNAME, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT, database=DB_NAME, **ssl_args)
-    return connection
+    return connection_pool.get_connection()
 
 def truncate_table(tablename):
     """
@@ -1575,6 +1571,171 @@ def check_running_pipeline_count():
         return 0
 
 
+# Name of the MySQL user lock that serializes the scheduler claims of all processes and hosts
+PIPELINE_SCHEDULER_LOCK = 'pipeline_scheduler'
+PIPELINE_SCHEDULER_LOCK_TIMEOUT = int(os.getenv("PIPELINE_SCHEDULER_LOCK_TIMEOUT", "10"))
+
+
+def claim_pending_pipeline_runs(worker_id, max_concurrent, max_per_client=None, max_per_pipeline=None, scan_limit=50):
+    """
+    Atomically claim PENDING pipeline runs that fit in the free slots and quotas.
+    Claims are serialized with the GET_LOCK('pipeline_scheduler') user lock, taken
+    before the RUNNING runs are counted and released after the claim is committed,
+    so concurrent schedulers never exceed max_concurrent or the quotas. Order is
+    priority (lower first), then FIFO. Returns no runs when the lock is not
+    acquired within PIPELINE_SCHEDULER_LOCK_TIMEOUT seconds.
+
+    The scheduler columns of pipeline_run are created by pipeline_scheduler_setup.py.
+
+    Args:
+        worker_id: Identifier of the claiming scheduler, stored on the claimed runs
+        max_concurrent: Max RUNNING pipelines overall
+        max_per_client: Max RUNNING pipelines per client_id (None for no limit)
+        max_per_pipeline: dict of pipeline type -> max RUNNING pipelines of that type
+        scan_limit: Max PENDING rows inspected per claim
+
+    Returns:
+        list of dicts with keys: run_id, batch_id, pipeline, client_id
+    """
+    max_per_pipeline = max_per_pipeline or {}
+    try:
+        with connect_to_database() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT GET_LOCK(%s, %s);", (PIPELINE_SCHEDULER_LOCK, PIPELINE_SCHEDULER_LOCK_TIMEOUT))
+                if cursor.fetchone()[0] != 1:
+                    from code1.logger import logger
+                    logger.warning("Scheduler lock not acquired, another scheduler is claiming runs")
+                    return []
+                try:
+                    # New transaction, so the counts see every claim committed before the lock was taken
+                    connection.commit()
+                    return _claim_pending_pipeline_runs(connection, cursor, worker_id, max_concurrent,
+                                                        max_per_client, max_per_pipeline, scan_limit)
+                finally:
+                    # The lock belongs to the (pooled) session, release it even when the claim failed
+                    connection.rollback()
+                    cursor.execute("SELECT RELEASE_LOCK(%s);", (PIPELINE_SCHEDULER_LOCK,))
+                    cursor.fetchall()
+    except Exception as e:
+        from code1.logger import logger
+        logger.error(f"Error claiming pending pipeline runs: {str(e)}")
+        return []
+
+
+def _claim_pending_pipeline_runs(connection, cursor, worker_id, max_concurrent, max_per_client, max_per_pipeline,
+                                 scan_limit):
+    """Claim of claim_pending_pipeline_runs, called with the scheduler lock held"""
+    cursor.execute("""SELECT pipeline, client_id, COUNT(*)
+                      FROM pipeline_run
+                      WHERE status = 'RUNNING'
+                      GROUP BY pipeline, client_id;""")
+    running_by_pipeline, running_by_client, total_running = {}, {}, 0
+    for pipeline, client_id, count in cursor.fetchall():
+        running_by_pipeline[pipeline] = running_by_pipeline.get(pipeline, 0) + count
+        running_by_client[client_id] = running_by_client.get(client_id, 0) + count
+        total_running += count
+
+    if total_running >= max_concurrent:
+        connection.rollback()
+        return []
+
+    cursor.execute("""SELECT run_id, batch_id, pipeline, client_id
+                      FROM pipeline_run
+                      WHERE status = 'PENDING'
+                      ORDER BY priority ASC, created_at ASC
+                      LIMIT %s
+                      FOR UPDATE SKIP LOCKED;""", (scan_limit,))
+    claimed = []
+    for run_id, batch_id, pipeline, client_id in cursor.fetchall():
+        if total_running >= max_concurrent:
+            break
+        if max_per_client is not None and running_by_client.get(client_id, 0) >= max_per_client:
+            continue
+        if pipeline in max_per_pipeline and running_by_pipeline.get(pipeline, 0) >= max_per_pipeline[pipeline]:
+            continue
+        claimed.append({'run_id': run_id, 'batch_id': batch_id, 'pipeline': pipeline, 'client_id': client_id})
+        running_by_client[client_id] = running_by_client.get(client_id, 0) + 1
+        running_by_pipeline[pipeline] = running_by_pipeline.get(pipeline, 0) + 1
+        total_running += 1
+
+    if claimed:
+        now = datetime.now(timezone.utc)
+        run_ids = [run['run_id'] for run in claimed]
+        placeholders = ', '.join(['%s'] * len(run_ids))
+        cursor.execute(f"""UPDATE pipeline_run
+                           SET status = 'RUNNING', worker_id = %s, heartbeat_at = %s, started_at = %s,
+                               attempts = attempts + 1, status_message = 'Pipeline claimed for execution'
+                           WHERE run_id IN ({placeholders});""", (worker_id, now, now, *run_ids))
+    connection.commit()
+    return claimed
+
+
+def update_pipeline_run_heartbeat(run_id, worker_id):
+    """Refresh heartbeat_at of a RUNNING pipeline run owned by worker_id"""
+    try:
+        with connect_to_database() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("""UPDATE pipeline_run SET heartbeat_at = %s
+                                  WHERE run_id = %s AND worker_id = %s AND status = 'RUNNING';""",
+                               (datetime.now(timezone.utc), run_id, worker_id))
+                connection.commit()
+                return cursor.rowcount > 0
+    except Exception as e:
+        from code1.logger import logger
+        logger.error(f"Error updating heartbeat for run_id {run_id}: {str(e)}")
+        return False
+
+
+def reclaim_stale_pipeline_runs(heartbeat_timeout_seconds, max_attempts):
+    """
+    Return RUNNING pipeline runs whose worker stopped sending heartbeats to the queue,
+    or mark them FAILED once they used max_attempts. Runs without a heartbeat
+    (started before the scheduler tracked them) are left untouched.
+
+    Returns:
+        int: Number of runs reclaimed or failed
+    """
+    try:
+        with connect_to_database() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("""SELECT run_id, attempts FROM pipeline_run
+                                  WHERE status = 'RUNNING' AND heartbeat_at IS NOT NULL AND heartbeat_at < %s
+                                  FOR UPDATE SKIP LOCKED;""",
+                               (datetime.now(timezone.utc) - timedelta(seconds=heartbeat_timeout_seconds),))
+                stale_runs = cursor.fetchall()
+                for run_id, attempts in stale_runs:
+                    if attempts >= max_attempts:
+                        cursor.execute("""UPDATE pipeline_run SET status = 'FAILED', finished_at = %s, worker_id = NULL,
+                                              status_message = 'Worker stopped responding, max attempts reached'
+                                          WHERE run_id = %s;""", (datetime.now(timezone.utc), run_id))
+                    else:
+                        cursor.execute("""UPDATE pipeline_run SET status = 'PENDING', worker_id = NULL, heartbeat_at = NULL,
+                                              status_message = 'Requeued after worker stopped responding'
+                                          WHERE run_id = %s;""", (run_id,))
+                connection.commit()
+                return len(stale_runs)
+    except Exception as e:
+        from code1.logger import logger
+        logger.error(f"Error reclaiming stale pipeline runs: {str(e)}")
+        return 0
+
+
+def fail_pipeline_run_if_running(run_id, worker_id, status_message):
+    """Mark a run FAILED when its worker finished without the pipeline setting a final status"""
+    try:
+        with connect_to_database() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("""UPDATE pipeline_run SET status = 'FAILED', finished_at = %s, status_message = %s
+                                  WHERE run_id = %s AND worker_id = %s AND status = 'RUNNING';""",
+                               (datetime.now(timezone.utc), status_message, run_id, worker_id))
+                connection.commit()
+                return cursor.rowcount > 0
+    except Exception as e:
+        from code1.logger import logger
+        logger.error(f"Error closing pipeline run {run_id}: {str(e)}")
+        return False
+
+
 def get_run_date_for_pipeline_run(run_id):
     """
     Fetch the run_date from pipeline_run table for a given run_id.
@@ -1661,13 +1822,14 @@ def get_pipeline_run_details(run_id):
         return None
 
 
-def enqueue_pipeline(pipeline, run_datetime):
+def enqueue_pipeline(pipeline, run_datetime, priority=None):
     """
     Enqueue a pipeline for execution. Creates a new batch and pipeline_run record.
     
     Args:
         pipeline: Pipeline name ('ZBLOCK' or 'AP')
         run_datetime: ISO format datetime string for the run (e.g., '2026-01-22T14:00:00+00:00')
+        priority: Optional queue priority, lower runs first (interactive runs), default PIPELINE_DEFAULT_PRIORITY
         
     Returns:
         dict with keys: success (bool), message (str), batch_id (int), run_id (int), status_code (int)
@@ -1747,11 +1909,13 @@ def enqueue_pipeline(pipeline, run_datetime):
         
         # Step 5: Insert pipeline_run record with initial values
         try:
+            if priority is None:
+                priority = int(os.getenv("PIPELINE_DEFAULT_PRIORITY", "100"))
             with connect_to_database() as connection:
                 with connection.cursor() as cursor:
                     insert_query = """INSERT INTO pipeline_run 
-                        (batch_id, pipeline, run_date, status, started_at , current_step, status_message) 
-                        VALUES (%s, %s, %s, %s, %s, %s, %s);"""
+                        (batch_id, pipeline, run_date, status, started_at , current_step, status_message, client_id, priority) 
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s);"""
                     started_at = datetime.now(timezone.utc)
                     cursor.execute(insert_query, (
                         batch_id,
@@ -1760,7 +1924,9 @@ def enqueue_pipeline(pipeline, run_datetime):
                         'PENDING',
                         started_at,
                         None,
-                        f"Pipeline enqueued for execution"
+                        f"Pipeline enqueued for execution",
+                        int(os.getenv("CLIENT_ID", 1)),
+                        int(priority)
                     ))
                     connection.commit()
                     run_id = cursor.lastrowid
@@ -0,0 +1,259 @@
+"""
+Bulk loader for large DataFrame uploads.
+
+DataFrame.to_sql appends through batched INSERT statements, which dominates the
+upload of the multi-million row ap_transaction_{audit_id} and quarterly tables.
+upload_dataframe streams the frame in chunks of DB_BULK_LOAD_CHUNK_ROWS rows to a
+temporary tab separated file and loads every chunk with LOAD DATA LOCAL INFILE.
+When the server or client does not allow local infile, the chunks are written
+with multi-row INSERT statements instead. All chunks are loaded in one
+transaction. The load is rolled back when a statement raises warnings (LOAD DATA
+LOCAL turns conversion errors, truncation and duplicate keys into warnings) or
+when the loaded row count differs from the frame.
+
+The bulk path is opt-in (DB_BULK_LOAD=true, LOAD DATA additionally needs
+DB_LOCAL_INFILE=true). Frames below DB_BULK_LOAD_MIN_ROWS rows, or uploads to a
+table that does not exist yet (to_sql creates it), keep using to_sql.
+"""
+
+import os
+import time
+import datetime
+import tempfile
+import numpy as np
+import pandas as pd
+import pymysql
+from code1.logger import capture_log_message
+from databases import connection_pool
+
+BULK_LOAD_ENABLED = os.getenv("DB_BULK_LOAD", "false").lower() == "true"
+BULK_LOAD_MIN_ROWS = int(os.getenv("DB_BULK_LOAD_MIN_ROWS", "10000"))
+BULK_LOAD_CHUNK_ROWS = int(os.getenv("DB_BULK_LOAD_CHUNK_ROWS", "100000"))
+BULK_LOAD_TMP_DIR = os.getenv("DB_BULK_LOAD_TMP_DIR") or None
+
+# MySQL error codes raised when LOAD DATA LOCAL is disabled on the server or the client
+LOCAL_INFILE_DISABLED_ERRORS = (1148, 2068, 3948)
+
+_NULL = '\\N'
+# Upper bound of one multi-row INSERT statement (below the default max_allowed_packet)
+MAX_INSERT_STATEMENT_BYTES = 1024 * 1024
+
+
+class RowCountMismatch(Exception):
+    """Raised when the rows written to the table differ from the rows of the frame"""
+
+
+class BulkLoadWarnings(Exception):
+    """Raised when MySQL reports warnings (conversion, truncation, duplicate keys) for a loaded chunk"""
+
+
+def _quote_identifier(name: str) -> str:
+    return "`" + str(name).replace("`", "``") + "`"
+
+
+def _escape_text(values: pd.Series) -> pd.Series:
+    # Escapes of LOAD DATA with FIELDS ESCAPED BY '\\'
+    return (values.str.replace('\\', '\\\\', regex=False)
+                  .str.replace('\t', '\\t', regex=False)
+                  .str.replace('\n', '\\n', regex=False)
+                  .str.replace('\r', '\\r', regex=False)
+                  .str.replace('\0', '\\0', regex=False))
+
+
+def _format_value(value) -> str:
+    """One value of an object column as the text LOAD DATA expects (same values as to_sql writes)"""
+    if isinstance(value, (bool, np.bool_)):
+        return '1' if value else '0'
+    if isinstance(value, datetime.datetime):
+        return value.replace(tzinfo=None).strftime('%Y-%m-%d %H:%M:%S.%f')
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return str(value)
+
+
+def _format_column(values: pd.Series) -> pd.Series:
+    """Column as the text LOAD DATA expects, missing values as \\N"""
+    missing = values.isna()
+    if pd.api.types.is_bool_dtype(values):
+        text = values.astype('Int8').astype(str)
+    elif pd.api.types.is_datetime64_any_dtype(values):
+        if getattr(values.dt, 'tz', None) is not None:
+            values = values.dt.tz_localize(None)
+        text = values.dt.strftime('%Y-%m-%d %H:%M:%S.%f')
+    elif pd.api.types.is_numeric_dtype(values):
+        text = values.astype(str)
+    elif pd.api.types.infer_dtype(values, skipna=True) in ('string', 'empty'):
+        text = _escape_text(values.astype(str))
+    else:
+        # Mixed object values (bools, dates, numbers, ...) are converted one by one
+        text = _escape_text(values.map(_format_value, na_action='ignore').astype(str))
+    return text.where(~missing, _NULL)
+
+
+def _write_chunk_file(chunk: pd.DataFrame, path: str):
+    lines = None
+    for column in chunk.columns:
+        text = _format_column(chunk[column])
+        lines = text if lines is None else lines.str.cat(text, sep='\t')
+    with open(path, 'w', encoding='utf-8', newline='') as chunk_file:
+        if lines is not None and len(lines):
+            chunk_file.write('\n'.join(lines.tolist()))
+            chunk_file.write('\n')
+
+
+def _raise_on_warnings(cursor, tablename: str):
+    """Raise BulkLoadWarnings when the last statement left warnings"""
+    cursor.execute("SHOW COUNT(*) WARNINGS")
+    warning_count = cursor.fetchone()[0]
+    if not warning_count:
+        return
+    cursor.execute("SHOW WARNINGS LIMIT 5")
+    messages = "; ".join(f"{level} {code}: {message}" for level, code, message in cursor.fetchall())
+    raise BulkLoadWarnings(f"{warning_count} warning(s) while loading {tablename}: {messages}")
+
+
+def _load_data_infile(cursor, path: str, tablename: str, columns: list) -> int:
+    column_list = ",".join(_quote_identifier(column) for column in columns)
+    cursor.execute(
+        f"LOAD DATA LOCAL INFILE %s INTO TABLE {_quote_identifier(tablename)} CHARACTER SET utf8mb4 "
+        f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' ({column_list})",
+        (path,))
+    loaded_rows = cursor.rowcount
+    _raise_on_warnings(cursor, tablename)
+    return loaded_rows
+
+
+def _insert_rows(cursor, chunk: pd.DataFrame, tablename: str) -> int:
+    """Multi-row INSERT statements of at most MAX_INSERT_STATEMENT_BYTES, warnings checked after each"""
+    column_list = ",".join(_quote_identifier(column) for column in chunk.columns)
+    prefix = f"INSERT INTO {_quote_identifier(tablename)} ({column_list}) VALUES "
+    placeholders = "(" + ",".join(["%s"] * len(chunk.columns)) + ")"
+    rows = chunk.astype(object).where(chunk.notna(), None).to_numpy().tolist()
+
+    inserted_rows = 0
+    statement_values, statement_bytes = [], len(prefix)
+    for row in rows + [None]:
+        value = None if row is None else cursor.mogrify(placeholders, row)
+        if statement_values and (value is None or statement_bytes + len(value) + 1 > MAX_INSERT_STATEMENT_BYTES):
+            cursor.execute(prefix + ",".join(statement_values))
+            inserted_rows += cursor.rowcount
+            _raise_on_warnings(cursor, tablename)
+            statement_values, statement_bytes = [], len(prefix)
+        if value is not None:
+            statement_values.append(value)
+            statement_bytes += len(value) + 1
+    return inserted_rows
+
+
+def _table_exists(cursor, tablename: str) -> bool:
+    cursor.execute("SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+                   (tablename,))
+    return cursor.fetchone()[0] > 0
+
+
+def bulk_load_dataframe(data: pd.DataFrame, tablename: str, chunk_rows: int = BULK_LOAD_CHUNK_ROWS,
+                        use_local_infile: bool = connection_pool.LOCAL_INFILE) -> int:
+    """
+    Append data to an existing table in chunks within one transaction.
+
+    Args:
+        data (pd.DataFrame): Rows to append, column names must match the table
+        tablename (str): Target table
+        chunk_rows (int): Rows per temporary file / INSERT batch
+        use_local_infile (bool): False writes with multi-row INSERT statements only
+    Returns:
+        Number of rows loaded
+    Raises:
+        BulkLoadWarnings: a chunk raised MySQL warnings, nothing is committed
+        RowCountMismatch: the rows written differ from len(data), nothing is committed
+    """
+    columns = list(data.columns)
+    loaded_rows = 0
+    connection = connection_pool.get_engine().raw_connection()
+    try:
+        cursor = connection.cursor()
+        with tempfile.TemporaryDirectory(dir=BULK_LOAD_TMP_DIR) as tmp_dir:
+            path = os.path.join(tmp_dir, 'chunk.tsv')
+            for start in range(0, len(data), chunk_rows):
+                chunk = data.iloc[start:start + chunk_rows]
+                if use_local_infile:
+                    _write_chunk_file(chunk, path)
+                    try:
+                        loaded_rows += _load_data_infile(cursor, path, tablename, columns)
+                        continue
+                    except pymysql.err.OperationalError as e:
+                        if e.args[0] not in LOCAL_INFILE_DISABLED_ERRORS:
+                            raise
+                        capture_log_message(f"LOAD DATA LOCAL INFILE not allowed ({e.args[0]}), "
+                                            f"loading {tablename} with INSERT statements")
+                        use_local_infile = False
+                loaded_rows += _insert_rows(cursor, chunk, tablename)
+        if loaded_rows != len(data):
+            raise RowCountMismatch(f"Loaded {loaded_rows} of {len(data)} rows into {tablename}")
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    return loaded_rows
+
+
+def upload_dataframe(data: pd.DataFrame, tablename: str):
+    """
+    Append data to tablename, bulk loading large frames into existing tables
+    and using to_sql (which also creates a missing table) otherwise.
+    """
+    if BULK_LOAD_ENABLED and len(data) >= BULK_LOAD_MIN_ROWS and len(data.columns):
+        connection = connection_pool.get_engine().raw_connection()
+        try:
+            table_exists = _table_exists(connection.cursor(), tablename)
+        finally:
+            connection.close()
+        if table_exists:
+            start_time = time.perf_counter()
+            loaded_rows = bulk_load_dataframe(data, tablename)
+            capture_log_message(f"Bulk loaded {loaded_rows} rows into {tablename} "
+                                f"in {time.perf_counter() - start_time:.2f} seconds")
+            return
+    with connection_pool.get_engine().begin() as connection:
+        data.to_sql(tablename, con=connection, index=False, if_exists='append')
+
+
+def benchmark_bulk_load(data: pd.DataFrame, tablename: str, chunk_rows: int = BULK_LOAD_CHUNK_ROWS) -> dict:
+    """
+    Time to_sql against the bulk loader (LOAD DATA and INSERT fallback) for data.
+
+    Each method loads into its own scratch copy of tablename (CREATE TABLE ... LIKE),
+    which is dropped afterwards, so tablename itself is not modified.
+    Returns:
+        dict of method -> {'seconds', 'rows_per_second'}
+    """
+    engine = connection_pool.get_engine()
+    methods = {
+        'to_sql': lambda scratch: data.to_sql(scratch, con=engine, index=False, if_exists='append',
+                                              chunksize=chunk_rows),
+        'load_data_infile': lambda scratch: bulk_load_dataframe(data, scratch, chunk_rows=chunk_rows,
+                                                                use_local_infile=True),
+        'multi_row_insert': lambda scratch: bulk_load_dataframe(data, scratch, chunk_rows=chunk_rows,
+                                                                use_local_infile=False),
+    }
+    results = {}
+    for method, load in methods.items():
+        scratch = f"{tablename}_bench_{method}"[:64]
+        with engine.begin() as connection:
+            connection.exec_driver_sql(f"DROP TABLE IF EXISTS {_quote_identifier(scratch)}")
+            connection.exec_driver_sql(f"CREATE TABLE {_quote_identifier(scratch)} LIKE {_quote_identifier(tablename)}")
+        try:
+            start_time = time.perf_counter()
+            load(scratch)
+            seconds = time.perf_counter() - start_time
+            results[method] = {'seconds': round(seconds, 3),
+                               'rows_per_second': round(len(data) / seconds) if seconds else np.inf}
+        finally:
+            with engine.begin() as connection:
+                connection.exec_driver_sql(f"DROP TABLE IF EXISTS {_quote_identifier(scratch)}")
+        capture_log_message(f"Upload benchmark {tablename} ({len(data)} rows) {method}: {results[method]}")
+    return results
@@ -0,0 +1,259 @@
+"""
+Process-wide database connection pools.
+
+One pool per driver (mysql.connector, pymysql) and one shared SQLAlchemy engine,
+created lazily on first use with the credentials from local_database and the
+DB_* environment variables:
+
+- get_connection()            : pooled mysql.connector connection
+- get_pymysql_connection()    : pooled pymysql connection (DictCursor by default)
+- get_engine()                : shared SQLAlchemy engine (mysql+pymysql)
+
+Connections are pinged on checkout, the number of open connections is bounded by
+DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW and a checkout waits at most DB_POOL_TIMEOUT
+seconds. Closing a pooled connection, or leaving its ``with`` block, returns it to
+the pool. Pools are re-created in a forked child (multiprocessing) without closing
+the parent's sockets. get_pool_metrics() reports checkouts and pool wait times.
+"""
+
+import os
+import time
+import threading
+import mysql.connector
+import pymysql
+import pymysql.cursors
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.pool import QueuePool, NullPool
+
+POOLING_ENABLED = os.getenv("DB_CONNECTION_POOLING", "true").lower() == "true"
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+# Allow LOAD DATA LOCAL INFILE on engine connections (used by databases.bulk_loader)
+LOCAL_INFILE = os.getenv("DB_LOCAL_INFILE", "false").lower() == "true"
+
+
+def _db_settings() -> dict:
+    from local_database import get_database_credentials
+    credentials = get_database_credentials()
+    use_ssl_ca = os.getenv("USE_SSL_CA", "false").lower() == "true"
+    return {
+        'user': credentials["username"],
+        'password': credentials["password"],
+        'host': os.getenv("DB_HOST"),
+        'port': os.getenv("DB_PORT"),
+        'database': os.getenv("DB_NAME"),
+        'ssl_ca': os.getenv("SSL_CA") if use_ssl_ca else None,
+    }
+
+
+class PoolMetrics:
+    """Checkout counters and pool wait times of one pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.connections_created = 0
+        self.failed_pings = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record_checkout(self, wait_seconds: float):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+    def increment(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'connections_created': self.connections_created,
+                'failed_pings': self.failed_pings,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': round(1000 * self.total_wait_seconds / self.checkouts, 3) if self.checkouts else 0.0,
+                'max_wait_ms': round(1000 * self.max_wait_seconds, 3),
+            }
+
+
+class _TimedPoolMixin:
+    """Records checkouts and pool wait times of the shared engine in _engine_metrics"""
+
+    def connect(self):
+        start_time = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            _engine_metrics.increment('timeouts')
+            raise
+        _engine_metrics.record_checkout(time.perf_counter() - start_time)
+        return connection
+
+
+class _TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+class _TimedNullPool(_TimedPoolMixin, NullPool):
+    pass
+
+
+class PooledConnection:
+    """
+    DB-API connection checked out of a pool. Behaves like the driver connection;
+    close() and leaving a ``with`` block return it to the pool instead of closing it.
+    """
+
+    def __init__(self, pooled):
+        self._pooled = pooled
+
+    def __getattr__(self, name):
+        return getattr(self._pooled, name)
+
+    def close(self):
+        if self._pooled is not None:
+            self._pooled.close()
+            self._pooled = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class DriverPool:
+    """Bounded, pre-pinging pool of raw driver connections"""
+
+    def __init__(self, name: str, creator):
+        self.name = name
+        self.metrics = PoolMetrics()
+
+        def counting_creator():
+            self.metrics.increment('connections_created')
+            return creator()
+
+        self._pool = QueuePool(counting_creator, pool_size=POOL_SIZE, max_overflow=POOL_MAX_OVERFLOW,
+                               timeout=POOL_TIMEOUT, recycle=POOL_RECYCLE)
+
+    def connect(self) -> PooledConnection:
+        start_time = time.perf_counter()
+        try:
+            pooled = self._pool.connect()
+        except Exception:
+            self.metrics.increment('timeouts')
+            raise
+        self.metrics.record_checkout(time.perf_counter() - start_time)
+        try:
+            # Pre-ping, reconnects a connection the server dropped while it sat in the pool
+            pooled.dbapi_connection.ping(reconnect=True)
+        except Exception:
+            self.metrics.increment('failed_pings')
+            pooled.invalidate()
+            pooled = self._pool.connect()
+        return PooledConnection(pooled)
+
+    def status(self) -> str:
+        return self._pool.status()
+
+
+_lock = threading.Lock()
+_pid = None
+_pools = {}
+_engine = None
+_engine_metrics = PoolMetrics()
+# Pools inherited from the parent process, kept referenced so their sockets are never closed from a child
+_orphaned = []
+
+
+def _reset_after_fork():
+    """Drop pools created in the parent process (called on first use in a new process)"""
+    global _pid, _pools, _engine, _engine_metrics
+    if _pid == os.getpid():
+        return
+    if _pools:
+        _orphaned.extend(_pools.values())
+    if _engine is not None:
+        # close=False leaves the parent's connections alone and gives this process a fresh pool
+        _engine.dispose(close=False)
+    _pools = {}
+    _engine_metrics = PoolMetrics()
+    _pid = os.getpid()
+
+
+def _get_pool(name: str, creator) -> DriverPool:
+    with _lock:
+        _reset_after_fork()
+        if name not in _pools:
+            _pools[name] = DriverPool(name, creator)
+        return _pools[name]
+
+
+def _mysql_connector_creator():
+    settings = _db_settings()
+    ssl_args = {'ssl_ca': settings['ssl_ca']} if settings['ssl_ca'] else {}
+    return mysql.connector.connect(user=settings['user'], password=settings['password'], host=settings['host'],
+                                   port=settings['port'], database=settings['database'], **ssl_args)
+
+
+def _pymysql_creator():
+    settings = _db_settings()
+    ssl_args = {'ssl_ca': settings['ssl_ca']} if settings['ssl_ca'] else {}
+    return pymysql.connect(host=settings['host'], user=settings['user'], password=settings['password'],
+                           db=settings['database'], port=int(settings['port'] or 3306), **ssl_args)
+
+
+def get_connection():
+    """mysql.connector connection, pooled unless DB_CONNECTION_POOLING=false"""
+    if not POOLING_ENABLED:
+        return _mysql_connector_creator()
+    return _get_pool('mysql.connector', _mysql_connector_creator).connect()
+
+
+def get_pymysql_connection(cursorclass=pymysql.cursors.DictCursor):
+    """pymysql connection, pooled unless DB_CONNECTION_POOLING=false"""
+    if not POOLING_ENABLED:
+        connection = _pymysql_creator()
+        connection.cursorclass = cursorclass
+        return connection
+    connection = _get_pool('pymysql', _pymysql_creator).connect()
+    # cursor() of a pymysql connection uses its cursorclass, set on the pooled driver connection
+    connection.dbapi_connection.cursorclass = cursorclass
+    return connection
+
+
+def get_engine():
+    """Shared SQLAlchemy engine (mysql+pymysql) with pre-ping and bounded pool"""
+    global _engine
+    with _lock:
+        _reset_after_fork()
+        if _engine is None:
+            settings = _db_settings()
+            connect_args = {'ssl': {'ca': settings['ssl_ca']}} if settings['ssl_ca'] else {'ssl': None}
+            if LOCAL_INFILE:
+                connect_args['local_infile'] = True
+            url = "mysql+pymysql://{user}:{password}@{host}:{port}/{database}".format(**settings)
+            if POOLING_ENABLED:
+                _engine = create_engine(url, connect_args=connect_args, poolclass=_TimedQueuePool,
+                                        pool_pre_ping=True, pool_size=POOL_SIZE, max_overflow=POOL_MAX_OVERFLOW,
+                                        pool_timeout=POOL_TIMEOUT, pool_recycle=POOL_RECYCLE)
+            else:
+                _engine = create_engine(url, connect_args=connect_args, poolclass=_TimedNullPool)
+            event.listen(_engine, 'connect', lambda *args: _engine_metrics.increment('connections_created'))
+        return _engine
+
+
+def get_pool_metrics() -> dict:
+    """Checkout and wait time metrics of every pool in this process"""
+    if _pid != os.getpid():
+        return {}
+    metrics = {name: dict(pool.metrics.as_dict(), status=pool.status()) for name, pool in _pools.items()}
+    if _engine is not None:
+        metrics['sqlalchemy'] = dict(_engine_metrics.as_dict(), status=_engine.pool.status())
+    return metrics
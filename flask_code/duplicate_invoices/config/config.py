@@ -16,6 +16,17 @@ except (ImportError, RuntimeError) as e:
 
 POSTED_DATE_THRESHOLD = 365
 
+# Pairwise comparison engine (model/pairwise_engine.py)
+# Groups larger than PAIRWISE_MAX_BLOCK_SIZE are split into row tiles (all pairs are still scored);
+# every block is scored in chunks of PAIRWISE_PAIR_CHUNK_SIZE pairs.
+# PAIRWISE_SUB_BLOCKING splits large groups by invoice-date window and invoice-number prefix
+# instead. It is lossy (pairs across windows / prefixes are never compared), so it is off by default
+PAIRWISE_SUB_BLOCKING = os.environ.get('PAIRWISE_SUB_BLOCKING', 'false').lower() == 'true'
+PAIRWISE_MAX_BLOCK_SIZE = 500
+PAIRWISE_PAIR_CHUNK_SIZE = 250000
+PAIRWISE_DATE_WINDOW_DAYS = 365
+PAIRWISE_MAX_PREFIX_LENGTH = 2
+
 # Calculate PACKAGE_ROOT from this file's location (avoids circular import)
 # config.py is at duplicate_invoices/config/config.py, so parent.parent is duplicate_invoices/
 PACKAGE_ROOT = pathlib.Path(__file__).resolve().parent.parent
@@ -45,11 +45,20 @@ PERFORMANCE_THRESHOLDS = {
     # Maximum dataset size for synchronous processing
     'max_sync_records': 50000,
     
+    # Minimum number of pairs to use the batched similarity kernel (below this, per-pair calls are faster)
+    'min_pairs_for_batch': 64,
+    
     # Records per second targets
     'target_throughput_gpu': 100000,    # Records/second on GPU
     'target_throughput_cpu': 5000,      # Records/second on CPU
 }
 
+# CPU batched similarity kernel (gpu/cpu_backend.py)
+CPU_BATCH_CONFIG = {
+    'batch_size': 200000,               # Number of pairs per rapidfuzz cpdist call
+    'workers': int(os.environ.get('DUPLICATE_INVOICE_CPU_WORKERS', -1)),  # Worker threads, -1 uses all cores
+}
+
 # A100 80GB Specific Settings
 A100_CONFIG = {
     'batch_size': 20000,                # Larger batches for A100
@@ -2,31 +2,80 @@
 GPU Acceleration Module for Duplicate Invoice Detection
 ========================================================
 
-This module provides TensorFlow-based GPU acceleration for 
-the duplicate invoice detection pipeline.
+This module provides TensorFlow-based GPU acceleration and a CPU batched
+similarity backend for the duplicate invoice detection pipeline.
 
 Usage:
-    from duplicate_invoices.gpu import TFDuplicateAccelerator, is_gpu_available
-    
-    if is_gpu_available():
-        accelerator = TFDuplicateAccelerator()
-        # Use accelerator for batch processing
+    from duplicate_invoices.gpu import get_similarity_accelerator
+
+    accelerator = get_similarity_accelerator(n_pairs)
+    if accelerator is not None:
+        is_duplicate, scores = accelerator.compute_similarity_batch_gpu(sources, targets)
 """
 
-from .tf_backend import (
-    TFDuplicateAccelerator,
-    TFGroupProcessor,
-    get_accelerator,
-    is_gpu_available,
-    get_device_info,
-    configure_tensorflow_gpu,
-    HAS_GPU
+from duplicate_invoices.config.gpu_config import USE_GPU, PERFORMANCE_THRESHOLDS
+from .cpu_backend import (
+    CPUDuplicateAccelerator,
+    batch_levenshtein_distance,
+    batch_levenshtein_ratio,
+    batch_invoice_similarity,
+    get_cpu_accelerator
 )
 
+# TensorFlow is optional, the CPU backend works without it
+try:
+    from .tf_backend import (
+        TFDuplicateAccelerator,
+        TFGroupProcessor,
+        get_accelerator,
+        is_gpu_available,
+        get_device_info,
+        configure_tensorflow_gpu,
+        HAS_GPU
+    )
+except ImportError:
+    TFDuplicateAccelerator = None
+    TFGroupProcessor = None
+    get_accelerator = None
+    configure_tensorflow_gpu = None
+    HAS_GPU = False
+
+    def is_gpu_available() -> bool:
+        return False
+
+    def get_device_info() -> dict:
+        return {'gpu_available': False, 'tensorflow_version': 'N/A'}
+
+
+def get_similarity_accelerator(n_pairs: int, use_gpu: bool = USE_GPU):
+    """
+    Select the similarity backend for a batch of pairs using PERFORMANCE_THRESHOLDS.
+
+    Args:
+        n_pairs: Number of pairs to be scored
+        use_gpu: Allow the TensorFlow backend
+
+    Returns:
+        TFDuplicateAccelerator, CPUDuplicateAccelerator, or None when the batch is too
+        small to benefit from batching (score per pair instead)
+    """
+    if n_pairs < PERFORMANCE_THRESHOLDS['min_pairs_for_batch']:
+        return None
+    if use_gpu and HAS_GPU and n_pairs >= PERFORMANCE_THRESHOLDS['min_records_for_gpu']:
+        return get_accelerator()
+    return get_cpu_accelerator()
+
+
 __all__ = [
     'TFDuplicateAccelerator',
     'TFGroupProcessor',
+    'CPUDuplicateAccelerator',
     'get_accelerator',
+    'get_cpu_accelerator',
+    'get_similarity_accelerator',
+    'batch_levenshtein_distance',
+    'batch_levenshtein_ratio',
+    'batch_invoice_similarity',
     'is_gpu_available',
     'get_device_info',
     'configure_tensorflow_gpu',
@@ -0,0 +1,310 @@
+"""
+CPU Batched Similarity Backend for Duplicate Invoice Detection
+================================================================
+Batched Levenshtein kernel that scores whole arrays of string pairs in one
+call with rapidfuzz ``process.cpdist`` (multi-threaded, releases the GIL).
+
+Key Features:
+- No TensorFlow dependency, runs on CPU-only machines
+- Scores identical to ``duplicate_extract_helper.is_invoice_similar``
+- Same interface as ``TFDuplicateAccelerator``
+
+Usage:
+    from duplicate_invoices.gpu.cpu_backend import CPUDuplicateAccelerator
+
+    accelerator = CPUDuplicateAccelerator()
+    is_duplicate, scores = accelerator.compute_similarity_batch_gpu(sources, targets)
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Callable, Optional, Sequence, Tuple
+import logging
+
+from rapidfuzz import process
+from rapidfuzz.distance import Levenshtein
+
+from duplicate_invoices.config.gpu_config import CPU_BATCH_CONFIG
+from duplicate_invoices.model import duplicate_extract_helper as dupl_helper
+
+logger = logging.getLogger(__name__)
+
+
+def _to_object_array(values: Sequence) -> np.ndarray:
+    """Convert any sequence (list, padded '<U' array, Series) to an object array of str"""
+    return np.array([str(v) for v in values], dtype=object)
+
+
+def _lengths(values: np.ndarray) -> np.ndarray:
+    return np.fromiter(map(len, values), dtype=np.int64, count=len(values))
+
+
+def batch_levenshtein_distance(
+    source_strings: Sequence,
+    target_strings: Sequence,
+    workers: int = CPU_BATCH_CONFIG['workers']
+) -> np.ndarray:
+    """
+    Levenshtein distance for every (source[k], target[k]) pair in one call.
+
+    Args:
+        source_strings: Array of source strings
+        target_strings: Array of target strings (same length)
+        workers: rapidfuzz worker threads (-1 uses all cores)
+
+    Returns:
+        1D int array of edit distances
+    """
+    if len(source_strings) == 0:
+        return np.array([], dtype=np.int64)
+    return process.cpdist(
+        list(source_strings),
+        list(target_strings),
+        scorer=Levenshtein.distance,
+        dtype=np.int64,
+        workers=workers
+    )
+
+
+def batch_levenshtein_ratio(
+    source_strings: Sequence,
+    target_strings: Sequence,
+    workers: int = CPU_BATCH_CONFIG['workers']
+) -> np.ndarray:
+    """
+    Levenshtein similarity ratio (0-100) for every pair, as computed by
+    ``get_similarity_score``: (max_len - distance) * 100 / max_len.
+
+    Pairs with an empty string score 0.
+
+    Args:
+        source_strings: Array of source strings
+        target_strings: Array of target strings (same length)
+        workers: rapidfuzz worker threads (-1 uses all cores)
+
+    Returns:
+        1D float array of similarity scores
+    """
+    source = _to_object_array(source_strings)
+    target = _to_object_array(target_strings)
+    distance = batch_levenshtein_distance(source, target, workers=workers)
+    return _ratio_from_distance(distance, _lengths(source), _lengths(target))
+
+
+def _ratio_from_distance(distance: np.ndarray, len1: np.ndarray, len2: np.ndarray) -> np.ndarray:
+    max_len = np.maximum(len1, len2)
+    scores = np.zeros(len(distance), dtype=np.float64)
+    valid = (len1 > 0) & (len2 > 0)
+    # Same operation order as get_similarity_score so float results are identical
+    scores[valid] = (max_len[valid] - distance[valid]) * 100 / max_len[valid]
+    return scores
+
+
+def _contains_either(source: np.ndarray, target: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """Substring test (either direction) evaluated only where mask is True"""
+    result = np.zeros(len(source), dtype=bool)
+    idx = np.flatnonzero(mask)
+    result[idx] = [(s in t) or (t in s) for s, t in zip(source[idx], target[idx])]
+    return result
+
+
+def batch_invoice_similarity(
+    source_values: Sequence,
+    target_values: Sequence,
+    workers: int = CPU_BATCH_CONFIG['workers']
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Batched equivalent of ``is_invoice_similar`` for arrays of pairs.
+
+    The Levenshtein distances of all pairs are computed in a single
+    ``cpdist`` call, the short/long and numeric/alphanumeric rules are
+    applied as boolean masks.
+
+    Args:
+        source_values: Array of source invoice numbers
+        target_values: Array of target invoice numbers (same length)
+        workers: rapidfuzz worker threads (-1 uses all cores)
+
+    Returns:
+        Tuple of (is_duplicate array, scores array)
+    """
+    source = _to_object_array(source_values)
+    target = _to_object_array(target_values)
+    n_pairs = len(source)
+
+    is_duplicate = np.zeros(n_pairs, dtype=bool)
+    scores = np.zeros(n_pairs, dtype=np.float64)
+    if n_pairs == 0:
+        return is_duplicate, scores
+
+    # Convert numbers to normalized string format
+    is_num1 = np.fromiter((s.isdigit() for s in source), dtype=bool, count=n_pairs)
+    is_num2 = np.fromiter((s.isdigit() for s in target), dtype=bool, count=n_pairs)
+    source[is_num1] = [str(int(s)) for s in source[is_num1]]
+    target[is_num2] = [str(int(s)) for s in target[is_num2]]
+
+    len1, len2 = _lengths(source), _lengths(target)
+    min_len, max_len = np.minimum(len1, len2), np.maximum(len1, len2)
+    both_num = is_num1 & is_num2
+
+    # Early returns for edge cases and exact matching inputs
+    empty = (len1 == 0) | (len2 == 0)
+    exact = ~empty & (source == target)
+    is_duplicate[exact] = True
+    scores[exact] = 100.0
+    unresolved = ~empty & ~exact
+
+    short1 = len1 <= dupl_helper.SHORT_LENGTH_THRESHOLD
+    short2 = len2 <= dupl_helper.SHORT_LENGTH_THRESHOLD
+    both_short = unresolved & short1 & short2
+    one_short = unresolved & (short1 | short2) & ~both_short
+    # If longer input is more than double the shorter, not similar
+    one_short &= ~(max_len >= min_len * 2)
+    long_inputs = unresolved & ~short1 & ~short2
+
+    # Both numbers: short -> never similar, otherwise only a single inner edit counts
+    numeric_edit = (one_short | long_inputs) & both_num
+    distance = batch_levenshtein_distance(source, target, workers=workers)
+    single_edit = np.zeros(n_pairs, dtype=bool)
+    for idx in np.flatnonzero(numeric_edit & (distance == 1)):
+        single_edit[idx] = dupl_helper.check_for_single_number_edit(source[idx], target[idx], len1[idx], len2[idx])
+    is_duplicate[single_edit] = True
+    scores[single_edit] = 95.0
+
+    # Alphanumeric (or mixed) inputs: special IN condition, shared substring, then Levenshtein score
+    in_candidates = (both_short & (is_num1 ^ is_num2)) | ((one_short | long_inputs) & ~both_num)
+    contains = _contains_either(source, target, in_candidates)
+    special_in = in_candidates & contains & (min_len * 2 >= max_len)
+    is_duplicate[special_in] = True
+    scores[special_in] = 90.0
+
+    shared_substring = (one_short | long_inputs) & ~both_num & ~special_in & contains & (np.abs(len1 - len2) < 3)
+    is_duplicate[shared_substring] = True
+    scores[shared_substring] = 95.0
+
+    levenshtein = ((both_short & ~both_num) | ((one_short | long_inputs) & ~both_num)) & ~special_in & ~shared_substring
+    ratio = _ratio_from_distance(distance, len1, len2)
+    scores[levenshtein] = ratio[levenshtein]
+    is_duplicate[levenshtein] = ratio[levenshtein] >= dupl_helper.SCORE_THRESOLD
+
+    return is_duplicate, scores
+
+
+class CPUDuplicateAccelerator:
+    """
+    CPU batched duplicate detection.
+    Drop-in replacement for TFDuplicateAccelerator on machines without a GPU.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = CPU_BATCH_CONFIG['batch_size'],
+        score_threshold: float = 60.0,
+        workers: int = CPU_BATCH_CONFIG['workers']
+    ):
+        """
+        Initialize the CPU accelerator.
+
+        Args:
+            batch_size: Number of pairs to process per batch
+            score_threshold: Minimum similarity score threshold
+            workers: rapidfuzz worker threads (-1 uses all cores)
+        """
+        self.batch_size = batch_size
+        self.score_threshold = score_threshold
+        self.workers = workers
+        self.has_gpu = False
+
+        logger.info(f"CPUDuplicateAccelerator initialized (workers: {self.workers})")
+
+    def _batch_levenshtein_ratio(self, source_strings: Sequence, target_strings: Sequence) -> np.ndarray:
+        """Levenshtein similarity ratio (0-100) for batches of string pairs."""
+        return batch_levenshtein_ratio(source_strings, target_strings, workers=self.workers)
+
+    def compute_similarity_batch_gpu(
+        self,
+        source_values: Sequence,
+        target_values: Sequence,
+        similarity_fn: Optional[Callable] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Compute similarity for batches of pairs.
+        ``is_invoice_similar`` (the default) is evaluated with the batched kernel,
+        any other similarity function is applied per pair.
+
+        Args:
+            source_values: List of source strings
+            target_values: List of target strings
+            similarity_fn: Custom similarity function (uses is_invoice_similar if None)
+
+        Returns:
+            Tuple of (is_duplicate array, scores array)
+        """
+        n_pairs = len(source_values)
+        is_duplicate = np.zeros(n_pairs, dtype=bool)
+        scores = np.zeros(n_pairs, dtype=np.float64)
+
+        if n_pairs == 0:
+            return is_duplicate, scores
+
+        if similarity_fn is not None and similarity_fn is not dupl_helper.is_invoice_similar:
+            for idx in range(n_pairs):
+                is_duplicate[idx], scores[idx] = similarity_fn(source_values[idx], target_values[idx])
+            return is_duplicate, scores
+
+        for start in range(0, n_pairs, self.batch_size):
+            stop = min(start + self.batch_size, n_pairs)
+            is_duplicate[start:stop], scores[start:stop] = batch_invoice_similarity(
+                source_values[start:stop],
+                target_values[start:stop],
+                workers=self.workers
+            )
+
+        return is_duplicate, scores
+
+    def process_pairs_dataframe(
+        self,
+        pairs_df: pd.DataFrame,
+        source_col: str,
+        target_col: str,
+        similarity_fn: Optional[Callable] = None
+    ) -> pd.DataFrame:
+        """
+        Process a DataFrame of pairs with the batched kernel.
+
+        Args:
+            pairs_df: DataFrame with pair information
+            source_col: Column name for source values
+            target_col: Column name for target values
+            similarity_fn: Function to compute similarity
+
+        Returns:
+            DataFrame with is_duplicate and score columns added
+        """
+        if pairs_df.empty:
+            pairs_df['is_duplicate'] = []
+            pairs_df['score'] = []
+            return pairs_df
+
+        is_duplicate, scores = self.compute_similarity_batch_gpu(
+            pairs_df[source_col].tolist(),
+            pairs_df[target_col].tolist(),
+            similarity_fn
+        )
+
+        pairs_df['is_duplicate'] = is_duplicate
+        pairs_df['score'] = scores
+
+        return pairs_df
+
+
+# Singleton accelerator instance
+_cpu_accelerator: Optional[CPUDuplicateAccelerator] = None
+
+
+def get_cpu_accelerator(**kwargs) -> CPUDuplicateAccelerator:
+    """Get or create singleton CPU accelerator instance."""
+    global _cpu_accelerator
+    if _cpu_accelerator is None:
+        _cpu_accelerator = CPUDuplicateAccelerator(**kwargs)
+    return _cpu_accelerator
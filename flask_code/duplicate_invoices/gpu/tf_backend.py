@@ -8,7 +8,7 @@ Key Features:
 - Automatic GPU detection and memory management
 - XLA compilation for optimized execution
 - Batch processing for large datasets
-- 100% accuracy with exact similarity computation
+- 100% accuracy with exact similarity computation (batched rapidfuzz kernel)
 - Fallback to CPU when GPU unavailable
 
 Usage:
@@ -30,9 +30,20 @@ os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'  # Reduce TF logging noise
 
 import tensorflow as tf
 
+from duplicate_invoices.config.gpu_config import CPU_BATCH_CONFIG
+from duplicate_invoices.gpu.cpu_backend import batch_levenshtein_ratio, batch_invoice_similarity
+from duplicate_invoices.model import duplicate_extract_helper as dupl_helper
+
 logger = logging.getLogger(__name__)
 
 
+def _as_str_array(values) -> List[str]:
+    """Convert a string tensor, bytes array or sequence to a list of str"""
+    if isinstance(values, tf.Tensor):
+        values = values.numpy()
+    return [v.decode('utf-8') if isinstance(v, bytes) else str(v) for v in values]
+
+
 def configure_tensorflow_gpu() -> bool:
     """
     Configure TensorFlow for optimal GPU usage.
@@ -134,64 +145,29 @@ class TFDuplicateAccelerator:
         """
         return tf.strings.strip(tf.strings.upper(strings))
     
-    @tf.function
     def _batch_levenshtein_ratio(
         self,
         source_strings: tf.Tensor,
         target_strings: tf.Tensor
-    ) -> tf.Tensor:
+    ) -> np.ndarray:
         """
         Compute Levenshtein similarity ratio for batches of string pairs.
-        Uses TensorFlow string operations on GPU.
         
-        Note: TensorFlow doesn't have native Levenshtein, so we compute
-        a character-level similarity approximation that's GPU-friendly.
-        For exact Levenshtein, use the CPU fallback.
+        TensorFlow doesn't have a native Levenshtein op, so the distances are
+        computed by the batched rapidfuzz kernel of the CPU backend in one call.
         
         Args:
-            source_strings: 1D tensor of source strings
-            target_strings: 1D tensor of target strings
+            source_strings: 1D tensor (or array) of source strings
+            target_strings: 1D tensor (or array) of target strings
             
         Returns:
-            1D tensor of similarity scores (0-100)
+            1D array of similarity scores (0-100)
         """
-        # Get string lengths
-        source_lens = tf.strings.length(source_strings)
-        target_lens = tf.strings.length(target_strings)
-        
-        # Maximum length for normalization
-        max_lens = tf.maximum(source_lens, target_lens)
-        max_lens = tf.cast(max_lens, tf.float32)
-        
-        # Check for exact matches
-        exact_match = tf.cast(tf.equal(source_strings, target_strings), tf.float32)
-        
-        # For non-exact matches, compute character overlap ratio
-        # This is a GPU-friendly approximation
-        source_chars = tf.strings.bytes_split(source_strings)
-        target_chars = tf.strings.bytes_split(target_strings)
-        
-        # Use set intersection for character-level similarity
-        # This is faster on GPU than true Levenshtein
-        def compute_char_similarity(args):
-            src, tgt, max_len = args
-            src_set = tf.sets.intersection(
-                tf.expand_dims(src, 0),
-                tf.expand_dims(tgt, 0)
-            )
-            common_chars = tf.cast(tf.sets.size(src_set), tf.float32)
-            # Jaccard-like similarity
-            total_chars = max_len + 1e-7
-            return tf.minimum(common_chars / total_chars * 100.0, 100.0)
-        
-        # Fallback: use exact match score or character overlap
-        scores = tf.where(
-            exact_match > 0.5,
-            tf.ones_like(max_lens) * 100.0,
-            tf.ones_like(max_lens) * 0.0  # Will be computed by CPU for non-matches
+        return batch_levenshtein_ratio(
+            _as_str_array(source_strings),
+            _as_str_array(target_strings),
+            workers=CPU_BATCH_CONFIG['workers']
         )
-        
-        return scores
     
     def compute_similarity_batch_gpu(
         self,
@@ -201,12 +177,14 @@ class TFDuplicateAccelerator:
     ) -> Tuple[np.ndarray, np.ndarray]:
         """
         Compute similarity for batches of pairs using GPU.
-        Falls back to CPU for exact Levenshtein when needed.
+        Exact matches are resolved on the GPU, the remaining pairs are scored
+        with the batched CPU kernel (is_invoice_similar) or per pair for a
+        custom similarity function.
         
         Args:
             source_values: List of source strings
             target_values: List of target strings
-            similarity_fn: Custom similarity function (uses default if None)
+            similarity_fn: Custom similarity function (uses is_invoice_similar if None)
             
         Returns:
             Tuple of (is_duplicate array, scores array)
@@ -221,8 +199,8 @@ class TFDuplicateAccelerator:
             source_tf = tf.constant(source_values, dtype=tf.string)
             target_tf = tf.constant(target_values, dtype=tf.string)
             
-            # Check for exact matches (GPU accelerated)
-            exact_matches = tf.equal(source_tf, target_tf)
+            # Check for exact matches (GPU accelerated), is_invoice_similar never matches empty values
+            exact_matches = tf.equal(source_tf, target_tf) & (tf.strings.length(source_tf) > 0)
             exact_matches_np = exact_matches.numpy()
         
         # Initialize results
@@ -236,7 +214,17 @@ class TFDuplicateAccelerator:
         # For non-exact matches, use provided similarity function or default
         non_exact_indices = np.where(~exact_matches_np)[0]
         
-        if len(non_exact_indices) > 0 and similarity_fn is not None:
+        if len(non_exact_indices) == 0:
+            return is_duplicate, scores
+        
+        if similarity_fn is None or similarity_fn is dupl_helper.is_invoice_similar:
+            # Batched kernel for the default similarity function
+            is_duplicate[non_exact_indices], scores[non_exact_indices] = batch_invoice_similarity(
+                [source_values[idx] for idx in non_exact_indices],
+                [target_values[idx] for idx in non_exact_indices],
+                workers=CPU_BATCH_CONFIG['workers']
+            )
+        else:
             # Process non-exact matches with provided function
             for idx in non_exact_indices:
                 is_dup, score = similarity_fn(source_values[idx], target_values[idx])
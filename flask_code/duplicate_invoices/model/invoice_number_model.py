@@ -1,4 +1,5 @@
-from invoice_number_similarity.predict import make_prediction
+from invoice_number_similarity.predict import make_prediction, make_predictions
+import numpy as np
 from duplicate_invoices.config import config
 from tqdm import tqdm
 from pandarallel import pandarallel
@@ -23,6 +24,21 @@ def is_similar(source, dest, exact_matching=config.EXACT_MATCHING, model=config.
     return duplicate_risk_score, similarity_score
 
 
+def are_similar(sources, dests, exact_matching=config.EXACT_MATCHING, model=config.INVOICE_NUMBER_SIMILARITY_MODEL):
+    """Batched is_similar over arrays of pairs, scored in both directions"""
+    sources = np.asarray(sources, dtype=object)
+    dests = np.asarray(dests, dtype=object)
+    if exact_matching:
+        is_equal = (sources == dests)
+        return is_equal, is_equal.astype(int)
+
+    forward = make_predictions(sources=sources, dests=dests, model=model)
+    reverse = make_predictions(sources=dests, dests=sources, model=model)
+    risk_scores = np.maximum(forward['predictions'][:, 1], reverse['predictions'][:, 1])
+    similarity_scores = np.maximum(forward['similarity_score'], reverse['similarity_score'])
+    return risk_scores, similarity_scores
+
+
 def get_similar_invoices(invoices, keys,flag, threshold=0.5, \
     exact_matching=config.EXACT_MATCHING, model=config.INVOICE_NUMBER_SIMILARITY_MODEL):
     # TODO: Clustering approach for grouping, maybe one invoice in two groups
@@ -34,17 +50,19 @@ def get_similar_invoices(invoices, keys,flag, threshold=0.5, \
         current_similars = set()
         current_similars_scores = []
         current_similars_risk_scores = []
-        for j, (dest, dest_key,dest_flag) in enumerate(zip(invoices[i+1:], keys[i+1:],flag[i+1:])):
+        # Score every candidate of this source in one batch, then apply the matches in order
+        candidates = [j for j in range(i+1, len(invoices))
+                      if keys[j] not in found and (source_flag or flag[j])]
+        if not candidates:
+            continue
+        risk_scores, similarity_scores = are_similar([source]*len(candidates), [invoices[j] for j in candidates],
+                                                     exact_matching=exact_matching, model=model)
+        for j, current_risk_score, similarity_score in zip(candidates, risk_scores, similarity_scores):
+            dest_key = keys[j]
             # Commented because two invoice numbers (same)
             # Solved using key instead of invoice number
             if dest_key in found:
                 continue
-            if not (source_flag or dest_flag):
-                continue
-            current_risk_score, similarity_score = is_similar(source, dest, exact_matching=exact_matching, model=model)
-            current_risk_score_rev, similarity_score_rev = is_similar(dest, source, exact_matching=exact_matching, model=model)
-            current_risk_score = max(current_risk_score, current_risk_score_rev)
-            similarity_score = max(similarity_score, similarity_score_rev)
             if current_risk_score > threshold:
                 current_similars.add(source_key)
                 current_similars.add(dest_key)
@@ -1,12 +1,10 @@
-from itertools import combinations
-from functools import partial
-from joblib import Parallel, delayed
 from tqdm import tqdm
 import pandas as pd
 import os
 from duplicate_invoices.model import duplicate_extract_helper as dupl_helper
+from duplicate_invoices.model.pairwise_engine import PairwiseComparisonEngine, build_group_arrays
 from pandarallel import pandarallel
-from duplicate_invoices.config.config import POSTED_DATE_THRESHOLD
+from duplicate_invoices.config.config import POSTED_DATE_THRESHOLD, PAIRWISE_MAX_BLOCK_SIZE
 
 # GPU Configuration - Import with fallback
 try:
@@ -54,6 +52,10 @@ class OptimizedDuplicateDetector:
                 capture_log_message(f"GPU initialization failed, falling back to CPU: {e}")
                 self.use_gpu = False
         
+        # Similarity backend per batch of pairs is picked from PERFORMANCE_THRESHOLDS (gpu_config.py)
+        self.pairwise_engine = PairwiseComparisonEngine(posted_date_threshold=POSTED_DATE_THRESHOLD,
+                                                        use_gpu=self.use_gpu)
+        
         
     def _create_comparison_value(self, row, columns):
         """Create comparison value for similarity checking"""
@@ -76,213 +78,67 @@ class OptimizedDuplicateDetector:
         return dupl_helper.is_invoice_similar(source_value, dest_value)
     
     
-    def _check_row(self, row):
+    def _score_group(self, group_indices, similarity_columns, process_parallely=False):
         """
-        Check a single row for duplicates
+        Score all pairs of a group with the pairwise comparison engine.
+        Pairs are generated as index arrays over the group's column arrays, groups larger than
+        PAIRWISE_MAX_BLOCK_SIZE are split into row tiles that together cover every pair.
         
         Args:
-            row: Series containing pair information
+            group_indices: List of DataFrame indices for the group
+            similarity_columns: Columns to use for similarity comparison, empty for the special case
+            process_parallely: If True, score the blocks of the group in parallel and only count
+                non-duplicates (used for large groups to keep memory bounded)
             
         Returns:
-            tuple: (pair_key, is_duplicate, score)
+            tuple: (local_duplicates_dict, local_non_duplicates_set, non_duplicate_count)
         """
-        pair_key = row['pair_key']
-        source_value = row['source_value']
-        dest_value = row['dest_value']
-        is_current_data_i = row['is_current_data_i']
-        is_current_data_j = row['is_current_data_j']
-        pk_i = row['pk_i']
-        pk_j = row['pk_j']
-        
-        
-        # Skip if already processed
-        
-        # Update: Calculate pairs even it was computed previously, duplicate pairs can be dropped at final step
-
-        # if pair_key in self.duplicate_pairs or pair_key in self.processed_non_duplicates:
-        #     return None
-        
-        # Check current data constraint
-        if not (is_current_data_i or is_current_data_j):
-            return None
-        
-        # Check similarity
-        is_duplicate, score = self._similarity_function(source_value, dest_value)
-        
-        return (is_duplicate , pair_key, score, pk_i,pk_j)
-    
+        # Slice the main DataFrame using indices (memory efficient)
+        group_df = self.df.loc[group_indices]
+        arrays = build_group_arrays(group_df, similarity_columns)
+        
+        return self.pairwise_engine.score_group(
+            arrays,
+            special_case=not similarity_columns,
+            n_jobs=NO_OF_WORKERS if process_parallely else 1,
+            track_non_duplicates=not process_parallely
+        )
 
     def _process_group_pairs(self, group_indices, similarity_columns, process_parallely=False):
         """
         Function that processes a group using indices.
-        If  the number of invoices is large, possible number of combinations is also large.
-        Hence, we use parallel processing to speed up the pairwise comparison. Else its a normal processing for smaller groups.
-        
+        Every pair is checked with is_invoice_similar on the comparison value.
         
         Args:
             group_indices: List of DataFrame indices for the group
             similarity_columns: Columns to use for similarity comparison
-            process_parallely: If True, use parallel processing for large groups, 
+            process_parallely: If True, score the sub-blocks of a large group in parallel
             
         Returns:
             tuple: (local_duplicates_dict, local_non_duplicates_set)
         """
-        # Slice the main DataFrame using indices (memory efficient)
-        all_rows = []
-        group_df = self.df.loc[group_indices].reset_index(drop=True)
-        group_df['comparison_value'] = group_df.apply( lambda row: self._create_comparison_value(row, similarity_columns), axis=1 )
-
-        local_duplicates = {}
-        local_non_duplicates = set()
-        
-        if len(group_df) < 2:
-            return local_duplicates,local_non_duplicates
-        
-        # Process all pairs within the group
-        for i, j in combinations(group_df.index, 2):
-            row_i = group_df.iloc[i]
-            row_j = group_df.iloc[j]
-            
-            pk_i = row_i['PrimaryKeySimple']
-            pk_j = row_j['PrimaryKeySimple']
-            
-            # Create consistent pair key (smaller first)
-            pair_key = tuple(sorted([pk_i, pk_j]))
-            
-            # Skip if already processed (check against global state)
-
-            # Update: Calculate pairs even it was computed previously, duplicate pairs can be dropped at final step
-            # if pair_key in self.duplicate_pairs:
-            #     continue
-            
-            is_current_data_i = row_i.get('is_current_data', True)
-            is_current_data_j = row_j.get('is_current_data', True)
-            
-            # Check current data constraint
-            
-            if not (is_current_data_i or is_current_data_j):
-                continue
-            
-            # Create comparison values
-            source_value = group_df.iloc[i]['comparison_value']
-            dest_value = group_df.iloc[j]['comparison_value']
-            
-            
-            
-            # If process_parallely is set True, store row wise info only
-            if process_parallely:
-                all_rows.append({
-                'pair_key': pair_key,
-                'source_value': source_value,
-                'dest_value': dest_value,
-                'pk_i': pk_i,
-                'pk_j': pk_j,
-                'is_current_data_i': is_current_data_i,
-                'is_current_data_j': is_current_data_j
-            })
-            else:  
-                # Check similarity
-                is_duplicate, score = self._similarity_function(source_value, dest_value)
-                
-                if is_duplicate:
-                    local_duplicates[pair_key] = {
-                        'score': score,
-                        'source_pk': pk_i,
-                        'dest_pk': pk_j
-                    }
-                else:
-                    local_non_duplicates.add(pair_key)
-                    
-        if process_parallely:
-            # Store all rows in a DataFrame for parallel processing
-            pairs_df = pd.DataFrame(all_rows)
-            
-            # Use pandarallel to process all rows in parallel
-            if pairs_df.shape[0]!=0:
-                results = pairs_df.parallel_apply(lambda row:self._check_row(row),axis=1) # type: ignore
-                
-                for result in results.dropna():
-                    is_duplicate, pair_key, score, pk_i, pk_j = result
-                    if is_duplicate:
-                        local_duplicates[pair_key] = {
-                            'score': score,
-                            'source_pk': pk_i,
-                            'dest_pk': pk_j
-                        }
-                    else:
-                        # If not a duplicate, we could track non-duplicates if needed
-                        local_non_duplicates.add(pair_key)
-            
-        return local_duplicates,local_non_duplicates
+        local_duplicates, local_non_duplicates, _ = self._score_group(group_indices, similarity_columns,
+                                                                      process_parallely)
+        return local_duplicates, local_non_duplicates
 
     def _process_special_case(self, group_indices, similarity_columns):
-        # Slice the main DataFrame using indices (memory efficient)
-        all_rows = []
-        group_df = self.df.loc[group_indices].reset_index(drop=True)
-        group_df['comparison_value'] = group_df.apply( lambda row: self._create_comparison_value(row, similarity_columns), axis=1 )
-
-        local_duplicates = {}
-        local_non_duplicates = set()
-        
-        if len(group_df) < 2:
-            return local_duplicates,local_non_duplicates
+        """
+        Special case where no similarity columns are configured: pairs are duplicates when their
+        posting dates are within POSTED_DATE_THRESHOLD days, pairs of pure numeric invoice numbers are skipped.
         
-        # Process all pairs within the group
-        for i, j in combinations(group_df.index, 2):
-            row_i = group_df.iloc[i]
-            row_j = group_df.iloc[j]
-            
-            pk_i = row_i['PrimaryKeySimple']
-            pk_j = row_j['PrimaryKeySimple']
-            
-            # Create consistent pair key (smaller first)
-            # print("sonsistent")
-            pair_key = tuple(sorted([pk_i, pk_j]))
-            
-            # Skip if already processed (check against global state)
-            # print("skip")
-
-            # check and continue to next pair if both invoice numbers are pure numbers
-            source_invoice_number = group_df.iloc[i]['INVOICE_NUMBER_FORMAT']
-            dest_invoice_number = group_df.iloc[j]['INVOICE_NUMBER_FORMAT']
-            if source_invoice_number.isdigit() and dest_invoice_number.isdigit():
-                continue
-            
-            # Update: Calculate pairs even it was computed previously, duplicate pairs can be dropped at final step
-            # if pair_key in self.duplicate_pairs:
-            #     continue
-            
-            is_current_data_i = row_i.get('is_current_data', True)
-            is_current_data_j = row_j.get('is_current_data', True)
-            
-            # Check current data constraint
-            # print("current")
-            if not (is_current_data_i or is_current_data_j):
-                continue
-            
-            # Create comparison values
-            # print(f"i: {i} adn {j} and create: {group_df}")
-            source_value = group_df.iloc[i]['comparison_value']
-            dest_value = group_df.iloc[j]['comparison_value']
-
-            # Check similarity
-            # print(f"source: {source_value} and dest: {dest_value}")
-            # is_duplicate, score = dupl_helper._posted_date_similarity(source_value, dest_value, threshold=POSTED_DATE_THRESHOLD)
-            # is_duplicate, score = True, 85.0
-            # is_duplicate, score = (False, 0) if dupl_helper.is_sequential_series(str(source_invoice_number),str(dest_invoice_number)) else (True, 85.0)
-            # if is_duplicate:
-            is_duplicate, score = dupl_helper._posted_date_similarity(source_value, dest_value, threshold=POSTED_DATE_THRESHOLD)
+        Returns:
+            tuple: (local_duplicates_dict, local_non_duplicates_set)
+        """
+        local_duplicates, local_non_duplicates, _ = self._score_group(group_indices, similarity_columns)
+        return local_duplicates, local_non_duplicates
 
-            if is_duplicate:
-                local_duplicates[pair_key] = {
-                    'score': score,
-                    'source_pk': pk_i,
-                    'dest_pk': pk_j
-                }
-            else:
-                local_non_duplicates.add(pair_key)
-            
-        return local_duplicates,local_non_duplicates
+    def _add_scenario_duplicates(self, local_duplicates, scenario_id):
+        """Store group level duplicates in the global state, keyed with the scenario id"""
+        for pair_key, pair_info in local_duplicates.items():
+            pair_key =  (pair_key,scenario_id) # store pair info with scenario id to avoid conflicts across scenarios
+            if pair_key not in self.duplicate_pairs:
+                pair_info['SCENARIO_ID'] = scenario_id
+                self.duplicate_pairs[pair_key] = pair_info
 
     def _process_scenario_optimized(self, scenario_info):
         """Process a single scenario with optimized parallel processing"""
@@ -295,9 +151,9 @@ class OptimizedDuplicateDetector:
         capture_log_message(f"Processing Scenario {scenario_id}: {scenario_info['SCENARIO_NAME']}")
 
         group_lengths = []
-        group_indices_list_small = [] # Store all indices when group size is less than 500
-        group_indices_list_large = [] # Store indices for groups with size >= 500
-        size_threshold = 500
+        group_indices_list_small = [] # Store all indices when group size is less than the block size
+        group_indices_list_large = [] # Store indices for groups that the pairwise engine has to sub-block
+        size_threshold = PAIRWISE_MAX_BLOCK_SIZE
         
         # Apply groupby on whole data based on groupby columns, and store indices of grouped rows
         for _, group_df in self.df.groupby(group_by_fields):
@@ -334,39 +190,20 @@ class OptimizedDuplicateDetector:
                                                                                     axis=1) # type: ignore
             
             for local_duplicates,local_non_duplicates in results:
-                for pair_key, pair_info in local_duplicates.items():
-                    pair_key =  (pair_key,scenario_id) # store pair info with scenario id to avoid conflicts across scenarios
-                    if pair_key not in self.duplicate_pairs:
-                        pair_info['SCENARIO_ID'] = scenario_id
-                        self.duplicate_pairs[pair_key] = pair_info
-                    
+                self._add_scenario_duplicates(local_duplicates, scenario_id)
                 self.processed_non_duplicates.update(local_non_duplicates)
             
-        # Not running large Groups as of Now
-
-        
-        # if group_indices_list_large:
-        #     main_df_large = pd.DataFrame({'group_indices':group_indices_list_large})
-        #     capture_log_message(f"No of Groups that are large: {main_df_large.shape}")
-            
-        #     if similarity_columns:
-        #         results_large = main_df_large.apply(lambda x:self._process_group_pairs(group_indices=x['group_indices'],
-        #                                                                         similarity_columns=similarity_columns,
-        #                                                                         process_parallely=True),  # process parallely within a group
-        #                                                                         axis=1)
-        #     else: # Special case where no columns are present
-        #         results_large = main_df_large.parallel_apply(lambda x: self._process_special_case(x['group_indices'],
-        #                                                                             similarity_columns), 
-        #                                                                             axis=1) # type: ignore
-            
-        #     for local_duplicates, local_non_duplicates in results_large:
-        #         for pair_key, pair_info in local_duplicates.items():
-        #             if pair_key not in self.duplicate_pairs:
-        #                 pair_info['SCENARIO_ID'] = scenario_id
-        #                 self.duplicate_pairs[pair_key] = pair_info
-                        
-        #         self.processed_non_duplicates.update(local_non_duplicates)
-            
+        # Large groups are sub-blocked by the pairwise engine and their blocks are scored in parallel.
+        # Non-duplicate pair keys are only counted for them, storing them would defeat the bounded memory.
+        large_group_non_duplicates = 0
+        for group_indices in group_indices_list_large:
+            local_duplicates, _, non_duplicate_count = self._score_group(group_indices, similarity_columns,
+                                                                         process_parallely=True)
+            self._add_scenario_duplicates(local_duplicates, scenario_id)
+            large_group_non_duplicates += non_duplicate_count
+        
+        if group_indices_list_large:
+            capture_log_message(f"Non-duplicate pairs in large groups: {large_group_non_duplicates}")
             
         capture_log_message(f"Length of processed duplicate pairs:{len(self.duplicate_pairs)}")
         capture_log_message(f"Length of processed non-duplicates:{len(self.processed_non_duplicates)}")
@@ -0,0 +1,444 @@
+"""
+Pairwise Comparison Engine
+==========================
+Vectorised pair generation and scoring for duplicate invoice groups.
+
+A group is converted once into NumPy column arrays (primary key, comparison
+value, current-data flag, ...) and pairs are generated as index arrays in
+bounded chunks instead of walking rows with ``iloc``. Groups larger than
+``max_block_size`` are split into row tiles (each tile with itself and with
+every later tile), so every pair of the group is still scored, the blocks can
+be scored in parallel and memory stays bounded for groups of any size.
+
+The special case (posted-date check) is split by posted-date window first;
+windows are wider than the day threshold and adjacent windows are crossed, so
+no pair within the threshold is skipped.
+
+Optional, lossy sub-blocking (``sub_blocking`` / PAIRWISE_SUB_BLOCKING, off by
+default) splits large groups by invoice-date window and then by normalised
+invoice-number prefix. Pairs across windows or prefixes are never compared, so
+duplicates such as "INV-1001" / "1001" or invoices dated more than a window
+apart are missed; only enable it when recall may be traded for speed.
+"""
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+from duplicate_invoices.model import duplicate_extract_helper as dupl_helper
+from duplicate_invoices.gpu import get_similarity_accelerator
+from duplicate_invoices.config.config import (
+    POSTED_DATE_THRESHOLD,
+    PAIRWISE_MAX_BLOCK_SIZE,
+    PAIRWISE_PAIR_CHUNK_SIZE,
+    PAIRWISE_DATE_WINDOW_DAYS,
+    PAIRWISE_MAX_PREFIX_LENGTH,
+    PAIRWISE_SUB_BLOCKING,
+)
+
+NS_PER_DAY = 86_400 * 10**9
+POSTED_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+SPECIAL_CASE_SCORE = 65
+MISSING_DAY = np.iinfo(np.int64).min
+
+
+def build_comparison_values(group_df, columns):
+    """
+    Column-wise equivalent of ``OptimizedDuplicateDetector._create_comparison_value``.
+
+    Args:
+        group_df: DataFrame of the group
+        columns: Comma separated column names (defaults to POSTING_DATE)
+
+    Returns:
+        np.ndarray: object array of comparison strings
+    """
+    if not columns or columns == '':
+        columns = 'POSTING_DATE'
+
+    column_list = [col.strip() for col in columns.split(',')]
+    values = None
+    for col in column_list:
+        if col in group_df.columns:
+            # map(str) keeps str(Timestamp) formatting ("%Y-%m-%d %H:%M:%S") used by the row-wise version
+            col_values = group_df[col].map(str)
+        else:
+            col_values = pd.Series('', index=group_df.index)
+        values = col_values if values is None else values + '-' + col_values
+
+    return values.to_numpy(dtype=object)
+
+
+def _to_block_days(dates):
+    """Days since epoch for date-window blocking, MISSING_DAY for NaT"""
+    days = dates.to_numpy(dtype='datetime64[ns]').astype(np.int64) // NS_PER_DAY
+    return np.where(dates.isna().to_numpy(), MISSING_DAY, days)
+
+
+def build_group_arrays(group_df, similarity_columns, block_date_column='INVOICE_DATE'):
+    """
+    Convert a group DataFrame into the column arrays used by the engine.
+
+    Args:
+        group_df: DataFrame of the group (any index)
+        similarity_columns: Columns used for the similarity check ('' for the special case)
+        block_date_column: Date column used for the date-window sub-blocking
+
+    Returns:
+        dict: column arrays keyed by name, all of equal length
+    """
+    special_case = not similarity_columns
+    n = len(group_df)
+
+    if 'is_current_data' in group_df.columns:
+        is_current = group_df['is_current_data'].fillna(True).astype(bool).to_numpy()
+    else:
+        is_current = np.ones(n, dtype=bool)
+
+    if 'INVOICE_NUMBER_FORMAT' in group_df.columns:
+        invoice_numbers = group_df['INVOICE_NUMBER_FORMAT'].astype(str).to_numpy(dtype=object)
+    else:
+        invoice_numbers = np.full(n, '', dtype=object)
+
+    values = build_comparison_values(group_df, similarity_columns)
+
+    arrays = {
+        'position': np.arange(n),
+        'pk': group_df['PrimaryKeySimple'].to_numpy(dtype=object),
+        'value': values,
+        'is_current': is_current,
+        'invoice_number': invoice_numbers,
+        'is_digit': pd.Series(invoice_numbers, dtype=object).str.isdigit().fillna(False).to_numpy(dtype=bool),
+    }
+
+    if special_case:
+        # Special case compares posting dates; parse once instead of strptime per pair
+        posted = pd.to_datetime(pd.Series(values), format=POSTED_DATE_FORMAT)
+        arrays['posted_ns'] = posted.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        arrays['posted_valid'] = posted.notna().to_numpy()
+        arrays['block_days'] = _to_block_days(posted)
+    elif block_date_column in group_df.columns:
+        arrays['block_days'] = _to_block_days(pd.to_datetime(group_df[block_date_column], errors='coerce'))
+
+    return arrays
+
+
+def _take(arrays, indices):
+    """Slice every column array with the same row indices"""
+    return {key: value[indices] for key, value in arrays.items()}
+
+
+def _concat(left, right):
+    """Stack the column arrays of two row sets"""
+    return {key: np.concatenate([left[key], right[key]]) for key in left}
+
+
+def _score_similarity(block, i_idx, j_idx, use_gpu=False):
+    """
+    Score pairs with ``is_invoice_similar``; exact matches are resolved vectorised,
+    the rest goes to the batched similarity backend selected by PERFORMANCE_THRESHOLDS
+    """
+    source_values = block['value'][i_idx]
+    dest_values = block['value'][j_idx]
+
+    n_pairs = len(i_idx)
+    is_duplicate = np.zeros(n_pairs, dtype=bool)
+    scores = np.zeros(n_pairs, dtype=np.float64)
+
+    # Equal non-empty raw strings are always an exact match after normalisation as well
+    exact = (source_values == dest_values) & (source_values != '')
+    is_duplicate[exact] = True
+    scores[exact] = 100.0
+
+    remaining = np.flatnonzero(~exact)
+    accelerator = get_similarity_accelerator(len(remaining), use_gpu=use_gpu)
+    if accelerator is None:
+        for idx in remaining:
+            is_duplicate[idx], scores[idx] = dupl_helper.is_invoice_similar(source_values[idx], dest_values[idx])
+    else:
+        is_duplicate[remaining], scores[remaining] = accelerator.compute_similarity_batch_gpu(
+            source_values[remaining],
+            dest_values[remaining]
+        )
+
+    return is_duplicate, scores
+
+
+def _score_posted_date(block, i_idx, j_idx, threshold):
+    """Vectorised ``_posted_date_similarity``: |floor(delta in days)| <= threshold"""
+    delta_days = np.floor_divide(block['posted_ns'][i_idx] - block['posted_ns'][j_idx], NS_PER_DAY)
+    is_duplicate = (np.abs(delta_days) <= threshold) & block['posted_valid'][i_idx] & block['posted_valid'][j_idx]
+    scores = np.full(len(i_idx), SPECIAL_CASE_SCORE, dtype=np.float64)
+    return is_duplicate, scores
+
+
+def _iter_pair_chunks(n_left, n_right, pair_chunk_size):
+    """
+    Yield (i_idx, j_idx) index arrays covering all pairs of a block.
+
+    ``n_right`` is None for a self block (pairs i < j within the same rows),
+    otherwise the block is the full cross product of the left and right rows.
+    """
+    width = n_left if n_right is None else n_right
+    if n_left == 0 or width == 0:
+        return
+
+    rows_per_chunk = max(1, pair_chunk_size // width)
+    columns = np.arange(width)
+    for start in range(0, n_left, rows_per_chunk):
+        rows = np.arange(start, min(start + rows_per_chunk, n_left))
+        i_idx = np.repeat(rows, width)
+        j_idx = np.tile(columns, len(rows))
+        if n_right is None:
+            keep = j_idx > i_idx
+            i_idx, j_idx = i_idx[keep], j_idx[keep]
+        if len(i_idx):
+            yield i_idx, j_idx
+
+
+def _score_block(left, right, special_case, pair_chunk_size, posted_date_threshold, track_non_duplicates,
+                 use_gpu=False):
+    """
+    Score every pair of a single block.
+
+    Args:
+        left: Column arrays of the left rows
+        right: Column arrays of the right rows, None for a self block
+
+    Returns:
+        tuple: (local_duplicates_dict, local_non_duplicates_set, non_duplicate_count)
+    """
+    local_duplicates = {}
+    local_non_duplicates = set()
+    non_duplicate_count = 0
+
+    n_left = len(left['pk'])
+    n_right = None if right is None else len(right['pk'])
+    block = left if right is None else _concat(left, right)
+
+    for i_idx, j_idx in _iter_pair_chunks(n_left, n_right, pair_chunk_size):
+        if n_right is not None:
+            j_idx = j_idx + n_left
+            # Keep the group order of the pair (source row first), the comparisons are not symmetric
+            swap = block['position'][i_idx] > block['position'][j_idx]
+            i_idx, j_idx = np.where(swap, j_idx, i_idx), np.where(swap, i_idx, j_idx)
+
+        # Check current data constraint
+        keep = block['is_current'][i_idx] | block['is_current'][j_idx]
+        if special_case:
+            # Skip pairs where both invoice numbers are pure numbers
+            keep &= ~(block['is_digit'][i_idx] & block['is_digit'][j_idx])
+        i_idx, j_idx = i_idx[keep], j_idx[keep]
+        if not len(i_idx):
+            continue
+
+        if special_case:
+            is_duplicate, scores = _score_posted_date(block, i_idx, j_idx, posted_date_threshold)
+        else:
+            is_duplicate, scores = _score_similarity(block, i_idx, j_idx, use_gpu=use_gpu)
+
+        pk_i = block['pk'][i_idx]
+        pk_j = block['pk'][j_idx]
+
+        for idx in np.flatnonzero(is_duplicate):
+            # Create consistent pair key (smaller first)
+            pair_key = tuple(sorted([pk_i[idx], pk_j[idx]]))
+            local_duplicates[pair_key] = {
+                'score': scores[idx].item(),
+                'source_pk': pk_i[idx],
+                'dest_pk': pk_j[idx]
+            }
+
+        non_duplicate_idx = np.flatnonzero(~is_duplicate)
+        non_duplicate_count += len(non_duplicate_idx)
+        if track_non_duplicates:
+            local_non_duplicates.update(tuple(sorted([pk_i[idx], pk_j[idx]])) for idx in non_duplicate_idx)
+
+    return local_duplicates, local_non_duplicates, non_duplicate_count
+
+
+class PairwiseComparisonEngine:
+    """
+    Blocked, vectorised pairwise comparison for duplicate invoice groups.
+
+    Usage:
+        engine = PairwiseComparisonEngine()
+        arrays = build_group_arrays(group_df, similarity_columns)
+        duplicates, non_duplicates = engine.score_group(arrays, special_case=False)
+    """
+
+    def __init__(
+        self,
+        max_block_size: int = PAIRWISE_MAX_BLOCK_SIZE,
+        pair_chunk_size: int = PAIRWISE_PAIR_CHUNK_SIZE,
+        date_window_days: int = PAIRWISE_DATE_WINDOW_DAYS,
+        max_prefix_length: int = PAIRWISE_MAX_PREFIX_LENGTH,
+        posted_date_threshold: int = POSTED_DATE_THRESHOLD,
+        use_gpu: bool = False,
+        sub_blocking: bool = PAIRWISE_SUB_BLOCKING
+    ):
+        """
+        Args:
+            max_block_size: Blocks with more rows than this are split into row tiles
+            pair_chunk_size: Maximum number of pairs materialised at once
+            date_window_days: Width of the invoice-date windows (sub_blocking only)
+            max_prefix_length: Deepest invoice-number prefix used for sub-blocking
+            posted_date_threshold: Day threshold for the posted-date special case
+            use_gpu: Allow the TensorFlow similarity backend for blocks scored in-process
+            sub_blocking: Split large groups by invoice date and invoice-number prefix;
+                lossy, pairs across blocks are not compared
+        """
+        self.max_block_size = max_block_size
+        self.pair_chunk_size = pair_chunk_size
+        self.date_window_days = date_window_days
+        self.max_prefix_length = max_prefix_length
+        self.posted_date_threshold = posted_date_threshold
+        self.use_gpu = use_gpu
+        self.sub_blocking = sub_blocking
+
+    def _split_by_date(self, arrays, rows, window_days):
+        """Split a self block into date windows; adjacent windows are crossed"""
+        day_values = arrays['block_days'][rows]
+        missing = day_values == MISSING_DAY
+        dated_rows, undated_rows = rows[~missing], rows[missing]
+
+        windows = day_values[~missing] // window_days
+        unique_windows = np.unique(windows)
+        if len(unique_windows) <= 1 and not len(undated_rows):
+            return None
+
+        blocks = []
+        rows_by_window = {w: dated_rows[windows == w] for w in unique_windows}
+        for w in unique_windows:
+            blocks.append((rows_by_window[w], None))
+            if w + 1 in rows_by_window:
+                blocks.append((rows_by_window[w], rows_by_window[w + 1]))
+
+        if len(undated_rows):
+            # Rows without a date cannot be windowed, compare them with everything
+            blocks.append((undated_rows, None))
+            if len(dated_rows):
+                blocks.append((undated_rows, dated_rows))
+        return blocks
+
+    @staticmethod
+    def _prefix_keys(arrays, rows, length):
+        return pd.Series(arrays['invoice_number'][rows], dtype=object).str[:length].to_numpy(dtype=object)
+
+    def _split_by_prefix(self, arrays, left, right, length):
+        """Split a block so that only rows sharing an invoice-number prefix are compared"""
+        left_keys = self._prefix_keys(arrays, left, length)
+        if right is None:
+            codes, uniques = pd.factorize(left_keys)
+            if len(uniques) <= 1:
+                return None
+            return [(left[codes == c], None) for c in range(len(uniques))]
+
+        right_keys = self._prefix_keys(arrays, right, length)
+        left_unique, right_unique = set(left_keys), set(right_keys)
+        if len(left_unique) <= 1 and left_unique == right_unique:
+            return None
+        return [(left[left_keys == key], right[right_keys == key]) for key in sorted(left_unique & right_unique)]
+
+    def _block_size(self, left, right):
+        return len(left) if right is None else max(len(left), len(right))
+
+    def _tile(self, left, right):
+        """Split a block into row tiles of at most max_block_size rows covering all of its pairs"""
+        left_tiles = [left[start:start + self.max_block_size] for start in range(0, len(left), self.max_block_size)]
+        if right is not None:
+            right_tiles = [right[start:start + self.max_block_size]
+                           for start in range(0, len(right), self.max_block_size)]
+            for left_tile in left_tiles:
+                for right_tile in right_tiles:
+                    yield left_tile, right_tile
+            return
+
+        for k, tile in enumerate(left_tiles):
+            yield tile, None
+            for later_tile in left_tiles[k + 1:]:
+                yield tile, later_tile
+
+    def iter_blocks(self, arrays, special_case=False):
+        """
+        Yield (left_rows, right_rows) index blocks covering the group.
+
+        ``right_rows`` is None for a self block. Large blocks are split into row
+        tiles; the special case is split by posted-date window first. With
+        ``sub_blocking`` large blocks are split by invoice-date window and
+        invoice-number prefix instead (lossy).
+        """
+        rows = np.arange(len(arrays['pk']))
+        # Special case compares posting dates: windows slightly wider than the threshold
+        # (day flooring can add one day on each side) keep the sub-blocking lossless
+        window_days = self.posted_date_threshold + 2 if special_case else self.date_window_days
+        # Prefix blocking is only meaningful when invoice numbers are compared
+        max_level = 0 if special_case else self.max_prefix_length
+        if not special_case and not self.sub_blocking:
+            max_level = -1
+
+        pending = [(rows, None, 0)]
+        while pending:
+            left, right, level = pending.pop()
+            if self._block_size(left, right) <= self.max_block_size:
+                yield left, right
+                continue
+            if level > max_level:
+                yield from self._tile(left, right)
+                continue
+
+            if level == 0:
+                blocks = self._split_by_date(arrays, left, window_days) \
+                    if right is None and 'block_days' in arrays and window_days else None
+            else:
+                blocks = self._split_by_prefix(arrays, left, right, level)
+
+            if blocks is None:
+                pending.append((left, right, level + 1))
+            else:
+                pending.extend((block_left, block_right, level + 1) for block_left, block_right in blocks
+                               if len(block_left) and (block_right is None or len(block_right)))
+
+    def score_group(self, arrays, special_case=False, n_jobs=1, track_non_duplicates=True):
+        """
+        Score all (blocked) pairs of a group.
+
+        Args:
+            arrays: Output of ``build_group_arrays``
+            special_case: True when no similarity columns are configured (posted-date check)
+            n_jobs: Number of joblib workers used across blocks
+            track_non_duplicates: Collect non-duplicate pair keys (disable for large groups)
+
+        Returns:
+            tuple: (local_duplicates_dict, local_non_duplicates_set, non_duplicate_count)
+        """
+        if len(arrays['pk']) < 2:
+            return {}, set(), 0
+
+        block_args = (
+            (
+                _take(arrays, left),
+                None if right is None else _take(arrays, right),
+                special_case,
+                self.pair_chunk_size,
+                self.posted_date_threshold,
+                track_non_duplicates,
+                # Worker processes stay on the CPU backend
+                self.use_gpu and n_jobs == 1
+            )
+            for left, right in self.iter_blocks(arrays, special_case=special_case)
+        )
+        if n_jobs == 1:
+            results = [_score_block(*args) for args in block_args]
+        else:
+            results = Parallel(n_jobs=n_jobs)(delayed(_score_block)(*args) for args in block_args)
+
+        local_duplicates = {}
+        local_non_duplicates = set()
+        non_duplicate_count = 0
+        for block_duplicates, block_non_duplicates, block_count in results:
+            # Blocks are disjoint, every pair is scored at most once
+            local_duplicates.update(block_duplicates)
+            local_non_duplicates.update(block_non_duplicates)
+            non_duplicate_count += block_count
+
+        return local_duplicates, local_non_duplicates, non_duplicate_count
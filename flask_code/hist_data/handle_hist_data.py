@@ -12,6 +12,8 @@ from databases.sharding_tables import ShardingTables
 from pandas.api.types import is_integer_dtype, is_float_dtype, is_datetime64_any_dtype, is_object_dtype, is_string_dtype, is_numeric_dtype
 import utils
 from code1 import src_load
+from Ingestor.historical_invoice_index import refresh_historical_invoice_index
+from row_dedup import anti_join
 
 def align_column_dtypes(existing_df: pd.DataFrame, filtered_df: pd.DataFrame) -> tuple:
 
@@ -72,7 +74,7 @@ def filter_out_duplicate_data(existing_df:pd.DataFrame,filtered_df:pd.DataFrame)
         subset_columns =  ['acc_doc','COMPANY_NAME','POSTED_DATE','INVOICE_NUMBER','INVOICE_DATE']
     else:
         subset_columns =  ['acc_doc','FISCAL_YEAR','COMPANY_NAME','CLIENT']
-    unique_df =  filtered_df[~ (filtered_df[subset_columns].apply(tuple,axis=1).isin(existing_df[subset_columns].apply(tuple,axis=1)) )]
+    unique_df = anti_join(filtered_df, existing_df, subset_columns)
     # final_df = merged_df.drop_duplicates(subset=['acc_doc','COMPANY_CODE','POSTED_DATE','INVOICE_NUMBER','INVOICE_DATE'],keep='first',ignore_index='True')
     
     if unique_df.empty:
@@ -348,6 +350,9 @@ def store_hist_data_in_parquet_file(batch_id: int,df: pd.DataFrame):
 
             if (total_additional_records)!=0:
                 capture_log_message(f"{total_additional_records} total new records stored in parquet file/s!!")
+                if g.module_nm == "AP":
+                    # Update the duplicate invoice index for the rewritten monthly files
+                    refresh_historical_invoice_index(erp_folder_path)
             else:
                 capture_log_message(f"No new records to be stored in parquet!!")
 
@@ -2,6 +2,7 @@ import pathlib
 import pandas as pd
 import invoice_number_similarity
 import json
+import os
 
 pd.options.display.max_rows = 10
 pd.options.display.max_columns = 10
@@ -24,6 +25,10 @@ TARGET = "Label"
 PIPELINE_NAME = "model_cat_20250103_124940"
 PIPELINE_SAVE_FILE = f"{PIPELINE_NAME}"
 
+# batched prediction (make_predictions): pairs per CatBoost call and CatBoost threads
+PREDICTION_BATCH_SIZE = 20000
+PREDICTION_THREAD_COUNT = int(os.getenv("INVOICE_SIMILARITY_THREAD_COUNT", 12))
+
 # used for differential testing
 ACCEPTABLE_MODEL_DIFFERENCE = 0.05
 
@@ -4,7 +4,7 @@ import pandas as pd
 from invoice_number_similarity.processing.data_management import load_pipeline, load_features
 from invoice_number_similarity.config import config, logging_config
 from invoice_number_similarity import __version__ as _version
-from invoice_number_similarity.processing.features import extract_features
+from invoice_number_similarity.processing.features import extract_features, build_feature_matrix
 from invoice_number_similarity.rule_based_model import rule_based_similarity
 
 import logging
@@ -80,3 +80,52 @@ def make_prediction(*, input_data: t.Union[str, str], model:str='ML') -> dict:
     # )
 
     return results
+
+
+def make_predictions(*, sources: t.Sequence[str], dests: t.Sequence[str], model: str = 'ML',
+                     batch_size: int = config.PREDICTION_BATCH_SIZE,
+                     thread_count: int = config.PREDICTION_THREAD_COUNT) -> dict:
+    """Make predictions for arrays of invoice number pairs.
+
+    Pairs where one invoice number contains the other are resolved without the model,
+    the feature matrix of the remaining pairs is built column-wise and scored with one
+    predict_proba call per chunk of batch_size pairs.
+
+    Args:
+        sources: Source invoice numbers.
+        dests: Destination invoice numbers (same length as sources).
+        model: The model to use: RULE_BASED or ML
+        batch_size: Number of pairs per model call.
+        thread_count: CatBoost thread count.
+
+    Returns:
+        Predictions (n_pairs x 2) and similarity scores for each pair, as well as the model version.
+    """
+    sources = np.asarray(sources, dtype=object)
+    dests = np.asarray(dests, dtype=object)
+    n_pairs = len(sources)
+
+    predictions = np.zeros((n_pairs, 2), dtype=float)
+    similarity_scores = np.zeros(n_pairs, dtype=float)
+
+    contained = np.fromiter(((src in dest) or (dest in src) for src, dest in zip(sources, dests)),
+                            dtype=bool, count=n_pairs)
+    predictions[contained] = [0, 1]
+    similarity_scores[contained] = 100
+
+    to_score = np.flatnonzero(~contained)
+    if model == 'RULE_BASED':
+        for idx in to_score:
+            prediction, similarity_score = rule_based_similarity(sources[idx], dests[idx])
+            predictions[idx] = [1-prediction, prediction]
+            similarity_scores[idx] = similarity_score
+        return {"predictions": predictions, "similarity_score": similarity_scores, "version": _version}
+
+    score_pos = features.index('score')
+    for start in range(0, len(to_score), batch_size):
+        chunk = to_score[start:start+batch_size]
+        data = build_feature_matrix(sources[chunk], dests[chunk], features)
+        predictions[chunk] = _pipe.predict_proba(data, thread_count=thread_count)
+        similarity_scores[chunk] = data[:, score_pos]
+
+    return {"predictions": predictions, "similarity_score": similarity_scores, "version": _version}
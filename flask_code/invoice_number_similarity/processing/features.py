@@ -230,3 +230,27 @@ def extract_features(src, dest, t=2):
 
     return features
 
+
+
+def build_feature_matrix(sources, dests, feature_names, t=2):
+    """Feature matrix for arrays of (src, dest) pairs, in feature_names column order.
+
+    Same encoding as the single pair path of predict.make_prediction: string features
+    are one-hot encoded as '<feature>_<value>' = 1, numeric features are taken as is and
+    any feature missing for a pair is -1.
+    """
+    records = [extract_features(src, dest, t=t) for src, dest in zip(sources, dests)]
+    frame = pd.DataFrame.from_records(records)
+    feature_pos = {name: pos for pos, name in enumerate(feature_names)}
+
+    matrix = frame.reindex(columns=feature_names).astype(float).fillna(-1).to_numpy()
+    for col in frame.columns[frame.dtypes == object]:
+        values = frame[col]
+        values = values[values.map(type) == str]
+        if values.empty:
+            continue
+        one_hot_names = col + '_' + values
+        for name, rows in one_hot_names.groupby(one_hot_names).groups.items():
+            if name in feature_pos:
+                matrix[rows, feature_pos[name]] = 1
+    return matrix
@@ -1,20 +1,59 @@
+import os
 import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 from invoice_verification.Schemas.sap_row import SAPRow
 from invoice_verification.Schemas.overall_process import OverallProcess
+from invoice_verification.db.bulk_writer import BufferedInvoiceWriter, BULK_DB_WRITES
 from invoice_verification.logger.logger import log_message
 
+# Worker pool mode: OCR (SAPRow construction) in processes, LLM/validation/DB in threads
+PARALLEL_PROCESSING = os.getenv("IV_PARALLEL_PROCESSING", "false").lower() == "true"
+# PaddleOCR runs several MKLDNN threads per process, so one OCR worker per OCR_THREADS_PER_WORKER cores
+OCR_THREADS_PER_WORKER = int(os.getenv("IV_OCR_THREADS_PER_WORKER", "4"))
+OCR_WORKERS = int(os.getenv("IV_OCR_WORKERS", str(max(1, (os.cpu_count() or 1) // OCR_THREADS_PER_WORKER))))
+IO_WORKERS = int(os.getenv("IV_IO_WORKERS", "8"))
+LLM_CONCURRENCY = int(os.getenv("IV_LLM_CONCURRENCY", "4"))
+DB_CONCURRENCY = int(os.getenv("IV_DB_CONCURRENCY", "2"))
+
+# Define sensitive fields to exclude from logging
+LONG_FIELDS = {'invoice_lines','eml_lines', 'voucher_lines','payment_certificate_lines','xml_lines'}
+
+
+def build_sap_row(idx, accounting_doc, group) -> SAPRow:
+    """Create the SAPRow of one account document (loads the attachments and runs OCR)"""
+    log_message(f"START:: Processing transaction {str(group['TRANSACTION_ID'].iloc[0])} and account document: {str(accounting_doc)}")
+    sap_row = SAPRow(account_doc_id=idx,
+                    group=group)
+    log_message(f"SAP Row created for transaction {str(group['TRANSACTION_ID'].iloc[0])} and account document: {str(accounting_doc)}")
+
+    # Log only non-sensitive parameters
+    safe_params = {k: v for k, v in sap_row.__dict__.items() if k not in LONG_FIELDS}
+    log_message(f"SAP Row parameters (excluding sensitive data): {safe_params}")
+    return sap_row
+
 
 class InvoiceProcessingFlow:
     """Main orchestrator for batch invoice processing"""
-    
-    def __init__(self, vendors_df, sap_df, batch_id):
+
+    def __init__(self, vendors_df, sap_df, batch_id, parallel: bool = PARALLEL_PROCESSING,
+                 bulk_db_writes: bool = BULK_DB_WRITES):
         self.vendors_df = vendors_df
         self.sap_df = sap_df
         self.batch_id = batch_id
+        self.parallel = parallel
+        # Buffer results and persist them in bulk transactions instead of one transaction set per invoice
+        self.db_writer = BufferedInvoiceWriter() if bulk_db_writes else None
+        # group idx -> account_document_id, to map failed bulk flushes back to their documents
+        self._account_document_ids = {}
         # Track success/failure
         self.success_count = 0
         self.failed_count = 0
-        
+        # Per document outcome in the original group order: (accounting_doc, success)
+        self.results = []
+
     def process_all_invoices(self):
         """Process all invoices in the batch"""
         try:
@@ -26,61 +65,153 @@ class InvoiceProcessingFlow:
             # # TRANSACTION_ID is a autoincrement id for each row in SAP data
             # self.sap_df["TRANSACTION_ID"] = self.sap_df.index + 1
 
-            total_groups = len(self.sap_df.groupby(["DOCUMENT_NUMBER","CLIENT","COMPANY_CODE","FISCAL_YEAR"]))
+            groups = [(idx, accounting_doc, group) for idx, (accounting_doc, group) in
+                      enumerate(self.sap_df.groupby(["DOCUMENT_NUMBER","CLIENT","COMPANY_CODE","FISCAL_YEAR"]), 1)]
+            total_groups = len(groups)
             log_message(f"Processing {total_groups} invoice groups")
 
-            for idx, (accounting_doc, group) in enumerate(self.sap_df.groupby(["DOCUMENT_NUMBER","CLIENT","COMPANY_CODE","FISCAL_YEAR"]), 1):
-                try:
-                    start_time = time.time()
-                    # Create SAPRow object
-                    log_message(f"START:: Processing transaction {str(group['TRANSACTION_ID'].iloc[0])} and account document: {str(accounting_doc)}")
-                    sap_row = SAPRow(account_doc_id=idx,
-                                    group=group)
-                    log_message(f"SAP Row created for transaction {str(group['TRANSACTION_ID'].iloc[0])} and account document: {str(accounting_doc)}")
-                    # log all parameters of sap_row
-                    
-                    
-                    # Define sensitive fields to exclude from logging
-                    long_fields = {'invoice_lines','eml_lines', 'voucher_lines','payment_certificate_lines','xml_lines'}
-
-                    # Log only non-sensitive parameters
-                    safe_params = {k: v for k, v in sap_row.__dict__.items() if k not in long_fields}
-                    log_message(f"SAP Row parameters (excluding sensitive data): {safe_params}")
-                    # from invoice_verification.db.db_connection import insert_quarter_rows, insert_transaction_rows
-                   
-                    # # Insert account document level data
-                    # insert_quarter_rows([sap_row])
-
-                    # log_message(f"Inserted quarter rows for transaction {str(group['TRANSACTION_ID'].iloc[0])} and account document: {str(accounting_doc)}")
-                   
-                    # # Insert transaction level data
-                    # insert_transaction_rows(group, idx, sap_row.quarter_label)
-
-                    # log_message(f"Inserted transaction rows for transaction {str(group['TRANSACTION_ID'].iloc[0])} and account document: {str(accounting_doc)}")
-                    
-
-                    
-
-                    # Process individual invoice
-                    processor = OverallProcess(sap_row, self.vendors_df, self.batch_id)
-                    success = processor.main()
-                        
-                    if success:
-                        self.success_count += 1
-                    else:
-                        self.failed_count += 1
-                    
-                except Exception as e:
-                    log_message(f"Error processing transaction {str(group['TRANSACTION_ID'].iloc[0])} and account document: {str(accounting_doc)},  Error: {e}", error_logger=True)
-                    self.failed_count += 1
-                    import traceback
-                    log_message(traceback.format_exc(), error_logger=True)
-                    continue
-                end_time = time.time()
-                log_message(f"Time taken: {end_time - start_time:.2f} seconds for transaction {str(group['TRANSACTION_ID'].iloc[0])} and account document: {str(accounting_doc)}")
+            if self.parallel and total_groups > 1:
+                outcomes = self._process_parallel(groups)
+            else:
+                outcomes = [self._process_sequential(idx, accounting_doc, group) for idx, accounting_doc, group in groups]
+
+            if self.db_writer is not None:
+                self.db_writer.close()
+                failed_docs = self.db_writer.failed_account_documents
+                outcomes = [success and self._account_document_ids.get(idx) not in failed_docs
+                            for (idx, _, _), success in zip(groups, outcomes)]
+
+            self.results = [(accounting_doc, success) for (_, accounting_doc, _), success in zip(groups, outcomes)]
+            self.success_count = sum(1 for success in outcomes if success)
+            self.failed_count = total_groups - self.success_count
             log_message(f"Process_all_invoices complete: {self.success_count} success, {self.failed_count} failed")
             return self.success_count, self.failed_count, total_groups
-            
+
         except Exception as e:
             log_message(f"Fatal error in process_all_invoices: {e}", error_logger=True)
-            raise
\ No newline at end of file
+            raise
+
+    def _log_failure(self, accounting_doc, group, e):
+        log_message(f"Error processing transaction {str(group['TRANSACTION_ID'].iloc[0])} and account document: {str(accounting_doc)},  Error: {e}", error_logger=True)
+        import traceback
+        log_message("".join(traceback.format_exception(type(e), e, e.__traceback__)), error_logger=True)
+
+    def _process_sequential(self, idx, accounting_doc, group) -> bool:
+        """Process one account document end to end in the calling thread"""
+        try:
+            start_time = time.time()
+            sap_row = build_sap_row(idx, accounting_doc, group)
+            self._account_document_ids[idx] = sap_row.account_document_id
+
+            # Process individual invoice
+            processor = OverallProcess(sap_row, self.vendors_df, self.batch_id, db_writer=self.db_writer)
+            success = processor.main()
+        except Exception as e:
+            self._log_failure(accounting_doc, group, e)
+            return False
+        end_time = time.time()
+        log_message(f"Time taken: {end_time - start_time:.2f} seconds for transaction {str(group['TRANSACTION_ID'].iloc[0])} and account document: {str(accounting_doc)}")
+        return success
+
+    def _process_parallel(self, groups) -> list:
+        """
+        Bounded worker pool: SAPRow construction (file loading and OCR) runs in a process pool,
+        LLM calls, validation and DB inserts of finished rows run in a thread pool with
+        separate concurrency limits for the LLM and DB stages. Outcomes are returned in the
+        order of groups, a failing document only marks its own outcome False.
+
+        When an OCR worker process dies (e.g. out of memory) the pool is broken and every
+        unfinished document gets BrokenProcessPool. Those documents are rebuilt one at a
+        time in a fresh single-process pool, so only the document that kills its worker
+        again is marked failed.
+        """
+        outcomes = [False] * len(groups)
+        llm_limiter = threading.BoundedSemaphore(LLM_CONCURRENCY)
+        db_limiter = threading.BoundedSemaphore(DB_CONCURRENCY)
+        log_message(f"Parallel processing with {OCR_WORKERS} OCR processes and {IO_WORKERS} I/O threads "
+                    f"(LLM concurrency: {LLM_CONCURRENCY}, DB concurrency: {DB_CONCURRENCY})")
+
+        def process_row(idx, sap_row):
+            self._account_document_ids[idx] = sap_row.account_document_id
+            processor = OverallProcess(sap_row, self.vendors_df, self.batch_id,
+                                       llm_limiter=llm_limiter, db_limiter=db_limiter,
+                                       db_writer=self.db_writer)
+            return processor.main()
+
+        start_times = {}
+        # fork keeps the configured batch logger and loaded models in the OCR workers
+        with ProcessPoolExecutor(max_workers=OCR_WORKERS, mp_context=multiprocessing.get_context("fork")) as ocr_pool, \
+                ThreadPoolExecutor(max_workers=IO_WORKERS) as io_pool:
+            # Submit every OCR job before any I/O thread starts so workers are forked from a quiet parent
+            ocr_futures = {}
+            for position, (idx, accounting_doc, group) in enumerate(groups):
+                start_times[position] = time.time()
+                ocr_futures[ocr_pool.submit(build_sap_row, idx, accounting_doc, group)] = position
+
+            io_futures = {}
+            broken_positions = []
+            pending = set(ocr_futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    position = ocr_futures[future]
+                    idx, accounting_doc, group = groups[position]
+                    try:
+                        io_futures[io_pool.submit(process_row, idx, future.result())] = position
+                    except BrokenProcessPool:
+                        broken_positions.append(position)
+                    except Exception as e:
+                        self._log_failure(accounting_doc, group, e)
+
+            if broken_positions:
+                log_message(f"An OCR worker process died, rebuilding {len(broken_positions)} unfinished "
+                            f"document(s) one at a time", error_logger=True)
+                # Finish the I/O of the built rows first so the retry processes are forked from a quiet parent
+                wait(io_futures)
+                rebuilt_rows = []
+                for position, sap_row, error in self._build_rows_isolated(groups, broken_positions):
+                    idx, accounting_doc, group = groups[position]
+                    if error is not None:
+                        self._log_failure(accounting_doc, group, error)
+                    else:
+                        rebuilt_rows.append((position, idx, sap_row))
+                for position, idx, sap_row in rebuilt_rows:
+                    io_futures[io_pool.submit(process_row, idx, sap_row)] = position
+
+            for future, position in io_futures.items():
+                _, accounting_doc, group = groups[position]
+                try:
+                    outcomes[position] = future.result()
+                except Exception as e:
+                    self._log_failure(accounting_doc, group, e)
+                    continue
+                log_message(f"Time taken: {time.time() - start_times[position]:.2f} seconds for transaction {str(group['TRANSACTION_ID'].iloc[0])} and account document: {str(accounting_doc)}")
+
+        return outcomes
+
+    @staticmethod
+    def _build_rows_isolated(groups, positions):
+        """
+        Build the SAP rows of positions one at a time in a single-process pool, a new pool
+        is started after a document kills the worker.
+
+        Yields:
+            (position, sap_row or None, exception or None)
+        """
+        pool = None
+        try:
+            for position in sorted(positions):
+                idx, accounting_doc, group = groups[position]
+                if pool is None:
+                    pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("fork"))
+                try:
+                    yield position, pool.submit(build_sap_row, idx, accounting_doc, group).result(), None
+                except BrokenProcessPool as e:
+                    pool.shutdown(wait=False)
+                    pool = None
+                    yield position, None, e
+                except Exception as e:
+                    yield position, None, e
+        finally:
+            if pool is not None:
+                pool.shutdown()
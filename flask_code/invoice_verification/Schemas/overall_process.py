@@ -1,3 +1,4 @@
+from contextlib import nullcontext
 from invoice_verification.Schemas.invoice_processing_result import InvoiceProcessingResult
 from invoice_verification.Schemas.invoice_verification_result import InvoiceVerificationResult
 from invoice_verification.Schemas.invoice_param_config_result import InvoiceParamConfigResult
@@ -14,12 +15,18 @@ from invoice_verification.db.db_connection import insert_complete_invoice_data
 class OverallProcess:
     """Main processing orchestrator for a single invoice"""
     
-    def __init__(self, sap_row:SAPRow, vendors_df, batch_id, vat_df=None, gl_accounts_df=None):
+    def __init__(self, sap_row:SAPRow, vendors_df, batch_id, vat_df=None, gl_accounts_df=None,
+                 llm_limiter=None, db_limiter=None, db_writer=None):
         self.sap_row = sap_row
         self.vendors_df = vendors_df
         self.batch_id = batch_id
         self.vat_df = vat_df
         self.gl_accounts_df = gl_accounts_df
+        # Optional semaphores bounding concurrent LLM calls / DB writes across worker threads
+        self.llm_limiter = llm_limiter or nullcontext()
+        self.db_limiter = db_limiter or nullcontext()
+        # Optional BufferedInvoiceWriter, results are then persisted in bulk instead of per invoice
+        self.db_writer = db_writer
 
     
     def main(self):
@@ -58,12 +65,21 @@ class OverallProcess:
             attachments_result.set_attachment_paths(self.sap_row.attachments)
 
             #Insert results into the database
-            insert_complete_invoice_data(processing_result=processing_result,
-                                         verification_result=verification_result,
-                                         param_config_result=param_config_result,
-                                         ui_flat_result=ui_flat_result,
-                                         attachments_result=attachments_result,
-                                         quarter_label=self.sap_row.quarter_label)
+            if self.db_writer is not None:
+                self.db_writer.add(processing_result=processing_result,
+                                   verification_result=verification_result,
+                                   param_config_result=param_config_result,
+                                   ui_flat_result=ui_flat_result,
+                                   attachments_result=attachments_result,
+                                   quarter_label=self.sap_row.quarter_label)
+                return True
+            with self.db_limiter:
+                insert_complete_invoice_data(processing_result=processing_result,
+                                             verification_result=verification_result,
+                                             param_config_result=param_config_result,
+                                             ui_flat_result=ui_flat_result,
+                                             attachments_result=attachments_result,
+                                             quarter_label=self.sap_row.quarter_label)
             return True
             
         except Exception as e:
@@ -84,12 +100,13 @@ class OverallProcess:
             #     log_message("No invoice lines found/Dummpy PDF, No LLM callreturning empty OCRData")
             #     return OCRData()
             # else:
-            invoice_ocr_json = get_llama_api_result(
-                account_document=str(self.sap_row.account_document_number),
-                text_lines=self.sap_row.invoice_lines_1,
-                sap_row=self.sap_row,
-                invoice_type="invoice"
-            )
+            with self.llm_limiter:
+                invoice_ocr_json = get_llama_api_result(
+                    account_document=str(self.sap_row.account_document_number),
+                    text_lines=self.sap_row.invoice_lines_1,
+                    sap_row=self.sap_row,
+                    invoice_type="invoice"
+                )
             log_message(f"LLM OCR extraction result: {invoice_ocr_json}")
             # Convert JSON to OCRData object
             return OCRData.from_dict(invoice_ocr_json)
@@ -107,12 +124,13 @@ class OverallProcess:
             
         try:
             
-            voucher_ocr_json = get_llama_api_result(
-                account_document=str(self.sap_row.account_document_number),
-                text_lines=self.sap_row.voucher_lines,
-                sap_row=self.sap_row,
-                invoice_type="voucher"
-            )
+            with self.llm_limiter:
+                voucher_ocr_json = get_llama_api_result(
+                    account_document=str(self.sap_row.account_document_number),
+                    text_lines=self.sap_row.voucher_lines,
+                    sap_row=self.sap_row,
+                    invoice_type="voucher"
+                )
             # Convert JSON to VoucherOCRData object
             return VoucherOCRData.from_dict(voucher_ocr_json)
         
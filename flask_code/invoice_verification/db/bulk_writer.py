@@ -0,0 +1,219 @@
+# db/bulk_writer.py
+"""
+Buffered bulk persistence of invoice verification results.
+Results of many invoices are collected in memory and written with multi-row
+INSERT ... ON DUPLICATE KEY UPDATE statements, one transaction per flush.
+"""
+
+import os
+import time
+import threading
+from datetime import datetime
+from typing import Dict, List
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from invoice_verification.logger.logger import log_message
+from invoice_verification.db.db_connection import get_session, get_quarterly_models_from_dict, sanitize_parameters
+
+BULK_DB_WRITES = os.getenv("IV_BULK_DB_WRITES", "false").lower() == "true"
+DB_WRITE_BATCH_SIZE = int(os.getenv("IV_DB_WRITE_BATCH_SIZE", "50"))
+DB_FLUSH_INTERVAL = float(os.getenv("IV_DB_FLUSH_INTERVAL", "30"))
+
+EXCLUDED_FROM_UPDATE = {'created_at', 'created_date'}
+
+
+def _group_by_columns(rows: List[Dict]) -> List[List[Dict]]:
+    """Split rows into groups sharing the same column set (a multi-row VALUES needs identical keys)"""
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    return list(groups.values())
+
+
+def bulk_upsert(session, model, rows: List[Dict], keep_existing_on_null: bool = False) -> int:
+    """
+    Multi-row INSERT ... ON DUPLICATE KEY UPDATE of rows into the model table.
+    Creation timestamps are preserved on update and onupdate timestamps are refreshed.
+    Args:
+        session: Open session, the caller owns the transaction
+        model: Table model class
+        rows: Sanitized row dicts
+        keep_existing_on_null: If True a NULL in the new row keeps the stored value
+    Returns:
+        int: Number of rows sent
+    """
+    table = model.__table__
+    for group in _group_by_columns(rows):
+        insert_stmt = mysql_insert(table).values(group)
+        update_dict = {}
+        for column_name in group[0]:
+            if column_name in EXCLUDED_FROM_UPDATE:
+                continue
+            new_value = insert_stmt.inserted[column_name]
+            if keep_existing_on_null:
+                new_value = func.coalesce(new_value, table.c[column_name])
+            update_dict[column_name] = new_value
+        for column in table.columns:
+            if column.onupdate is not None and column.name not in group[0]:
+                update_dict[column.name] = datetime.now()
+        session.execute(insert_stmt.on_duplicate_key_update(**update_dict))
+    return len(rows)
+
+
+class BufferedInvoiceWriter:
+    """
+    Collects the results of many invoices and persists them in bulk.
+
+    The buffer is flushed once batch_size invoices are pending or flush_interval seconds
+    have passed since the last flush, and on close(). Every flush writes all pending
+    invoices of all quarters in a single transaction, so a failing flush leaves no
+    partially written invoice behind. Safe to share between worker threads.
+    """
+
+    def __init__(self, batch_size: int = DB_WRITE_BATCH_SIZE, flush_interval: float = DB_FLUSH_INTERVAL,
+                 retry_on_deadlock: int = 2):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.retry_on_deadlock = retry_on_deadlock
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: Dict[str, List[Dict]] = {}
+        self._pending_count = 0
+        self._last_flush_time = time.time()
+        # account_document_ids of invoices lost in a failed flush
+        self.failed_account_documents = set()
+        # Metrics
+        self.invoices_written = 0
+        self.rows_written = 0
+        self.flush_count = 0
+        self.total_flush_seconds = 0.0
+        self.last_flush_seconds = 0.0
+
+    def add(self, processing_result, verification_result, param_config_result, ui_flat_result,
+            attachments_result, quarter_label: str) -> None:
+        """Buffer the results of one invoice, same arguments as insert_complete_invoice_data"""
+        quarter_label = str(quarter_label).lower().replace("-", "_")
+        invoice = {
+            'processing': sanitize_parameters(processing_result.to_db_dict()),
+            'verification': sanitize_parameters(verification_result.to_db_dict()),
+            'param_config': [sanitize_parameters(config) for config in param_config_result.to_db_list()],
+            'ui_flat': sanitize_parameters(ui_flat_result.to_db_dict()),
+            'attachments': [sanitize_parameters(attachment) for attachment in attachments_result.to_db_list()],
+        }
+        if not invoice['processing'].get('account_document_id'):
+            raise ValueError("account_document_id is required for upsert")
+
+        with self._lock:
+            self._pending.setdefault(quarter_label, []).append(invoice)
+            self._pending_count += 1
+            due = self._pending_count >= self.batch_size or \
+                time.time() - self._last_flush_time >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Write all pending invoices in one transaction.
+        Returns:
+            int: Number of invoices written
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                no_of_invoices, self._pending_count = self._pending_count, 0
+                self._last_flush_time = time.time()
+            if not no_of_invoices:
+                return 0
+
+            start_time = time.time()
+            attempt = 0
+            while True:
+                try:
+                    with get_session() as session:
+                        no_of_rows = sum(self._write_quarter(session, quarter_label, invoices)
+                                         for quarter_label, invoices in pending.items())
+                    break
+                except Exception as e:
+                    attempt += 1
+                    log_message(f"Bulk invoice flush failed (attempt {attempt}): {e}", error_logger=True)
+                    if not isinstance(e, SQLAlchemyError) or attempt > self.retry_on_deadlock:
+                        self.failed_account_documents.update(invoice['processing']['account_document_id']
+                                                             for invoices in pending.values() for invoice in invoices)
+                        return 0
+                    time.sleep(0.2 * attempt)
+
+            elapsed = time.time() - start_time
+            self.invoices_written += no_of_invoices
+            self.rows_written += no_of_rows
+            self.flush_count += 1
+            self.total_flush_seconds += elapsed
+            self.last_flush_seconds = elapsed
+            log_message(f"Bulk flush wrote {no_of_invoices} invoices ({no_of_rows} rows) in {elapsed:.3f} seconds "
+                        f"({no_of_rows / elapsed if elapsed else 0:.1f} rows/sec)")
+            return no_of_invoices
+
+    def _write_quarter(self, session, quarter_label: str, invoices: List[Dict]) -> int:
+        """Upsert the buffered invoices of one quarter, returns the number of rows written"""
+        models_dict = get_quarterly_models_from_dict(quarter_label)
+        processing_model = models_dict['processing']
+
+        # Later results of the same account document win, as with sequential upserts
+        invoices = list({invoice['processing']['account_document_id']: invoice for invoice in invoices}.values())
+        no_of_rows = bulk_upsert(session, processing_model, [invoice['processing'] for invoice in invoices])
+
+        account_doc_ids = [invoice['processing']['account_document_id'] for invoice in invoices]
+        processing_ids = dict(session.query(processing_model.account_document_id, processing_model.id)
+                              .filter(processing_model.account_document_id.in_(account_doc_ids)).all())
+
+        verification_rows, param_config_rows, ui_flat_rows, attachment_rows = [], [], [], []
+        for invoice in invoices:
+            processing_id = processing_ids[invoice['processing']['account_document_id']]
+            verification_rows.append(dict(invoice['verification'], processing_id=processing_id))
+            param_config_rows.extend(dict(config, invoice_id=processing_id) for config in invoice['param_config'])
+            ui_flat_rows.append(dict(invoice['ui_flat'], invoice_id=processing_id))
+            attachment_rows.extend(dict(attachment, invoice_id=processing_id) for attachment in invoice['attachments'])
+
+        no_of_rows += bulk_upsert(session, models_dict['verification'], verification_rows)
+        if param_config_rows:
+            # None values keep the stored value to avoid NOT NULL violations, as in insert_invoice_param_config
+            no_of_rows += bulk_upsert(session, models_dict['param_config'], param_config_rows, keep_existing_on_null=True)
+        no_of_rows += bulk_upsert(session, models_dict['ui_flat'], ui_flat_rows)
+        if attachment_rows:
+            no_of_rows += self._insert_new_attachments(session, models_dict['attachments'], attachment_rows)
+        return no_of_rows
+
+    @staticmethod
+    def _insert_new_attachments(session, attachments_model, attachment_rows: List[Dict]) -> int:
+        """Insert-only: attachments already stored for (invoice_id, file_path) are skipped"""
+        invoice_ids = {row['invoice_id'] for row in attachment_rows}
+        existing = set(session.query(attachments_model.invoice_id, attachments_model.file_path)
+                       .filter(attachments_model.invoice_id.in_(invoice_ids)).all())
+        new_rows = []
+        for row in attachment_rows:
+            key = (row['invoice_id'], row['file_path'])
+            if key not in existing:
+                existing.add(key)
+                new_rows.append(row)
+        for group in _group_by_columns(new_rows):
+            session.execute(mysql_insert(attachments_model.__table__).values(group))
+        log_message(f"Attachments: inserted {len(new_rows)}, skipped {len(attachment_rows) - len(new_rows)} duplicate records")
+        return len(new_rows)
+
+    def close(self) -> dict:
+        """Flush the remaining invoices and return the write metrics"""
+        self.flush()
+        metrics = self.metrics()
+        log_message(f"Bulk invoice writer metrics: {metrics}")
+        return metrics
+
+    def metrics(self) -> dict:
+        return {
+            'invoices_written': self.invoices_written,
+            'rows_written': self.rows_written,
+            'failed_invoices': len(self.failed_account_documents),
+            'flush_count': self.flush_count,
+            'rows_per_second': self.rows_written / self.total_flush_seconds if self.total_flush_seconds else 0.0,
+            'avg_flush_seconds': self.total_flush_seconds / self.flush_count if self.flush_count else 0.0,
+            'last_flush_seconds': self.last_flush_seconds,
+        }
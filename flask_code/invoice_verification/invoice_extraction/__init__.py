@@ -4,7 +4,8 @@ from invoice_verification.invoice_extraction.ocr import ocr_extractor
 from invoice_verification.invoice_extraction.pdf_plumber import pdf_extractor
 from invoice_verification.invoice_extraction.llm import get_llama_result
 from invoice_verification.invoice_extraction.helper import check_file_type
-from invoice_verification.invoice_extraction.language_detector import detect_language_from_image
+from invoice_verification.invoice_extraction.language_detector import detect_language_single_pass
+from invoice_verification.invoice_extraction.cache import cache_get, cache_put, file_sha256, OCR_CACHE_VERSION
 from typing import List, Dict, Any, Tuple
 
 
@@ -31,13 +32,25 @@ def extract_text_lines(
     log_message(f"Started Extracting Text lines for Account Document: {account_document}")
     result: List[str] = []
 
-    detect_lang = detect_language_from_image(image_path=file_path)
+    # Same file bytes give the same OCR output, reuse it on retries and re-audits
+    try:
+        cache_key = f"{file_sha256(file_path)}|{OCR_CACHE_VERSION}|{vendor_code}|{int(return_checkbox_radio_mappings)}"
+    except OSError as e:
+        log_message(f"Could not hash file for OCR cache: {e}", error_logger=True)
+        cache_key = None
+    cached = cache_get("ocr", cache_key) if cache_key else None
+    if cached is not None:
+        log_message(f"OCR cache hit for Account Document: {account_document}")
+        return cached["text_lines"], cached["checkbox_radiobutton_mappings"]
+
+    detect_lang, initial_results = detect_language_single_pass(file_path=file_path)
     log_message(f"Detected Language for the Input file: {detect_lang}")
 
     result, checkbox_radiobutton_mappings = ocr_extractor(file_path=file_path, 
                                                           detect_lang=detect_lang,
                                                           return_checkbox_radio_mappings=return_checkbox_radio_mappings,
-                                                          vendor_code=vendor_code)
+                                                          vendor_code=vendor_code,
+                                                          initial_results=initial_results)
     # if OCR_FLAG:
     #     log_message("File is an Image or Scanned PDF")
     #     log_message("OCR Extraction process Started")
@@ -55,6 +68,9 @@ def extract_text_lines(
 
     if not result:
         log_message(f"Extracted text lines is empty, result is {result}")
+    elif cache_key:
+        cache_put("ocr", cache_key, {"text_lines": result,
+                                     "checkbox_radiobutton_mappings": checkbox_radiobutton_mappings})
     
     return result, checkbox_radiobutton_mappings
 
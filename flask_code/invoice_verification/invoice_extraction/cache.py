@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Any, Optional
+from invoice_verification.logger.logger import log_message
+
+# Bump when OCR post-processing or the Llama API prompt/model changes so old entries are not reused
+OCR_CACHE_VERSION = "paddleocr-v5/2"
+LLM_CACHE_VERSION = os.getenv("LLAMA_MODEL_VERSION", "Llama-api/version-0.1")
+
+CACHE_ENABLED = os.getenv("IV_EXTRACTION_CACHE_ENABLED", "false").lower() == "true"
+CACHE_MAX_SIZE_MB = int(os.getenv("IV_EXTRACTION_CACHE_MAX_MB", "512"))
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                  'iv_cache', 'extraction_cache.sqlite')
+CACHE_PATH = os.getenv("IV_EXTRACTION_CACHE_PATH", DEFAULT_CACHE_PATH)
+
+
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of the file bytes"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_sha256(value: Any) -> str:
+    """SHA-256 of a JSON serialisable value"""
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class ExtractionCache():
+    """
+    Content-addressed SQLite cache for OCR text lines and parsed Llama API responses.
+
+    Entries are keyed by (kind, content hash + version), evicted least recently used
+    once the stored payload exceeds max_size_bytes. Hit/miss counters are kept per kind.
+    """
+
+    def __init__(self, db_path: str = CACHE_PATH, max_size_mb: int = CACHE_MAX_SIZE_MB) -> None:
+        self.db_path = db_path
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS cache_entries (
+                                kind TEXT NOT NULL,
+                                cache_key TEXT NOT NULL,
+                                value TEXT NOT NULL,
+                                size INTEGER NOT NULL,
+                                created_at REAL NOT NULL,
+                                last_access REAL NOT NULL,
+                                PRIMARY KEY (kind, cache_key))""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache_entries (last_access)")
+            conn.execute("""CREATE TABLE IF NOT EXISTS cache_stats (
+                                kind TEXT PRIMARY KEY,
+                                hits INTEGER NOT NULL DEFAULT 0,
+                                misses INTEGER NOT NULL DEFAULT 0)""")
+
+    @contextmanager
+    def _connect(self):
+        """Short lived connection, committed and closed on exit"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _count(conn: sqlite3.Connection, kind: str, hit: bool) -> None:
+        column = 'hits' if hit else 'misses'
+        conn.execute("INSERT OR IGNORE INTO cache_stats (kind) VALUES (?)", (kind,))
+        conn.execute(f"UPDATE cache_stats SET {column} = {column} + 1 WHERE kind = ?", (kind,))
+
+    def get(self, kind: str, cache_key: str) -> Optional[Any]:
+        """Cached value or None on a miss"""
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT value FROM cache_entries WHERE kind = ? AND cache_key = ?",
+                               (kind, cache_key)).fetchone()
+            self._count(conn, kind, hit=row is not None)
+            if row is None:
+                return None
+            conn.execute("UPDATE cache_entries SET last_access = ? WHERE kind = ? AND cache_key = ?",
+                         (time.time(), kind, cache_key))
+        return json.loads(row[0])
+
+    def put(self, kind: str, cache_key: str, value: Any) -> None:
+        payload = json.dumps(value)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute("""INSERT OR REPLACE INTO cache_entries
+                            (kind, cache_key, value, size, created_at, last_access)
+                            VALUES (?, ?, ?, ?, ?, ?)""",
+                         (kind, cache_key, payload, len(payload), now, now))
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Drop least recently used entries until the cache is back under 90% of its size limit"""
+        total_size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+        if total_size <= self.max_size_bytes:
+            return
+        target_size = int(self.max_size_bytes * 0.9)
+        evicted = 0
+        for kind, cache_key, size in conn.execute(
+                "SELECT kind, cache_key, size FROM cache_entries ORDER BY last_access").fetchall():
+            if total_size <= target_size:
+                break
+            conn.execute("DELETE FROM cache_entries WHERE kind = ? AND cache_key = ?", (kind, cache_key))
+            total_size -= size
+            evicted += 1
+        log_message(f"Extraction cache evicted {evicted} entries, size now {total_size} bytes")
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            counters = {kind: {'hits': hits, 'misses': misses}
+                        for kind, hits, misses in conn.execute("SELECT kind, hits, misses FROM cache_stats")}
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries").fetchone()
+        return {'entries': entries, 'size_bytes': size, 'counters': counters}
+
+
+_extraction_cache: Optional[ExtractionCache] = None
+
+
+def get_extraction_cache() -> Optional[ExtractionCache]:
+    """Shared cache instance, None when the cache is disabled or cannot be opened"""
+    global _extraction_cache
+    if not CACHE_ENABLED:
+        return None
+    if _extraction_cache is None:
+        try:
+            _extraction_cache = ExtractionCache()
+        except Exception as e:
+            log_message(f"Extraction cache unavailable, continuing without it: {e}", error_logger=True)
+            return None
+    return _extraction_cache
+
+
+def cache_get(kind: str, cache_key: str) -> Optional[Any]:
+    """Lookup that never raises, cache errors count as a miss"""
+    cache = get_extraction_cache()
+    if cache is None:
+        return None
+    try:
+        return cache.get(kind, cache_key)
+    except Exception as e:
+        log_message(f"Error reading {kind} from extraction cache: {e}", error_logger=True)
+        return None
+
+
+def cache_put(kind: str, cache_key: str, value: Any) -> None:
+    """Store that never raises"""
+    cache = get_extraction_cache()
+    if cache is None:
+        return
+    try:
+        cache.put(kind, cache_key, value)
+    except Exception as e:
+        log_message(f"Error writing {kind} to extraction cache: {e}", error_logger=True)
@@ -5,7 +5,7 @@ Language Detection Module
 Detects the language of text in images/PDFs before OCR processing.
 """
 import tempfile
-from typing import List
+from typing import List, Optional, Tuple
 import time
 # from langdetect import detect, LangDetectException
 from fast_langdetect import detect
@@ -16,6 +16,8 @@ from invoice_verification.Parameters.utils import remove_page_markers
 from invoice_verification.invoice_extraction.ocr.helper import adapt_paddle_result, merge_text_with_spaces
 from invoice_verification.Parameters.utils import remove_page_markers
 from invoice_verification.invoice_extraction.paddle_models import chinese_model
+from invoice_verification.invoice_extraction.helper import get_ocr_model_for_language
+import numpy as np
 import os
 import pdfplumber
 
@@ -335,199 +337,91 @@ def detect_language_from_text(text: str) -> str:
         log_message(f"Language detection error: {str(e)}")
         return DEFAULT_LANGUAGE
 
-# update the code to handle multi page PDFs by extracting text from the first page, and use pdf2image to convert to image for OCR
-def perform_initial_ocr(image_path: str) -> str:
+# Single pass detection: first page rendered at low DPI is enough to identify the script
+LANGUAGE_DETECTION_DPI = 100
+MIN_TEXT_LAYER_CHARS = 100
+MAX_TEXT_LAYER_PAGES = 2
+
+
+def _text_from_pdf_layer(pdf_path: str) -> str:
+    """Embedded text of the first pages of a PDF, empty for scanned PDFs"""
+    with pdfplumber.open(pdf_path) as pdf:
+        page_texts = [page.extract_text() or "" for page in pdf.pages[:MAX_TEXT_LAYER_PAGES]]
+    return " ".join(text.strip() for text in page_texts).strip()
+
+
+def _text_from_ocr_results(results) -> str:
+    if not results:
+        return ""
+    adapted_result = adapt_paddle_result(results)
+    merged_text = merge_text_with_spaces(adapted_result)
+    return " ".join(remove_page_markers(merged_text)).strip()
+
+
+def detect_language_single_pass(file_path: str) -> Tuple[str, Optional[list]]:
     """
-    Perform initial OCR with default language to get text for language detection
-    
+    Detect the OCR language with at most one cheap recognition pass.
+
+    PDFs with an embedded text layer are detected from that text without OCR,
+    scanned PDFs from the first page rendered at LANGUAGE_DETECTION_DPI. Image files
+    are scanned once with the default model, and that result is returned for reuse
+    when the detected language maps to the same model, so the full OCR pass is skipped.
+
     Args:
-        image_path (str): Path to the image file
-        
+        file_path (str): Path to the PDF or image file
+
     Returns:
-        str: Extracted text for language detection
+        Tuple of (PaddleOCR language code, reusable OCR results or None)
     """
-    log_message("LANGUAGE DETECTION: Performing initial OCR scan for language detection...")
-    log_message(f"Performing initial OCR on {image_path} for language detection")
-    
+    log_message(f"LANGUAGE DETECTION: Starting single pass language detection for {file_path}")
+    if not os.path.exists(file_path):
+        log_message(f"Image file not found: {file_path}")
+        return DEFAULT_LANGUAGE, None
+
     try:
-        # Initialize PaddleOCR with minimal settings for quick processing
-        log_message("LANGUAGE DETECTION: Initializing PaddleOCR with Chinese as default language...")
-        
-        # Check if its ending with .pdf
-        if image_path.lower().endswith('.pdf'):
-            
-            with pdfplumber.open(image_path) as pdf:
-                no_of_pages = len(pdf.pages)
-                log_message(f"LANGUAGE DETECTION: PDF has {no_of_pages} pages")
-
-                extracted_text = ""
-                MIN_TEXT_THRESHOLD = 100
-
-                # Loop through pages to extract sufficient text
-
-                from pdf2image import convert_from_path
-                max_pages_to_check = min(no_of_pages, 2)  # Check up to first 2 pages
-                images = convert_from_path(image_path, first_page=1, last_page=max_pages_to_check, dpi=200)
-
-                for page_num in range(no_of_pages):
-                    # page = pdf.pages[page_num]
-                    # page_text = page.extract_text()
-
-                    # if page_text:
-                    #     extracted_text += " " + page_text.strip()
-                    #     log_message(f"LANGUAGE DETECTION: Extracted text from page {page_num + 1}")
-
-                    # # Check if we have enough text (excluding spaces)
-                    # if len(extracted_text.replace(" ", "")) >= MIN_TEXT_THRESHOLD:
-                    #     log_message(f"LANGUAGE DETECTION: Sufficient text extracted from {page_num + 1} page(s)")
-                    #     log_message(f"Extracted text length: {extracted_text.strip()}")
-                    #     return extracted_text.strip()
-
-                # If text extraction from all pages didn't meet threshold, try OCR on first page
-                    if len(extracted_text.replace(" ", "")) < MIN_TEXT_THRESHOLD:
-                        log_message("LANGUAGE DETECTION: Insufficient text from PDF pages, proceeding with OCR on first page image")
-
-                        if not images:
-                            log_message("Failed to convert first page of PDF to image for OCR")
-                            return ""
-                        
-                        # Save the first page image to a temporary file
-                        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_image_file:
-                            temp_image_path = temp_image_file.name
-                            images[page_num].save(temp_image_path, 'PNG')
-                            log_message(f"LANGUAGE DETECTION: Converted {page_num + 1} page of PDF to image for OCR, {temp_image_path}")
-                        
-                        # Perform OCR
-                        log_message("LANGUAGE DETECTION: Running initial OCR scan...")
-                        start_time = time.time()
-
-                        results = chinese_model.predict(
-                                temp_image_path,
-                                text_det_limit_side_len=960,
-                                text_det_limit_type='max',
-                                text_det_thresh=0.2,
-                                text_det_box_thresh=0.45,
-                                text_det_unclip_ratio=1.6,
-                                text_rec_score_thresh=0.3
-                            )
-                        processing_time = time.time() - start_time
-                        log_message(f"LANGUAGE DETECTION: Initial OCR completed in {processing_time:.2f} seconds")
-                        
-                        # Clean up temporary image file
-                        try:
-                            os.remove(temp_image_path)
-                        except Exception as e:
-                            pass
-
-                        extracted = ""
-                        if results and len(results) > 0:
-                            adapted_result = adapt_paddle_result(results)
-                            merged_text = merge_text_with_spaces(adapted_result)
-                            extracted = remove_page_markers(merged_text)
-                            log_message("OCR Result:\n" + "\n".join(extracted))
-
-                        # Extract text from results
-                        ocr_text = " ".join(extracted) if results and len(results) > 0 else ""
-                        
-                        # Check if OCR text meets threshold
-                        if len(ocr_text.replace(" ", "")) >= MIN_TEXT_THRESHOLD:
-                            return ocr_text.strip()
-                        
-                        # If still not enough text, return empty string
-                        log_message(f"LANGUAGE DETECTION: Text length ({len(ocr_text.replace(' ', ''))}) below threshold ({MIN_TEXT_THRESHOLD}), returning empty")
-                        continue
-
-                return extracted_text.strip()
+        start_time = time.time()
+        if file_path.lower().endswith('.pdf'):
+            text_layer = _text_from_pdf_layer(file_path)
+            if len(text_layer.replace(" ", "")) >= MIN_TEXT_LAYER_CHARS:
+                log_message("LANGUAGE DETECTION: Using embedded PDF text layer, no OCR needed")
+                return detect_language_from_text(text_layer), None
+
+            from pdf2image import convert_from_path
+            images = convert_from_path(file_path, first_page=1, last_page=1, dpi=LANGUAGE_DETECTION_DPI)
+            if not images:
+                log_message("Failed to convert first page of PDF to image for OCR")
+                return DEFAULT_LANGUAGE, None
+            results = chinese_model.predict(np.array(images[0]),
+                                            text_det_limit_side_len=960,
+                                            text_det_limit_type='max',
+                                            text_det_thresh=0.2,
+                                            text_det_box_thresh=0.45,
+                                            text_det_unclip_ratio=1.6,
+                                            text_rec_score_thresh=0.3
+                                        )
+            reusable_results = None
         else:
-            # For non-PDF files, perform OCR directly
-            log_message("LANGUAGE DETECTION: Running initial OCR scan on image file...")
-            start_time = time.time()
-
-            results = chinese_model.predict(
-                        image_path,
-                        text_det_limit_side_len=960,
-                        text_det_limit_type='max',
-                        text_det_thresh=0.2,
-                        text_det_box_thresh=0.45,
-                        text_det_unclip_ratio=1.6,
-                        text_rec_score_thresh=0.3
-                    )
-            processing_time = time.time() - start_time
-            log_message(f"LANGUAGE DETECTION: Initial OCR completed in {processing_time:.2f} seconds")
-            log_message(f"Initial OCR completed in {processing_time:.2f} seconds")
-        
-            extracted = ""
-            if results and len(results) > 0:
-                adapted_result = adapt_paddle_result(results)
-                merged_text = merge_text_with_spaces(adapted_result)
-                extracted = remove_page_markers(merged_text)
-                log_message("OCR Result:\n" + "\n".join(extracted))
-
-            # Extract text from results
-            extracted_text = " ".join(extracted) if results and len(results) > 0 else ""
-            text_count = len(extracted_text) if results and len(results) > 0 else 0
-        # text_count = 0
-        # if results:
-        #     for sublist in results:
-        #         if not sublist:
-        #             continue
-        #         for item in sublist:
-        #             text = item[1][0]  # Text content
-        #             # confidence = item[1][1]  # Confidence score
-        #             extracted_text += text + " "
-        #             text_count += 1
-
-        log_message(f"LANGUAGE DETECTION: OCR extracted {extracted_text.strip()}")
-        
-        log_message(f"LANGUAGE DETECTION: Extracted {text_count} text segments from image")
-        if text_count == 0:
-            log_message("LANGUAGE DETECTION: No text was extracted from the image!")
-        
-        return extracted_text.strip()
-    
+            # Same input and parameters as the full pass, so the result is reusable
+            results = chinese_model.predict(file_path,
+                                            text_det_limit_side_len=960,
+                                            text_det_limit_type='max',
+                                            text_det_thresh=0.2,
+                                            text_det_box_thresh=0.45,
+                                            text_det_unclip_ratio=1.6,
+                                            text_rec_score_thresh=0.3
+                                        )
+            reusable_results = results
+        log_message(f"LANGUAGE DETECTION: Initial OCR completed in {time.time() - start_time:.2f} seconds")
+
+        detected_lang = detect_language_from_text(_text_from_ocr_results(results))
+        if reusable_results is not None and get_ocr_model_for_language(detected_lang) is not chinese_model:
+            reusable_results = None
+        return detected_lang, reusable_results
+
     except Exception as e:
-        log_message(f"ERROR in initial OCR for file {image_path}: {str(e)},",error_logger=True)
-        import traceback
-        log_message(traceback.format_exc(), error_logger=True)
-        return ""
+        log_message(f"ERROR in language detection for file {file_path}: {str(e)}", error_logger=True)
+        return DEFAULT_LANGUAGE, None
 
-def detect_language_from_image(image_path: str) -> str:
-    """
-    Detect language from an image by performing initial OCR and analyzing text
-    
-    Args:
-        image_path (str): Path to the image file
-        
-    Returns:
-        str: Detected language code for PaddleOCR
-    """
-    log_message("\n" + "=" * 50)
-    log_message(f"LANGUAGE DETECTION: Starting language detection for {image_path}")
-    log_message("=" * 50)
-    
-    # Check if file exists
-    if not os.path.exists(image_path):
-        log_message(f"ERROR: Image file not found: {image_path}")
-        log_message(f"Image file not found: {image_path}")
-        return DEFAULT_LANGUAGE
-    
-    # Perform initial OCR to get text
-    log_message("LANGUAGE DETECTION: Performing initial OCR scan...")
-    extracted_text = perform_initial_ocr(image_path)
-    
-    if not extracted_text:
-        log_message(f"WARNING: No text extracted from {image_path}, using default language: {DEFAULT_LANGUAGE}")
-        log_message(f"No text extracted from {image_path}, using default language")
-        return DEFAULT_LANGUAGE
-    
-    log_message(f"LANGUAGE DETECTION: Extracted text sample: '{extracted_text[:100]}...'" if len(extracted_text) > 100 else f"LANGUAGE DETECTION: Extracted text: '{extracted_text}'")
-    
-    # Detect language from extracted text
-    detected_lang = detect_language_from_text(extracted_text)
-    log_message(f"LANGUAGE DETECTION: Detected language: {detected_lang}")
-    log_message("=" * 50 + "\n")
-    
-    return detected_lang
 
 def detect_language_from_sample(sample_text: List[str]) -> str:
     """
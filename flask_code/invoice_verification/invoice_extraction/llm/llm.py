@@ -3,6 +3,7 @@ from invoice_verification.invoice_extraction.llm.utils import extract_invoice_cu
     , swap_vendor_bill_to_details_if_needed
 from invoice_verification.Schemas.sap_row import SAPRow
 from invoice_verification.logger.logger import log_message
+from invoice_verification.invoice_extraction.cache import cache_get, cache_put, content_sha256, LLM_CACHE_VERSION
 import time
 import requests
 import json
@@ -291,6 +292,13 @@ class LlamaAPI():
             payload = self._prepare_payload(text_lines=filtered_lines)
             log_message(f"No of lines sent to Llama API: {len(filtered_lines)}")
 
+            # Keyed on the whole request (lines and filename), an identical request gives an identical response
+            cache_key = f"{content_sha256(payload)}|{LLM_CACHE_VERSION}|{self.API_ENDPOINT}"
+            cached = cache_get("llm", cache_key)
+            if cached is not None:
+                log_message(f"Llama API cache hit for account_document: {self.account_document}")
+                return cached["invoice_data"], cached["raw_response"]
+
             for line in filtered_lines:
                 log_message(f"{line}")
             # Log request info
@@ -323,6 +331,8 @@ class LlamaAPI():
             execution_time = time.time() - start_time
             log_message(f"API call successful in {execution_time:.2f}s")
             log_message(f"json response from llama: {json_response}")
+            cache_put("llm", cache_key, {"invoice_data": json_response['invoice_data'],
+                                         "raw_response": json_response['raw_response']})
             return json_response['invoice_data'], json_response['raw_response']
             
         except (ValueError, TypeError):
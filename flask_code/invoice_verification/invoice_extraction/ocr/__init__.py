@@ -1,11 +1,12 @@
 from invoice_verification.invoice_extraction.ocr.ocr import extract_text_lines_from_image_using_ocr
 from invoice_verification.logger.logger import log_message
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
 
 def ocr_extractor(file_path: str,
                 detect_lang: str,
                 return_checkbox_radio_mappings: bool,
-                vendor_code: str
+                vendor_code: str,
+                initial_results: Optional[List] = None
                 ) -> Tuple[List, Dict]:
     """
     This function calls the PaddleOCR
@@ -19,6 +20,7 @@ def ocr_extractor(file_path: str,
     ocr_result, checkbox_radiobutton_mappings = extract_text_lines_from_image_using_ocr(file_path=file_path,
                                                                detect_lang=detect_lang,
                                                                return_checkbox_radio_mappings=return_checkbox_radio_mappings,
-                                                               vendor_code=vendor_code)
+                                                               vendor_code=vendor_code,
+                                                               initial_results=initial_results)
 
     return ocr_result, checkbox_radiobutton_mappings
\ No newline at end of file
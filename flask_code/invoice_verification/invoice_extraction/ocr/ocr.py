@@ -5,7 +5,7 @@ from invoice_verification.logger.logger import log_message
 from invoice_verification.Parameters.constants import CITI_BANK_VENDOR_CODES
 from invoice_verification.invoice_extraction.paddle_models import chinese_model
 from invoice_verification.invoice_extraction.helper import get_ocr_model_for_language
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional
 from datetime import datetime
 import numpy as np
 
@@ -22,13 +22,16 @@ MAX_PAGES_TO_PROCESS_FOR_LARGE_PDF = 3
 def extract_text_lines_from_image_using_ocr(file_path:str,
                                             detect_lang: str,
                                             return_checkbox_radio_mappings: bool,
-                                            vendor_code: str
+                                            vendor_code: str,
+                                            initial_results: Optional[List] = None
                                             ) -> Tuple[List, Dict]:
     """
     Extract text lines from invoice copy from image using  PADDLE OCR.
 
     Args:
         image_path (_type_): Path of the image file.
+        initial_results: Results of the language detection pass, reused for image files
+            when that pass already ran the model selected for detect_lang.
         
     Returns:
         list: List of extracted text lines.
@@ -44,7 +47,10 @@ def extract_text_lines_from_image_using_ocr(file_path:str,
         results = []  
 
         # Check if file is a PDF first!
-        if not file_path.lower().endswith('.pdf'):
+        if not file_path.lower().endswith('.pdf') and initial_results is not None:
+            log_message(f"Image file detected, reusing OCR results from language detection pass")
+            results = initial_results
+        elif not file_path.lower().endswith('.pdf'):
             # Not a PDF - process as image normally
             log_message(f"Image file detected, processing normally")
             results = ocr.predict(file_path,
@@ -0,0 +1,110 @@
+"""
+Concurrent scheduler for the pipeline_run queue.
+
+Each call of schedule_pending_runs reclaims runs of crashed workers, then atomically
+claims as many PENDING runs as the free slots and quotas allow and starts every
+claimed run in its own process. While a run executes, a heartbeat thread in its
+process refreshes pipeline_run.heartbeat_at; a run whose heartbeat stops for
+PIPELINE_HEARTBEAT_TIMEOUT seconds is requeued (or failed after PIPELINE_MAX_ATTEMPTS).
+
+Quotas (env):
+- PIPELINE_MAX_CONCURRENT            : RUNNING pipelines overall
+- PIPELINE_MAX_CONCURRENT_PER_CLIENT : RUNNING pipelines per client_id, defaults to PIPELINE_MAX_CONCURRENT.
+                                       Every run of a deployment is enqueued with its CLIENT_ID, so a lower
+                                       value caps the whole deployment; it only separates clients when
+                                       several deployments share the pipeline_run table
+- PIPELINE_TYPE_QUOTAS               : per pipeline type, e.g. "AP:1,ZBLOCK:2"
+Runs are claimed by priority (lower first, interactive runs enqueue with a low value), then FIFO.
+
+The scheduler columns of pipeline_run are added once with pipeline_scheduler_setup.py.
+"""
+
+import os
+import socket
+import threading
+import traceback
+from multiprocessing import Process
+from code1 import src_load
+from code1.logger import logger as root_logger
+
+MAX_CONCURRENT_PIPELINES = int(os.getenv("PIPELINE_MAX_CONCURRENT", "2"))
+MAX_CONCURRENT_PER_CLIENT = int(os.getenv("PIPELINE_MAX_CONCURRENT_PER_CLIENT", str(MAX_CONCURRENT_PIPELINES)))
+HEARTBEAT_SECONDS = int(os.getenv("PIPELINE_HEARTBEAT_SECONDS", "30"))
+HEARTBEAT_TIMEOUT_SECONDS = int(os.getenv("PIPELINE_HEARTBEAT_TIMEOUT", "300"))
+MAX_ATTEMPTS = int(os.getenv("PIPELINE_MAX_ATTEMPTS", "2"))
+
+
+def parse_pipeline_quotas(value: str) -> dict:
+    """'AP:1,ZBLOCK:2' -> {'AP': 1, 'ZBLOCK': 2}"""
+    quotas = {}
+    for item in (value or "").split(','):
+        if ':' in item:
+            pipeline, limit = item.split(':', 1)
+            quotas[pipeline.strip().upper()] = int(limit)
+    return quotas
+
+
+PIPELINE_TYPE_QUOTAS = parse_pipeline_quotas(os.getenv("PIPELINE_TYPE_QUOTAS", ""))
+
+
+def get_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _heartbeat_loop(run_id, worker_id, stop_event: threading.Event):
+    while not stop_event.wait(HEARTBEAT_SECONDS):
+        if not src_load.update_pipeline_run_heartbeat(run_id, worker_id):
+            root_logger.warning(f"[Scheduler] Heartbeat for run_id={run_id} was not recorded")
+
+
+def run_with_heartbeat(run_id, worker_id, target, *args):
+    """
+    Execute target(*args) while sending heartbeats for run_id. A run still RUNNING
+    when target returns (pipeline crashed before setting a final status) is marked FAILED.
+    """
+    stop_event = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat_loop, args=(run_id, worker_id, stop_event), daemon=True)
+    heartbeat.start()
+    try:
+        target(*args)
+    except Exception as e:
+        root_logger.error(f"[Scheduler] Pipeline run_id={run_id} raised: {str(e)}")
+        root_logger.error(traceback.format_exc())
+    finally:
+        stop_event.set()
+        heartbeat.join()
+        if src_load.fail_pipeline_run_if_running(run_id, worker_id, "Pipeline finished without a final status"):
+            root_logger.error(f"[Scheduler] Pipeline run_id={run_id} ended without a final status, marked FAILED")
+
+
+def schedule_pending_runs(target, run_date_lookup=None) -> dict:
+    """
+    Reclaim stale runs, claim pending runs within the quotas and start each in a process.
+
+    Args:
+        target: fn(run_id, batch_id, pipeline, run_timestamp_str) executing one pipeline run
+        run_date_lookup: fn(run_id) -> scheduled run datetime, defaults to src_load.get_run_date_for_pipeline_run
+    Returns:
+        dict with keys: reclaimed (int), started (list of claimed run dicts)
+    """
+    run_date_lookup = run_date_lookup or src_load.get_run_date_for_pipeline_run
+
+    reclaimed = src_load.reclaim_stale_pipeline_runs(HEARTBEAT_TIMEOUT_SECONDS, MAX_ATTEMPTS)
+    if reclaimed:
+        root_logger.info(f"[Scheduler] Reclaimed {reclaimed} pipeline runs without heartbeat")
+
+    worker_id = get_worker_id()
+    claimed_runs = src_load.claim_pending_pipeline_runs(worker_id=worker_id,
+                                                        max_concurrent=MAX_CONCURRENT_PIPELINES,
+                                                        max_per_client=MAX_CONCURRENT_PER_CLIENT,
+                                                        max_per_pipeline=PIPELINE_TYPE_QUOTAS)
+    for run in claimed_runs:
+        run_date = run_date_lookup(run['run_id'])
+        run['run_timestamp'] = run_date.strftime("%Y_%m_%d_%H_%M") if run_date else None
+        root_logger.info(f"[Scheduler] Starting {run['pipeline']} pipeline: run_id={run['run_id']}, "
+                         f"batch_id={run['batch_id']}, client_id={run['client_id']}, run_timestamp={run['run_timestamp']}")
+        process = Process(target=run_with_heartbeat,
+                          args=(run['run_id'], worker_id, target,
+                                run['run_id'], run['batch_id'], run['pipeline'], run['run_timestamp']))
+        process.start()
+    return {'reclaimed': reclaimed, 'started': claimed_runs}
@@ -0,0 +1,56 @@
+"""
+One-off setup of the pipeline_run table for the concurrent pipeline scheduler.
+
+Adds the scheduler columns (client_id, priority, worker_id, heartbeat_at, attempts)
+and the queue index when they are missing. Run once per database before starting
+the scheduler, re-running it is a no-op:
+
+    python pipeline_scheduler_setup.py
+"""
+
+from code1.src_load import connect_to_database
+
+PIPELINE_RUN_SCHEDULER_COLUMNS = {
+    'client_id': "INT NULL",
+    'priority': "INT NOT NULL DEFAULT 100",
+    'worker_id': "VARCHAR(100) NULL",
+    'heartbeat_at': "DATETIME NULL",
+    'attempts': "INT NOT NULL DEFAULT 0",
+}
+QUEUE_INDEX = 'idx_pipeline_run_queue'
+
+
+def setup_pipeline_run_scheduler_columns() -> list:
+    """
+    Add the missing scheduler columns and the queue index to pipeline_run.
+
+    Returns:
+        list of the DDL statements executed
+    """
+    executed = []
+    with connect_to_database() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute("""SELECT COLUMN_NAME FROM information_schema.COLUMNS
+                              WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'pipeline_run';""")
+            existing_columns = {row[0].lower() for row in cursor.fetchall()}
+            for column, definition in PIPELINE_RUN_SCHEDULER_COLUMNS.items():
+                if column not in existing_columns:
+                    executed.append(f"ALTER TABLE pipeline_run ADD COLUMN {column} {definition};")
+
+            cursor.execute("""SELECT COUNT(*) FROM information_schema.STATISTICS
+                              WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'pipeline_run'
+                              AND INDEX_NAME = %s;""", (QUEUE_INDEX,))
+            if cursor.fetchone()[0] == 0:
+                executed.append(f"CREATE INDEX {QUEUE_INDEX} ON pipeline_run (status, priority, created_at);")
+
+            for statement in executed:
+                cursor.execute(statement)
+            connection.commit()
+    return executed
+
+
+if __name__ == "__main__":
+    statements = setup_pipeline_run_scheduler_columns()
+    for statement in statements:
+        print(statement)
+    print(f"pipeline_run scheduler setup complete ({len(statements)} change(s))")
@@ -0,0 +1,245 @@
+"""
+In-process stage runner for the end to end pipelines (AP / ZBLOCK).
+
+The stages of a pipeline are declared with their dependencies and executed in the
+calling process. Route stages dispatch the existing Flask endpoints directly through
+the app (own app context, before/after request hooks and error handlers included)
+instead of an HTTP request back to the same server, so a stage does not hold a
+second WSGI worker, has no request timeout and its result is handed over by reference.
+
+Every completed stage can be checkpointed to the local disk (DataFrames and Arrow
+tables as parquet, other results as JSON). A rerun of the same pipeline and batch
+resumes after the last completed stage. Per stage wall time and memory are recorded.
+"""
+
+import os
+import json
+import time
+import shutil
+import resource
+from datetime import datetime, timezone
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import requests
+from code1.logger import logger as root_logger
+
+# Dispatch route stages inside this process, set false to call them over HTTP on APP_URL
+STAGES_IN_PROCESS = os.getenv("PIPELINE_STAGES_IN_PROCESS", "true").lower() == "true"
+CHECKPOINTS_ENABLED = os.getenv("PIPELINE_CHECKPOINTS", "false").lower() == "true"
+CHECKPOINT_FOLDER = os.getenv("PIPELINE_CHECKPOINT_FOLDER",
+                              os.path.join(os.getenv("UPLOADS", ""), "pipeline_checkpoints"))
+
+
+def _rss_mb() -> float:
+    """Current resident memory of this process in MB"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return _peak_rss_mb()
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class StageResponse:
+    """
+    Response of a route stage with the part of the requests.Response interface
+    the pipelines use (status_code, text, json(), truthy when status_code < 400).
+    """
+
+    def __init__(self, status_code: int, text: str):
+        self.status_code = status_code
+        self.text = text
+
+    @classmethod
+    def from_flask_response(cls, response):
+        return cls(response.status_code, response.get_data(as_text=True))
+
+    @classmethod
+    def from_requests_response(cls, response):
+        return cls(response.status_code, response.text)
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def __bool__(self):
+        return self.ok
+
+    def json(self):
+        return json.loads(self.text)
+
+    def __repr__(self):
+        return f"<StageResponse [{self.status_code}]>"
+
+
+class Stage:
+    """
+    One pipeline stage.
+
+    Args:
+        name (str): Unique stage name
+        run (callable): fn(inputs) -> output, inputs is a dict of the outputs of depends_on
+        depends_on (list): Names of the stages that must have completed successfully first
+    """
+
+    def __init__(self, name: str, run, depends_on=()):
+        self.name = name
+        self.run = run
+        self.depends_on = list(depends_on)
+
+
+def route_stage(app, name: str, path: str, method: str = 'GET', payload=None, depends_on=()) -> Stage:
+    """Stage that executes the Flask endpoint at path and returns a StageResponse"""
+    def run(inputs):
+        if not STAGES_IN_PROCESS:
+            response = requests.request(method, f"{os.getenv('APP_URL')}{path}", json=payload, verify=False)
+            return StageResponse.from_requests_response(response)
+        # Fresh app context so the stage gets its own g, as it would in a separate request
+        with app.app_context(), app.test_request_context(path, method=method, json=payload):
+            response = app.full_dispatch_request()
+            return StageResponse.from_flask_response(response)
+    return Stage(name, run, depends_on)
+
+
+def _is_success(output) -> bool:
+    if isinstance(output, StageResponse):
+        return output.ok
+    return output is not None
+
+
+class StageRunner:
+    """
+    Runs the stages of one pipeline run in dependency order.
+
+    Stages are started with run_stage (so the caller can act on each result) or all
+    at once with run. A stage only starts when all its dependencies succeeded.
+    """
+
+    def __init__(self, pipeline: str, batch_id, stages: list, checkpoints: bool = CHECKPOINTS_ENABLED,
+                 checkpoint_folder: str = CHECKPOINT_FOLDER):
+        self.pipeline = pipeline
+        self.batch_id = batch_id
+        self.stages = {stage.name: stage for stage in stages}
+        self.order = self._topological_order()
+        self.outputs = {}
+        self.metrics = {}
+        self.checkpoints = checkpoints
+        self.checkpoint_path = os.path.join(checkpoint_folder, f"{str(pipeline).lower()}_{batch_id}")
+
+    def _topological_order(self) -> list:
+        order, visiting, done = [], set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Cycle in pipeline stages at {name}")
+            if name not in self.stages:
+                raise ValueError(f"Unknown stage dependency {name}")
+            visiting.add(name)
+            for dependency in self.stages[name].depends_on:
+                visit(dependency)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def run_stage(self, name: str):
+        """
+        Run one stage, or return its checkpointed output when a previous run completed it.
+        Raises:
+            RuntimeError: a dependency has not completed successfully
+        """
+        stage = self.stages[name]
+        for dependency in stage.depends_on:
+            if not _is_success(self.outputs.get(dependency)):
+                raise RuntimeError(f"Stage {name} of {self.pipeline} pipeline needs {dependency} to complete first")
+
+        output = self._load_checkpoint(name)
+        if output is not None:
+            root_logger.info(f"{self.pipeline} Pipeline - Stage {name} resumed from checkpoint for Batch ID {self.batch_id}")
+            self.outputs[name] = output
+            self.metrics[name] = {'resumed': True}
+            return output
+
+        inputs = {dependency: self.outputs[dependency] for dependency in stage.depends_on}
+        rss_before = _rss_mb()
+        start_time = time.perf_counter()
+        try:
+            output = stage.run(inputs)
+        finally:
+            self.metrics[name] = {
+                'duration_seconds': round(time.perf_counter() - start_time, 3),
+                'rss_before_mb': round(rss_before, 1),
+                'rss_after_mb': round(_rss_mb(), 1),
+                'peak_rss_mb': round(_peak_rss_mb(), 1),
+                'resumed': False,
+            }
+            root_logger.info(f"{self.pipeline} Pipeline - Stage {name} metrics for Batch ID {self.batch_id}: {self.metrics[name]}")
+
+        self.outputs[name] = output
+        if _is_success(output):
+            self._save_checkpoint(name, output)
+        return output
+
+    def run(self) -> dict:
+        """Run all stages in dependency order, stops at the first failing stage"""
+        for name in self.order:
+            if not _is_success(self.run_stage(name)):
+                break
+        return self.outputs
+
+    def complete(self):
+        """Drop the checkpoints once the whole pipeline run succeeded"""
+        if self.checkpoints and os.path.exists(self.checkpoint_path):
+            shutil.rmtree(self.checkpoint_path, ignore_errors=True)
+
+    # Checkpoints
+    def _save_checkpoint(self, name: str, output):
+        if not self.checkpoints:
+            return
+        try:
+            os.makedirs(self.checkpoint_path, exist_ok=True)
+            meta = {'stage': name, 'completed_at': datetime.now(timezone.utc).isoformat()}
+            if isinstance(output, pd.DataFrame):
+                output.to_parquet(os.path.join(self.checkpoint_path, f"{name}.parquet"))
+                meta['kind'] = 'dataframe'
+            elif isinstance(output, pa.Table):
+                pq.write_table(output, os.path.join(self.checkpoint_path, f"{name}.parquet"))
+                meta['kind'] = 'arrow'
+            elif isinstance(output, StageResponse):
+                meta.update(kind='response', status_code=output.status_code, text=output.text)
+            else:
+                meta.update(kind='json', value=output)
+            tmp_path = os.path.join(self.checkpoint_path, f"{name}.json.tmp")
+            with open(tmp_path, 'w') as meta_file:
+                json.dump(meta, meta_file)
+            os.replace(tmp_path, os.path.join(self.checkpoint_path, f"{name}.json"))
+        except (OSError, TypeError, ValueError) as e:
+            root_logger.error(f"{self.pipeline} Pipeline - Could not checkpoint stage {name}: {e}")
+
+    def _load_checkpoint(self, name: str):
+        meta_path = os.path.join(self.checkpoint_path, f"{name}.json")
+        if not self.checkpoints or not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path) as meta_file:
+                meta = json.load(meta_file)
+            if meta['kind'] == 'dataframe':
+                return pd.read_parquet(os.path.join(self.checkpoint_path, f"{name}.parquet"))
+            if meta['kind'] == 'arrow':
+                return pq.read_table(os.path.join(self.checkpoint_path, f"{name}.parquet"))
+            if meta['kind'] == 'response':
+                return StageResponse(meta['status_code'], meta['text'])
+            return meta['value']
+        except (OSError, ValueError, KeyError) as e:
+            root_logger.error(f"{self.pipeline} Pipeline - Ignoring unreadable checkpoint of stage {name}: {e}")
+            return None
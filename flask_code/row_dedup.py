@@ -0,0 +1,108 @@
+"""
+Key based row deduplication shared by the ingestion paths.
+
+The key columns of both frames are hashed column-wise to 64-bit values
+(pd.util.hash_pandas_object), the frames are anti-joined on the hashes and every
+hash match is confirmed by comparing the key values themselves, so a hash
+collision can never drop a row. Missing key values compare equal to each other.
+
+Use it after aligning the key column dtypes of both frames: the comparison is
+exact, 1 and '1' are different keys. Numbers compare by value as in Python, also
+inside object columns (1, 1.0 and np.int64(1) are the same key).
+"""
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import infer_dtype, is_numeric_dtype
+
+_ROW = '__row_position'
+_HASH = '__key_hash'
+
+
+def hash_key_columns(df: pd.DataFrame, columns: list) -> np.ndarray:
+    """64-bit hash per row of the given columns"""
+    return pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+
+
+def _integral_number(value):
+    if isinstance(value, (bool, np.bool_, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _object_keys(values: pd.Series) -> pd.Series:
+    """
+    Object column whose integral numbers are Python ints. Object columns are hashed as
+    str(value), so 1.0 and 1 only hash equally once they are the same value.
+    """
+    values = values.astype(object)
+    if infer_dtype(values, skipna=True) in ('string', 'bytes', 'empty'):
+        return values
+    # Built as object explicitly, Series.map would turn integral values back into floats
+    return pd.Series([_integral_number(value) for value in values.to_numpy()], index=values.index, dtype=object)
+
+
+def _comparable_keys(left: pd.DataFrame, right: pd.DataFrame, columns: list) -> tuple:
+    """Key columns of both frames with equal dtypes, so equal keys hash equally"""
+    left_keys, right_keys = left[columns], right[columns]
+    for column in columns:
+        left_dtype, right_dtype = left_keys[column].dtype, right_keys[column].dtype
+        if left_dtype == right_dtype and left_dtype != object:
+            continue
+        if left_dtype != right_dtype and is_numeric_dtype(left_dtype) and is_numeric_dtype(right_dtype):
+            # 1 and 1.0 are the same key
+            left_keys = left_keys.assign(**{column: left_keys[column].astype('float64')})
+            right_keys = right_keys.assign(**{column: right_keys[column].astype('float64')})
+        else:
+            left_keys = left_keys.assign(**{column: _object_keys(left_keys[column])})
+            right_keys = right_keys.assign(**{column: _object_keys(right_keys[column])})
+    return left_keys, right_keys
+
+
+def _values_equal(left: pd.Series, right: pd.Series) -> np.ndarray:
+    equal = left.eq(right).to_numpy(dtype=bool, na_value=False)
+    return equal | (left.isna().to_numpy() & right.isna().to_numpy())
+
+
+def rows_in(left: pd.DataFrame, right: pd.DataFrame, columns: list) -> np.ndarray:
+    """
+    Boolean mask over the rows of left, True where the key of the row also occurs in right.
+
+    Args:
+        left (pd.DataFrame): Rows to test
+        right (pd.DataFrame): Rows to look the keys up in
+        columns (list): Key columns, present in both frames
+    Returns:
+        np.ndarray of bool with len(left) values
+    """
+    found = np.zeros(len(left), dtype=bool)
+    if len(left) == 0 or len(right) == 0:
+        return found
+    left, right = _comparable_keys(left, right, columns)
+    left_hash = hash_key_columns(left, columns)
+    right_hash = hash_key_columns(right, columns)
+
+    candidates = np.flatnonzero(np.isin(left_hash, right_hash))
+    if len(candidates) == 0:
+        return found
+
+    # Confirm the hash matches on the key values, against the distinct matching keys of right only
+    right_keys = right[np.isin(right_hash, left_hash[candidates])].drop_duplicates()
+    right_keys[_HASH] = hash_key_columns(right_keys, columns)
+    left_keys = left.iloc[candidates].reset_index(drop=True)
+    left_keys[_ROW] = candidates
+    left_keys[_HASH] = left_hash[candidates]
+
+    pairs = left_keys.merge(right_keys, on=_HASH, suffixes=('', '__right'))
+    equal = np.ones(len(pairs), dtype=bool)
+    for column in columns:
+        equal &= _values_equal(pairs[column], pairs[f"{column}__right"])
+    found[pairs[_ROW].to_numpy()[equal]] = True
+    return found
+
+
+def anti_join(left: pd.DataFrame, right: pd.DataFrame, columns: list) -> pd.DataFrame:
+    """Rows of left whose key does not occur in right"""
+    return left[~rows_in(left, right, columns)]
@@ -1,6 +1,7 @@
 import pandas as pd
 from typing import Optional
 from .t001_rename import T001_RENAME_MAP
+from ..dimension_lookup import lookup_join
 
 def merge_t001(invoice_df:pd.DataFrame,
                 t001:Optional[pd.DataFrame])-> pd.DataFrame:
@@ -68,7 +69,7 @@ def merge_t001(invoice_df:pd.DataFrame,
     else:
         logger.info("No duplicates found in T001 based on (Client, Company Code).")
     pre_merge_shape = invoice_df.shape
-    merged = pd.merge(invoice_df, t001, how='left', on=keys, suffixes=('_Invoice', '_T001'))
+    merged = lookup_join(invoice_df, t001, on=keys, suffixes=('_Invoice', '_T001'))
     post_merge_shape = merged.shape
     if pre_merge_shape[0] != post_merge_shape[0]:
         raise ValueError("Merge altered number of rows in invoice DataFrame, indicating a potential issue with join keys.")
@@ -1,7 +1,72 @@
 import pandas as pd
 import numpy as np
+from typing import Optional
+from pandas.api.types import is_numeric_dtype, is_bool_dtype
 
-def clean_amount_column(series: pd.Series) -> pd.Series:
+# A single separator followed by exactly three digits ("1,234", "12.500") reads as a
+# decimal in one convention and as thousands in the other
+_AMBIGUOUS_AMOUNT_PATTERN = r'^-?\d{1,3}[.,]\d{3}-?$'
+
+try:
+    import pyarrow  # noqa: F401
+    _STRING_DTYPE = 'string[pyarrow]'
+except ImportError:
+    _STRING_DTYPE = 'string'
+
+
+def _comma_is_last_separator(cleaned: pd.Series) -> pd.Series:
+    """True where a comma occurs after the last dot (the row rule for the European reading)"""
+    return cleaned.str.contains(r',[^.]*$', regex=True, na=False)
+
+
+def detect_amount_convention(cleaned: pd.Series) -> Optional[str]:
+    """
+    Detect the decimal convention of a whole amount column from its unambiguous values.
+
+    European ('EU'): dot as thousand separator, comma as decimal separator
+    US ('US')      : comma as thousand separator, dot as decimal separator
+
+    Evidence per value: both separators present (the last one is the decimal), one
+    separator followed by other than three digits (a decimal), or one separator
+    repeated (thousands).
+
+    Args:
+        cleaned (pd.Series): Amount strings, stripped
+    Returns:
+        'EU', 'US' or None when the column has no unambiguous value or mixes both
+    """
+    return _convention_from_votes(*_convention_evidence(cleaned))
+
+
+def _convention_from_votes(eu_votes: pd.Series, us_votes: pd.Series) -> Optional[str]:
+    eu_count, us_count = int(eu_votes.sum()), int(us_votes.sum())
+    if eu_count and not us_count:
+        return 'EU'
+    if us_count and not eu_count:
+        return 'US'
+    return None
+
+
+def _convention_evidence(cleaned: pd.Series):
+    """Per value: (evidence for EU, evidence for US)"""
+    dots = cleaned.str.count(r'\.')
+    commas = cleaned.str.count(',')
+    both = (dots > 0) & (commas > 0)
+    comma_last = _comma_is_last_separator(cleaned)
+    three_digits_after_last = cleaned.str.contains(r'[.,]\d{3}-?$', regex=True, na=False)
+    single_decimal = (dots + commas == 1) & ~three_digits_after_last
+
+    eu_votes = (both & comma_last) | \
+               (~both & (commas == 1) & single_decimal) | \
+               (~both & (dots > 1))
+    us_votes = (both & ~comma_last) | \
+               (~both & (dots == 1) & single_decimal) | \
+               (~both & (commas > 1))
+    return eu_votes.fillna(False).astype(bool), us_votes.fillna(False).astype(bool)
+
+
+def clean_amount_column(series: pd.Series, convention: Optional[str] = None,
+                        column_name: Optional[str] = None) -> pd.Series:
     """
     Cleans SAP-style amount fields:
     - Handles European format (dot as thousand separator, comma as decimal)
@@ -10,8 +75,16 @@ def clean_amount_column(series: pd.Series) -> pd.Series:
     - Removes leading '/' if present
     - Converts cleaned string to float
 
+    The convention is detected once for the whole column (see detect_amount_convention)
+    and applied with vectorized string operations. Values whose own separators
+    contradict it keep their own reading. When the column mixes or gives no evidence,
+    each value is read by its last separator (as before) and values like "1,234" that
+    are ambiguous are counted and logged instead of being silently guessed.
+
     Args:
         series (pd.Series): Raw amount column (string or mixed type).
+        convention (str): 'EU' or 'US' to skip the detection (e.g. known per file)
+        column_name (str): Column name used in log messages, defaults to series.name
 
     Returns:
         pd.Series: Cleaned numeric column (float64), NaN for invalid values.
@@ -26,61 +99,55 @@ def clean_amount_column(series: pd.Series) -> pd.Series:
         if not isinstance(series, pd.Series):
             raise TypeError("Input must be a pandas Series.")
 
-        # Convert all to string for uniform cleaning
-        cleaned = series.astype(str)
+        # Already numeric (e.g. cleaned in an earlier stage), nothing to parse
+        if is_numeric_dtype(series) and not is_bool_dtype(series):
+            return series.astype('float64')
+
+        # Amount columns repeat a lot of values, parse each distinct value once (missing values get code -1)
+        codes, uniques = pd.factorize(series)
+
+        # Convert all to string for uniform cleaning (arrow backed, vectorized string kernels)
+        values = pd.Series(uniques, dtype=object).astype(str).astype(_STRING_DTYPE)
 
         # Remove leading "/" (SAP export artifacts)
-        cleaned = cleaned.str.lstrip('/')
+        values = values.str.lstrip('/')
 
         # Strip spaces early
-        cleaned = cleaned.str.strip()
-
-        # Define function to detect and fix European format
-        def fix_european_format(val: str) -> str:
-            """
-            Detects European number format where:
-            - Dot (.) is thousand separator
-            - Comma (,) is decimal separator
-            
-            Detection: If comma appears after the last dot position-wise,
-            it's European format (e.g., "1.234,56" or "55.00,45")
-            """
-            if pd.isna(val) or val == '' or val == 'nan' or val == 'None':
-                return val
-            
-            last_dot = val.rfind('.')
-            last_comma = val.rfind(',')
-            
-            # European format: comma appears after dot (position-wise)
-            # Examples: "1.234,56", "55.00,45", "1.234.567,89"
-            if last_comma > last_dot and last_comma != -1:
-                # Remove all dots (thousand separators)
-                # Replace comma with dot (decimal separator)
-                val = val.replace('.', '').replace(',', '.')
-            # US format: dot appears after comma or no comma at all
-            # Examples: "1,234.56", "55,000.45"
-            elif last_dot > last_comma or (last_dot != -1 and last_comma == -1):
-                # Remove all commas (thousand separators)
-                val = val.replace(',', '')
-            # Only comma, no dot: could be European decimal
-            # Example: "1234,56"
-            elif last_comma != -1 and last_dot == -1:
-                val = val.replace(',', '.')
-            # Only dot, no comma: already correct
-            # Example: "1234.56"
-            else:
-                val = val.replace(',', '')
-            
-            return val
-
-        # Apply European format fix to each value
-        cleaned = cleaned.apply(fix_european_format)
+        values = values.str.strip()
+
+        # European reading: remove all dots (thousand separators), comma becomes the decimal separator
+        as_european = values.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+        # US reading: remove all commas (thousand separators)
+        as_us = values.str.replace(',', '', regex=False)
+        # Reading of each value on its own: comma after the last dot means European
+        by_value = as_european.where(_comma_is_last_separator(values), as_us)
+
+        eu_votes, us_votes = _convention_evidence(values)
+        if convention is None:
+            convention = _convention_from_votes(eu_votes, us_votes)
+        if convention in ('EU', 'US'):
+            contradicts = us_votes if convention == 'EU' else eu_votes
+            by_column = as_european if convention == 'EU' else as_us
+            values = by_column.where(~contradicts, by_value)
+        else:
+            ambiguous = values.str.match(_AMBIGUOUS_AMOUNT_PATTERN, na=False)
+            if ambiguous.any():
+                from .logger_config import get_logger
+                ambiguous_rows = int(ambiguous.to_numpy()[codes[codes >= 0]].sum())
+                get_logger().warning(
+                    f"Amount column {column_name or series.name or '<unnamed>'}: no consistent decimal convention, {ambiguous_rows} "
+                    f"ambiguous value(s) read by their last separator, e.g. {values[ambiguous].tolist()[:5]}"
+                )
+            values = by_value
 
         # Move trailing '-' to the front (e.g., "123.45-" → "-123.45")
-        cleaned = cleaned.str.replace(r'^([0-9.]+)-$', r'-\1', regex=True)
+        trailing_minus = values.str.contains(r'^[0-9.]+-$', regex=True, na=False)
+        values = values.where(~trailing_minus, '-' + values.str[:-1])
 
         # Convert to float, coercing invalid to NaN
-        cleaned = pd.to_numeric(cleaned, errors='coerce')
+        parsed = pd.to_numeric(values, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        parsed = np.append(parsed, np.nan)  # code -1 (missing) → NaN
+        cleaned = pd.Series(parsed[codes], index=series.index, name=series.name)
 
         return cleaned
     except Exception as e:
@@ -0,0 +1,90 @@
+"""
+Dimension Lookup
+Left join of the invoice data with a dimension table that has one row per join key
+(T001, T052U, T053S, T003, WTH and RETINV after their de-duplication), and keyed
+lookups of single columns (VIM comments).
+
+Instead of a pandas merge, both key sets are hashed into one integer key per row and
+each invoice row looks up the position of its dimension row in a flat array. The
+dimension columns are gathered by that position and attached to the invoice data
+without copying its existing columns. The result equals
+pd.merge(left, right, how='left', on=keys, suffixes=suffixes) for a right side with
+unique keys (missing keys match each other, unmatched rows get missing values).
+"""
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+
+def _joint_key_codes(left: pd.DataFrame, right: pd.DataFrame, left_keys: List[str],
+                     right_keys: List[str]) -> Tuple[np.ndarray, np.ndarray, int]:
+    """One integer code per row of left and right, equal codes for equal keys"""
+    combined = np.zeros(len(left) + len(right), dtype=np.int64)
+    group_count = 1
+    for left_key, right_key in zip(left_keys, right_keys):
+        values = pd.concat([left[left_key], right[right_key]], ignore_index=True)
+        key_codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        combined, combined_uniques = pd.factorize(combined * len(uniques) + key_codes)
+        group_count = len(combined_uniques)
+    return combined[:len(left)], combined[len(left):], group_count
+
+
+def lookup_indexer(left: pd.DataFrame, right: pd.DataFrame, keys: List[str],
+                   right_keys: Optional[List[str]] = None) -> np.ndarray:
+    """
+    Position of the matching right row for every left row, -1 where there is none.
+
+    Args:
+        keys: Key columns of left (and of right, unless right_keys is given)
+        right_keys: Key columns of right, in the order of keys
+    Raises:
+        ValueError: right has more than one row for a key
+    """
+    right_keys = keys if right_keys is None else right_keys
+    left_codes, right_codes, group_count = _joint_key_codes(left, right, keys, right_keys)
+    if len(np.unique(right_codes)) != len(right_codes):
+        raise ValueError(f"Dimension table is not unique on {right_keys}, de-duplicate it before the lookup.")
+    positions = np.full(group_count, -1, dtype=np.int64)
+    positions[right_codes] = np.arange(len(right_codes))
+    return positions[left_codes]
+
+
+def lookup_values(left: pd.DataFrame, right: pd.DataFrame, keys: List[str], right_keys: List[str],
+                  column: str) -> pd.Series:
+    """
+    Column of right for every row of left (indexed like left), missing where the key has no row.
+    Where right has several rows for a key, the last one is used (as a dict built from right would).
+    """
+    right = right.drop_duplicates(subset=right_keys, keep='last')
+    indexer = lookup_indexer(left, right, keys, right_keys)
+    values = right[column].reset_index(drop=True).reindex(indexer)
+    values.index = left.index
+    return values
+
+
+def lookup_join(left: pd.DataFrame, right: pd.DataFrame, on: List[str],
+                suffixes: Tuple[str, str] = ('_x', '_y')) -> pd.DataFrame:
+    """
+    Left join of left with a dimension table right that is unique on the keys.
+
+    Args:
+        left: Invoice level DataFrame
+        right: Dimension DataFrame, one row per key
+        on: Join key columns, present in both
+        suffixes: Suffixes for non-key columns present in both, as in pd.merge
+    Returns:
+        DataFrame with the rows of left (in order, RangeIndex) and the non-key columns of right
+    """
+    indexer = lookup_indexer(left, right, on)
+    value_columns = [column for column in right.columns if column not in on]
+    overlap = set(value_columns) & set(left.columns)
+
+    left_part = left.copy(deep=False)
+    left_part.columns = [f"{column}{suffixes[0]}" if column in overlap else column for column in left.columns]
+    left_part.index = pd.RangeIndex(len(left_part))
+
+    # Position -1 is not a row label, reindex fills it with missing values as the merge does
+    right_part = right[value_columns].reset_index(drop=True).reindex(indexer)
+    right_part.columns = [f"{column}{suffixes[1]}" if column in overlap else column for column in value_columns]
+    right_part.index = left_part.index
+    return pd.concat([left_part, right_part], axis=1, copy=False)
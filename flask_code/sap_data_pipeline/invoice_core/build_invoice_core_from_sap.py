@@ -10,6 +10,7 @@ from .bkpf_rename import BKPF_RENAME_MAP
 from .withhold_tax_rename import WITHHOLD_TAX_RENAME_MAP
 from .t003_rename import T003_RENAME_MAP
 from .udc_rename import UDC_RENAME_MAPPINGS
+from ..dimension_lookup import lookup_join
 region_lookup = {1:'NAA',2:'LAA',3:'APAC',4:'EMEA'}
 
 def merge_bseg_bkpf(bseg_file_df:Optional[pd.DataFrame], bkpf_file_df:Optional[pd.DataFrame]) -> pd.DataFrame:
@@ -221,7 +222,7 @@ def merge_with_item(df, with_item):
     logger.debug("Data types of join keys in main DF:")
     logger.debug(df[keys].dtypes)
 
-    merged = pd.merge(df, with_item, how='left', on=keys, suffixes=('', '_WITH'))
+    merged = lookup_join(df, with_item, on=keys, suffixes=('', '_WITH'))
     post_shape = merged.shape[0]
 
     
@@ -300,7 +301,7 @@ def merge_t003(df, t003):
     df['DOCUMENT_TYPE'] = df['DOCUMENT_TYPE'].astype(str).str.upper().str.strip()
 
     pre_shape = df.shape[0]
-    merged = pd.merge(df, t003, how='left', on=keys, suffixes=('', '_T003'))
+    merged = lookup_join(df, t003, on=keys, suffixes=('', '_T003'))
     post_shape = merged.shape[0]
     if pre_shape != post_shape:
         logger.warning(f"⚠️ Row count changed during T003 merge: before={pre_shape}, after={post_shape} — investigate possible data issues.") 
@@ -344,6 +345,19 @@ def create_vim_key_for_reference(row):
         return val1 + val2 + val3
 
 
+def create_vim_keys_for_reference(df: pd.DataFrame) -> pd.Series:
+    """
+    Column-wise create_vim_key_for_reference for all rows of df.
+
+    REFERENCE_KEY where REF_TRANSACTION == RMRP, else COMPANY_CODE + DOCUMENT_NUMBER + FISCAL_YEAR
+    (each as stripped text).
+    """
+    built_keys = (df['COMPANY_CODE'].astype(str).str.strip()
+                  + df['DOCUMENT_NUMBER'].astype(str).str.strip()
+                  + df['FISCAL_YEAR'].astype(str).str.strip()).astype(object)
+    return built_keys.where(df['REF_TRANSACTION'] != 'RMRP', df['REFERENCE_KEY'])
+
+
 def merge_retinv(df:pd.DataFrame, retinv:pd.DataFrame)->pd.DataFrame:
     """Merge with RETINV table."""
     logger = get_logger()
@@ -381,7 +395,7 @@ def merge_retinv(df:pd.DataFrame, retinv:pd.DataFrame)->pd.DataFrame:
     logger.info(f"RETINV shape after grouping: {retinv.shape}")
     
     logger.debug(df[keys].dtypes)
-    merged = pd.merge(df, retinv, how='left', on=keys, suffixes=('', '_RETINV'))
+    merged = lookup_join(df, retinv, on=keys, suffixes=('', '_RETINV'))
     post_shape = merged.shape[0]
     logger.info(f"RETINV merge complete. Shape: {merged.shape}")
     # Diagnostic: Check how many records matched
@@ -513,7 +527,7 @@ def build_invoice_core(bseg:Optional[pd.DataFrame],
 
     # add a new column called VIM_OBJECT_KEY, same key is used for UDC too....
 
-    df['VIM_OBJECT_KEY'] = df.apply(lambda row:create_vim_key_for_reference(row),axis=1)
+    df['VIM_OBJECT_KEY'] = create_vim_keys_for_reference(df)
 
     if with_item is not None:
         df = merge_with_item(df, with_item)
@@ -0,0 +1,327 @@
+"""
+Master Parquet Store
+Append-only, partitioned storage for the persistent SAP master tables.
+
+Layout per table (master_parquet/<TABLE>/):
+    _manifest.json                  : parts of the table with row counts and key ranges
+    parts/part-<seq>-<id>.parquet   : immutable part files
+
+An ingest writes its new unique rows as one new part and deduplicates only against
+the key columns of the parts whose key ranges overlap the new rows. Tables whose
+rows are replaced (LFBK, EKKO, ...) are rewritten as a single part. Once a table has
+more than MASTER_PARQUET_MAX_PARTS parts, the parts are compacted into one in a
+background thread. The manifest is replaced atomically, so readers always see a
+complete set of parts.
+
+Stores are written from several processes, so every read-modify-write of the manifest
+holds an exclusive flock on _manifest.lock in the table folder (plus a thread lock).
+Parts replaced by a rewrite or compaction are only listed as retired in the manifest and
+deleted by a later manifest update once MASTER_PARQUET_RETIRED_GRACE_SECONDS have passed,
+so a reader that listed them from the previous manifest can still finish reading them.
+
+A legacy single file (SAP_<TABLE>_data.parquet) is adopted as the first part on the
+first write; until then read_master_table reads the legacy file.
+"""
+import os
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pandas.api.types import is_numeric_dtype
+
+try:
+    import fcntl
+except ImportError:  # no flock on Windows, only the writers of this process are serialised
+    fcntl = None
+
+MAX_PARTS = int(os.getenv('MASTER_PARQUET_MAX_PARTS', '16'))
+RETIRED_GRACE_SECONDS = int(os.getenv('MASTER_PARQUET_RETIRED_GRACE_SECONDS', '3600'))
+MANIFEST_FILE = '_manifest.json'
+LOCK_FILE = '_manifest.lock'
+PARTS_FOLDER = 'parts'
+
+# One lock per table folder, serialises manifest updates of ingest and compaction
+_table_locks: Dict[str, threading.Lock] = {}
+_table_locks_guard = threading.Lock()
+_compactions: Dict[str, threading.Thread] = {}
+
+
+@contextmanager
+def _table_lock(table_dir: str):
+    """Exclusive lock of a table folder across the threads of this process and other processes"""
+    table_dir = os.path.abspath(table_dir)
+    with _table_locks_guard:
+        thread_lock = _table_locks.setdefault(table_dir, threading.Lock())
+    with thread_lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(table_dir, exist_ok=True)
+        with open(os.path.join(table_dir, LOCK_FILE), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _key_range(values: pd.Series) -> Dict:
+    """Min / max of a key column (numeric or text) and whether it has missing values"""
+    nulls = bool(values.isna().any())
+    values = values.dropna()
+    if values.empty:
+        return {'kind': None, 'nulls': nulls}
+    if is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        return {'kind': 'number', 'min': float(values.min()), 'max': float(values.max()), 'nulls': nulls}
+    values = values.astype(str)
+    return {'kind': 'text', 'min': values.min(), 'max': values.max(), 'nulls': nulls}
+
+
+def _ranges_overlap(part_range: Dict, new_range: Dict) -> bool:
+    if part_range['nulls'] and new_range['nulls']:
+        return True
+    if part_range['kind'] is None or new_range['kind'] is None:
+        # Missing values are compared as "" after dtype alignment, keep the part
+        return True
+    if part_range['kind'] != new_range['kind']:
+        # Text and numbers compare differently after dtype alignment, keep the part
+        return True
+    return not (new_range['max'] < part_range['min'] or new_range['min'] > part_range['max'])
+
+
+class MasterParquetStore:
+    """
+    Partitioned parquet dataset of one master table.
+
+    Args:
+        master_parquet_path: Path to master_parquet directory
+        table_name: SAP table name (trailing underscores are stripped for folder naming)
+        key_columns: Business key columns used for the part key ranges
+    """
+
+    def __init__(self, master_parquet_path: str, table_name: str, key_columns: Optional[List[str]] = None):
+        self.table_name = table_name
+        clean_table_name = table_name.rstrip('_')
+        self.table_dir = os.path.join(master_parquet_path, clean_table_name)
+        self.parts_dir = os.path.join(self.table_dir, PARTS_FOLDER)
+        self.manifest_path = os.path.join(self.table_dir, MANIFEST_FILE)
+        self.legacy_path = os.path.join(self.table_dir, f'SAP_{clean_table_name}_data.parquet')
+        self.key_columns = list(key_columns or [])
+
+    # ------------------------------------------------------------------ manifest
+    def _load_manifest(self) -> Optional[Dict]:
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path) as manifest_file:
+            return json.load(manifest_file)
+
+    def _save_manifest(self, manifest: Dict):
+        """Replace the manifest, called with the table lock held"""
+        self._purge_retired(manifest)
+        manifest['updated_at'] = datetime.now(timezone.utc).isoformat()
+        tmp_path = f"{self.manifest_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    @staticmethod
+    def _retire(manifest: Dict, files: List[str]):
+        """List files (relative to the table folder) for deletion after the grace period"""
+        retired_at = time.time()
+        manifest.setdefault('retired', []).extend({'file': file, 'retired_at': retired_at} for file in files)
+
+    def _purge_retired(self, manifest: Dict):
+        """Delete the retired files whose grace period has passed"""
+        now = time.time()
+        kept = []
+        for entry in manifest.get('retired', []):
+            if now - entry['retired_at'] < RETIRED_GRACE_SECONDS:
+                kept.append(entry)
+                continue
+            try:
+                os.remove(os.path.join(self.table_dir, entry['file']))
+            except FileNotFoundError:
+                pass
+        manifest['retired'] = kept
+
+    def _new_part_entry(self, manifest: Dict, table: pa.Table) -> Dict:
+        os.makedirs(self.parts_dir, exist_ok=True)
+        sequence = manifest['next_sequence']
+        manifest['next_sequence'] += 1
+        filename = f"part-{sequence:06d}-{uuid.uuid4().hex[:8]}.parquet"
+        pq.write_table(table, os.path.join(self.parts_dir, filename))
+        return {
+            'file': filename,
+            'sequence': sequence,
+            'rows': table.num_rows,
+            'key_ranges': self._key_ranges(table),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+        }
+
+    def _key_ranges(self, table: pa.Table) -> Dict:
+        key_columns = [column for column in self.key_columns if column in table.column_names]
+        if not key_columns:
+            return {}
+        keys_df = table.select(key_columns).to_pandas()
+        return {column: _key_range(keys_df[column]) for column in key_columns}
+
+    def _adopt_legacy_file(self) -> Dict:
+        """Manifest for the table, registering a legacy single file as its first part (table lock held)"""
+        manifest = self._load_manifest()
+        if manifest is not None:
+            return manifest
+        manifest = {'table': self.table_name, 'key_columns': self.key_columns, 'next_sequence': 0, 'parts': []}
+        if os.path.exists(self.legacy_path):
+            entry = self._new_part_entry(manifest, pq.read_table(self.legacy_path))
+            manifest['parts'].append(entry)
+            self._retire(manifest, [os.path.basename(self.legacy_path)])
+            self._save_manifest(manifest)
+        return manifest
+
+    def _part_paths(self, parts: List[Dict]) -> List[str]:
+        return [os.path.join(self.parts_dir, part['file']) for part in parts]
+
+    @staticmethod
+    def _part_files(parts: List[Dict]) -> List[str]:
+        return [os.path.join(PARTS_FOLDER, part['file']) for part in parts]
+
+    # ------------------------------------------------------------------ reads
+    def exists(self) -> bool:
+        return os.path.exists(self.manifest_path) or os.path.exists(self.legacy_path)
+
+    @property
+    def total_rows(self) -> int:
+        manifest = self._load_manifest()
+        if manifest is not None:
+            return sum(part['rows'] for part in manifest['parts'])
+        if os.path.exists(self.legacy_path):
+            return pq.ParquetFile(self.legacy_path).metadata.num_rows
+        return 0
+
+    def schema(self) -> Optional[pa.Schema]:
+        manifest = self._load_manifest()
+        if manifest is not None and manifest['parts']:
+            return pq.read_schema(self._part_paths(manifest['parts'][:1])[0])
+        if os.path.exists(self.legacy_path):
+            return pq.read_schema(self.legacy_path)
+        return None
+
+    def _read_parts_table(self, parts: List[Dict], columns: Optional[List[str]] = None) -> pa.Table:
+        schema = pq.read_schema(self._part_paths(parts[:1])[0])
+        if columns is not None:
+            columns = [column for column in columns if column in schema.names]
+        tables = [pq.read_table(path, columns=columns) for path in self._part_paths(parts)]
+        return pa.concat_tables(tables)
+
+    def _read_parts(self, parts: List[Dict], columns: Optional[List[str]] = None) -> pd.DataFrame:
+        return self._read_parts_table(parts, columns).to_pandas()
+
+    def read(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Whole table (or the given columns) as one DataFrame"""
+        manifest = self._load_manifest()
+        if manifest is None:
+            if os.path.exists(self.legacy_path):
+                if columns is not None:
+                    legacy_columns = pq.read_schema(self.legacy_path).names
+                    columns = [column for column in columns if column in legacy_columns]
+                return pd.read_parquet(self.legacy_path, columns=columns)
+            return pd.DataFrame()
+        if not manifest['parts']:
+            return pd.DataFrame()
+        return self._read_parts(manifest['parts'], columns)
+
+    def read_keys_overlapping(self, new_df: pd.DataFrame, key_columns: List[str]) -> pd.DataFrame:
+        """
+        Key columns of the parts whose key ranges overlap the key ranges of new_df,
+        the only existing rows new_df can duplicate.
+        """
+        with _table_lock(self.table_dir):
+            manifest = self._adopt_legacy_file()
+        new_ranges = {column: _key_range(new_df[column]) for column in key_columns if column in new_df.columns}
+        relevant = []
+        for part in manifest['parts']:
+            part_ranges = part.get('key_ranges', {})
+            if all(_ranges_overlap(part_ranges[column], new_range)
+                   for column, new_range in new_ranges.items() if column in part_ranges):
+                relevant.append(part)
+        if not relevant:
+            return pd.DataFrame(columns=key_columns)
+        return self._read_parts(relevant, key_columns)
+
+    # ------------------------------------------------------------------ writes
+    def append(self, df: pd.DataFrame) -> bool:
+        """
+        Append df as a new immutable part. df must already have the columns of the table.
+        Returns False (nothing written) when df cannot be cast to the table schema.
+        """
+        with _table_lock(self.table_dir):
+            manifest = self._adopt_legacy_file()
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if manifest['parts']:
+                schema = pq.read_schema(self._part_paths(manifest['parts'][:1])[0])
+                try:
+                    table = table.select(schema.names).cast(schema)
+                except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, KeyError, ValueError):
+                    return False
+            manifest['parts'].append(self._new_part_entry(manifest, table))
+            self._save_manifest(manifest)
+            part_count = len(manifest['parts'])
+        if part_count > MAX_PARTS:
+            self.compact_in_background()
+        return True
+
+    def rewrite(self, df: pd.DataFrame):
+        """Replace the whole table with df, written as a single part"""
+        with _table_lock(self.table_dir):
+            manifest = self._load_manifest()
+            if manifest is None:
+                manifest = {'table': self.table_name, 'key_columns': self.key_columns, 'next_sequence': 0, 'parts': []}
+                if os.path.exists(self.legacy_path):
+                    self._retire(manifest, [os.path.basename(self.legacy_path)])
+            old_parts = manifest['parts']
+            manifest['parts'] = [self._new_part_entry(manifest, pa.Table.from_pandas(df, preserve_index=False))]
+            self._retire(manifest, self._part_files(old_parts))
+            self._save_manifest(manifest)
+
+    def compact(self):
+        """Merge all current parts into one part, parts appended meanwhile are kept"""
+        with _table_lock(self.table_dir):
+            manifest = self._load_manifest()
+            if manifest is None or len(manifest['parts']) <= 1:
+                return
+            parts = list(manifest['parts'])
+        merged_table = self._read_parts_table(parts)
+        with _table_lock(self.table_dir):
+            manifest = self._load_manifest()
+            compacted_files = {part['file'] for part in parts}
+            entry = self._new_part_entry(manifest, merged_table)
+            manifest['parts'] = [entry] + [part for part in manifest['parts'] if part['file'] not in compacted_files]
+            self._retire(manifest, self._part_files(parts))
+            self._save_manifest(manifest)
+
+    def compact_in_background(self) -> threading.Thread:
+        """Start compact() in a thread (non-daemon, so the process waits for it before exiting)"""
+        table_dir = os.path.abspath(self.table_dir)
+        with _table_locks_guard:
+            running = _compactions.get(table_dir)
+            if running is not None and running.is_alive():
+                return running
+            thread = threading.Thread(target=self.compact, name=f"compact-{self.table_name}")
+            _compactions[table_dir] = thread
+            thread.start()
+            return thread
+
+
+def read_master_table(master_parquet_path: str, table_name: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Read a master table from its part files or its legacy single parquet file"""
+    return MasterParquetStore(master_parquet_path, table_name).read(columns=columns)
+
+
+def master_table_exists(master_parquet_path: str, table_name: str) -> bool:
+    return MasterParquetStore(master_parquet_path, table_name).exists()
@@ -1,6 +1,7 @@
 import pandas as pd
 from typing import Optional
 from .t053_rename import T053_RENAME_MAP
+from ..dimension_lookup import lookup_join
 
 def merge_t053s(invoice_df:pd.DataFrame,
                  t053s:Optional[pd.DataFrame])-> pd.DataFrame:
@@ -63,7 +64,7 @@ def merge_t053s(invoice_df:pd.DataFrame,
     logger.debug(f"Data types of join keys in Invoice:\n{invoice_df[keys].dtypes}")
     
     pre_merge_shape = invoice_df.shape
-    merged = pd.merge(invoice_df, t053s, how='left', on=keys, suffixes=('_Invoice', '_T053S'))
+    merged = lookup_join(invoice_df, t053s, on=keys, suffixes=('_Invoice', '_T053S'))
     logger.info(f"Invoice and T053S merged. Shape: {merged.shape}")
     post_merge_shape = merged.shape
     if pre_merge_shape[0] != post_merge_shape[0]:
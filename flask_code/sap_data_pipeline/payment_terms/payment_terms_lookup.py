@@ -1,6 +1,7 @@
 import pandas as pd
 from typing import Optional
 from .t052u_rename import T052U_RENAME_MAP
+from ..dimension_lookup import lookup_join
 from ..logger_config import get_logger
 def merge_t052u(invoice_df:pd.DataFrame,
                 t052u: Optional[pd.DataFrame]) -> pd.DataFrame:
@@ -63,7 +64,7 @@ def merge_t052u(invoice_df:pd.DataFrame,
     logger.debug(invoice_df[keys].dtypes)
     
     pre_merge_shape = invoice_df.shape
-    merged = pd.merge(invoice_df, t052u, how='left', on=keys, suffixes=('_Invoice', '_T052U'))
+    merged = lookup_join(invoice_df, t052u, on=keys, suffixes=('_Invoice', '_T052U'))
     
     post_merge_shape = merged.shape
     if pre_merge_shape[0] != post_merge_shape[0]:
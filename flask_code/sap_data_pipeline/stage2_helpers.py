@@ -3,7 +3,12 @@ Stage 2 Helper Functions
 Helper utilities for SAP data ingestion and state management.
 """
 import os
+import time
+import logging
 import pandas as pd
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import Dict, Optional, List, Tuple
 from pandas.api.types import (
     is_integer_dtype, is_float_dtype, is_datetime64_any_dtype, 
@@ -11,6 +16,14 @@ from pandas.api.types import (
 )
 
 from sap_data_pipeline.data_cleaning import clean_amount_column, clean_date_column
+from sap_data_pipeline.master_parquet_store import MasterParquetStore
+from row_dedup import anti_join, rows_in
+
+# Reader processes for the SAP files of a run (1 reads the files serially in this process)
+READER_WORKERS = int(os.getenv('SAP_READER_WORKERS', str(min(4, os.cpu_count() or 1))))
+# CSV files from this size on are streamed in chunks of CSV_CHUNK_ROWS rows
+CSV_STREAM_MIN_BYTES = int(os.getenv('SAP_CSV_STREAM_MIN_MB', '256')) * 1024 * 1024
+CSV_CHUNK_ROWS = int(os.getenv('SAP_CSV_CHUNK_ROWS', '500000'))
 
 
 # ============================================================================
@@ -100,7 +113,7 @@ def perform_data_cleaning_on_dataframe(df: pd.DataFrame, logger, table_name: str
         col_to_clean = amount_cleanup_tables[table_name]
         for col in col_to_clean:
             if col in df.columns:
-                df[col] = clean_amount_column(df[col])
+                df[col] = clean_amount_column(df[col], column_name=f"{table_name}.{col}")
             else:
                 logger.debug(f"Column {col} not found in {filename} for table {table_name}, skipping amount cleaning.")
 
@@ -140,105 +153,112 @@ def get_table_parquet_path(master_parquet_path: str, table_name: str) -> str:
 # FILE READING
 # ============================================================================
 
-def read_files_for_table(
-    sap_run_folder: str,
-    table_name: str,
-    filenames: List[str],
-    logger
-) -> Optional[pd.DataFrame]:
+def _read_file(file_path: str, filename: str, csv_chunk_rows: int):
+    """Read one SAP file, CSV files of at least CSV_STREAM_MIN_BYTES are streamed in chunks of csv_chunk_rows rows."""
+    if filename.lower().endswith('.parquet'):
+        return pd.read_parquet(file_path)
+    if filename.lower().endswith('.csv'):
+        if os.path.getsize(file_path) < CSV_STREAM_MIN_BYTES:
+            return pd.read_csv(file_path)
+        # Drop in-chunk duplicates while streaming so large BSEG extracts never hold them all
+        chunks = [chunk.drop_duplicates(keep='first')
+                  for chunk in pd.read_csv(file_path, chunksize=csv_chunk_rows)]
+        return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+    if filename.lower().endswith(('.xlsx', '.xls')):
+        return pd.read_excel(file_path, engine='openpyxl')
+    return None
+
+
+def read_and_clean_file(sap_run_folder: str, table_name: str, filename: str,
+                        csv_chunk_rows: int = CSV_CHUNK_ROWS) -> Dict:
     """
-    Read and concatenate all files for a specific table from the run folder.
-    
-    Supports: Excel (.xlsx, .xls), CSV (.csv), Parquet (.parquet)
-    
-    Args:
-        sap_run_folder: Path to the run-scoped SAP folder
-        table_name: SAP table name
-        filenames: List of filenames belonging to this table
-        logger: Logger instance
-    
+    Read, normalise and clean one file of a table. Runs in a reader process, so
+    messages are returned to the caller instead of logged.
+
+    Returns:
+        dict with keys: filename, df (None when unreadable), messages (list of (level, text)), stats
+    """
+    file_path = os.path.join(sap_run_folder, filename)
+    result = {'filename': filename, 'df': None, 'messages': [], 'stats': {}}
+    start_time = time.perf_counter()
+    try:
+        df = _read_file(file_path, filename, csv_chunk_rows)
+        if df is None:
+            result['messages'].append(('warning', f"Unsupported file format for {filename}, skipping"))
+            return result
+
+        result['messages'].append(('info', f"Successfully read {filename}, shape={df.shape}"))
+        # Normalize column names (strip whitespace)
+        df.columns = [str(c).strip() for c in df.columns]
+
+        # Drop exact duplicates within the file
+        initial_rows = len(df)
+        df.drop_duplicates(inplace=True, keep='first')
+        if len(df) < initial_rows:
+            result['messages'].append(('info', f"Dropped {initial_rows - len(df)} duplicate rows from {filename}"))
+
+        # Amount columns are cast to numbers here, in the reader process
+        df = perform_data_cleaning_on_dataframe(df, logging.getLogger('sap_pipeline'), table_name, filename)
+        result['df'] = df
+
+        seconds = time.perf_counter() - start_time
+        size_mb = os.path.getsize(file_path) / (1024 * 1024)
+        result['stats'] = {'rows': len(df), 'size_mb': round(size_mb, 2), 'seconds': round(seconds, 3),
+                           'mb_per_second': round(size_mb / seconds, 2) if seconds else None,
+                           'rows_per_second': round(len(df) / seconds) if seconds else None}
+    except Exception as e:
+        result['messages'].append(('error', f"Failed to read {filename} for table {table_name}: {e}"))
+    return result
+
+
+def _log_file_result(result: Dict, table_name: str, logger):
+    for level, message in result['messages']:
+        getattr(logger, level)(message)
+    if result['df'] is not None:
+        logger.info(f"Read {result['filename']} for {table_name}: shape {result['df'].shape}, "
+                    f"throughput {result['stats']}")
+
+
+def combine_table_files(table_name: str, file_results: List[Dict], logger) -> Optional[pd.DataFrame]:
+    """
+    Concatenate the file results of one table (in file order), harmonize dtypes and drop duplicates.
+
     Returns:
         Combined DataFrame or None if no valid data
     """
-    if not filenames:
-        logger.warning(f"No files provided for table {table_name}")
-        return None
-    
     dfs = []
     expected_cols = None
-    
-    for filename in filenames:
-        file_path = os.path.join(sap_run_folder, filename)
-
-        try:
-            # Read based on file extension
-            if filename.lower().endswith('.parquet'):
-                df = pd.read_parquet(file_path)
-            elif filename.lower().endswith('.csv'):
-                df = pd.read_csv(file_path)
-            elif filename.lower().endswith(('.xlsx', '.xls')):
-                df = pd.read_excel(file_path, engine='openpyxl')
-            else:
-                logger.warning(f"Unsupported file format for {filename}, skipping")
-                continue
-            
-            logger.info(f"Successfully read {filename}, shape={df.shape}") 
-            # Normalize column names (strip whitespace)
-            df.columns = [str(c).strip() for c in df.columns]
-            
-            # Check column consistency
-            if expected_cols is None:
-                expected_cols = len(df.columns)
-            elif len(df.columns) != expected_cols:
-                logger.error(
-                    f"Column count mismatch in {filename} for table {table_name}. "
-                    f"Expected {expected_cols}, got {len(df.columns)}"
-                )
-                
-            
-            # Log basic info
-            logger.info(f"Read {filename} for {table_name}: shape {df.shape}")
-            
-            # Drop exact duplicates within the file
-            initial_rows = len(df)
-            df.drop_duplicates(inplace=True, keep='first')
-            if len(df) < initial_rows:
-                logger.info(f"Dropped {initial_rows - len(df)} duplicate rows from {filename}")
-            
-            df = perform_data_cleaning_on_dataframe(df, logger, table_name, filename)
-
-            dfs.append(df)
-            
-        except Exception as e:
-            print(f"DEBUG read_files: ERROR reading {filename}: {type(e).__name__}: {str(e)}")
-            logger.error(f"Failed to read {filename} for table {table_name}: {e}")
-            # Continue processing other files
+    for result in file_results:
+        _log_file_result(result, table_name, logger)
+        df = result['df']
+        if df is None:
             continue
-    
+        # Check column consistency
+        if expected_cols is None:
+            expected_cols = len(df.columns)
+        elif len(df.columns) != expected_cols:
+            logger.error(
+                f"Column count mismatch in {result['filename']} for table {table_name}. "
+                f"Expected {expected_cols}, got {len(df.columns)}"
+            )
+        dfs.append(df)
+
     if not dfs:
-        print(f"DEBUG read_files: No valid data loaded for table {table_name}")
         logger.warning(f"No valid data loaded for table {table_name}")
         return None
-    
-    print(f"DEBUG read_files: Harmonizing {len(dfs)} dataframes")
-    # Harmonize dtypes across all DataFrames before concatenation
-    # This prevents 'object' columns with mixed types (int and str) that crash Parquet
-    # dfs = harmonize_dataframe_list(dfs, logger)
-    
-    print(f"DEBUG read_files: Concatenating {len(dfs)} dataframes")
+
     # Concatenate all dataframes
     combined_df = pd.concat(dfs, ignore_index=True)
     try:
-
+        # Harmonize dtypes, prevents 'object' columns with mixed types (int and str) that crash Parquet
         combined_df = harmonize_single_dataframe_vectorized(df=combined_df, logger=logger)
     except Exception as e:
         logger.error(f"Error during harmonization for {table_name}: {e}")
         import traceback
         logger.debug(traceback.format_exc())
         raise Exception(f"Harmonization failed for {table_name}: {e}")
-    print(f"DEBUG read_files: Combined dataframe shape = {combined_df.shape}")
     logger.info(f"Combined {len(dfs)} file(s) for {table_name}: total shape {combined_df.shape}")
-    
+
     # Drop duplicates in combined data
     initial_rows = len(combined_df)
     combined_df.drop_duplicates(inplace=True, keep='first')
@@ -247,11 +267,95 @@ def read_files_for_table(
     else:
         logger.info(f"No duplicate rows found after combining for {table_name}")
 
-
- 
     return combined_df
 
 
+def read_files_for_tables(
+    sap_run_folder: str,
+    files_by_table: Dict[str, List[str]],
+    logger,
+    max_workers: int = READER_WORKERS
+):
+    """
+    Read the files of many tables concurrently with a bounded process pool.
+
+    Tables are read in the order of files_by_table, the files of a table largest
+    first. While a table is read, the files of the following tables are read ahead
+    until max_workers files are in flight, so at most about max_workers read-ahead
+    files are held in memory besides the table being yielded. Each table is yielded
+    as soon as all of its files are read. Pass the file results to combine_table_files.
+
+    An unreadable file is reported in its result (read_and_clean_file). A reader
+    process that dies (e.g. out of memory) breaks the pool: BrokenProcessPool is
+    raised and the run stops, so no partially read table is ingested and no
+    source file is deleted.
+
+    Yields:
+        (table_name, list of read_and_clean_file results in file order)
+    """
+    tasks = [(table_name, filename) for table_name, filenames in files_by_table.items() for filename in filenames]
+    if max_workers <= 1 or len(tasks) <= 1:
+        for table_name, filenames in files_by_table.items():
+            yield table_name, [read_and_clean_file(sap_run_folder, table_name, filename) for filename in filenames]
+        return
+
+    def file_size(filename):
+        try:
+            return os.path.getsize(os.path.join(sap_run_folder, filename))
+        except OSError:
+            return 0
+
+    # Table order, largest file first within a table
+    queue = deque((table_name, filename) for table_name, filenames in files_by_table.items()
+                  for filename in sorted(filenames, key=file_size, reverse=True))
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(tasks))) as executor:
+        futures = {}
+        for table_name, filenames in files_by_table.items():
+            # All files of this table, then read ahead while fewer than max_workers files are in flight
+            while queue and (queue[0][0] == table_name or len(futures) < max_workers):
+                task = queue.popleft()
+                futures[task] = executor.submit(read_and_clean_file, sap_run_folder, task[0], task[1])
+            try:
+                results = [futures.pop((table_name, filename)).result() for filename in filenames]
+            except BrokenProcessPool:
+                logger.error(f"A reader process died while reading table {table_name}, stopping the run "
+                             f"(no table of this run is ingested from here on)")
+                raise
+            yield table_name, results
+    logger.info(f"Read {len(tasks)} file(s) of {len(files_by_table)} table(s) with {max_workers} reader processes "
+                f"in {time.perf_counter() - start_time:.2f} seconds")
+
+
+def read_files_for_table(
+    sap_run_folder: str,
+    table_name: str,
+    filenames: List[str],
+    logger
+) -> Optional[pd.DataFrame]:
+    """
+    Read and concatenate all files for a specific table from the run folder.
+    
+    Supports: Excel (.xlsx, .xls), CSV (.csv), Parquet (.parquet)
+    Files are read concurrently when the table has several files.
+    
+    Args:
+        sap_run_folder: Path to the run-scoped SAP folder
+        table_name: SAP table name
+        filenames: List of filenames belonging to this table
+        logger: Logger instance
+    
+    Returns:
+        Combined DataFrame or None if no valid data
+    """
+    if not filenames:
+        logger.warning(f"No files provided for table {table_name}")
+        return None
+
+    file_results = dict(read_files_for_tables(sap_run_folder, {table_name: filenames}, logger))[table_name]
+    return combine_table_files(table_name, file_results, logger)
+
+
 # ============================================================================
 # DATA TYPE ALIGNMENT
 # ============================================================================
@@ -520,16 +624,11 @@ def filter_out_duplicate_data(
     # Align data types before comparison
     existing_df, new_df = align_column_dtypes(existing_df, new_df, logger)
     
-    # Use tuple-based comparison (pattern from handle_hist_data.py)
+    # Hash anti-join on the business keys, hash matches confirmed on the key values
     logger.info(f"Deduplicating {table_name} using keys: {subset_columns}")
     
     try:
-        # Create tuple representation of subset columns for comparison
-        unique_df = new_df[
-            ~(new_df[subset_columns].apply(tuple, axis=1).isin(
-                existing_df[subset_columns].apply(tuple, axis=1)
-            ))
-        ]
+        unique_df = anti_join(new_df, existing_df, subset_columns)
         
         duplicates_count = len(new_df) - len(unique_df)
         logger.info(
@@ -648,9 +747,7 @@ def replace_old_rows_with_new_rows(existing_df,new_df,logger,table_name)-> pd.Da
 
 
     # Identify rows in existing_df that match new_df on business keys
-    mask = existing_df[subset_columns].apply(tuple, axis=1).isin(
-        new_df[subset_columns].apply(tuple, axis=1)
-    )
+    mask = rows_in(existing_df, new_df, subset_columns)
 
     # Remove matching rows from existing_df
     filtered_existing_df = existing_df[~mask]
@@ -708,9 +805,7 @@ def special_case_handle_for_lfbk(existing_df,new_df,logger):
     existing_df, new_df = align_column_dtypes(existing_df, new_df, logger)
 
     # Identify rows in existing_df that match new_df on business keys
-    mask = existing_df[subset_columns].apply(tuple, axis=1).isin(
-        new_df[subset_columns].apply(tuple, axis=1)
-    )
+    mask = rows_in(existing_df, new_df, subset_columns)
 
     matching_rows_df = existing_df[mask]
     logger.info(
@@ -829,15 +924,13 @@ def create_synthetic_bseg_from_bkpf(logger, bkpf_path, master_parquet_path):
         logger.error("Master parquet path not provided, cannot save synthetic BSEG")
         return False
     
-    # Create master BSEG directory and build file path
-    master_bseg_folder = os.path.join(master_parquet_path, 'BSEG')
-    os.makedirs(master_bseg_folder, exist_ok=True)
-    synthetic_bseg_path = os.path.join(master_bseg_folder, 'SAP_BSEG_data.parquet')
+    # Master BSEG store (part files + manifest) under master_parquet/BSEG
+    store = MasterParquetStore(master_parquet_path, 'BSEG', key_columns=UNIQUE_COLUMNS_MAP['BSEG'])
     
     # Save synthetic BSEG parquet to master location
     try:
-        synthetic_bseg.to_parquet(synthetic_bseg_path, index=False, engine='pyarrow')
-        logger.info(f"Saved synthetic BSEG to master location: {synthetic_bseg_path}")
+        store.rewrite(synthetic_bseg)
+        logger.info(f"Saved synthetic BSEG to master location: {store.table_dir}")
         return True
     except Exception as e:
         logger.error(f"Failed to save synthetic BSEG parquet: {e}")
@@ -14,7 +14,8 @@ from .stage2_helpers import (
     get_master_parquet_path,
     get_table_parquet_path,
     harmonize_single_dataframe_vectorized,
-    read_files_for_table,
+    read_files_for_tables,
+    combine_table_files,
     filter_out_duplicate_data,
     get_transactional_parquet_path,
     delete_source_files,
@@ -22,10 +23,36 @@ from .stage2_helpers import (
     replace_old_rows_with_new_rows,
     create_synthetic_bseg_from_bkpf
 )
+from .master_parquet_store import MasterParquetStore
 
 load_dotenv()
 
 
+def _force_identifier_columns_to_string(df: pd.DataFrame, table_name: str, logger) -> pd.DataFrame:
+    """
+    Force problematic bank/account identifier columns to STRING before Parquet write.
+    These columns often contain alphanumeric identifiers that PyArrow can't infer correctly.
+    """
+    bank_identifier_columns = ['Bank Account', 'Bank Key', 'Account Number', 'IBAN']
+    for col in bank_identifier_columns:
+        if col in df.columns:
+            df[col] = df[col].astype(str)
+            logger.debug(f"Forced column '{col}' to STRING type for {table_name}")
+    return df
+
+
+def _harmonize_for_parquet(df: pd.DataFrame, table_name: str, logger) -> pd.DataFrame:
+    """Harmonize dtypes to prevent PyArrow type errors, then force identifier columns to STRING"""
+    try:
+        df = harmonize_single_dataframe_vectorized(df=df, logger=logger)
+    except Exception as e:
+        logger.error(f"Error during harmonization for {table_name}: {e}")
+        import traceback
+        logger.debug(traceback.format_exc())
+        raise Exception(f"Harmonization failed for {table_name}: {e}")
+    return _force_identifier_columns_to_string(df, table_name, logger)
+
+
 def process_master_file_table(
     table_name: str,
     new_df: pd.DataFrame,
@@ -52,22 +79,22 @@ def process_master_file_table(
     """
     logger.info(f"Processing MASTER FILE table: {table_name}")
     
-    # Get parquet file path
-    parquet_path = get_table_parquet_path(master_parquet_path, table_name)
+    # Partitioned part files + manifest under master_parquet/<TABLE>/
+    store = MasterParquetStore(master_parquet_path, table_name, key_columns=UNIQUE_COLUMNS_MAP.get(table_name))
     
     # always will be True
     if append_new_rows:
         # Mode: Append new unique rows to existing data
         logger.info(f"Append mode: Processing new data for {table_name}")
         
-        # Check if parquet file exists
-        parquet_exists = os.path.exists(parquet_path)
+        # Check if parquet data exists
+        parquet_exists = store.exists()
         
         if not parquet_exists:
             # No existing file: save all new data
             logger.info(f"No existing parquet for {table_name}, saving all new data")
-            new_df.to_parquet(parquet_path, index=False, engine='pyarrow')
-            logger.info(f" Saved new parquet for {table_name}: {parquet_path}")
+            store.rewrite(new_df)
+            logger.info(f" Saved new parquet for {table_name}: {store.table_dir}")
             res = delete_source_files(source_files=source_files, sap_run_folder=sap_run_folder, logger=logger)
             
             logger.info(f"  Deleted {len(res)}/{len(source_files)} source file(s) after saving new parquet")
@@ -89,14 +116,20 @@ def process_master_file_table(
             # Initialize matching_vendors_list as empty - only LFBK will populate it
             matching_vendors_list = []
             
+            replaces_rows = table_name == 'LFBK' or table_name in REPLACE_OLD_ROW_WITH_NEW_ROW_TABLES
             logger.info(f"Loading existing parquet for {table_name}")
             try:
-                existing_df = pd.read_parquet(parquet_path)
-                logger.info(f"Loaded existing data: {len(existing_df)} rows")
+                if replaces_rows:
+                    existing_df = store.read()
+                else:
+                    # Only the business keys of the parts whose key range overlaps the new rows
+                    existing_df = store.read_keys_overlapping(new_df, UNIQUE_COLUMNS_MAP.get(table_name) or list(new_df.columns))
+                existing_rows = store.total_rows
+                logger.info(f"Loaded existing data: {len(existing_df)} of {existing_rows} rows")
             except Exception as e:
                 logger.error(f"Failed to load existing parquet for {table_name}: {e}")
                 logger.warning(f"Treating as new file and saving new data")
-                new_df.to_parquet(parquet_path, index=False, engine='pyarrow')
+                store.rewrite(new_df)
 
                 res = delete_source_files(source_files=source_files, sap_run_folder=sap_run_folder, logger=logger)
 
@@ -124,86 +157,73 @@ def process_master_file_table(
             if len(unique_new_df) == 0 and modified_df.empty:
                 logger.info(f"No new unique rows for {table_name}, keeping existing data unchanged")
                 return {
-                    'existing_rows': len(existing_df),
+                    'existing_rows': existing_rows,
                     'new_rows_received': len(new_df),
                     'new_rows_added': 0,
-                    'total_rows': len(existing_df),
+                    'total_rows': existing_rows,
                     'mode': 'no_new_data'
                 }
             
             # Ensure column alignment before concatenation
             # Add missing columns to unique_new_df with NaN
+            existing_columns = list(existing_df.columns) if replaces_rows else store.schema().names
             if modified_df.empty:
-                for col in existing_df.columns:
+                for col in existing_columns:
                     if col not in unique_new_df.columns:
                         unique_new_df[col] = pd.NA
                         logger.debug(f"Added missing column '{col}' to new data for {table_name}")
             else:
-                for col in existing_df.columns:
+                for col in existing_columns:
                     if col not in modified_df.columns:
                         modified_df[col] = pd.NA
                         logger.debug(f"Added missing column '{col}' to modified data for {table_name}")
 
             if modified_df.empty:   
                 # Reorder columns to match existing (safe approach with reindex)
-                unique_new_df = unique_new_df.reindex(columns=existing_df.columns)
+                unique_new_df = unique_new_df.reindex(columns=existing_columns)
             else:
-                modified_df = modified_df.reindex(columns=existing_df.columns)
+                modified_df = modified_df.reindex(columns=existing_columns)
             
             if not unique_new_df.empty:
-                # Harmonize dtypes before concatenation to prevent PyArrow type errors
-                # harmonized_dfs = harmonize_dataframe_list([existing_df, unique_new_df], logger)
-                
-                # Concatenate existing + unique new data
-                updated_df = pd.concat([existing_df, unique_new_df], ignore_index=True)
-                try:
-                    updated_df = harmonize_single_dataframe_vectorized(df=updated_df, logger=logger)
-                except Exception as e:
-                    logger.error(f"Error during harmonization for {table_name}: {e}")
-                    import traceback
-                    logger.debug(traceback.format_exc())
-                    raise Exception(f"Harmonization failed for {table_name}: {e}")
-                
-                logger.info(f"Combined data for {table_name}: {len(updated_df)} total rows")
-            else:
-                updated_df = modified_df
-                logger.info(f"Updated data for {table_name} after replacements: {len(updated_df)} total rows")
-            
-            # Force problematic bank/account identifier columns to STRING before Parquet write
-            # These columns often contain alphanumeric identifiers that PyArrow can't infer correctly
-            bank_identifier_columns = ['Bank Account', 'Bank Key', 'Account Number', 'IBAN']
-            for col in bank_identifier_columns:
-                if col in updated_df.columns:
-                    updated_df[col] = updated_df[col].astype(str)
-                    logger.debug(f"Forced column '{col}' to STRING type for {table_name}")
-                
-            # Save updated data to parquet
-            updated_df.to_parquet(parquet_path, index=False, engine='pyarrow')
-            logger.info(f" Saved updated parquet for {table_name}")
+                # Append only the new unique rows as a new part, existing parts are not rewritten
+                unique_new_df = _harmonize_for_parquet(unique_new_df, table_name, logger)
+                if store.append(unique_new_df):
+                    total_rows = existing_rows + len(unique_new_df)
+                    logger.info(f" Appended {len(unique_new_df)} rows as a new part for {table_name}: {total_rows} total rows")
+                else:
+                    # New rows cannot be cast to the stored schema, rewrite the table with harmonized types
+                    logger.warning(f"New rows of {table_name} do not fit the stored schema, rewriting the table")
+                    updated_df = pd.concat([store.read(), unique_new_df], ignore_index=True)
+                    updated_df = _harmonize_for_parquet(updated_df, table_name, logger)
+                    store.rewrite(updated_df)
+                    total_rows = len(updated_df)
+                    logger.info(f" Saved updated parquet for {table_name}: {total_rows} total rows")
 
-
-            
-            # Return different stats based on processing mode
-            if not unique_new_df.empty:
                 # For deduplication mode (filter_out_duplicate_data)
                 return {
-                    'existing_rows': len(existing_df),
+                    'existing_rows': existing_rows,
                     'new_rows_received': len(new_df),
                     'new_rows_added': len(unique_new_df),
-                    'total_rows': len(updated_df),
+                    'total_rows': total_rows,
                     'mode': 'append_deduplicated',
                     'matching_vendors_list': matching_vendors_list
                 }
-            else:
-                # For replacement mode (LFBK or REPLACE tables)
-                return {
-                    'existing_rows': len(existing_df),
-                    'new_rows_received': len(new_df),
-                    'new_rows_added': len(updated_df) - len(existing_df),  # Net change in rows
-                    'total_rows': len(updated_df),
-                    'mode': 'replaced' if table_name == 'LFBK' else 'replaced_by_business_key',
-                    'matching_vendors_list': matching_vendors_list
-                }
+
+            updated_df = modified_df
+            logger.info(f"Updated data for {table_name} after replacements: {len(updated_df)} total rows")
+            updated_df = _force_identifier_columns_to_string(updated_df, table_name, logger)
+            store.rewrite(updated_df)
+            logger.info(f" Saved updated parquet for {table_name}")
+
+            # For replacement mode (LFBK or REPLACE tables)
+            return {
+                'existing_rows': len(existing_df),
+                'new_rows_received': len(new_df),
+                'new_rows_added': len(updated_df) - len(existing_df),  # Net change in rows
+                'total_rows': len(updated_df),
+                'mode': 'replaced' if table_name == 'LFBK' else 'replaced_by_business_key',
+                'matching_vendors_list': matching_vendors_list
+            }
     
     else:
         # Mode: Placeholder for future logic
@@ -363,34 +383,36 @@ def ingest_and_update_state(
     tables_processed = []
     vendor_list_to_be_updated = []
     
-    # Process each table that has new files
-    for table_name, filenames in sap_files_by_table.items():
+    # Process each table that has new files, files of all tables are read concurrently
+    for table_name, file_results in read_files_for_tables(sap_run_folder, sap_files_by_table, logger):
+        filenames = sap_files_by_table[table_name]
         logger.info("-" * 80)
         logger.info(f"Processing Table: {table_name}")
         logger.info(f"New files: {len(filenames)}")       
         
         try:
             # Step 1: Read new files for this table
-            new_df = read_files_for_table(sap_run_folder, table_name, filenames, logger)
-            print(f"DEBUG Stage2: read_files_for_table returned, new_df type = {type(new_df)}")
+            new_df = combine_table_files(table_name, file_results, logger)
+            del file_results
+            logger.debug(f"Stage2: combine_table_files returned, new_df type = {type(new_df)}")
             
             if new_df is None:
-                print(f"DEBUG Stage2: new_df is None for {table_name}")
+                logger.debug(f"Stage2: new_df is None for {table_name}")
                 logger.warning(f"No valid data loaded for {table_name}, skipping")
                 continue
             
             if len(new_df) == 0:
-                print(f"DEBUG Stage2: new_df is empty for {table_name}")
+                logger.debug(f"Stage2: new_df is empty for {table_name}")
                 logger.warning(f"No valid data loaded for {table_name}, skipping")
                 continue
             
-            print(f"DEBUG Stage2: new_df shape = {new_df.shape} for {table_name}")
+            logger.debug(f"Stage2: new_df shape = {new_df.shape} for {table_name}")
             logger.info(f"Loaded new data for {table_name}: {len(new_df)} rows, {len(new_df.columns)} columns")
             
             # Step 2: Check if this is a MASTER_FILE table
-            print(f"DEBUG Stage2: Checking if {table_name} is in MASTER_FILES")
+            logger.debug(f"Stage2: Checking if {table_name} is in MASTER_FILES")
             if table_name in MASTER_FILES:
-                print(f"DEBUG Stage2: {table_name} IS a MASTER_FILE - processing")
+                logger.debug(f"Stage2: {table_name} IS a MASTER_FILE - processing")
                 # Process as master file
                 stats = process_master_file_table(
                     table_name=table_name,
@@ -401,7 +423,7 @@ def ingest_and_update_state(
                     sap_run_folder=sap_run_folder,
                     source_files=filenames
                 )
-                print(f"DEBUG Stage2: process_master_file_table returned stats: {stats}")
+                logger.debug(f"Stage2: process_master_file_table returned stats: {stats}")
                 
                 stats['files_processed'] = len(filenames)
                 tables_updated[table_name] = stats
@@ -411,7 +433,7 @@ def ingest_and_update_state(
                     vendor_list_to_be_updated.extend(stats['matching_vendors_list'])
                 
             else:
-                print(f"DEBUG Stage2: {table_name} is TRANSACTIONAL - processing")
+                logger.debug(f"Stage2: {table_name} is TRANSACTIONAL - processing")
                 # NOT a master file - process as transactional table
                 logger.info(f"{table_name} is a TRANSACTIONAL table")
                 stats = process_transactional_table(
@@ -423,19 +445,16 @@ def ingest_and_update_state(
                     sap_run_folder=sap_run_folder,
                     logger=logger
                 )
-                print(f"DEBUG Stage2: process_transactional_table returned stats: {stats}")
+                logger.debug(f"Stage2: process_transactional_table returned stats: {stats}")
                 
                 stats['files_processed'] = len(filenames)
                 tables_updated[table_name] = stats
                 tables_processed.append(table_name)
                 
         except Exception as e:
-            print(f"DEBUG Stage2: EXCEPTION in table processing loop for {table_name}:")
-            print(f"  Type: {type(e).__name__}")
-            print(f"  Message: {str(e)}")
             import traceback
-            print(f"  Traceback:\n{traceback.format_exc()}")
-            logger.error(f"Error processing table {table_name}: {e}")
+            logger.error(f"Error processing table {table_name}: {type(e).__name__}: {e}")
+            logger.debug(traceback.format_exc())
             tables_failed.append(table_name)
             continue
     
@@ -5,10 +5,12 @@ This stage reads only from persistent parquet state and produces deterministic o
 """
 import os
 import pandas as pd
-from typing import Dict, Optional
+import pyarrow.parquet as pq
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
 from .logger_config import get_logger
 from .utils import EXPECTED_TABLES, Z_BLOCK_EXPECTED_TABLES
+from .master_parquet_store import read_master_table, master_table_exists
 
 # Import existing merge functions
 from .invoice_core.build_invoice_core_from_sap import build_invoice_core
@@ -24,13 +26,46 @@ from .doa.doaredel_rename import DOA_REDEL_RENAME_MAPPING
 
 load_dotenv()
 
+# Columns read per table when the builder consumes a closed set of them (projection pushed into
+# the parquet read). Tables not listed are read in full: their remaining columns are carried
+# into the invoice output, and the extracts contain already-named columns (PAYER, LINE_ITEM_ID,
+# LE_NAME, ...) that no rename map lists.
+# Source and renamed names are both listed, the extracts use either.
+TABLE_COLUMN_PROJECTIONS = {
+    'T042Z': ['MANDT', 'LAND1', 'ZLSCH', 'TEXT2', 'CLIENT', 'COUNTRY', 'PAYMENT_METHOD', 'PAYMENT_METHOD_DESCRIPTION'],
+}
+
+# Tables only used for the DOA output of the Z-block pipeline
+DOA_TABLES = ['VRDOA', 'DOAREDEL']
+# Expected tables that no stage 3 step consumes
+NOT_USED_IN_STAGE3 = ['APMEMO']
+
+
+def stage3_table_list(table_list: list, is_zblock: bool) -> list:
+    """
+    Tables stage 3 reads for the pipeline mode: only the BKPF variant of the mode,
+    the DOA tables only for Z-block, and no table that is not consumed.
+    """
+    unused = {'BKPF'} if is_zblock else {'Z_BKPF', *DOA_TABLES}
+    unused.update(NOT_USED_IN_STAGE3)
+    return [table_name for table_name in table_list if table_name not in unused]
+
+
+def _projected_columns(parquet_path: str, columns: Optional[List[str]]) -> Optional[List[str]]:
+    """Requested columns present in the parquet file (None reads all columns)"""
+    if columns is None:
+        return None
+    available = set(pq.read_schema(parquet_path).names)
+    return [column for column in columns if column in available]
+
 
 def load_parquet_files(
     master_parquet_path: str,
     transactional_parquet_path: str,
     run_id: str,
     table_list: list,
-    logger
+    logger,
+    table_columns: Optional[Dict[str, List[str]]] = None
 ) -> tuple[Dict[str, pd.DataFrame], list]:
     """
     Load all required parquet files from Stage 2 output.
@@ -45,6 +80,8 @@ def load_parquet_files(
         run_id: Run timestamp from Stage 1/2
         table_list: List of expected table names
         logger: Logger instance
+        table_columns: Columns to read per table (read in the parquet reader, missing ones
+            are skipped); tables not in it are read in full
     
     Returns:
         Tuple of (sap_data dict, missing_tables list)
@@ -53,6 +90,7 @@ def load_parquet_files(
     
     sap_data = {}
     missing_tables = []
+    table_columns = table_columns or {}
     
     for table_name in table_list:
         clean_table_name = table_name.rstrip('_')
@@ -76,10 +114,14 @@ def load_parquet_files(
             )
             source_type = "transactional"
         
-        # Try to load the parquet file
-        if os.path.exists(parquet_path):
+        # Try to load the parquet file (master tables may be stored as part files)
+        if os.path.exists(parquet_path) or (source_type == "master" and master_table_exists(master_parquet_path, table_name)):
             try:
-                df = pd.read_parquet(parquet_path)
+                columns = table_columns.get(table_name)
+                if source_type == "master":
+                    df = read_master_table(master_parquet_path, table_name, columns=columns)
+                else:
+                    df = pd.read_parquet(parquet_path, columns=_projected_columns(parquet_path, columns))
                 sap_data[table_name] = df
                 logger.info(f" Loaded {table_name} ({source_type}): {df.shape}")
             except Exception as e:
@@ -109,6 +151,9 @@ def build_invoice_data(sap_data: Dict[str, pd.DataFrame], is_zblock: bool, logge
     - ZBLOCK: uses Z_BKPF data
     - AP: uses normal BKPF data
     
+    The source tables are removed from sap_data as soon as they are merged (only the
+    DOA tables stay), so their memory is released while the invoice data grows.
+    
     Args:
         sap_data: Dictionary of table name -> DataFrame
         is_zblock: Whether this is Z-block mode (determines BKPF table name)
@@ -128,12 +173,12 @@ def build_invoice_data(sap_data: Dict[str, pd.DataFrame], is_zblock: bool, logge
     # Step 1: Build invoice core
     logger.info("Building invoice core...")
     invoice_core_df = build_invoice_core(
-        bseg=sap_data.get('BSEG'),
-        bkpf=sap_data.get(bkpf_table_name),
-        with_item=sap_data.get('WTH'),
-        t003=sap_data.get('T003'),
-        retinv=sap_data.get('RETINV'),
-        udc=sap_data.get('UDC'),
+        bseg=sap_data.pop('BSEG', None),
+        bkpf=sap_data.pop(bkpf_table_name, None),
+        with_item=sap_data.pop('WTH', None),
+        t003=sap_data.pop('T003', None),
+        retinv=sap_data.pop('RETINV', None),
+        udc=sap_data.pop('UDC', None),
     )
     logger.info(f"Invoice Core shape: {invoice_core_df.shape}")
     logger.debug(f"Invoice Core REGION_BSEG value counts:\n{invoice_core_df['REGION_BSEG'].value_counts()}")
@@ -142,7 +187,7 @@ def build_invoice_data(sap_data: Dict[str, pd.DataFrame], is_zblock: bool, logge
     logger.info("Merging company data (T001)...")
     invoice_df = merge_t001(
         invoice_df=invoice_core_df,
-        t001=sap_data.get('T001')
+        t001=sap_data.pop('T001', None)
     )
     logger.info(f"After T001 merge: {invoice_df.shape}")
     
@@ -150,7 +195,7 @@ def build_invoice_data(sap_data: Dict[str, pd.DataFrame], is_zblock: bool, logge
     logger.info("Merging payment terms (T052U)...")
     invoice_df = merge_t052u(
         invoice_df=invoice_df,
-        t052u=sap_data.get('T052U')
+        t052u=sap_data.pop('T052U', None)
     )
     logger.info(f"After T052U merge: {invoice_df.shape}")
     
@@ -158,7 +203,7 @@ def build_invoice_data(sap_data: Dict[str, pd.DataFrame], is_zblock: bool, logge
     logger.info("Merging payment method (T042Z)...")
     invoice_df = merge_t042z(
         invoice_df=invoice_df,
-        t042z=sap_data.get('T042Z')
+        t042z=sap_data.pop('T042Z', None)
     )
     logger.info(f"After T042Z merge: {invoice_df.shape}")
     
@@ -166,7 +211,7 @@ def build_invoice_data(sap_data: Dict[str, pd.DataFrame], is_zblock: bool, logge
     logger.info("Merging payment reason code (T053S)...")
     invoice_df = merge_t053s(
         invoice_df=invoice_df,
-        t053s=sap_data.get('T053S')
+        t053s=sap_data.pop('T053S', None)
     )
     logger.info(f"After T053S merge: {invoice_df.shape}")
     
@@ -174,8 +219,8 @@ def build_invoice_data(sap_data: Dict[str, pd.DataFrame], is_zblock: bool, logge
     logger.info("Merging purchase order data (EKKO, EKPO)...")
     invoice_df = merge_po_info(
         invoice_df=invoice_df,
-        ekko_df=sap_data.get('EKKO'),
-        ekpo_df=sap_data.get('EKPO')
+        ekko_df=sap_data.pop('EKKO', None),
+        ekpo_df=sap_data.pop('EKPO', None)
     )
     logger.info(f"After PO merge: {invoice_df.shape}")
     
@@ -183,10 +228,10 @@ def build_invoice_data(sap_data: Dict[str, pd.DataFrame], is_zblock: bool, logge
     logger.info("Merging vendor master data (LFA1, LFB1, LFBK, LFM1)...")
     invoice_df = build_vendor_master_core(
         invoice_level_data=invoice_df,
-        lfa1=sap_data.get('LFA1'),
-        lfb1=sap_data.get('LFB1'),
-        lfbk=sap_data.get('LFBK'),
-        lfm1=sap_data.get('LFM1'),
+        lfa1=sap_data.pop('LFA1', None),
+        lfb1=sap_data.pop('LFB1', None),
+        lfbk=sap_data.pop('LFBK', None),
+        lfm1=sap_data.pop('LFM1', None),
         vendor_list_to_be_updated=vendor_list_to_be_updated
     )
     logger.info(f"After vendor master merge: {invoice_df.shape}")
@@ -195,14 +240,14 @@ def build_invoice_data(sap_data: Dict[str, pd.DataFrame], is_zblock: bool, logge
     logger.info("Merging VIM invoice verification data...")
     invoice_df = merge_invoice_line_item_with_vim_data(
         invoice_line_item=invoice_df,
-        vim_data=sap_data.get('VIM_'),
-        vim_t100t=sap_data.get('VIMT100'),
-        vim_t0101=sap_data.get('VIMT101'),
-        vim_1log_comm=sap_data.get('1LOGCOMM'),
-        vim_8log_comm=sap_data.get('8LOGCOMM'),
-        vim_1log=sap_data.get('1LOG_'),
-        vim_8log=sap_data.get('8LOG_'),
-        vim_apr_log=sap_data.get('APRLOG')
+        vim_data=sap_data.pop('VIM_', None),
+        vim_t100t=sap_data.pop('VIMT100', None),
+        vim_t0101=sap_data.pop('VIMT101', None),
+        vim_1log_comm=sap_data.pop('1LOGCOMM', None),
+        vim_8log_comm=sap_data.pop('8LOGCOMM', None),
+        vim_1log=sap_data.pop('1LOG_', None),
+        vim_8log=sap_data.pop('8LOG_', None),
+        vim_apr_log=sap_data.pop('APRLOG', None)
     )
     logger.info(f"After VIM merge: {invoice_df.shape}")
     
@@ -411,7 +456,7 @@ def assemble_invoices(
         logger.info(f"Transactional Parquet Path: {transactional_parquet_path}")
         
         # Select table list based on pipeline mode
-        table_list = Z_BLOCK_EXPECTED_TABLES
+        table_list = stage3_table_list(Z_BLOCK_EXPECTED_TABLES, is_zblock)
         logger.info(f"Expected tables: {len(table_list)}")
         
         # Step 1: Load all parquet files
@@ -423,7 +468,8 @@ def assemble_invoices(
             transactional_parquet_path=transactional_parquet_path,
             run_id=run_id,
             table_list=table_list,
-            logger=logger
+            logger=logger,
+            table_columns=TABLE_COLUMN_PROJECTIONS
         )
         
         # Validate mandatory tables (BSEG and pipeline-specific BKPF variant)
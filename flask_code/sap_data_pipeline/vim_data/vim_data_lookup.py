@@ -6,6 +6,7 @@ from .vim_rename import VIM_RENAME_MAPPING
 from .vim_t100t_rename import VIM_T100T_RENAME_MAPPING
 from .vim_t101t_rename import VIM_T101_RENAME_MAPPING
 from ..logger_config import get_logger
+from ..dimension_lookup import lookup_values
 
 # 
 # logger = logging.getLogger(__name__)
@@ -206,7 +207,7 @@ def merge_vim_with_vim_t100t_and_t101(vim_data:pd.DataFrame,
                                         4: 'SUBSEQUENT DEBIT'}
         
         if 'VIM_DP_TRANSACTION_EVENT' in vim_data.columns:
-            vim_data['VIM_DP_TRANSACTION_EVENT'] = vim_data['VIM_DP_TRANSACTION_EVENT'].apply(lambda x: vim_dp_transaction_event_map.get(x,None))
+            vim_data['VIM_DP_TRANSACTION_EVENT'] = vim_data['VIM_DP_TRANSACTION_EVENT'].map(vim_dp_transaction_event_map)
             print("Mapped VIM_DP_TRANSACTION_EVENT values in VIM Data.",vim_data['VIM_DP_TRANSACTION_EVENT'].value_counts(dropna=False))
         else:
             print("Warning: 'VIM_DP_TRANSACTION_EVENT' column not found in VIM Data for mapping.")
@@ -387,12 +388,10 @@ def merge_invoice_line_item_with_vim_data(invoice_line_item:pd.DataFrame,
 
         # Merge 1LOG comments into VIM full merged data
         logger.info("Merging VIM 1LOGCOMM data into VIM full merged data...")
-        vim_1log_lookup_dict = vim_1log_comm_data.set_index(['CLIENT','DOCUMENT_ID'])['1LOG_COMMENTS'].to_dict()
-
-        # Use lookup dict to map comments in vim_full_merged
-        vim_full_merged['VIM_1LOG_COMMENTS'] = vim_full_merged.apply(
-            lambda row: vim_1log_lookup_dict.get((row['CLIENT'], row['VIM_DOCUMENT_ID']), np.nan), axis=1
-        )
+        vim_full_merged['VIM_1LOG_COMMENTS'] = lookup_values(vim_full_merged, vim_1log_comm_data,
+                                                             keys=['CLIENT','VIM_DOCUMENT_ID'],
+                                                             right_keys=['CLIENT','DOCUMENT_ID'],
+                                                             column='1LOG_COMMENTS')
 
         logger.info("Null value counts in VIM_1LOG_COMMENTS after merge:")
         logger.info(f"{vim_full_merged['VIM_1LOG_COMMENTS'].isna().sum()} nulls out of {len(vim_full_merged)} rows")
@@ -406,12 +405,11 @@ def merge_invoice_line_item_with_vim_data(invoice_line_item:pd.DataFrame,
 
     # Process 8LOG comments if available
     if not vim_8log_comm_data.empty:
-        # Create a dict look up for 8 log comments
-        vim_8log_lookup_dict = vim_8log_comm_data.set_index(['CLIENT','8LOG_OBJECT_KEY'])['8LOG_COMMENTS'].to_dict()
-
-        vim_full_merged['VIM_8LOG_COMMENTS'] = vim_full_merged.apply(
-            lambda row: vim_8log_lookup_dict.get((row['CLIENT'], row['VIM_OBJECT_KEY']), np.nan), axis=1
-        )
+        # Keyed look up of the 8 log comments (last object type wins for a key, as in a dict)
+        vim_full_merged['VIM_8LOG_COMMENTS'] = lookup_values(vim_full_merged, vim_8log_comm_data,
+                                                             keys=['CLIENT','VIM_OBJECT_KEY'],
+                                                             right_keys=['CLIENT','8LOG_OBJECT_KEY'],
+                                                             column='8LOG_COMMENTS')
     else:
         logger.info("VIM 8LOGCOMM data not available, skipping 8LOG comments merge")
         vim_full_merged['VIM_8LOG_COMMENTS'] = np.nan
@@ -0,0 +1,96 @@
+"""
+Benchmark of the VIM key construction and VIM comment lookups on synthetic BKPF / VIM data.
+
+Times the previous row-wise implementations (DataFrame.apply over rows, dict lookups
+per row) against the column-wise ones used by the pipeline and checks that both
+give the same result.
+
+    python -m sap_data_pipeline.vim_data.vim_lookup_benchmark [rows]
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from ..dimension_lookup import lookup_values
+from ..invoice_core.build_invoice_core_from_sap import create_vim_key_for_reference, create_vim_keys_for_reference
+from ..logger_config import get_logger
+
+
+def synthetic_invoice_data(rows: int, seed: int = 0) -> pd.DataFrame:
+    """BKPF-like rows with the VIM key inputs, a quarter of them invoice receipts (RMRP)"""
+    rng = np.random.default_rng(seed)
+    document_numbers = rng.integers(5_100_000_000, 5_199_999_999, rows)
+    fiscal_years = rng.integers(2020, 2026, rows)
+    return pd.DataFrame({
+        'CLIENT': rng.choice([100, 200], rows),
+        'COMPANY_CODE': rng.choice(['1000', '2000', ' 3000'], rows),
+        'DOCUMENT_NUMBER': document_numbers.astype(str),
+        'FISCAL_YEAR': fiscal_years,
+        'REF_TRANSACTION': rng.choice(['RMRP', 'BKPF', 'VBRK', 'RMRP'], rows, p=[0.25, 0.5, 0.15, 0.1]),
+        'REFERENCE_KEY': (document_numbers + 1).astype(str) + fiscal_years.astype(str),
+    })
+
+
+def synthetic_comments(invoice_data: pd.DataFrame, share: float = 0.3, seed: int = 0) -> pd.DataFrame:
+    """Grouped 8LOG comments for a share of the VIM object keys, some keys under two object types"""
+    rng = np.random.default_rng(seed)
+    sample = invoice_data.sample(frac=share, random_state=seed)
+    comments = pd.DataFrame({
+        'CLIENT': sample['CLIENT'].to_numpy(),
+        '8LOG_OBJECT_TYPE': rng.choice(['BUS2081', 'BKPF'], len(sample)),
+        '8LOG_OBJECT_KEY': sample['VIM_OBJECT_KEY'].to_numpy(),
+        '8LOG_COMMENTS': 'comment ' + pd.Series(np.arange(len(sample))).astype(str).to_numpy(),
+    })
+    return comments.sort_values(['CLIENT', '8LOG_OBJECT_TYPE', '8LOG_OBJECT_KEY'], ignore_index=True)
+
+
+def _timed(function):
+    start_time = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start_time
+
+
+def benchmark_vim_lookup(rows: int = 200_000, seed: int = 0) -> dict:
+    """
+    Run both implementations on synthetic data of the given size.
+    Returns:
+        dict of step -> {'row_wise_seconds', 'column_wise_seconds', 'speedup'}
+    Raises:
+        AssertionError: the implementations disagree
+    """
+    logger = get_logger()
+    invoice_data = synthetic_invoice_data(rows, seed)
+
+    row_wise_keys, row_wise_key_seconds = _timed(
+        lambda: invoice_data.apply(lambda row: create_vim_key_for_reference(row), axis=1))
+    column_wise_keys, column_wise_key_seconds = _timed(lambda: create_vim_keys_for_reference(invoice_data))
+    assert row_wise_keys.astype(str).equals(column_wise_keys.astype(str)), "VIM keys differ"
+
+    invoice_data['VIM_OBJECT_KEY'] = column_wise_keys
+    comments = synthetic_comments(invoice_data, seed=seed)
+
+    def row_wise_lookup():
+        lookup_dict = comments.set_index(['CLIENT', '8LOG_OBJECT_KEY'])['8LOG_COMMENTS'].to_dict()
+        return invoice_data.apply(lambda row: lookup_dict.get((row['CLIENT'], row['VIM_OBJECT_KEY']), np.nan), axis=1)
+
+    row_wise_comments, row_wise_lookup_seconds = _timed(row_wise_lookup)
+    column_wise_comments, column_wise_lookup_seconds = _timed(
+        lambda: lookup_values(invoice_data, comments, keys=['CLIENT', 'VIM_OBJECT_KEY'],
+                              right_keys=['CLIENT', '8LOG_OBJECT_KEY'], column='8LOG_COMMENTS'))
+    assert row_wise_comments.equals(column_wise_comments), "VIM comment lookups differ"
+
+    results = {}
+    for step, row_wise_seconds, column_wise_seconds in [
+        ('vim_object_key', row_wise_key_seconds, column_wise_key_seconds),
+        ('8log_comments_lookup', row_wise_lookup_seconds, column_wise_lookup_seconds),
+    ]:
+        results[step] = {'row_wise_seconds': round(row_wise_seconds, 3),
+                         'column_wise_seconds': round(column_wise_seconds, 3),
+                         'speedup': round(row_wise_seconds / column_wise_seconds, 1) if column_wise_seconds else np.inf}
+        logger.info(f"VIM lookup benchmark ({rows} rows) {step}: {results[step]}")
+    return results
+
+
+if __name__ == '__main__':
+    print(benchmark_vim_lookup(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000))
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+# Modules import each other from the flask_code root (e.g. "from code1.logger import ...")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# code1.logger and code1.src_load import each other, so code1.src_load is imported first as app.py does.
+# Without the database settings it fails after code1.logger is loaded, which is all the tests log through
+try:
+    import code1.src_load  # noqa: F401
+except Exception:
+    pass
+
+
+@pytest.fixture
+def app_context():
+    """Flask application context for modules logging through code1.logger.capture_log_message (reads flask.g)"""
+    flask = pytest.importorskip('flask')
+    with flask.Flask(__name__).app_context():
+        yield
@@ -0,0 +1,52 @@
+import sqlite3
+
+import pytest
+
+connection_pool = pytest.importorskip('databases.connection_pool')
+sqlalchemy_exc = pytest.importorskip('sqlalchemy.exc')
+
+
+@pytest.fixture
+def engine_metrics(monkeypatch):
+    metrics = connection_pool.PoolMetrics()
+    monkeypatch.setattr(connection_pool, '_engine_metrics', metrics)
+    return metrics
+
+
+def test_engine_pool_records_checkout_wait_and_timeouts(engine_metrics):
+    pool = connection_pool._TimedQueuePool(lambda: sqlite3.connect(':memory:'), pool_size=1, max_overflow=0,
+                                           timeout=0.05)
+    connection = pool.connect()
+    with pytest.raises(sqlalchemy_exc.TimeoutError):
+        pool.connect()
+    connection.close()
+    pool.connect().close()
+
+    metrics = engine_metrics.as_dict()
+    assert metrics['checkouts'] == 2
+    assert metrics['timeouts'] == 1
+    assert metrics['max_wait_ms'] >= 0.0
+
+
+def test_recreated_engine_pool_keeps_recording(engine_metrics):
+    pool = connection_pool._TimedQueuePool(lambda: sqlite3.connect(':memory:'), pool_size=1, max_overflow=0)
+    pool.recreate().connect().close()
+    assert engine_metrics.as_dict()['checkouts'] == 1
+
+
+def test_shared_engine_reports_its_metrics(monkeypatch, engine_metrics):
+    monkeypatch.setattr(connection_pool, '_db_settings', lambda: {
+        'user': 'user', 'password': 'password', 'host': 'localhost', 'port': 3306, 'database': 'db', 'ssl_ca': None})
+    monkeypatch.setattr(connection_pool, '_engine', None)
+    monkeypatch.setattr(connection_pool, '_pools', {})
+    monkeypatch.setattr(connection_pool, '_pid', None)
+    monkeypatch.setattr(connection_pool, 'POOLING_ENABLED', True)
+
+    engine = connection_pool.get_engine()
+    assert isinstance(engine.pool, connection_pool._TimedQueuePool)
+    # get_engine() in a new process starts the engine metrics afresh
+    assert connection_pool._engine_metrics is not engine_metrics
+    connection_pool._engine_metrics.record_checkout(0.002)
+    metrics = connection_pool.get_pool_metrics()
+    assert metrics['sqlalchemy']['checkouts'] == 1 and metrics['sqlalchemy']['max_wait_ms'] == 2.0
+    engine.dispose()
@@ -0,0 +1,84 @@
+import random
+
+import numpy as np
+
+from duplicate_invoices.gpu.cpu_backend import batch_invoice_similarity
+from duplicate_invoices.model.duplicate_extract_helper import SHORT_LENGTH_THRESHOLD, is_invoice_similar
+
+EDGE_CASE_PAIRS = [
+    # empty strings
+    ('', ''), ('', '123'), ('INV1', ''),
+    # exact matches, also after numeric normalisation
+    ('INV-100', 'INV-100'), ('00123', '123'), ('0', '000'),
+    # short inputs: both numbers, one number, none
+    ('12', '13'), ('123', '123'), ('12', 'A12'), ('A1', 'A2'), ('AB', 'ABC'),
+    # one short, one long: length at and over double the short one
+    ('1234', '12345678'), ('1234', '1234567'), ('ABCD', 'ABCDE'), ('123', 'X1234'), ('AB1', 'AB12'),
+    # long inputs, same lengths: single edits in the middle and at the ends
+    ('1234567', '1234667'), ('1234567', '2234567'), ('1234567', '1234568'), ('INV-0001', 'INV-0002'),
+    ('INV-1234', 'INX-1234'), ('ABCDEFGH', 'ABCDEFGH'),
+    # long inputs: insert / delete, substrings within and beyond 2 characters
+    ('123456', '1234567'), ('123456', '1293456'), ('INV12345', 'INV123456'), ('12345', '9912345'),
+    ('INVOICE-77', 'INV-77'), ('X12345Y', '12345'),
+]
+
+
+def _random_invoice_number(rng):
+    kind = rng.random()
+    length = rng.randint(1, 10)
+    if kind < 0.4:
+        return ''.join(rng.choice('0123456789') for _ in range(length))
+    if kind < 0.8:
+        prefix = rng.choice(['', 'INV', 'inv-', 'A', 'AB/'])
+        return prefix + ''.join(rng.choice('0123456789') for _ in range(length))
+    return ''.join(rng.choice('AB01-') for _ in range(length))
+
+
+def _mutate(value, rng):
+    """Near-duplicate of value: one edit, a prefix / suffix or leading zeros"""
+    choice = rng.random()
+    position = rng.randint(0, len(value))
+    if choice < 0.3 and value:
+        return value[:position] + rng.choice('0123456789A') + value[position + 1:]
+    if choice < 0.5:
+        return value[:position] + rng.choice('0123456789') + value[position:]
+    if choice < 0.6 and value:
+        return value[:position] + value[position + 1:]
+    if choice < 0.8:
+        return rng.choice(['0', '00', 'X', 'INV']) + value
+    return value + rng.choice(['1', '-A', ''])
+
+
+def _random_pairs(n_pairs, seed):
+    rng = random.Random(seed)
+    pairs = []
+    for _ in range(n_pairs):
+        source = _random_invoice_number(rng)
+        target = _mutate(source, rng) if rng.random() < 0.7 else _random_invoice_number(rng)
+        pairs.append((source, target))
+    return pairs
+
+
+def _assert_same_as_scalar(pairs):
+    sources = np.array([source for source, _ in pairs], dtype=object)
+    targets = np.array([target for _, target in pairs], dtype=object)
+    is_duplicate, scores = batch_invoice_similarity(sources, targets)
+    for k, (source, target) in enumerate(pairs):
+        expected_duplicate, expected_score = is_invoice_similar(source, target)
+        assert (bool(is_duplicate[k]), float(scores[k])) == (bool(expected_duplicate), float(expected_score)), \
+            (source, target)
+
+
+def test_edge_cases_match_is_invoice_similar():
+    assert all(len(pair[0]) <= SHORT_LENGTH_THRESHOLD for pair in EDGE_CASE_PAIRS[7:12])
+    _assert_same_as_scalar(EDGE_CASE_PAIRS)
+    _assert_same_as_scalar([(target, source) for source, target in EDGE_CASE_PAIRS])
+
+
+def test_random_pairs_match_is_invoice_similar():
+    _assert_same_as_scalar(_random_pairs(20000, seed=1))
+
+
+def test_empty_batch():
+    is_duplicate, scores = batch_invoice_similarity([], [])
+    assert len(is_duplicate) == 0 and len(scores) == 0
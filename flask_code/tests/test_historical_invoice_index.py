@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+historical_invoice_index = pytest.importorskip('Ingestor.historical_invoice_index')
+helper = pytest.importorskip('AP_Module.helper')
+
+HistoricalInvoiceIndex = historical_invoice_index.HistoricalInvoiceIndex
+
+pytestmark = pytest.mark.usefixtures('app_context')
+
+
+def _historical_df(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    supplier_ids = rng.integers(1, 40, n_rows)
+    return pd.DataFrame({
+        'ACCOUNTING_DOC': [f"DOC{number}" for number in range(n_rows)],
+        'POSTED_DATE': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 180, n_rows), unit='D'),
+        'batch_id': rng.integers(1, 5, n_rows),
+        'SUPPLIER_ID': supplier_ids.astype(str),
+        'SUPPLIER_NAME': [f"Supplier {chr(65 + each % 26)}{each} Ltd" for each in supplier_ids],
+        'INVOICE_NUMBER': [f"INV-{each:05d}" for each in rng.integers(0, 3000, n_rows)],
+        'INVOICE_DATE': pd.Timestamp('2023-12-01') + pd.to_timedelta(rng.integers(0, 200, n_rows), unit='D'),
+        'INVOICE_AMOUNT': np.round(rng.uniform(1, 5000, n_rows), 2),
+    })
+
+
+def _candidate_docs(tmp_path, historical_df, current_df):
+    historical_df.to_parquet(tmp_path / 'hist_1_1_m1_2024.parquet', index=False)
+    hist_index = HistoricalInvoiceIndex(str(tmp_path))
+    hist_index.refresh()
+    index_df = hist_index.load(['hist_1_1_m1_2024.parquet'], '2024-01-01', '2024-12-31')
+
+    hist_suppliers = index_df[['SUPPLIER_NAME']].drop_duplicates().reset_index(drop=True)
+    supplier_mask = helper.similar_supplier_names(hist_suppliers, current_df['SUPPLIER_NAME'].unique())
+    matched_supplier_names = hist_suppliers.loc[supplier_mask, 'SUPPLIER_NAME'].tolist()
+    mask = HistoricalInvoiceIndex.neighbour_mask(index_df, current_df, matched_supplier_names=matched_supplier_names)
+    return set(index_df.loc[mask, 'ACCOUNTING_DOC'])
+
+
+def _baseline_docs(historical_df, current_df):
+    """Rows kept by the vendor, invoice number and invoice date filters of the full window read"""
+    mask = helper.similar_supplier_names(historical_df, current_df['SUPPLIER_NAME'].unique()) | \
+        helper.get_matching_invoice_rows(historical_df, current_df['INVOICE_NUMBER'].unique()) | \
+        helper.get_matching_rows_with_same_invoice_date(historical_df, current_df['INVOICE_DATE'].unique())
+    return set(historical_df.loc[mask, 'ACCOUNTING_DOC'])
+
+
+def test_candidates_are_a_superset_of_the_baseline_filter(tmp_path):
+    historical_df = _historical_df(2000)
+    current_df = _historical_df(50, seed=1).rename(columns={'SUPPLIER_ID': 'VENDORCODE'})
+
+    baseline_docs = _baseline_docs(historical_df, current_df)
+    candidate_docs = _candidate_docs(tmp_path, historical_df, current_df)
+    assert baseline_docs
+    assert baseline_docs <= candidate_docs
+
+
+def test_amounts_in_adjacent_buckets_are_candidates(tmp_path):
+    historical_df = pd.DataFrame({
+        'ACCOUNTING_DOC': ['DOC1', 'DOC2', 'DOC3'],
+        'POSTED_DATE': pd.to_datetime(['2024-02-01'] * 3),
+        'batch_id': [1, 1, 1],
+        'SUPPLIER_ID': ['100', '100', '100'],
+        'SUPPLIER_NAME': ['Acme', 'Acme', 'Acme'],
+        'INVOICE_NUMBER': ['A1', 'A2', 'A3'],
+        'INVOICE_DATE': pd.to_datetime(['2024-01-10', '2024-01-11', '2024-01-12']),
+        'INVOICE_AMOUNT': [99.99, 101.50, 250.00],
+    })
+    current_df = pd.DataFrame({
+        'VENDORCODE': ['100'],
+        'SUPPLIER_NAME': ['Other'],
+        'INVOICE_NUMBER': ['B1'],
+        'INVOICE_DATE': pd.to_datetime(['2024-03-01']),
+        'INVOICE_AMOUNT': [100.00],
+    })
+    historical_df.to_parquet(tmp_path / 'hist_1_1_m2_2024.parquet', index=False)
+    hist_index = HistoricalInvoiceIndex(str(tmp_path))
+    hist_index.refresh()
+    index_df = hist_index.load(['hist_1_1_m2_2024.parquet'], '2024-01-01', '2024-12-31')
+
+    mask = HistoricalInvoiceIndex.neighbour_mask(index_df, current_df)
+    assert set(index_df.loc[mask, 'ACCOUNTING_DOC']) == {'DOC1', 'DOC2'}
+
+
+def test_invoice_numbers_normalising_to_empty_are_candidates(tmp_path):
+    historical_df = pd.DataFrame({
+        'ACCOUNTING_DOC': ['DOC1', 'DOC2', 'DOC3'],
+        'POSTED_DATE': pd.to_datetime(['2024-02-01'] * 3),
+        'batch_id': [1, 1, 1],
+        'SUPPLIER_ID': ['100', '200', '300'],
+        'SUPPLIER_NAME': ['Acme', 'Globex', 'Initech'],
+        'INVOICE_NUMBER': ['000', None, 'A3'],
+        'INVOICE_DATE': pd.to_datetime(['2024-01-10', '2024-01-11', '2024-01-12']),
+        'INVOICE_AMOUNT': [10.0, 20.0, 30.0],
+    })
+    current_df = pd.DataFrame({
+        'VENDORCODE': ['900', '901'],
+        'SUPPLIER_NAME': ['Umbrella', 'Wayne'],
+        'INVOICE_NUMBER': ['000', None],
+        'INVOICE_DATE': pd.to_datetime(['2024-03-01', '2024-03-02']),
+        'INVOICE_AMOUNT': [500.0, 600.0],
+    })
+
+    baseline_docs = _baseline_docs(historical_df, current_df)
+    assert baseline_docs == {'DOC1', 'DOC2'}
+    assert baseline_docs <= _candidate_docs(tmp_path, historical_df, current_df)
@@ -0,0 +1,35 @@
+import numpy as np
+
+from invoice_number_similarity.config import config
+from invoice_number_similarity.processing.data_management import load_features
+from invoice_number_similarity.processing.features import build_feature_matrix, extract_features
+
+from test_cpu_similarity_backend import EDGE_CASE_PAIRS, _random_pairs
+
+features_dict = load_features(file_name=config.FEATURES_FILE)
+FEATURES = features_dict['categorical'] + features_dict['numerical']
+
+
+def _single_pair_row(src, dest):
+    """Encoding of predict.make_prediction for one pair"""
+    data_features = extract_features(src, dest)
+    add_features = {k + '_' + v: 1 for k, v in data_features.items() if type(v) == str}
+    data_features.update(add_features)
+    data_features = {key: val for key, val in data_features.items() if key in FEATURES}
+    return np.array([data_features.get(col, -1) for col in FEATURES], dtype=float)
+
+
+def _scored_pairs(pairs):
+    # make_predictions only encodes the pairs where neither number contains the other
+    return [(src, dest) for src, dest in pairs if src not in dest and dest not in src]
+
+
+def test_feature_matrix_matches_the_single_pair_encoding():
+    pairs = _scored_pairs(EDGE_CASE_PAIRS + _random_pairs(2500, seed=3))
+    assert len(pairs) > 1000
+
+    matrix = build_feature_matrix([src for src, _ in pairs], [dest for _, dest in pairs], FEATURES)
+    expected = np.vstack([_single_pair_row(src, dest) for src, dest in pairs])
+    assert matrix.shape == expected.shape
+    mismatched_rows = np.flatnonzero(~np.isclose(matrix, expected).all(axis=1))
+    assert len(mismatched_rows) == 0, [pairs[row] for row in mismatched_rows[:5]]
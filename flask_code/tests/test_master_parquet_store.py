@@ -0,0 +1,74 @@
+import json
+import multiprocessing
+import os
+
+import pandas as pd
+import pytest
+
+from sap_data_pipeline import master_parquet_store
+from sap_data_pipeline.master_parquet_store import MasterParquetStore, read_master_table
+
+
+def _write_legacy(master_parquet_path, table_name, data_df):
+    table_dir = os.path.join(master_parquet_path, table_name)
+    os.makedirs(table_dir)
+    data_df.to_parquet(os.path.join(table_dir, f'SAP_{table_name}_data.parquet'), index=False)
+
+
+def test_legacy_read_skips_projected_columns_missing_from_the_file(tmp_path):
+    # Projections list the source and the renamed column names, a legacy file has only one of them
+    _write_legacy(str(tmp_path), 'T042Z', pd.DataFrame({'MANDT': ['100'], 'ZLSCH': ['C'], 'TEXT1': ['Check']}))
+
+    data_df = read_master_table(str(tmp_path), 'T042Z', columns=['CLIENT', 'MANDT', 'ZLSCH', 'TEXT1'])
+    assert list(data_df.columns) == ['MANDT', 'ZLSCH', 'TEXT1']
+    assert data_df.shape[0] == 1
+
+
+def test_append_adopts_the_legacy_file_as_first_part(tmp_path):
+    _write_legacy(str(tmp_path), 'LFA1', pd.DataFrame({'LIFNR': ['1', '2'], 'NAME1': ['A', 'B']}))
+    store = MasterParquetStore(str(tmp_path), 'LFA1', key_columns=['LIFNR'])
+
+    assert store.append(pd.DataFrame({'LIFNR': ['3'], 'NAME1': ['C']}))
+    assert sorted(store.read()['LIFNR']) == ['1', '2', '3']
+
+
+def test_compacted_parts_are_deleted_after_the_grace_period(tmp_path, monkeypatch):
+    store = MasterParquetStore(str(tmp_path), 'LFA1', key_columns=['LIFNR'])
+    for number in range(3):
+        store.append(pd.DataFrame({'LIFNR': [str(number)], 'NAME1': ['A']}))
+    old_parts = store._part_paths(store._load_manifest()['parts'])
+
+    store.compact()
+    # A reader that listed the old parts before the compaction can still read them
+    assert all(os.path.exists(path) for path in old_parts)
+    assert sorted(store.read()['LIFNR']) == ['0', '1', '2']
+
+    monkeypatch.setattr(master_parquet_store, 'RETIRED_GRACE_SECONDS', 0)
+    store.append(pd.DataFrame({'LIFNR': ['3'], 'NAME1': ['B']}))
+    assert not any(os.path.exists(path) for path in old_parts)
+    assert store._load_manifest()['retired'] == []
+    assert sorted(store.read()['LIFNR']) == ['0', '1', '2', '3']
+
+
+def _append_rows(master_parquet_path, worker, n_appends):
+    store = MasterParquetStore(master_parquet_path, 'LFA1', key_columns=['LIFNR'])
+    for number in range(n_appends):
+        store.append(pd.DataFrame({'LIFNR': [f"{worker}-{number}"], 'NAME1': ['A']}))
+
+
+@pytest.mark.skipif(master_parquet_store.fcntl is None, reason="cross process lock needs fcntl")
+def test_concurrent_appends_from_several_processes_keep_every_part(tmp_path, monkeypatch):
+    monkeypatch.setattr(master_parquet_store, 'MAX_PARTS', 1000)
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_append_rows, args=(str(tmp_path), worker, 10)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+    assert all(process.exitcode == 0 for process in workers)
+
+    store = MasterParquetStore(str(tmp_path), 'LFA1')
+    with open(store.manifest_path) as manifest_file:
+        manifest = json.load(manifest_file)
+    assert len(manifest['parts']) == 40
+    assert len(set(store.read()['LIFNR'])) == 40
@@ -0,0 +1,41 @@
+import os
+import pickle
+
+import pytest
+
+model_registry = pytest.importorskip('GL_Module.model_registry')
+pytest.importorskip('joblib')
+
+pytestmark = pytest.mark.usefixtures('app_context')
+
+
+def _save(path, model, mtime_ns):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as model_file:
+        pickle.dump(model, model_file)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_same_named_models_in_different_folders_do_not_collide(tmp_path):
+    registry = model_registry.ModelRegistry(cache_dir=str(tmp_path / 'cache'))
+    first_path, second_path = str(tmp_path / 'a' / 'model.pkl'), str(tmp_path / 'b' / 'model.pkl')
+    _save(first_path, {'model': 'a'}, 10**18)
+    _save(second_path, {'model': 'b'}, 10**18)
+
+    assert registry.get(first_path) == {'model': 'a'}
+    assert registry.get(second_path) == {'model': 'b'}
+    assert len(os.listdir(tmp_path / 'cache')) == 2
+    assert registry._locks == {}
+
+
+def test_retrained_model_replaces_its_cache_file(tmp_path):
+    registry = model_registry.ModelRegistry(cache_dir=str(tmp_path / 'cache'))
+    path = str(tmp_path / 'model.pkl')
+    _save(path, {'version': 1}, 10**18)
+    assert registry.get(path) == {'version': 1}
+
+    _save(path, {'version': 2}, 2 * 10**18)
+    assert registry.get(path) == {'version': 2}
+    cache_files = os.listdir(tmp_path / 'cache')
+    assert len(cache_files) == 1 and cache_files[0].endswith(f".{2 * 10**18}.joblib")
+    assert registry._locks == {}
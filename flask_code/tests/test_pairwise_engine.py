@@ -0,0 +1,73 @@
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from duplicate_invoices.model import duplicate_extract_helper as dupl_helper
+from duplicate_invoices.model.pairwise_engine import PairwiseComparisonEngine, build_group_arrays
+
+
+def _supplier_group(n_rows, seed=7):
+    """One supplier group with near-duplicate invoice numbers spread over prefixes and years"""
+    rng = np.random.default_rng(seed)
+    base_numbers = rng.integers(1000, 1400, n_rows)
+    prefixes = rng.choice(['INV-', 'inv', '', 'A', 'B/'], n_rows)
+    numbers = [f"{prefix}{number}" for prefix, number in zip(prefixes, base_numbers)]
+    return pd.DataFrame({
+        'PrimaryKeySimple': [f"PK{i}" for i in range(n_rows)],
+        'INVOICE_NUMBER_FORMAT': numbers,
+        'INVOICE_DATE': pd.Timestamp('2018-01-01') + pd.to_timedelta(rng.integers(0, 2000, n_rows), unit='D'),
+        'is_current_data': rng.random(n_rows) < 0.5,
+    })
+
+
+def _baseline_duplicates(group_df, similarity_columns):
+    """Row-wise reference: every pair of the group through is_invoice_similar"""
+    arrays = build_group_arrays(group_df, similarity_columns)
+    duplicates = {}
+    for i, j in combinations(range(len(group_df)), 2):
+        if not (arrays['is_current'][i] or arrays['is_current'][j]):
+            continue
+        is_duplicate, score = dupl_helper.is_invoice_similar(arrays['value'][i], arrays['value'][j])
+        if is_duplicate:
+            duplicates[tuple(sorted([arrays['pk'][i], arrays['pk'][j]]))] = (score, arrays['pk'][i], arrays['pk'][j])
+    return duplicates
+
+
+def _engine_duplicates(engine, group_df, similarity_columns):
+    arrays = build_group_arrays(group_df, similarity_columns)
+    duplicates, _, _ = engine.score_group(arrays, track_non_duplicates=False)
+    return {key: (value['score'], value['source_pk'], value['dest_pk']) for key, value in duplicates.items()}
+
+
+def test_large_group_finds_every_baseline_pair():
+    group_df = _supplier_group(1200)
+    engine = PairwiseComparisonEngine(max_block_size=500)
+    assert engine.sub_blocking is False
+
+    baseline = _baseline_duplicates(group_df, 'INVOICE_NUMBER_FORMAT')
+    assert baseline
+    assert _engine_duplicates(engine, group_df, 'INVOICE_NUMBER_FORMAT') == baseline
+
+
+def test_sub_blocking_only_returns_baseline_pairs():
+    group_df = _supplier_group(1200)
+    engine = PairwiseComparisonEngine(max_block_size=500, sub_blocking=True)
+
+    baseline = _baseline_duplicates(group_df, 'INVOICE_NUMBER_FORMAT')
+    sub_blocked = _engine_duplicates(engine, group_df, 'INVOICE_NUMBER_FORMAT')
+    # Lossy: a subset of the baseline pairs, with the same scores
+    assert set(sub_blocked) < set(baseline)
+    assert all(baseline[key] == value for key, value in sub_blocked.items())
+
+
+def test_tiles_cover_every_pair_once():
+    engine = PairwiseComparisonEngine(max_block_size=7)
+    arrays = {'pk': np.arange(30)}
+    pairs = []
+    for left, right in engine.iter_blocks(arrays):
+        if right is None:
+            pairs.extend(combinations(left.tolist(), 2))
+        else:
+            pairs.extend((min(i, j), max(i, j)) for i in left for j in right)
+    assert sorted(pairs) == list(combinations(range(30), 2))
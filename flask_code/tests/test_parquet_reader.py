@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+parquet_reader = pytest.importorskip('Ingestor.parquet_reader')
+
+pytestmark = pytest.mark.usefixtures('app_context')
+
+
+def _write(tmp_path, frames):
+    paths = []
+    for number, data_df in enumerate(frames):
+        path = tmp_path / f"part_{number}.parquet"
+        data_df.to_parquet(path)
+        paths.append(str(path))
+    return paths
+
+
+def test_date_window_and_projection_are_applied(tmp_path):
+    paths = _write(tmp_path, [
+        pd.DataFrame({'POSTED_DATE': pd.to_datetime(['2024-01-05', '2024-03-01']), 'batch_id': [1, 2], 'X': [1, 2]}),
+        pd.DataFrame({'POSTED_DATE': pd.to_datetime(['2024-02-05', '2024-05-01']), 'batch_id': [1, 2], 'X': [3, 4]}),
+    ])
+    data_df = parquet_reader.read_parquet_pushdown(paths, str(tmp_path), columns=['X'],
+                                                   start_date='2024-01-01', end_date='2024-02-28')
+    assert list(data_df.columns) == ['X']
+    assert sorted(data_df['X']) == [1, 3]
+
+
+@pytest.mark.parametrize('other_dates', [
+    pd.to_datetime(['2024-02-05', '2024-05-01']).tz_localize('UTC'),
+    pd.Series(['2024-02-05', '2024-05-01']),
+], ids=['tz_aware', 'text'])
+def test_mixed_date_column_types_fall_back_to_per_file_reads(tmp_path, other_dates):
+    paths = _write(tmp_path, [
+        pd.DataFrame({'POSTED_DATE': pd.to_datetime(['2024-01-05', '2024-03-01']), 'batch_id': [1, 2], 'X': [1, 2]}),
+        pd.DataFrame({'POSTED_DATE': other_dates, 'batch_id': [1, 2], 'X': [3, 4]}),
+    ])
+    data_df = parquet_reader.read_parquet_pushdown(paths, str(tmp_path), columns=['X'],
+                                                   start_date='2024-01-01', end_date='2024-02-28')
+    assert sorted(data_df['X']) == [1, 3]
+
+    batch_df = parquet_reader.read_parquet_pushdown(paths, str(tmp_path), batch_id=2)
+    assert sorted(batch_df['X']) == [2, 4]
+    assert len(batch_df['POSTED_DATE']) == 2
@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+
+from GL_Module.Recurring_entry import RecurringEntriesDetector
+
+RULE_COLUMNS = ['entry_id', 'frequency', 'credit_accounts', 'debit_accounts', 'keywords',
+                'amount', 'amount_deviation', 'min_amount', 'max_amount']
+
+
+def _baseline_documents(df_period):
+    """Per period document aggregation of the former row-wise implementation"""
+    df_work = df_period.copy()
+    df_work['CREDIT_ACCOUNT'] = df_work.apply(lambda x: x['ACCOUNT_CODE'] if x['CREDIT_AMOUNT'] > 0 else None, axis=1)
+    df_work['DEBIT_ACCOUNT'] = df_work.apply(lambda x: x['ACCOUNT_CODE'] if x['DEBIT_AMOUNT'] > 0 else None, axis=1)
+    agg = df_work.groupby('ACCOUNTDOCID').agg({
+        'CREDIT_ACCOUNT': lambda v: list(v.dropna().unique()),
+        'DEBIT_ACCOUNT': lambda v: list(v.dropna().unique()),
+        'AMOUNT': 'sum',
+        'TRANSACTION_DESCRIPTION': lambda v: next((t for t in v if pd.notna(t) and t), ''),
+    }).reset_index()
+    agg = agg[(agg['CREDIT_ACCOUNT'].apply(len) == 1) & (agg['DEBIT_ACCOUNT'].apply(len) == 1)]
+    agg['CREDIT_ACCOUNT'] = agg['CREDIT_ACCOUNT'].apply(lambda a: a[0])
+    agg['DEBIT_ACCOUNT'] = agg['DEBIT_ACCOUNT'].apply(lambda a: a[0])
+    return agg
+
+
+def _baseline_amount_match(amount, entry):
+    if entry['amount'] is not None and amount == entry['amount']:
+        return True
+    if entry['amount'] is not None and entry['amount_deviation'] is not None:
+        return abs(amount - entry['amount']) <= abs(float(entry['amount_deviation']) / 100 * entry['amount'])
+    if entry['min_amount'] is not None and entry['max_amount'] is not None:
+        return entry['min_amount'] <= amount <= entry['max_amount']
+    return False
+
+
+def _baseline_detect(detector):
+    """Rule by rule, period by period loop the vectorised detect() replaced"""
+    records = []
+    for _, entry in detector.recurring_entries.iterrows():
+        monthly = entry['frequency'].lower() == 'monthly'
+        period_col = 'month_year' if monthly else 'quarter_year'
+        for period in (detector.all_months if monthly else detector.all_quarters):
+            if monthly:
+                year, month = period.split('-')
+                month = int(month)
+            else:
+                year, month = int(period[:4]), (int(period[-1]) - 1) * 3 + 1
+            documents = _baseline_documents(detector.transactions[detector.transactions[period_col] == period])
+            documents = documents[(documents['CREDIT_ACCOUNT'] == entry['credit_accounts']) &
+                                  (documents['DEBIT_ACCOUNT'] == entry['debit_accounts'])]
+            keywords = [kw.strip().lower() for kw in (entry.get('keywords') or '').split(',') if kw.strip()]
+            rec_amount, doc_id = None, None
+            for _, doc in documents.iterrows():
+                if _baseline_amount_match(doc['AMOUNT'], entry) and \
+                        (not keywords or any(kw in (doc['TRANSACTION_DESCRIPTION'] or '').lower() for kw in keywords)):
+                    rec_amount, doc_id = doc['AMOUNT'], doc['ACCOUNTDOCID']
+                    break
+            records.append({'entry_id': entry['entry_id'], 'year': year, 'month': month,
+                            'is_present': doc_id is not None, 'recorded_amount': rec_amount,
+                            'account_doc_number': doc_id})
+    return pd.DataFrame(records)
+
+
+def _journal(doc_id, posted_date, credit_account, debit_account, amount, text='', extra_credit_account=None):
+    lines = [
+        {'ACCOUNTDOCID': doc_id, 'POSTED_DATE': posted_date, 'ACCOUNT_CODE': credit_account,
+         'CREDIT_AMOUNT': amount, 'DEBIT_AMOUNT': 0.0, 'AMOUNT': amount, 'TRANSACTION_DESCRIPTION': ''},
+        {'ACCOUNTDOCID': doc_id, 'POSTED_DATE': posted_date, 'ACCOUNT_CODE': debit_account,
+         'CREDIT_AMOUNT': 0.0, 'DEBIT_AMOUNT': amount, 'AMOUNT': 0.0, 'TRANSACTION_DESCRIPTION': text},
+    ]
+    if extra_credit_account is not None:
+        lines.append({'ACCOUNTDOCID': doc_id, 'POSTED_DATE': posted_date, 'ACCOUNT_CODE': extra_credit_account,
+                      'CREDIT_AMOUNT': 1.0, 'DEBIT_AMOUNT': 0.0, 'AMOUNT': 1.0, 'TRANSACTION_DESCRIPTION': None})
+    return lines
+
+
+def _assert_same_as_baseline(transactions_df, rules_df):
+    detector = RecurringEntriesDetector(transactions_df=transactions_df, recurring_df=rules_df)
+    result = detector.detect()
+    expected = _baseline_detect(detector)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+    return result
+
+
+def test_small_ledger_matches_the_baseline_loop():
+    transactions = pd.DataFrame(
+        # Rent: exact in January, within 10% in February, a multi account journal only in March
+        _journal(1, '2024-01-05', 'BANK', 'RENT', 1000.0, 'Office RENT January') +
+        _journal(2, '2024-02-05', 'BANK', 'RENT', 1080.0, 'office rent feb') +
+        _journal(3, '2024-03-05', 'BANK', 'RENT', 1000.0, 'Office rent March', extra_credit_account='FEES') +
+        # Salaries: keyword match on the second keyword only, and a document without the keywords
+        _journal(4, '2024-01-28', 'BANK', 'SALARY', 500.0, 'Staff Bonus') +
+        _journal(5, '2024-02-28', 'BANK', 'SALARY', 510.0, 'Transfer') +
+        _journal(6, '2024-02-27', 'BANK', 'SALARY', 505.0, 'monthly salary') +
+        # Insurance: amount 100 with a 5% deviation, the range of the rule must not apply
+        _journal(7, '2024-01-15', 'BANK', 'INSURANCE', 150.0, 'premium') +
+        _journal(8, '2024-02-15', 'BANK', 'INSURANCE', 104.0, 'premium') +
+        # Quarterly fee: amount without deviation, the range decides
+        _journal(9, '2024-02-01', 'BANK', 'FEES', 750.0, 'Quarterly fee') +
+        _journal(10, '2024-01-20', 'BANK', 'FEES', 20000.0, 'Quarterly fee')
+    )
+    rules = pd.DataFrame([
+        ['R1', 'Monthly', 'BANK', 'RENT', 'rent', 1000.0, 10.0, None, None],
+        ['R2', 'monthly', 'BANK', 'SALARY', 'salary, BONUS', None, None, 400.0, 600.0],
+        ['R3', 'monthly', 'BANK', 'INSURANCE', '', 100.0, 5.0, 0.0, 1000.0],
+        ['R4', 'Quarterly', 'BANK', 'FEES', None, 500.0, None, 100.0, 1000.0],
+        ['R5', 'monthly', 'BANK', 'UNKNOWN', '', None, None, None, None],
+    ], columns=RULE_COLUMNS, dtype=object)
+
+    result = _assert_same_as_baseline(transactions, rules)
+    present = result.set_index(['entry_id', 'month'])['account_doc_number']
+    assert present[('R1', 1)] == 1 and present[('R1', 2)] == 2 and pd.isna(present[('R1', 3)])
+    assert present[('R2', 1)] == 4 and present[('R2', 2)] == 6
+    assert pd.isna(present[('R3', 1)]) and present[('R3', 2)] == 8
+    assert present[('R4', 1)] == 9
+
+
+def test_random_ledger_matches_the_baseline_loop():
+    rng = np.random.default_rng(7)
+    accounts = ['BANK', 'RENT', 'SALARY', 'FEES', 'TAX']
+    texts = ['', 'rent', 'Salary run', 'bank FEES', 'misc', 'Tax payment']
+    lines = []
+    for doc_id in range(300):
+        credit_account, debit_account = rng.choice(accounts, 2, replace=False)
+        posted_date = pd.Timestamp('2024-01-01') + pd.Timedelta(days=int(rng.integers(0, 270)))
+        amount = float(rng.choice([100.0, 250.0, 500.0, 1000.0, float(rng.integers(1, 2000))]))
+        extra = rng.choice(accounts) if rng.random() < 0.15 else None
+        lines += _journal(doc_id, posted_date, credit_account, debit_account, amount,
+                          texts[rng.integers(0, len(texts))], extra_credit_account=extra)
+
+    rules = []
+    for number in range(12):
+        credit_account, debit_account = rng.choice(accounts, 2, replace=False)
+        amount = float(rng.choice([100.0, 500.0, 1000.0])) if rng.random() < 0.7 else None
+        deviation = float(rng.choice([5.0, 20.0])) if rng.random() < 0.5 else None
+        bounds = sorted(rng.integers(0, 2000, 2).astype(float)) if rng.random() < 0.6 else [None, None]
+        keywords = rng.choice(['', 'rent', 'salary,fees', 'TAX'])
+        rules.append([f"R{number}", rng.choice(['monthly', 'Quarterly']), credit_account, debit_account,
+                      keywords, amount, deviation, bounds[0], bounds[1]])
+
+    result = _assert_same_as_baseline(pd.DataFrame(lines), pd.DataFrame(rules, columns=RULE_COLUMNS, dtype=object))
+    assert result['is_present'].any()
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from GL_Module.robust_statistics import grouped_mad_outliers
+
+
+def _mad_labels_one_group(values, threshold, amount_threshold):
+    """
+    Reference: the per account MAD check the Unusual Accounting Pattern rule ran on
+    each account before grouped_mad_outliers (formerly Rules_Framework.mark_unusual_activity_using_MAD)
+    """
+    min_val = np.min(values)
+    max_val = np.max(values)
+    median = np.median(values)
+    if median != 0:
+        spread_ratio = (max_val - min_val) / median
+    else:
+        spread_ratio = 0
+    if spread_ratio < 0.2:
+        return np.zeros(len(values), dtype=bool)
+    mad = np.median(np.abs(values - median))
+    if mad == 0:
+        return (values != median) & ((np.abs(values - median) / median) >= 0.5)
+    modified_z = 0.6745 * (values - median) / mad
+    is_outlier = np.abs(modified_z) > threshold
+    if amount_threshold is not None:
+        is_outlier = is_outlier & (np.abs(values) > amount_threshold)
+    return is_outlier
+
+
+def _reference_labels(values, groups, threshold, amount_threshold):
+    labels = pd.Series(False, index=values.index)
+    for _, group_values in values.groupby(groups):
+        labels[group_values.index] = _mad_labels_one_group(group_values.to_numpy(), threshold, amount_threshold)
+    return labels
+
+
+GROUPS = {
+    # most values equal, MAD is zero: values at least 50% off the median are outliers
+    'zero_mad': [100.0, 100.0, 100.0, 100.0, 160.0, 140.0, 100.0],
+    # zero median gives a zero spread ratio, nothing is flagged
+    'zero_median': [0.0, 0.0, 0.0, 5000000.0, -5000000.0],
+    # (max - min) / median under 0.2, nothing is flagged
+    'low_spread': [1000000.0, 1050000.0, 1100000.0, 1010000.0, 1150000.0],
+    # large outlier above the amount threshold
+    'above_amount': [10.0, 12.0, 11.0, 13.0, 9.0, 12.0, 5000000.0],
+    # outlier by z-score but below the amount threshold
+    'below_amount': [10.0, 12.0, 11.0, 13.0, 9.0, 12.0, 900.0],
+    'single_value': [42.0],
+}
+
+
+def _edge_case_values():
+    groups = [name for name, values in GROUPS.items() for _ in values]
+    values = pd.Series([value for group_values in GROUPS.values() for value in group_values])
+    return values, np.array(groups)
+
+
+@pytest.mark.parametrize('amount_threshold', [1000000, None])
+def test_edge_cases_match_per_group_reference(amount_threshold):
+    values, groups = _edge_case_values()
+    result = grouped_mad_outliers(values, groups, threshold=4.5, amount_threshold=amount_threshold)
+    expected = _reference_labels(values, groups, 4.5, amount_threshold)
+    pd.testing.assert_series_equal(result['mad_label'], expected, check_names=False)
+
+
+def test_edge_cases_flag_the_expected_groups():
+    values, groups = _edge_case_values()
+    labels = grouped_mad_outliers(values, groups, threshold=4.5)['mad_label']
+    flagged = set(groups[labels.to_numpy()])
+    assert flagged == {'zero_mad', 'above_amount'}
+    labels = grouped_mad_outliers(values, groups, threshold=4.5, amount_threshold=None)['mad_label']
+    assert set(groups[labels.to_numpy()]) == {'zero_mad', 'above_amount', 'below_amount'}
+
+
+def test_random_ledgers_match_per_group_reference():
+    rng = np.random.default_rng(3)
+    n_rows = 20000
+    accounts = rng.integers(0, 60, n_rows)
+    values = pd.Series(np.round(rng.lognormal(10, 1.5, n_rows), 2))
+    # Accounts with repeated amounts (zero MAD) and spikes above the amount threshold
+    values[accounts % 7 == 0] = 2500.0
+    spikes = rng.random(n_rows) < 0.01
+    values[spikes] = values[spikes] * 1000
+    groups = accounts.astype(str)
+
+    for threshold in (3.5, 4.5):
+        result = grouped_mad_outliers(values, groups, threshold=threshold)
+        expected = _reference_labels(values, groups, threshold, 1000000)
+        pd.testing.assert_series_equal(result['mad_label'], expected, check_names=False)
+        assert expected.any()
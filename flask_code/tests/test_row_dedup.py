@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from row_dedup import anti_join
+
+
+def _baseline_anti_join(left, right, columns):
+    """Tuple membership anti-join the hash anti-join replaced"""
+    return left[~left[columns].apply(tuple, axis=1).isin(set(right[columns].apply(tuple, axis=1)))]
+
+
+@pytest.mark.parametrize('left_key, right_key', [
+    (pd.Series([1.0, 2.0, np.nan]), pd.Series([1, 'x', 5], dtype=object)),
+    (pd.Series([1, 2, 3], dtype='int64'), pd.Series([1.0, 'x', 3.5], dtype=object)),
+    (pd.Series([1, '2', 3.0, 'INV-4'], dtype=object), pd.Series([1.0, 2, np.int64(3), 'INV-4'], dtype=object)),
+    (pd.Series(['1', '2', 'A'], dtype=object), pd.Series([1, 2, 'A'], dtype=object)),
+    (pd.Series([1, 2, 3], dtype='int64'), pd.Series([1.0, 2.5, 3.0], dtype='float64')),
+    (pd.Series([10**17 + 1, 5], dtype='int64'), pd.Series([10**17, 'x'], dtype=object)),
+], ids=['float_vs_object', 'int_vs_object', 'mixed_objects', 'text_vs_numbers', 'int_vs_float', 'large_ints'])
+def test_mixed_key_dtypes_match_the_tuple_baseline(left_key, right_key):
+    left = pd.DataFrame({'KEY': left_key, 'COMPANY_CODE': ['1000'] * len(left_key)})
+    right = pd.DataFrame({'KEY': right_key, 'COMPANY_CODE': ['1000'] * len(right_key)})
+
+    result = anti_join(left, right, ['KEY', 'COMPANY_CODE'])
+    expected = _baseline_anti_join(left, right, ['KEY', 'COMPANY_CODE'])
+    assert result.index.tolist() == expected.index.tolist()
+
+
+def test_missing_keys_match_each_other():
+    left = pd.DataFrame({'KEY': [1.0, np.nan], 'DATE': pd.to_datetime(['2024-01-01', None])})
+    right = pd.DataFrame({'KEY': [np.nan], 'DATE': pd.to_datetime([None])})
+    assert anti_join(left, right, ['KEY', 'DATE']).index.tolist() == [0]
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('tensorflow')
+from duplicate_invoices.gpu.tf_backend import TFDuplicateAccelerator  # noqa: E402
+from duplicate_invoices.model.duplicate_extract_helper import is_invoice_similar  # noqa: E402
+
+from test_cpu_similarity_backend import EDGE_CASE_PAIRS, _random_pairs  # noqa: E402
+
+
+def _assert_same_as_scalar(pairs):
+    is_duplicate, scores = TFDuplicateAccelerator(use_mixed_precision=False).compute_similarity_batch_gpu(
+        [source for source, _ in pairs], [target for _, target in pairs])
+    for k, (source, target) in enumerate(pairs):
+        expected_duplicate, expected_score = is_invoice_similar(source, target)
+        # Scores are float32 on this path
+        assert bool(is_duplicate[k]) == bool(expected_duplicate), (source, target)
+        assert float(scores[k]) == pytest.approx(expected_score, rel=1e-6), (source, target)
+
+
+def test_empty_values_are_never_duplicates():
+    is_duplicate, scores = TFDuplicateAccelerator(use_mixed_precision=False).compute_similarity_batch_gpu(
+        ['', '', 'INV1'], ['', '123', ''])
+    assert not is_duplicate.any()
+    assert np.all(scores == 0)
+
+
+def test_edge_cases_match_is_invoice_similar():
+    _assert_same_as_scalar(EDGE_CASE_PAIRS + [(target, source) for source, target in EDGE_CASE_PAIRS])
+
+
+def test_random_pairs_match_is_invoice_similar():
+    _assert_same_as_scalar(_random_pairs(5000, seed=2))